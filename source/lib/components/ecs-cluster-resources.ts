@@ -56,6 +56,8 @@ export interface EcsClusterResourcesProps extends cdk.StackProps {
   readonly newPrivateSubnet1Id: string;
   readonly newPrivateSubnet2Id: string;
   readonly numberOfmonthsForTerminationCheck: string;
+  readonly maxConcurrentAccounts: string;
+  readonly apiRateLimits: string;
   readonly stableTagCondition: string;
   readonly stableTagInUse: string;
 }
@@ -166,7 +168,7 @@ export class EcsClusterResources extends Construct {
         }),
         new PolicyStatement({
           effect: Effect.ALLOW,
-          actions: ["s3:PutObject", "s3:GetObject"],
+          actions: ["s3:PutObject", "s3:GetObject", "s3:AbortMultipartUpload"],
           resources: [
             cdk.Arn.format(
               {
@@ -220,7 +222,7 @@ export class EcsClusterResources extends Construct {
         }),
       ],
     });
-    props.usageTable.grant(costOptimizerAdminPolicy, "dynamodb:GetItem", "dynamodb:PutItem");
+    props.usageTable.grant(costOptimizerAdminPolicy, "dynamodb:GetItem", "dynamodb:PutItem", "dynamodb:Scan");
     costOptimizerAdminPolicy.attachToRole(costOptimizerAdminRole);
     overrideLogicalId(costOptimizerAdminPolicy, "CostOptimizerAdminPolicy");
     addCfnNagSuppression(costOptimizerAdminPolicy, {
@@ -299,6 +301,13 @@ export class EcsClusterResources extends Construct {
           image: image,
           cpu: 256,
           readonlyRootFilesystem: true,
+          mountPoints: [
+            {
+              sourceVolume: "tmp",
+              containerPath: "/tmp",
+              readOnly: false,
+            },
+          ],
           logConfiguration: {
             logDriver: "awslogs",
             options: {
@@ -404,6 +413,14 @@ export class EcsClusterResources extends Construct {
               name: "NumberOfMonthsForTerminationCheck",
               value: props.numberOfmonthsForTerminationCheck,
             },
+            {
+              name: "MaxConcurrentAccounts",
+              value: props.maxConcurrentAccounts,
+            },
+            {
+              name: "ApiRateLimits",
+              value: props.apiRateLimits,
+            },
             {
               name: "ImageVersion",
               value: image,
@@ -415,6 +432,11 @@ export class EcsClusterResources extends Construct {
           ],
         },
       ],
+      volumes: [
+        {
+          name: "tmp",
+        },
+      ],
     });
     overrideLogicalId(ecsTaskDefinition, "CostOptimizerTaskDefinition");
 
@@ -42,6 +42,12 @@ export class UsageReportBucketResources extends Construct {
       expiration: cdk.Duration.days(365),
       id: "DeletionRule",
     });
+    // Removes the parts of the multipart uploads of the reports which were not aborted
+    costOptimizerBucket.addLifecycleRule({
+      enabled: true,
+      abortIncompleteMultipartUploadAfter: cdk.Duration.days(1),
+      id: "AbortIncompleteMultipartUploadRule",
+    });
     overrideLogicalId(costOptimizerBucket, "CostOptimizerBucket");
 
     const costOptimizerBucketPolicy = costOptimizerBucket.policy as BucketPolicy;
@@ -215,7 +215,7 @@ export class VpcResources extends Construct {
     const s3EndPointPolicyDocument = new PolicyDocument({
       statements: [
         new PolicyStatement({
-          actions: ["s3:PutObject", "s3:GetObject"],
+          actions: ["s3:PutObject", "s3:GetObject", "s3:AbortMultipartUpload"],
           principals: [new AnyPrincipal()],
           resources: [
             cdk.Arn.format(
@@ -281,7 +281,7 @@ export class VpcResources extends Construct {
           },
         }),
         new PolicyStatement({
-          actions: ["dynamodb:PutItem", "dynamodb:GetItem"],
+          actions: ["dynamodb:PutItem", "dynamodb:GetItem", "dynamodb:Scan"],
           principals: [new AnyPrincipal()],
           resources: [
             cdk.Arn.format(
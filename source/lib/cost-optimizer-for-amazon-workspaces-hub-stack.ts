@@ -214,6 +214,21 @@ export class CostOptimizerHubStack extends cdk.Stack {
       default: "",
     });
 
+    const maxConcurrentAccounts = new CfnParameter(this, "MaxConcurrentAccounts", {
+      type: "Number",
+      description: "The number of accounts processed in parallel in a multi account deployment. Default is 4.",
+      default: 4,
+      minValue: 1,
+      maxValue: 32,
+    });
+
+    const apiRateLimits = new CfnParameter(this, "ApiRateLimits", {
+      type: "String",
+      description:
+        'Overrides of the requests per second of each account and region, as JSON keyed by service or "service:Operation", e.g. {"cloudwatch:GetMetricData": 25}. Leave blank for the default limits.',
+      default: "",
+    });
+
     const numberOfMonthsForTerminationCheck = new CfnParameter(this, "NumberOfMonthsForTerminationCheck", {
       type: "String",
       description:
@@ -286,7 +301,11 @@ export class CostOptimizerHubStack extends cdk.Stack {
           },
           {
             Label: { default: "Multi account deployment" },
-            Parameters: [organizationID.logicalId, managementAccountId.logicalId],
+            Parameters: [organizationID.logicalId, managementAccountId.logicalId, maxConcurrentAccounts.logicalId],
+          },
+          {
+            Label: { default: "API rate limits" },
+            Parameters: [apiRateLimits.logicalId],
           },
         ],
         ParameterLabels: {
@@ -347,6 +366,12 @@ export class CostOptimizerHubStack extends cdk.Stack {
           [numberOfMonthsForTerminationCheck.logicalId]: {
             default: "Number of months for termination check",
           },
+          [maxConcurrentAccounts.logicalId]: {
+            default: "Number of accounts processed in parallel",
+          },
+          [apiRateLimits.logicalId]: {
+            default: "API rate limit overrides",
+          },
         },
       },
     };
@@ -537,6 +562,8 @@ export class CostOptimizerHubStack extends cdk.Stack {
       newPrivateSubnet1Id: costOptimizerVpc.privateSubnet1.attrSubnetId,
       newPrivateSubnet2Id: costOptimizerVpc.privateSubnet2.attrSubnetId,
       numberOfmonthsForTerminationCheck: numberOfMonthsForTerminationCheck.valueAsString,
+      maxConcurrentAccounts: maxConcurrentAccounts.valueAsString,
+      apiRateLimits: apiRateLimits.valueAsString,
       stableTagCondition: stableTagCondition.logicalId,
       stableTagInUse: stableTagging.valueAsString,
     };
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Measures the session and client setup overhead paid per directory, with and without the
+shared client factory. No AWS calls are made. Run from source/workspaces_app:
+
+    python -m benchmarks.bench_client_factory --directories 50
+"""
+
+# Standard Library
+import argparse
+import os
+import time
+
+# AWS Libraries
+import boto3
+import botocore
+
+# Cost Optimizer for Amazon Workspaces
+from workspaces_app.utils import client_factory
+
+REGION = "us-east-1"
+boto_config = botocore.config.Config(
+    max_pool_connections=100,
+    retries={"max_attempts": 20, "mode": "standard"},
+)
+
+
+def setup_directory_without_factory(spoke_session: boto3.session.Session) -> None:
+    # Mirrors the clients previously built for every directory
+    boto3.session.Session().client("dynamodb", config=boto_config)  # UsageTableDAO
+    boto3.session.Session().client("dynamodb", config=boto_config)  # UserSessionDAO
+    spoke_session.client("cloudwatch", region_name=REGION, config=boto_config)
+    spoke_session.client("workspaces", region_name=REGION, config=boto_config)
+    spoke_session.client("cloudwatch", region_name=REGION, config=boto_config)
+    spoke_session.client("sts")
+    boto3.session.Session().client("s3", config=boto_config)  # s3_put_report
+
+
+def setup_directory_with_factory(spoke_session: boto3.session.Session) -> None:
+    default_session = client_factory.get_default_session()
+    client_factory.get_client(default_session, "dynamodb", config=boto_config)
+    client_factory.get_client(default_session, "dynamodb", config=boto_config)
+    client_factory.get_client(spoke_session, "cloudwatch", REGION, boto_config)
+    client_factory.get_client(spoke_session, "workspaces", REGION, boto_config)
+    client_factory.get_client(spoke_session, "cloudwatch", REGION, boto_config)
+    client_factory.get_client(spoke_session, "sts")
+    client_factory.get_client(default_session, "s3", config=boto_config)
+
+
+def run(name: str, setup, spoke_session, directories: int) -> None:
+    start = time.perf_counter()
+    setup(spoke_session)
+    startup = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(directories - 1):
+        setup(spoke_session)
+    per_directory = (time.perf_counter() - start) / max(directories - 1, 1)
+    print(
+        f"{name:<16} startup: {startup * 1000:8.1f} ms   "
+        f"per directory: {per_directory * 1000:8.2f} ms   "
+        f"total for {directories} directories: {(startup + per_directory * (directories - 1)):6.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--directories", type=int, default=50)
+    args = parser.parse_args()
+    for variable in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(variable, "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", REGION)
+
+    run(
+        "without factory",
+        setup_directory_without_factory,
+        boto3.session.Session(),
+        args.directories,
+    )
+    client_factory.clear()
+    run(
+        "with factory",
+        setup_directory_with_factory,
+        client_factory.new_session(),
+        args.directories,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+Measures the conversion of workspace records and user sessions to and from DynamoDB
+items, with the per-field TypeSerializer conversion and with the compiled codec. No AWS
+calls are made. Run from source/workspaces_app:
+
+    python -m benchmarks.bench_ddb_codec --records 100000
+"""
+
+# Standard Library
+import argparse
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+# AWS Libraries
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# Cost Optimizer for Amazon Workspaces
+from workspaces_app.user_session import UserSession
+from workspaces_app.workspace_record import (
+    WeightedAverage,
+    WorkspaceBillingData,
+    WorkspaceDescription,
+    WorkspacePerformanceMetrics,
+    WorkspaceRecord,
+)
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def workspace_record_to_ddb_obj_per_field(ws_record: WorkspaceRecord) -> dict:
+    # Mirrors WorkspaceRecord.to_ddb_obj before the codec
+    ddb_obj = {}
+    for key, value in ws_record.to_json().items():
+        ddb_obj |= {
+            WorkspaceRecord.class_field_to_ddb_attr(key): TypeSerializer().serialize(
+                value
+            )
+        }
+    return ddb_obj
+
+
+def workspace_record_from_ddb_obj_per_field(
+    ddb_item: dict, ws_description: WorkspaceDescription
+) -> WorkspaceRecord:
+    # Mirrors WorkspaceRecord.from_ddb_obj before the codec
+    ddb_as_json = {}
+    for key, value in ddb_item.items():
+        ddb_as_json |= {
+            WorkspaceRecord.ddb_attr_to_class_field(
+                key
+            ): TypeDeserializer().deserialize(value)
+        }
+    return WorkspaceRecord(
+        description=ws_description,
+        billing_data=WorkspaceBillingData.from_json(ddb_as_json),
+        report_date=ddb_as_json["report_date"],
+        last_reported_metric_period=ddb_as_json["last_reported_metric_period"],
+        last_known_user_connection=ddb_as_json["last_known_user_connection"],
+        performance_metrics=WorkspacePerformanceMetrics.from_json(ddb_as_json),
+        tags=ddb_as_json["tags"],
+        workspace_type=ddb_as_json["workspace_type"],
+    )
+
+
+def user_session_to_ddb_obj_per_field(user_session: UserSession) -> dict:
+    # Mirrors UserSession.to_ddb_obj before the codec, with the active sessions as a list
+    serializer = TypeSerializer()
+    class_as_json = asdict(user_session)
+    class_as_json["active_sessions"] = [
+        time.strftime(TIME_FORMAT) for time in class_as_json["active_sessions"]
+    ]
+    return {
+        UserSession.class_field_to_ddb_attr(key): serializer.serialize(value)
+        for key, value in class_as_json.items()
+    }
+
+
+def create_workspace_record(index: int) -> WorkspaceRecord:
+    return WorkspaceRecord(
+        description=WorkspaceDescription(
+            region="us-east-1",
+            account="111111111111",
+            workspace_id=f"ws-{index:09d}",
+            directory_id="d-0000000000",
+            usage_threshold=Decimal(85),
+            bundle_type="STANDARD",
+            username=f"user-{index}",
+            computer_name=f"computer-{index}",
+            initial_mode="AUTO_STOP",
+        ),
+        billing_data=WorkspaceBillingData(
+            billable_hours=index % 200, change_reported="-N-", new_mode="AUTO_STOP"
+        ),
+        performance_metrics=WorkspacePerformanceMetrics(
+            in_session_latency=WeightedAverage(Decimal("93.42"), 67),
+            cpu_usage=WeightedAverage(Decimal("14.42"), 68),
+            memory_usage=WeightedAverage(Decimal("55.42"), 69),
+            root_volume_disk_usage=WeightedAverage(Decimal("46.42"), 70),
+            user_volume_disk_usage=None,
+            udp_packet_loss_rate=None,
+        ),
+        report_date="2024-01-31T00:00:00Z",
+        last_reported_metric_period="2024-01-30T23:55:00Z",
+        last_known_user_connection="2024-01-30T18:00:00Z",
+        tags="[{'Key': 'team', 'Value': 'finance'}]",
+        workspace_type="PRIMARY",
+    )
+
+
+def create_user_session(index: int) -> UserSession:
+    start = datetime(2024, 1, 1, 9, tzinfo=timezone.utc)
+    return UserSession(
+        workspace_id=f"ws-{index:09d}",
+        directory_id="d-0000000000",
+        region="us-east-1",
+        account="111111111111",
+        username=f"user-{index}",
+        # A workday of connected 5 minutes samples
+        active_sessions=[start + timedelta(minutes=5 * slot) for slot in range(96)],
+        duration_hours=8,
+        in_session_latency=Decimal("93.42"),
+        cpu_usage=Decimal("14.42"),
+        memory_usage=Decimal("55.42"),
+        root_volume_disk_usage=Decimal("46.42"),
+        user_volume_disk_usage=Decimal("37.42"),
+        udp_packet_loss_rate=Decimal("0.42"),
+    )
+
+
+def run(name: str, convert, values: list) -> list:
+    start = time.perf_counter()
+    results = [convert(value) for value in values]
+    seconds = time.perf_counter() - start
+    print(
+        f"{name:<40} total: {seconds:6.2f} s   "
+        f"per record: {seconds / len(values) * 1_000_000:7.1f} us"
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    ws_records = [create_workspace_record(index) for index in range(args.records)]
+    ddb_items = run(
+        "WorkspaceRecord to item, per field",
+        workspace_record_to_ddb_obj_per_field,
+        ws_records,
+    )
+    assert (
+        run("WorkspaceRecord to item, codec", WorkspaceRecord.to_ddb_obj, ws_records)
+        == ddb_items
+    )
+    ws_description = ws_records[0].description
+    run(
+        "WorkspaceRecord from item, per field",
+        lambda item: workspace_record_from_ddb_obj_per_field(item, ws_description),
+        ddb_items,
+    )
+    run(
+        "WorkspaceRecord from item, codec",
+        lambda item: WorkspaceRecord.from_ddb_obj(item, ws_description),
+        ddb_items,
+    )
+
+    user_sessions = [create_user_session(index) for index in range(args.records)]
+    run(
+        "UserSession to item, per field",
+        user_session_to_ddb_obj_per_field,
+        user_sessions,
+    )
+    session_items = run(
+        "UserSession to item, codec", UserSession.to_ddb_obj, user_sessions
+    )
+    run("UserSession from item, codec", UserSession.from_ddb_obj, session_items)
+
+
+if __name__ == "__main__":
+    main()
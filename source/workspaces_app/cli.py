@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import argparse
+import json
+import os
+import shutil
+import sys
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+import main
+import workspaces_app.utils.date_utils as date_utils
+from workspaces_app.account_registry import AccountInfo
+from workspaces_app.run_planner import build_plan
+from workspaces_app.scheduler import get_budget_seconds
+from workspaces_app.utils.dashboard_metrics import DashboardMetrics
+from workspaces_app.utils.report_sink import ReportSink
+from workspaces_app.work_scheduler import DirectoryTarget
+from workspaces_app.workspace_record import WorkspaceRecord
+
+logger = Logger(service="wco_cli")
+log_level = str(os.getenv("LogLevel", "INFO"))
+logger.setLevel(log_level)
+
+# Stack parameters which are only used to publish a run, a scoped run does not publish
+CLI_DEFAULT_PARAMETERS = {
+    "LogLevel": "INFO",
+    "DryRun": "Yes",
+    "TestEndOfMonth": "No",
+    "SendAnonymousData": "No",
+    "SolutionVersion": "local",
+    "SolutionID": "local",
+    "UUID": "local",
+    "BucketName": "",
+    "TerminateUnusedWorkspaces": "No",
+}
+
+
+def parse_args(argv: typing.Union[typing.List[str], None] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Process a subset of the WorkSpaces with the same code as the ECS task. "
+            "The other settings are read from the environment variables of the task."
+        )
+    )
+    parser.add_argument(
+        "--account",
+        help="the account to process, the account of the credentials by default",
+    )
+    parser.add_argument(
+        "--role-name",
+        help="the role to assume in --account, looked up in the account registry by default",
+    )
+    parser.add_argument(
+        "--region",
+        action="append",
+        help="a region to process, may be repeated. Defaults to the Regions variable",
+    )
+    parser.add_argument(
+        "--directory", action="append", help="a directory id, may be repeated"
+    )
+    parser.add_argument(
+        "--workspace", action="append", help="a workspace id, may be repeated"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="the number of directories processed in parallel",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="do not modify or terminate workspaces, the default. Pass --no-dry-run to "
+        "apply the changes",
+    )
+    parser.add_argument(
+        "--output",
+        help="write the report to this file instead of uploading it to the bucket",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="write the estimated API calls and runtime as JSON instead of processing",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.output is None and not args.plan and not os.getenv("BucketName"):
+        parser.error("--output is required when BucketName is not set")
+    return args
+
+
+def get_stack_parameters(args: argparse.Namespace) -> dict[str, any]:
+    """
+    This method returns the stack parameters of the task with the overrides of the flags.
+    Workspaces are only modified with --no-dry-run, whatever the DryRun variable is.
+    """
+    for parameter, value in CLI_DEFAULT_PARAMETERS.items():
+        os.environ.setdefault(parameter, value)
+    stack_parameters = main.get_stack_parameters()
+    stack_parameters["DryRun"] = "Yes" if args.dry_run else "No"
+    return stack_parameters
+
+
+def get_target_account(
+    args: argparse.Namespace, current_account: str
+) -> typing.Union[AccountInfo, str]:
+    """
+    This method returns the account to process, either the current account or a spoke
+    account with the role to assume in it
+    """
+    if args.account is None or args.account == current_account:
+        return current_account
+    if args.role_name:
+        return AccountInfo(args.account, args.role_name)
+    for account in main.get_accounts(current_account):
+        if account != current_account and account.account_id == args.account:
+            return account
+    raise ValueError(
+        f"Account {args.account} is not registered, pass the role to assume with --role-name"
+    )
+
+
+def get_regions(args: argparse.Namespace) -> typing.Set[str]:
+    valid_workspaces_regions = main.get_valid_workspaces_regions(main.get_partition())
+    requested_regions = ",".join(args.region or []) or os.getenv("Regions", "")
+    return main.process_input_regions(requested_regions, valid_workspaces_regions)
+
+
+def get_targets(
+    session,
+    regions: typing.Set[str],
+    directory_ids: typing.Union[typing.List[str], None],
+) -> typing.List[typing.Tuple[str, dict]]:
+    """This method lists the directories of the regions and keeps the requested ones."""
+    targets = []
+    for region in sorted(regions):
+        for directory in main.get_workspaces_directories(session, region):
+            if directory_ids is None or directory.get("DirectoryId") in directory_ids:
+                targets.append((region, directory))
+    return targets
+
+
+def write_plan(
+    args: argparse.Namespace,
+    session,
+    account_id: str,
+    regions: typing.Set[str],
+    targets: typing.List[typing.Tuple[str, dict]],
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+) -> dict[str, any]:
+    """This method writes the plan of the requested directories to --output or stdout."""
+    plan = build_plan(
+        [
+            DirectoryTarget(account_id, session, region, directory)
+            for region, directory in targets
+        ],
+        [account_id],
+        regions,
+        date_time_values,
+        get_budget_seconds(stack_parameters),
+    )
+    if args.output is not None:
+        with open(args.output, "w") as output:
+            json.dump(plan, output, indent=2)
+        logger.info(f"Wrote the plan to {args.output}")
+    else:
+        print(json.dumps(plan, indent=2))
+    return plan
+
+
+def run(argv: typing.Union[typing.List[str], None] = None) -> int:
+    """
+    This method processes the requested directories and workspaces. Each directory goes
+    through process_directories, with the directories processed by --workers threads.
+    :return: the exit status
+    """
+    args = parse_args(argv)
+    stack_parameters = get_stack_parameters(args)
+    date_time_values = date_utils.get_date_time_values_for_processing()
+    current_account = main.get_account()
+    account = get_target_account(args, current_account)
+    session = main.get_account_session(account, current_account)
+    regions = get_regions(args)
+    targets = get_targets(session, regions, args.directory)
+    if args.plan:
+        write_plan(
+            args,
+            session,
+            main.get_account_id(account, current_account),
+            regions,
+            targets,
+            stack_parameters,
+            date_time_values,
+        )
+        return 0
+    workspace_ids = set(args.workspace) if args.workspace else None
+    logger.info(
+        f"Processing {len(targets)} directories of account "
+        f"{main.get_account_id(account, current_account)} with {args.workers} workers"
+    )
+
+    def process_target(
+        target: typing.Tuple[str, dict],
+    ) -> typing.Tuple[int, list[list[dict]], DashboardMetrics, ReportSink]:
+        region, directory = target
+        dashboard_metrics = DashboardMetrics()
+        report_sink = ReportSink(copy_objects=False)
+        directory_count, workspaces_processed = main.process_directories(
+            session,
+            {region},
+            stack_parameters,
+            date_time_values,
+            dashboard_metrics,
+            report_sink,
+            {region: [directory]},
+            workspace_ids,
+            upload=args.output is None,
+        )
+        return directory_count, workspaces_processed, dashboard_metrics, report_sink
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(process_target, targets))
+
+    dashboard_metrics = DashboardMetrics()
+    workspace_count = 0
+    with ReportSink(copy_objects=False) as report_sink:
+        report_sink.write(WorkspaceRecord.csv_header())
+        for _, workspaces_processed, directory_metrics, directory_sink in results:
+            with directory_sink:
+                report_sink.write_sink(directory_sink)
+            dashboard_metrics.merge(directory_metrics)
+            workspace_count += sum(
+                len(workspaces) for workspaces in workspaces_processed
+            )
+        if args.output is not None:
+            with open(args.output, "wb") as output:
+                shutil.copyfileobj(report_sink.open(), output)
+            logger.info(f"Wrote the report to {args.output}")
+    logger.info(
+        f"Processed {workspace_count} workspaces: {dashboard_metrics.to_json()}"
+    )
+    main.shutdown_compute_pool()
+    main.shutdown_session_writers()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
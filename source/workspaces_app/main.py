@@ -5,29 +5,73 @@
 
 # Standard Library
 import calendar
+import json
 import os
+import socket
+import threading
 import time
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from typing import Any, Union
 
 # AWS Libraries
 import boto3
 import botocore
-import botocore.credentials
 from aws_lambda_powertools import Logger
 
 # Cost Optimizer for Amazon Workspaces
 import workspaces_app.utils.date_utils as date_utils
+from workspaces_app.account_preflight import preflight_accounts
 from workspaces_app.account_registry import (
     AccountInfo,
     AccountRegistry,
     get_account_registry,
 )
+from workspaces_app.async_engine import AsyncDirectoryReader
+from workspaces_app.credential_manager import get_credential_manager
+from workspaces_app.directory_inventory import (
+    DirectoryInventory,
+    get_directory_inventory,
+)
 from workspaces_app.directory_reader import DirectoryReader
+from workspaces_app.metrics_compute import shutdown_compute_pool
+from workspaces_app.pipeline import PipelineDirectoryReader
+from workspaces_app.run_planner import build_plan
+from workspaces_app.scheduler import (
+    PLAN_ATTRIBUTES,
+    RunScheduler,
+    get_budget_seconds,
+    get_stored_priority_counts,
+    is_end_of_month,
+    start_run_scheduler,
+)
+from workspaces_app.utils import client_factory
 from workspaces_app.utils.dashboard_metrics import DashboardMetrics
-from workspaces_app.utils.s3_utils import upload_report
+from workspaces_app.utils.report_sink import ReportSink
+from workspaces_app.utils.session_writer import shutdown_session_writers
+from workspaces_app.utils.s3_utils import (
+    create_s3_key,
+    upload_report,
+    upload_report_sink,
+)
 from workspaces_app.utils.solution_metrics import SolutionMetricsHelper
+from workspaces_app.utils.usage_table_dao import UsageTableDAO
+from workspaces_app.work_queue import (
+    Lease,
+    WorkQueue,
+    WorkResult,
+    WorkUnit,
+    get_work_queue,
+)
+from workspaces_app.work_scheduler import (
+    DirectoryTarget,
+    LargestFirstScheduler,
+    WorkItem,
+    plan_work_items,
+)
+from workspaces_app.workspace_record import WorkspaceRecord
+from workspaces_app.workspaces_helper import list_workspaces_for_directory
 
 logger = Logger(service="wco_main")
 log_level = str(os.getenv("LogLevel", "INFO"))
@@ -39,42 +83,88 @@ boto_config = botocore.config.Config(
     user_agent_extra=os.getenv("UserAgentString"),
 )
 
+REPORT_HEADER = (
+    "WorkspaceID,Billable Hours,Usage Threshold,Change Reported,Bundle Type,Initial Mode,New Mode,"
+    "Username,Computer Name,DirectoryId,WorkspaceTerminated,insessionlatency,cpuusage,memoryusage,"
+    "rootvolumediskusage,uservolumediskusage,udppacketlossrate,Tags,WorkspaceType,ReportDate\n"
+)
+
 
 def refreshable_session(
     account: AccountInfo,
 ) -> boto3.session.Session:
-    get_credentials_partial = partial(get_credentials, account)
-    refreshable_creds = (
-        botocore.credentials.RefreshableCredentials.create_from_metadata(
-            metadata=get_credentials(account),
-            refresh_using=get_credentials_partial,
-            method="sts-assume-role",
-        )
+    return get_credential_manager().get_session(account)
+
+
+def prefetch_credentials(
+    accounts: list[typing.Union[AccountInfo, str]], current_account: str
+) -> None:
+    """This method assumes the spoke roles up front and keeps them refreshed in the background."""
+    credential_manager = get_credential_manager()
+    credential_manager.prefetch(
+        [account for account in accounts if account != current_account]
     )
-    session = botocore.session.get_session()
-    session._credentials = refreshable_creds
-    refreshable_session = boto3.session.Session(botocore_session=session)
-    return refreshable_session
+    credential_manager.start_refresh()
+
+
+def get_reachable_accounts(
+    accounts: list[typing.Union[AccountInfo, str]],
+    current_account: str,
+    regions: typing.Set[str],
+) -> list[typing.Union[AccountInfo, str]]:
+    """
+    This method excludes the spoke accounts which can not be reached, so they are reported
+    up front instead of failing after the retries of every region.
+    """
+    if os.getenv("AccountPreflight", "Yes") == "No" or not regions:
+        return accounts
+    # Probe in the region of the task when it is processed, WorkSpaces is available there
+    region = os.getenv("AWS_REGION")
+    if region not in regions:
+        region = sorted(regions)[0]
+    reachable_accounts, _ = preflight_accounts(accounts, current_account, region)
+    return reachable_accounts
 
 
-def get_credentials(account: AccountInfo) -> dict[str, str]:
-    sts_client = boto3.client("sts", config=boto_config)  # use default session
-    response = sts_client.assume_role(
-        RoleArn=account.role_name, RoleSessionName="SessionName"
+def plan_run_priorities(
+    run_scheduler: RunScheduler,
+    accounts: list[typing.Union[AccountInfo, str]],
+    current_account: str,
+    regions: typing.Set[str],
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+) -> None:
+    """
+    This method counts the workspaces of each priority in the records of the previous
+    runs, so the time of the high priority workspaces of the directories processed last is
+    reserved from the start of the run.
+    """
+    if not run_scheduler.has_budget:
+        return
+    usage_table_dao = UsageTableDAO(
+        client_factory.get_default_session(),
+        os.environ.get("UsageTable"),
+        os.getenv("AWS_REGION"),
     )
-    credentials = response.get("Credentials")
-    return {
-        "access_key": credentials.get("AccessKeyId"),
-        "secret_key": credentials.get("SecretAccessKey"),
-        "token": credentials.get("SessionToken"),
-        "expiry_time": credentials.get("Expiration").isoformat(),
-    }
+    try:
+        priority_counts = get_stored_priority_counts(
+            usage_table_dao.scan_ddb_items(PLAN_ATTRIBUTES),
+            is_end_of_month(stack_parameters, date_time_values),
+            [get_account_id(account, current_account) for account in accounts],
+            regions,
+        )
+    except Exception as e:
+        # The directories are still scheduled by priority as they are listed
+        logger.warning(f"Unable to plan the priorities of the run. Error: {e}")
+        return
+    run_scheduler.plan(priority_counts)
 
 
 def ecs_handler() -> None:
     """Perform workspaces management tasks and upload reports."""
     logger.info("Begin ECS task handler.")
     stack_parameters = get_stack_parameters()
+    run_scheduler = start_run_scheduler(stack_parameters)
     date_time_values = date_utils.get_date_time_values_for_processing()
     solution_metrics_helper = SolutionMetricsHelper(stack_parameters)
     solution_metrics_helper.start_timer()
@@ -82,66 +172,776 @@ def ecs_handler() -> None:
     valid_workspaces_regions = get_valid_workspaces_regions(partition)
     regions = process_input_regions(os.getenv("Regions"), valid_workspaces_regions)
     current_account = get_account()
-    # Policy: always perform workspaces management on the current account
-    accounts = [current_account]
-    account_registry: AccountRegistry = get_account_registry(boto3.session.Session())
-    accounts.extend(account_registry.get_accounts())
+    accounts = get_accounts(current_account)
+    prefetch_credentials(accounts, current_account)
+    accounts = get_reachable_accounts(accounts, current_account, regions)
+    account_directories = discover_directories(accounts, current_account, regions)
+    plan_run_priorities(
+        run_scheduler,
+        accounts,
+        current_account,
+        regions,
+        stack_parameters,
+        date_time_values,
+    )
 
-    dashboard_metrics = DashboardMetrics()
-    is_dry_run = stack_parameters.get("DryRun")
-    terminate_unused_workspaces = stack_parameters.get("TerminateUnusedWorkspaces")
-    aggregated_csv = (
-        "WorkspaceID,Billable Hours,Usage Threshold,Change Reported,Bundle Type,Initial Mode,New Mode,"
-        "Username,Computer Name,DirectoryId,WorkspaceTerminated,insessionlatency,cpuusage,memoryusage,"
-        "rootvolumediskusage,uservolumediskusage,udppacketlossrate,Tags,WorkspaceType,ReportDate\n"
+    if os.getenv("WorkScheduler", "Account") == "LargestFirst":
+        process = process_work_items
+    else:
+        process = process_accounts
+    (
+        report_sink,
+        total_directories,
+        list_workspaces_processed,
+        dashboard_metrics,
+    ) = process(
+        accounts,
+        current_account,
+        regions,
+        stack_parameters,
+        date_time_values,
+        account_directories,
     )
+
+    dashboard_metrics.update_concurrency_metrics(
+        client_factory.get_concurrency_controller().get_metrics()
+    )
+    with report_sink:
+        publish_run(
+            stack_parameters,
+            date_time_values,
+            solution_metrics_helper,
+            report_sink,
+            list_workspaces_processed,
+            dashboard_metrics,
+            total_directories,
+            len(regions),
+        )
+
+    get_credential_manager().stop_refresh()
+    shutdown_compute_pool()
+    shutdown_session_writers()
+    run_scheduler.log_summary()
+    client_factory.get_concurrency_controller().log_summary()
+    client_factory.get_circuit_breakers().log_summary()
+    client_factory.get_hedged_caller().log_summary()
+    logger.info("Completed ECS task handler.")
+
+
+def process_accounts(
+    accounts: list[typing.Union[AccountInfo, str]],
+    current_account: str,
+    regions: typing.Set[str],
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+    account_directories: dict[str, dict[str, list[dict]]],
+) -> tuple[ReportSink, int, list[list[list[dict]]], DashboardMetrics]:
+    """
+    :param accounts: the current account followed by the spoke accounts
+    :param current_account: the id of the account the ECS task runs in
+    :param regions: Set of AWS regions.
+    :param stack_parameters: Dictionary containing parameters used in the stack.
+    :param date_time_values: Dictionary of various relevant date strings.
+    :param account_directories: the directories found by the discovery, keyed by account id
+    :return: the aggregated report, the number of directories, the workspaces processed by
+        account and the dashboard metrics of the run
+    This method processes the accounts in parallel, the directories of an account one after
+    the other.
+    """
+    dashboard_metrics = DashboardMetrics()
+    report_sink = ReportSink()
+    report_sink.write(REPORT_HEADER)
     total_directories = 0
     list_workspaces_processed = []
-    for account in accounts:
-        try:
-            spoke_session = None
-            if account != current_account:
-                spoke_session = refreshable_session(account)
-            else:
-                spoke_session = boto3.session.Session()
-
-            (
-                report_csv,
-                directory_count,
-                workspaces_processed,
-            ) = process_directories(
-                spoke_session,
+    max_concurrent_accounts = get_max_concurrent_accounts()
+    logger.info(
+        f"Processing {len(accounts)} accounts with {max_concurrent_accounts} in parallel"
+    )
+    with ThreadPoolExecutor(max_workers=max_concurrent_accounts) as executor:
+        futures = [
+            executor.submit(
+                process_account,
+                account,
+                current_account,
                 regions,
                 stack_parameters,
                 date_time_values,
-                dashboard_metrics,
+                account_directories.get(get_account_id(account, current_account)),
+            )
+            for account in accounts
+        ]
+        # Merge in the order of the accounts so the report does not depend on completion order
+        for account, future in zip(accounts, futures):
+            try:
+                (
+                    account_report_sink,
+                    directory_count,
+                    workspaces_processed,
+                    account_dashboard_metrics,
+                ) = future.result()
+
+                with account_report_sink:
+                    report_sink.write_sink(account_report_sink)
+                total_directories = total_directories + directory_count
+                list_workspaces_processed.append(workspaces_processed)
+                dashboard_metrics.merge(account_dashboard_metrics)
+            except Exception as e:
+                logger.exception(
+                    f"Error processing workspaces for account {account}: {str(e)}"
+                )
+    return (
+        report_sink,
+        total_directories,
+        list_workspaces_processed,
+        dashboard_metrics,
+    )
+
+
+def process_work_items(
+    accounts: list[typing.Union[AccountInfo, str]],
+    current_account: str,
+    regions: typing.Set[str],
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+    account_directories: dict[str, dict[str, list[dict]]],
+) -> tuple[ReportSink, int, list[list[list[dict]]], DashboardMetrics]:
+    """
+    :param accounts: the current account followed by the spoke accounts
+    :param current_account: the id of the account the ECS task runs in
+    :param regions: Set of AWS regions.
+    :param stack_parameters: Dictionary containing parameters used in the stack.
+    :param date_time_values: Dictionary of various relevant date strings.
+    :param account_directories: the directories found by the discovery, keyed by account id
+    :return: the aggregated report, the number of directories, the workspaces processed by
+        account and the dashboard metrics of the run
+    This method splits all the directories of all the accounts into work items and processes
+    them largest first on a single worker pool. The results are merged in the order of the
+    accounts, regions and directories, so the report does not depend on the schedule.
+    """
+    targets = []
+    for account in accounts:
+        account_id = get_account_id(account, current_account)
+        try:
+            session = get_account_session(account, current_account)
+            directories = account_directories.get(account_id)
+            for region in sorted(regions):
+                if directories is not None:
+                    region_directories = directories.get(region, [])
+                else:
+                    region_directories = get_workspaces_directories(session, region)
+                for directory in region_directories:
+                    targets.append(
+                        DirectoryTarget(account_id, session, region, directory)
+                    )
+        except Exception as e:
+            logger.exception(
+                f"Error listing the directories for account {account}: {str(e)}"
             )
+    work_items = plan_work_items(targets)
+    futures = LargestFirstScheduler().run(
+        work_items,
+        partial(
+            process_work_item,
+            stack_parameters=stack_parameters,
+            date_time_values=date_time_values,
+        ),
+    )
 
-            aggregated_csv = aggregated_csv + report_csv
-            total_directories = total_directories + directory_count
-            list_workspaces_processed.append(workspaces_processed)
+    dashboard_metrics = DashboardMetrics()
+    report_sink = ReportSink()
+    report_sink.write(REPORT_HEADER)
+    workspaces_processed_by_account = {}
+    directory_workspace_count = 0
+    chunk_reports = []
+    for work_item, future in zip(work_items, futures):
+        directory_id = work_item.directory.get("DirectoryId")
+        account_workspaces = workspaces_processed_by_account.setdefault(
+            work_item.account_id, []
+        )
+        if work_item.chunk_index == 0:
+            account_workspaces.append([])
+            directory_workspace_count = 0
+            chunk_reports = []
+        try:
+            (
+                workspace_count,
+                list_workspaces,
+                directory_csv,
+                item_dashboard_metrics,
+            ) = future.result()
+            dashboard_metrics.merge(item_dashboard_metrics)
+            account_workspaces[-1].extend(list_workspaces)
+            directory_workspace_count = directory_workspace_count + workspace_count
+            chunk_reports.append(directory_csv)
+            if not report_sink.copy_objects:
+                report_sink.write(directory_csv)
         except Exception as e:
             logger.exception(
-                f"Error processing workspaces for account {account}: {str(e)}"
+                f"Error processing chunk {work_item.chunk_index} of directory {directory_id}: {str(e)}"
+            )
+        if work_item.chunk_index < work_item.chunk_count - 1:
+            continue
+        if work_item.chunk_count > 1 and directory_workspace_count:
+            # The chunks do not upload, the directory report is uploaded once complete
+            upload_report(
+                client_factory.get_default_session(),
+                date_time_values,
+                stack_parameters,
+                WorkspaceRecord.csv_header() + "".join(chunk_reports),
+                directory_id,
+                work_item.region,
+                work_item.account_id,
             )
+        if report_sink.copy_objects and directory_workspace_count:
+            report_sink.add_object(
+                create_s3_key(
+                    stack_parameters,
+                    directory_id,
+                    work_item.region,
+                    work_item.account_id,
+                    date_time_values,
+                )
+            )
+    return (
+        report_sink,
+        len(targets),
+        list(workspaces_processed_by_account.values()),
+        dashboard_metrics,
+    )
+
+
+def process_work_item(
+    work_item: WorkItem,
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+) -> tuple[int, list[dict], str, DashboardMetrics]:
+    """
+    :param work_item: the directory or the chunk of a directory to process
+    :param stack_parameters: Dictionary containing parameters used in the stack.
+    :param date_time_values: Dictionary of various relevant date strings.
+    :return: the number of workspaces, the workspaces processed, the report rows and the
+        dashboard metrics of the work item
+    This method processes the workspaces of a work item with its own metrics.
+    """
+    dashboard_metrics = DashboardMetrics()
+    directory_reader = get_directory_reader(work_item.session, work_item.region)
+    (
+        workspace_count,
+        list_workspaces,
+        directory_csv,
+    ) = directory_reader.process_directory(
+        stack_parameters,
+        get_directory_params(work_item.directory, work_item.region, date_time_values),
+        dashboard_metrics,
+        work_item.workspaces,
+        upload=work_item.chunk_count == 1,
+    )
+    dashboard_metrics.update_total_workspaces(workspace_count)
+    return workspace_count, list_workspaces, directory_csv, dashboard_metrics
+
+
+def coordinator_handler() -> None:
+    """
+    Publish a work unit for every directory, process units until the queue is drained
+    and merge the partial reports of all workers into the aggregated report.
+    """
+    logger.info("Begin coordinator.")
+    stack_parameters = get_stack_parameters()
+    run_scheduler = start_run_scheduler(stack_parameters)
+    date_time_values = date_utils.get_date_time_values_for_processing()
+    solution_metrics_helper = SolutionMetricsHelper(stack_parameters)
+    solution_metrics_helper.start_timer()
+    partition = get_partition()
+    valid_workspaces_regions = get_valid_workspaces_regions(partition)
+    regions = process_input_regions(os.getenv("Regions"), valid_workspaces_regions)
+    current_account = get_account()
+    accounts = get_accounts(current_account)
+    prefetch_credentials(accounts, current_account)
+    accounts = get_reachable_accounts(accounts, current_account, regions)
+
+    work_queue = get_work_queue(client_factory.get_default_session())
+    units = get_work_units(accounts, current_account, regions, date_time_values)
+    work_queue.put(units)
+    logger.info(f"Published {len(units)} work units")
+    results = wait_for_results(work_queue, units, stack_parameters)
+
+    dashboard_metrics = DashboardMetrics()
+    report_sink = ReportSink()
+    report_sink.write(REPORT_HEADER)
+    workspaces_processed_by_account = {}
+    # Merge in the order the units were published so the report does not depend on the workers
+    for unit in units:
+        result = results.get(unit.unit_id)
+        if result is None:
+            logger.error(f"No result for work unit {unit.unit_id}")
+            continue
+        if result.error:
+            logger.error(f"Work unit {unit.unit_id} failed: {result.error}")
+        if report_sink.copy_objects:
+            if result.report_csv:
+                report_sink.add_object(
+                    create_s3_key(
+                        stack_parameters,
+                        unit.directory.get("DirectoryId"),
+                        unit.region,
+                        unit.account_id,
+                        date_time_values,
+                    )
+                )
+        else:
+            report_sink.write(result.report_csv)
+        workspaces_processed_by_account.setdefault(unit.account_id, []).append(
+            result.workspaces_processed
+        )
+        dashboard_metrics.merge(DashboardMetrics.from_json(result.dashboard_metrics))
 
-    upload_report(
-        boto3.session.Session(), date_time_values, stack_parameters, aggregated_csv
+    dashboard_metrics.update_concurrency_metrics(
+        client_factory.get_concurrency_controller().get_metrics()
+    )
+    with report_sink:
+        publish_run(
+            stack_parameters,
+            date_time_values,
+            solution_metrics_helper,
+            report_sink,
+            list(workspaces_processed_by_account.values()),
+            dashboard_metrics,
+            len(units),
+            len(regions),
+        )
+
+    get_credential_manager().stop_refresh()
+    shutdown_compute_pool()
+    shutdown_session_writers()
+    run_scheduler.log_summary()
+    client_factory.get_concurrency_controller().log_summary()
+    client_factory.get_circuit_breakers().log_summary()
+    client_factory.get_hedged_caller().log_summary()
+    logger.info("Completed coordinator.")
+
+
+def worker_handler() -> None:
+    """Process work units published by the coordinator until the queue is empty."""
+    logger.info("Begin worker.")
+    stack_parameters = get_stack_parameters()
+    run_scheduler = start_run_scheduler(stack_parameters)
+    work_queue = get_work_queue(client_factory.get_default_session())
+    get_credential_manager().start_refresh()
+    processed = run_worker(work_queue, stack_parameters)
+    get_credential_manager().stop_refresh()
+    shutdown_compute_pool()
+    shutdown_session_writers()
+    run_scheduler.log_summary()
+    client_factory.get_concurrency_controller().log_summary()
+    client_factory.get_circuit_breakers().log_summary()
+    client_factory.get_hedged_caller().log_summary()
+    logger.info(f"Completed worker after processing {processed} work units.")
+
+
+def plan_handler() -> dict[str, any]:
+    """
+    Estimate the API calls and the runtime of a run with listing calls only. The plan is
+    printed as JSON, nothing is modified.
+    """
+    logger.info("Begin plan.")
+    stack_parameters = get_stack_parameters()
+    date_time_values = date_utils.get_date_time_values_for_processing()
+    partition = get_partition()
+    valid_workspaces_regions = get_valid_workspaces_regions(partition)
+    regions = process_input_regions(os.getenv("Regions"), valid_workspaces_regions)
+    current_account = get_account()
+    accounts = get_accounts(current_account)
+    prefetch_credentials(accounts, current_account)
+    accounts = get_reachable_accounts(accounts, current_account, regions)
+    account_directories = discover_directories(
+        accounts, current_account, regions, update_inventory=False
+    )
+
+    targets = []
+    for account in accounts:
+        account_id = get_account_id(account, current_account)
+        directories = account_directories.get(account_id)
+        if directories is None:
+            logger.warning(f"The directories of account {account_id} are not planned")
+            continue
+        session = get_account_session(account, current_account)
+        for region in sorted(regions):
+            for directory in directories.get(region, []):
+                targets.append(DirectoryTarget(account_id, session, region, directory))
+    plan = build_plan(
+        targets,
+        [get_account_id(account, current_account) for account in accounts],
+        regions,
+        date_time_values,
+        get_budget_seconds(stack_parameters),
+    )
+    print(json.dumps(plan, indent=2))
+
+    get_credential_manager().stop_refresh()
+    logger.info("Completed plan.")
+    return plan
+
+
+def get_accounts(current_account: str) -> list[typing.Union[AccountInfo, str]]:
+    """This method returns the current account followed by the registered spoke accounts."""
+    # Policy: always perform workspaces management on the current account
+    accounts = [current_account]
+    account_registry: AccountRegistry = get_account_registry(
+        client_factory.get_default_session()
+    )
+    accounts.extend(account_registry.get_accounts())
+    return accounts
+
+
+def publish_run(
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+    solution_metrics_helper: SolutionMetricsHelper,
+    report_sink: ReportSink,
+    list_workspaces_processed: list,
+    dashboard_metrics: DashboardMetrics,
+    total_directories: int,
+    region_count: int,
+) -> None:
+    """This method uploads the aggregated report and publishes the metrics for the run."""
+    upload_report_sink(
+        client_factory.get_default_session(),
+        date_time_values,
+        stack_parameters,
+        report_sink,
     )
 
     solution_metrics_helper.report_metrics(
         list_workspaces_processed,
         dashboard_metrics.total_workspaces,
         total_directories,
-        len(regions),
+        region_count,
     )
 
     execution_time = round(solution_metrics_helper._timer.get_elapsed_time() / 60, 2)
     dashboard_metrics.publish_metrics(
-        execution_time, is_dry_run, terminate_unused_workspaces
+        execution_time,
+        stack_parameters.get("DryRun"),
+        stack_parameters.get("TerminateUnusedWorkspaces"),
     )
 
-    logger.info("Completed ECS task handler.")
+
+def get_work_units(
+    accounts: list[typing.Union[AccountInfo, str]],
+    current_account: str,
+    regions: typing.Set[str],
+    date_time_values: dict[str, any],
+) -> list[WorkUnit]:
+    """
+    :param accounts: the current account followed by the spoke accounts
+    :param current_account: the id of the account the ECS task runs in
+    :param regions: Set of AWS regions.
+    :param date_time_values: Dictionary of various relevant date strings.
+    :return: a work unit for every directory of every account and region
+    This method enumerates the directories to process in this run.
+    """
+    run_id = os.getenv("RunId") or time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    account_directories = discover_directories(accounts, current_account, regions)
+    units = []
+    for account in accounts:
+        account_id = get_account_id(account, current_account)
+        role_name = account.role_name if account != current_account else None
+        directories = account_directories.get(account_id)
+        if directories is None:
+            continue
+        for region in sorted(regions):
+            for directory in directories.get(region, []):
+                units.append(
+                    WorkUnit(
+                        unit_id=f"{account_id}_{region}_{directory.get('DirectoryId')}",
+                        run_id=run_id,
+                        account_id=account_id,
+                        role_name=role_name,
+                        region=region,
+                        directory=directory,
+                        date_time_values=date_time_values,
+                    )
+                )
+    return units
+
+
+def get_account_id(
+    account: typing.Union[AccountInfo, str], current_account: str
+) -> str:
+    return account if account == current_account else account.account_id
+
+
+def get_account_session(
+    account: typing.Union[AccountInfo, str], current_account: str
+) -> boto3.session.Session:
+    if account != current_account:
+        return refreshable_session(account)
+    session = client_factory.get_default_session()
+    client_factory.get_circuit_breakers().set_account_id(
+        client_factory.get_credentials_identity(session), current_account
+    )
+    return session
+
+
+def discover_directories(
+    accounts: list[typing.Union[AccountInfo, str]],
+    current_account: str,
+    regions: typing.Set[str],
+    directory_inventory: typing.Union[DirectoryInventory, None] = None,
+    update_inventory: bool = True,
+) -> dict[str, dict[str, list[dict]]]:
+    """
+    :param accounts: the current account followed by the spoke accounts
+    :param current_account: the id of the account the ECS task runs in
+    :param regions: Set of AWS regions.
+    :param directory_inventory: the inventory of the previous runs, loaded when not given
+    :param update_inventory: record the directory counts in the inventory and save it
+    :return: the directories of each region, keyed by account id. Accounts without a session
+        are left out so they are listed again when they are processed.
+    This method lists the directories of all the account and region pairs concurrently.
+    Regions the inventory knows to have no directories are not listed.
+    """
+    if not regions:
+        return {}
+    if directory_inventory is None:
+        directory_inventory = get_directory_inventory(
+            client_factory.get_default_session()
+        )
+    account_directories = {}
+    pairs = []
+    for account in accounts:
+        account_id = get_account_id(account, current_account)
+        try:
+            session = get_account_session(account, current_account)
+        except Exception as e:
+            logger.exception(
+                f"Error creating a session for account {account}: {str(e)}"
+            )
+            continue
+        account_directories[account_id] = {}
+        for region in sorted(regions):
+            if directory_inventory and directory_inventory.is_known_empty(
+                account_id, region
+            ):
+                logger.debug(f"Skipping {account_id} {region} without directories")
+                continue
+            pairs.append((account_id, session, region))
+
+    max_workers = int(os.getenv("MaxConcurrentDiscovery", "16"))
+    logger.info(f"Listing the directories of {len(pairs)} account and region pairs")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(get_workspaces_directories, session, region, True)
+            for _, session, region in pairs
+        ]
+    for (account_id, _, region), future in zip(pairs, futures):
+        try:
+            directories = future.result()
+        except Exception as e:
+            # Leave the account out so its directories are listed again when it is processed
+            logger.exception(
+                f"Error listing the directories for account {account_id} in {region}: {str(e)}"
+            )
+            account_directories.pop(account_id, None)
+            continue
+        if account_id in account_directories:
+            account_directories[account_id][region] = directories
+        if directory_inventory and update_inventory:
+            directory_inventory.record(account_id, region, len(directories))
+    if directory_inventory and update_inventory:
+        directory_inventory.save()
+    return account_directories
+
+
+def wait_for_results(
+    work_queue: WorkQueue, units: list[WorkUnit], stack_parameters: dict[str, any]
+) -> dict[str, WorkResult]:
+    """
+    This method works on the queue alongside the workers and collects the results until
+    every unit has a result or the coordinator timeout has passed.
+    """
+    timeout_seconds = int(os.getenv("CoordinatorTimeoutSeconds", "7200"))
+    poll_seconds = int(os.getenv("WorkQueuePollSeconds", "30"))
+    deadline = time.monotonic() + timeout_seconds
+    results = {}
+    while True:
+        run_worker(work_queue, stack_parameters)
+        missing_units = [unit for unit in units if unit.unit_id not in results]
+        results.update(work_queue.get_results(missing_units))
+        missing_count = len(units) - len(results)
+        if not missing_count:
+            return results
+        if time.monotonic() >= deadline:
+            logger.error(f"Timed out waiting for {missing_count} work units")
+            return results
+        logger.info(f"Waiting for {missing_count} work units")
+        time.sleep(poll_seconds)
+
+
+def run_worker(
+    work_queue: WorkQueue,
+    stack_parameters: dict[str, any],
+    worker_id: typing.Union[str, None] = None,
+) -> int:
+    """
+    :param work_queue: the queue to lease work units from
+    :param stack_parameters: Dictionary containing parameters used in the stack.
+    :param worker_id: the owner of the leases, defaults to the host name and process id
+    :return: the number of work units leased
+    This method leases and processes work units until the queue has none available. A unit
+    which fails is released for another attempt, after the last attempt an error result is
+    recorded so the coordinator does not wait for it.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    lease_seconds = int(os.getenv("WorkLeaseSeconds", "900"))
+    max_attempts = int(os.getenv("WorkMaxAttempts", "3"))
+    sessions = {}
+    processed = 0
+    while (lease := work_queue.lease(worker_id, lease_seconds)) is not None:
+        processed = processed + 1
+        stop_renewal = threading.Event()
+        renewal = threading.Thread(
+            target=renew_lease,
+            args=(work_queue, lease, lease_seconds, stop_renewal),
+            daemon=True,
+        )
+        renewal.start()
+        try:
+            result = process_work_unit(lease.unit, stack_parameters, sessions)
+            work_queue.complete(lease, result)
+        except Exception as e:
+            logger.exception(
+                f"Error processing work unit {lease.unit.unit_id}, attempt {lease.attempts}: {str(e)}"
+            )
+            if lease.attempts >= max_attempts:
+                work_queue.complete(
+                    lease,
+                    WorkResult(
+                        unit_id=lease.unit.unit_id,
+                        report_csv="",
+                        workspaces_processed=[],
+                        dashboard_metrics=DashboardMetrics().to_json(),
+                        error=str(e),
+                    ),
+                )
+            else:
+                work_queue.release(lease)
+        finally:
+            stop_renewal.set()
+            renewal.join()
+    return processed
+
+
+def renew_lease(
+    work_queue: WorkQueue,
+    lease: Lease,
+    lease_seconds: int,
+    stop_renewal: threading.Event,
+) -> None:
+    """This method extends the lease at half of its duration until the unit is done."""
+    while not stop_renewal.wait(lease_seconds / 2):
+        try:
+            work_queue.extend(lease, lease_seconds)
+        except Exception as e:
+            logger.exception(
+                f"Error extending the lease for work unit {lease.unit.unit_id}: {str(e)}"
+            )
+
+
+def process_work_unit(
+    unit: WorkUnit,
+    stack_parameters: dict[str, any],
+    sessions: dict[str, boto3.session.Session],
+) -> WorkResult:
+    """
+    :param unit: the directory to process
+    :param stack_parameters: Dictionary containing parameters used in the stack.
+    :param sessions: sessions of the accounts processed by this worker, keyed by account id
+    :return: the partial report for the directory
+    This method processes the workspaces of a single directory.
+    """
+    session = sessions.get(unit.account_id)
+    if session is None:
+        if unit.role_name:
+            session = refreshable_session(AccountInfo(unit.account_id, unit.role_name))
+        else:
+            session = client_factory.get_default_session()
+        sessions[unit.account_id] = session
+    dashboard_metrics = DashboardMetrics()
+    directory_reader = get_directory_reader(session, unit.region)
+    (
+        workspace_count,
+        list_workspaces,
+        directory_csv,
+    ) = directory_reader.process_directory(
+        stack_parameters,
+        get_directory_params(unit.directory, unit.region, unit.date_time_values),
+        dashboard_metrics,
+    )
+    dashboard_metrics.update_total_workspaces(workspace_count)
+    return WorkResult(
+        unit_id=unit.unit_id,
+        report_csv=directory_csv,
+        workspaces_processed=list_workspaces,
+        dashboard_metrics=dashboard_metrics.to_json(),
+        error=None,
+    )
+
+
+def process_account(
+    account: typing.Union[AccountInfo, str],
+    current_account: str,
+    regions: typing.Set[str],
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+    directories: typing.Union[dict[str, list[dict]], None] = None,
+) -> tuple[ReportSink, int, list[list[dict]], DashboardMetrics]:
+    """
+    :param account: the account to process, either the current account or a spoke account
+    :param current_account: the id of the account the ECS task runs in
+    :param regions: Set of AWS regions.
+    :param stack_parameters: Dictionary containing parameters used in the stack.
+    :param date_time_values: Dictionary of various relevant date strings.
+    :param directories: the directories of each region found by the discovery, if any
+    :return: The sink with the report rows, the number of directories processed, the list of
+        the workspaces processed and the dashboard metrics collected for the account.
+    This method processes all the workspaces of a single account with its own session and metrics.
+    """
+    spoke_session = get_account_session(account, current_account)
+    account_dashboard_metrics = DashboardMetrics()
+    report_sink = ReportSink()
+    try:
+        directory_count, workspaces_processed = process_directories(
+            spoke_session,
+            regions,
+            stack_parameters,
+            date_time_values,
+            account_dashboard_metrics,
+            report_sink,
+            directories,
+        )
+    except Exception:
+        report_sink.close()
+        raise
+    return (
+        report_sink,
+        directory_count,
+        workspaces_processed,
+        account_dashboard_metrics,
+    )
+
+
+def get_max_concurrent_accounts() -> int:
+    """This method returns the number of accounts to process in parallel."""
+    try:
+        return max(1, int(os.getenv("MaxConcurrentAccounts", "4")))
+    except ValueError:
+        logger.warning(
+            "Invalid value for MaxConcurrentAccounts: {}. Defaulting to 1".format(
+                os.getenv("MaxConcurrentAccounts")
+            )
+        )
+        return 1
 
 
 def get_stack_parameters() -> dict[str, any]:
@@ -216,8 +1016,9 @@ def get_partition() -> str:
     This method gets the partition based the STS caller identity.
     """
     logger.debug("Getting the value for the partition")
-    my_session = boto3.session.Session()
-    sts_client = my_session.client("sts", config=boto_config)
+    sts_client = client_factory.get_client(
+        client_factory.get_default_session(), "sts", config=boto_config
+    )
     partition = sts_client.get_caller_identity()["Arn"].split(":")[1]
     logger.debug("Returning the partition value as {}".format(partition))
     return partition
@@ -226,8 +1027,9 @@ def get_partition() -> str:
 def get_account() -> str:
     """This method gets the partition based the STS caller identity."""
     logger.debug("Getting the value for the account")
-    my_session = boto3.session.Session()
-    sts_client = my_session.client("sts", config=boto_config)
+    sts_client = client_factory.get_client(
+        client_factory.get_default_session(), "sts", config=boto_config
+    )
     account = sts_client.get_caller_identity()["Account"]
     logger.debug("Returning the account value as %s", account)
     return account
@@ -270,8 +1072,10 @@ def get_valid_workspaces_regions(partition: str) -> list[str]:
     elif partition == "aws-iso-b":
         list_valid_workspaces_regions = ["us-isob-east-1"]
     try:
-        list_valid_workspaces_regions = boto3.session.Session().get_available_regions(
-            "workspaces", partition
+        list_valid_workspaces_regions = (
+            client_factory.get_default_session().get_available_regions(
+                "workspaces", partition
+            )
         )
     except Exception as e:
         logger.exception(
@@ -318,18 +1122,19 @@ def process_input_regions(
 
 
 def get_workspaces_directories(
-    session: boto3.session.Session, region: str
+    session: boto3.session.Session, region: str, raise_errors: bool = False
 ) -> typing.List[dict]:
     """
     :param: AWS region
+    :param raise_errors: raise the error instead of returning an empty list
     :return: List of workspace directories for a given region.
     This method returns the list of AWS directories in the given region.
     """
     logger.debug("Getting the workspace directories for the region {}".format(region))
     list_directories = []
     try:
-        workspace_client = session.client(
-            "workspaces", region_name=region, config=boto_config
+        workspace_client = client_factory.get_client(
+            session, "workspaces", region, boto_config
         )
         logger.info("Scanning Workspace Directories for Region %s", region)
         response = workspace_client.describe_workspace_directories()
@@ -347,66 +1152,254 @@ def get_workspaces_directories(
                 region, e
             )
         )
+        if raise_errors:
+            raise
     logger.debug("Returning the list of directories as {}".format(list_directories))
     return list_directories
 
 
+def get_directory_reader(
+    session: boto3.session.Session, region: str
+) -> DirectoryReader:
+    """
+    This method returns the reader of a directory. ProcessingEngine=Pipeline processes the
+    workspaces through the stages of the pipeline, ProcessingEngine=Asyncio processes them
+    concurrently in an event loop.
+    """
+    processing_engine = os.getenv("ProcessingEngine", "Threads")
+    if processing_engine == "Pipeline":
+        return PipelineDirectoryReader(session, region)
+    if processing_engine == "Asyncio":
+        return AsyncDirectoryReader(session, region)
+    return DirectoryReader(session, region)
+
+
 def process_directories(
     session: boto3.session.Session,
     workspaces_regions: typing.Set[str],
     stack_parameters: dict[str, any],
     date_time_values: dict[str, any],
     dashboard_metrics: DashboardMetrics,
-) -> tuple[Union[int, Any], Union[str, Any], Union[int, Any], list[list[dict]],]:
+    report_sink: ReportSink,
+    directories: typing.Union[dict[str, list[dict]], None] = None,
+    workspace_ids: typing.Union[typing.Set[str], None] = None,
+    upload: bool = True,
+) -> tuple[
+    Union[int, Any],
+    list[list[dict]],
+]:
     """
     :param workspaces_regions: List of AWS regions.
     :param stack_parameters: Dictionary containing parameters used in the stack.
     :param date_time_values: Dictionary of various relevant date strings.
-    :return: The total number of workspaces processed, the aggregated report data,
-        the number of directories processed, and a list of the workspaces processed.
-    This method processes all the workspaces for the given list of AWS regions.
+    :param report_sink: sink the report rows or the report key of each directory are added to
+    :param directories: the directories of each region found by the discovery, the regions
+        are listed when not given
+    :param workspace_ids: only process these workspaces of the directories
+    :param upload: upload the report of each directory to the bucket
+    :return: The number of directories processed and a list of the workspaces processed.
+    This method processes all the workspaces for the given list of AWS regions. The
+    directories with calls failed fast by a circuit breaker are processed again once the
+    breakers let calls through.
     """
     logger.debug(
         "Processing the workspaces for the list of regions {}".format(
             workspaces_regions
         )
     )
-    aggregated_csv = ""
     directory_count = 0
     list_workspaces_processed = []
+    retry_directories = []
+    circuit_breakers = client_factory.get_circuit_breakers()
+    account = client_factory.get_credentials_identity(session) if session else None
     for region in workspaces_regions:
-        list_directories = get_workspaces_directories(session, region)
+        if directories is not None:
+            list_directories = directories.get(region, [])
+        else:
+            list_directories = get_workspaces_directories(session, region)
         for directory in list_directories:
-            try:
-                logger.debug("Processing the directory {}".format(directory))
-                directory_count = directory_count + 1
-                directory_params = {
-                    "DirectoryId": directory.get("DirectoryId"),
-                    "Region": region,
-                    "DateTimeValues": date_time_values,
-                    "Directory": directory,
-                    "AnonymousDataEndpoint": "https://metrics.awssolutionsbuilder.com/generic",
-                }
-                directory_reader = DirectoryReader(session, region)
-                (
-                    workspace_count,
-                    list_workspaces,
-                    directory_csv,
-                ) = directory_reader.process_directory(
-                    stack_parameters, directory_params, dashboard_metrics
+            directory_count = directory_count + 1
+            rejected_calls = circuit_breakers.get_rejected_calls(account, region)
+            result = process_region_directory(
+                session,
+                region,
+                directory,
+                stack_parameters,
+                date_time_values,
+                workspace_ids,
+                upload,
+            )
+            if circuit_breakers.get_rejected_calls(account, region) > rejected_calls:
+                # Calls failed fast, the directory is processed again in the retry pass
+                logger.warning(
+                    f"Calls for the directory {directory.get('DirectoryId')} were failed "
+                    f"fast by a circuit breaker, it will be retried"
                 )
-                dashboard_metrics.update_total_workspaces(workspace_count)
-                list_workspaces_processed.append(list_workspaces)
-                aggregated_csv = aggregated_csv + directory_csv
-            except Exception as e:
-                logger.exception(
-                    "Error while processing the directory {}. Encountered the following error: {}".format(
-                        directory.get("DirectoryId"), e
-                    )
+                retry_directories.append((region, directory))
+                continue
+            if result is not None:
+                add_directory_result(
+                    result,
+                    region,
+                    directory,
+                    stack_parameters,
+                    date_time_values,
+                    dashboard_metrics,
+                    report_sink,
+                    list_workspaces_processed,
                 )
 
-    return (aggregated_csv, directory_count, list_workspaces_processed)
+    for region, directory in retry_directories:
+        circuit_breakers.wait_for_retry(account, region)
+        logger.info(f"Retrying the directory {directory.get('DirectoryId')}")
+        result = process_region_directory(
+            session,
+            region,
+            directory,
+            stack_parameters,
+            date_time_values,
+            workspace_ids,
+            upload,
+        )
+        if result is not None:
+            add_directory_result(
+                result,
+                region,
+                directory,
+                stack_parameters,
+                date_time_values,
+                dashboard_metrics,
+                report_sink,
+                list_workspaces_processed,
+            )
+
+    return (directory_count, list_workspaces_processed)
+
+
+def process_region_directory(
+    session: boto3.session.Session,
+    region: str,
+    directory: dict,
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+    workspace_ids: typing.Union[typing.Set[str], None] = None,
+    upload: bool = True,
+) -> typing.Union[tuple[int, list[dict], str, DashboardMetrics, DirectoryReader], None]:
+    """
+    :param region: the region of the directory
+    :param directory: the directory to process
+    :param workspace_ids: only process these workspaces of the directory
+    :param upload: upload the report of the directory to the bucket
+    :return: the number of workspaces, the workspaces processed, the report rows, the
+        dashboard metrics and the reader of the directory, None when the processing failed
+    This method processes the workspaces of a directory with its own metrics.
+    """
+    try:
+        logger.debug("Processing the directory {}".format(directory))
+        directory_params = get_directory_params(directory, region, date_time_values)
+        directory_reader = get_directory_reader(session, region)
+        workspaces = None
+        if workspace_ids is not None:
+            workspaces = [
+                workspace
+                for workspace in list_workspaces_for_directory(
+                    client_factory.get_client(
+                        session, "workspaces", region, boto_config
+                    ),
+                    directory.get("DirectoryId"),
+                )
+                if workspace.get("WorkspaceId") in workspace_ids
+            ]
+        dashboard_metrics = DashboardMetrics()
+        (
+            workspace_count,
+            list_workspaces,
+            directory_csv,
+        ) = directory_reader.process_directory(
+            stack_parameters,
+            directory_params,
+            dashboard_metrics,
+            workspaces,
+            upload=upload,
+        )
+        return (
+            workspace_count,
+            list_workspaces,
+            directory_csv,
+            dashboard_metrics,
+            directory_reader,
+        )
+    except Exception as e:
+        logger.exception(
+            "Error while processing the directory {}. Encountered the following error: {}".format(
+                directory.get("DirectoryId"), e
+            )
+        )
+        return None
+
+
+def add_directory_result(
+    result: tuple[int, list[dict], str, DashboardMetrics, DirectoryReader],
+    region: str,
+    directory: dict,
+    stack_parameters: dict[str, any],
+    date_time_values: dict[str, any],
+    dashboard_metrics: DashboardMetrics,
+    report_sink: ReportSink,
+    list_workspaces_processed: list[list[dict]],
+) -> None:
+    """This method adds the result of process_region_directory to the results of the run."""
+    (
+        workspace_count,
+        list_workspaces,
+        directory_csv,
+        directory_metrics,
+        directory_reader,
+    ) = result
+    dashboard_metrics.merge(directory_metrics)
+    dashboard_metrics.update_total_workspaces(workspace_count)
+    list_workspaces_processed.append(list_workspaces)
+    if report_sink.copy_objects:
+        # The directory report is only uploaded when it has workspaces
+        if workspace_count:
+            report_sink.add_object(
+                create_s3_key(
+                    stack_parameters,
+                    directory.get("DirectoryId"),
+                    region,
+                    directory_reader.get_account(),
+                    date_time_values,
+                )
+            )
+    else:
+        report_sink.write(directory_csv)
+
+
+def get_directory_params(
+    directory: dict, region: str, date_time_values: dict[str, any]
+) -> dict[str, any]:
+    """This method returns the parameters for processing a directory."""
+    return {
+        "DirectoryId": directory.get("DirectoryId"),
+        "Region": region,
+        "DateTimeValues": date_time_values,
+        "Directory": directory,
+        "AnonymousDataEndpoint": "https://metrics.awssolutionsbuilder.com/generic",
+    }
+
+
+def run() -> None:
+    """Run the task in the mode given by the RunMode environment variable."""
+    run_mode = os.getenv("RunMode", "Standalone")
+    if run_mode == "Coordinator":
+        coordinator_handler()
+    elif run_mode == "Plan":
+        plan_handler()
+    elif run_mode == "Worker":
+        worker_handler()
+    else:
+        ecs_handler()
 
 
 if __name__ == "__main__":
-    ecs_handler()
+    run()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import unittest
+
+# Third Party Libraries
+import cli
+import main
+import pytest
+
+# Cost Optimizer for Amazon Workspaces
+from workspaces_app.account_registry import AccountInfo
+from workspaces_app.workspace_record import WorkspaceRecord
+
+
+def test_parse_args():
+    args = cli.parse_args(
+        [
+            "--region",
+            "us-east-1",
+            "--region",
+            "eu-west-1",
+            "--directory",
+            "d-1",
+            "--workspace",
+            "ws-1",
+            "--workers",
+            "4",
+            "--dry-run",
+            "--output",
+            "report.csv",
+        ]
+    )
+    assert args.region == ["us-east-1", "eu-west-1"]
+    assert args.directory == ["d-1"]
+    assert args.workspace == ["ws-1"]
+    assert args.workers == 4
+    assert args.dry_run
+    assert args.output == "report.csv"
+
+
+def test_parse_args_dry_run_by_default():
+    assert cli.parse_args(["--output", "report.csv"]).dry_run
+    assert not cli.parse_args(["--no-dry-run", "--output", "report.csv"]).dry_run
+
+
+@unittest.mock.patch.dict(os.environ, {"DryRun": "No"})
+@unittest.mock.patch.object(main, "get_stack_parameters")
+def test_get_stack_parameters_dry_run(mock_get_stack_parameters):
+    mock_get_stack_parameters.side_effect = lambda: {"DryRun": os.environ["DryRun"]}
+    args = cli.parse_args(["--output", "report.csv"])
+    assert cli.get_stack_parameters(args)["DryRun"] == "Yes"
+
+    args = cli.parse_args(["--no-dry-run", "--output", "report.csv"])
+    assert cli.get_stack_parameters(args)["DryRun"] == "No"
+
+
+def test_parse_args_requires_output_without_bucket():
+    with unittest.mock.patch.dict(os.environ, {"BucketName": ""}):
+        with pytest.raises(SystemExit):
+            cli.parse_args([])
+
+
+def test_get_target_account():
+    args = cli.parse_args(["--output", "report.csv"])
+    assert cli.get_target_account(args, "111111111111") == "111111111111"
+
+    args = cli.parse_args(
+        ["--account", "222222222222", "--role-name", "role", "--output", "report.csv"]
+    )
+    assert cli.get_target_account(args, "111111111111") == AccountInfo(
+        "222222222222", "role"
+    )
+
+
+@unittest.mock.patch.object(main, "get_accounts")
+def test_get_target_account_from_registry(mock_get_accounts):
+    mock_get_accounts.return_value = [
+        "111111111111",
+        AccountInfo("222222222222", "spoke-role"),
+    ]
+    args = cli.parse_args(["--account", "222222222222", "--output", "report.csv"])
+    assert cli.get_target_account(args, "111111111111") == AccountInfo(
+        "222222222222", "spoke-role"
+    )
+
+    args = cli.parse_args(["--account", "333333333333", "--output", "report.csv"])
+    with pytest.raises(ValueError):
+        cli.get_target_account(args, "111111111111")
+
+
+@unittest.mock.patch.dict(os.environ, {})
+@unittest.mock.patch.object(main, "process_directories")
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+@unittest.mock.patch.object(main, "get_valid_workspaces_regions")
+@unittest.mock.patch.object(main, "get_partition")
+@unittest.mock.patch.object(main, "get_account", return_value="111111111111")
+@unittest.mock.patch.object(main, "get_account_session")
+@unittest.mock.patch.object(main, "get_stack_parameters")
+def test_run_writes_the_report_to_the_output(
+    mock_get_stack_parameters,
+    mock_get_account_session,
+    mock_get_account,
+    mock_get_partition,
+    mock_get_valid_workspaces_regions,
+    mock_get_workspaces_directories,
+    mock_process_directories,
+    tmp_path,
+):
+    mock_get_stack_parameters.return_value = {"DryRun": "No"}
+    mock_get_valid_workspaces_regions.return_value = ["us-east-1", "eu-west-1"]
+    mock_get_workspaces_directories.return_value = [
+        {"DirectoryId": "d-1"},
+        {"DirectoryId": "d-2"},
+    ]
+
+    def process_directories(
+        session,
+        regions,
+        stack_parameters,
+        date_time_values,
+        dashboard_metrics,
+        report_sink,
+        directories,
+        workspace_ids,
+        upload,
+    ):
+        assert stack_parameters["DryRun"] == "Yes"
+        assert workspace_ids == {"ws-1"}
+        assert not upload
+        report_sink.write(f"ws-1,{directories['us-east-1'][0]['DirectoryId']}\n")
+        return 1, [[{"billableTime": 1}]]
+
+    mock_process_directories.side_effect = process_directories
+    output = tmp_path / "report.csv"
+
+    status = cli.run(
+        [
+            "--region",
+            "us-east-1",
+            "--directory",
+            "d-2",
+            "--workspace",
+            "ws-1",
+            "--dry-run",
+            "--output",
+            str(output),
+        ]
+    )
+
+    assert status == 0
+    assert mock_process_directories.call_count == 1
+    assert output.read_text() == WorkspaceRecord.csv_header() + "ws-1,d-2\n"
+
+
+@unittest.mock.patch.dict(os.environ, {"BucketName": ""})
+@unittest.mock.patch.object(cli, "build_plan")
+@unittest.mock.patch.object(main, "process_directories")
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+@unittest.mock.patch.object(main, "get_valid_workspaces_regions")
+@unittest.mock.patch.object(main, "get_partition")
+@unittest.mock.patch.object(main, "get_account", return_value="111111111111")
+@unittest.mock.patch.object(main, "get_account_session")
+@unittest.mock.patch.object(main, "get_stack_parameters")
+def test_run_writes_the_plan(
+    mock_get_stack_parameters,
+    mock_get_account_session,
+    mock_get_account,
+    mock_get_partition,
+    mock_get_valid_workspaces_regions,
+    mock_get_workspaces_directories,
+    mock_process_directories,
+    mock_build_plan,
+    capsys,
+):
+    mock_get_stack_parameters.return_value = {"DryRun": "No"}
+    mock_get_valid_workspaces_regions.return_value = ["us-east-1"]
+    mock_get_workspaces_directories.return_value = [{"DirectoryId": "d-1"}]
+    mock_build_plan.return_value = {"estimated_runtime_seconds": 12.5}
+
+    status = cli.run(["--region", "us-east-1", "--plan"])
+
+    assert status == 0
+    mock_process_directories.assert_not_called()
+    targets, account_ids, regions, _, _ = mock_build_plan.call_args.args
+    assert [target.directory for target in targets] == [{"DirectoryId": "d-1"}]
+    assert account_ids == ["111111111111"]
+    assert regions == {"us-east-1"}
+    assert '"estimated_runtime_seconds": 12.5' in capsys.readouterr().out
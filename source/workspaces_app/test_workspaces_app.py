@@ -16,6 +16,11 @@ import pytest
 import boto3
 from botocore import stub
 
+# Cost Optimizer for Amazon Workspaces
+from workspaces_app.scheduler import PRIORITY_END_OF_MONTH
+from workspaces_app.utils import client_factory
+from workspaces_app.work_queue import SqliteWorkQueue
+
 
 @pytest.fixture(scope="module", autouse=True)
 def aws_credentials():
@@ -28,6 +33,13 @@ def aws_credentials():
     os.environ["AWS_ACCOUNT"] = "123456789012"
 
 
+@pytest.fixture(autouse=True)
+def clear_client_factory():
+    client_factory.clear()
+    yield
+    client_factory.clear()
+
+
 def test_process_input_regions_1():
     valid_workspaces_regions = ["us-east-1"]
     result = main.process_input_regions([], valid_workspaces_regions)
@@ -211,3 +223,670 @@ def test_set_end_of_month_TestEndOfMonth_untouched():
     stack_parameters = {"TestEndOfMonth": "No"}
     main.set_end_of_month(stack_parameters)
     assert stack_parameters["TestEndOfMonth"] == "No"
+
+
+@unittest.mock.patch.dict(os.environ, {"MaxConcurrentAccounts": "8"})
+def test_get_max_concurrent_accounts():
+    assert main.get_max_concurrent_accounts() == 8
+
+
+@unittest.mock.patch.dict(os.environ, {"MaxConcurrentAccounts": "foo"})
+def test_get_max_concurrent_accounts_invalid_value():
+    assert main.get_max_concurrent_accounts() == 1
+
+
+@unittest.mock.patch.object(main, "process_directories")
+@unittest.mock.patch.object(main, "refreshable_session")
+def test_process_account_uses_own_session_and_metrics(
+    mock_refreshable_session, mock_process_directories
+):
+    def process_directories(*args):
+        args[5].write("csv")
+        return (2, [[{"workspace": 1}]])
+
+    mock_process_directories.side_effect = process_directories
+    spoke_account = unittest.mock.Mock()
+
+    result = main.process_account(spoke_account, "111111111111", {"us-east-1"}, {}, {})
+
+    mock_refreshable_session.assert_called_once_with(spoke_account)
+    assert mock_process_directories.call_args.args[0] is (
+        mock_refreshable_session.return_value
+    )
+    assert result[0].getvalue() == "csv"
+    assert result[1:3] == (2, [[{"workspace": 1}]])
+    assert mock_process_directories.call_args.args[4] is result[3]
+
+
+@unittest.mock.patch.dict(os.environ, {"MaxConcurrentAccounts": "3"})
+@unittest.mock.patch.object(main, "prefetch_credentials")
+@unittest.mock.patch.object(main, "upload_report_sink")
+@unittest.mock.patch.object(main, "SolutionMetricsHelper")
+@unittest.mock.patch.object(main, "get_account_registry")
+@unittest.mock.patch.object(main, "get_account", return_value="111111111111")
+@unittest.mock.patch.object(main, "get_valid_workspaces_regions")
+@unittest.mock.patch.object(main, "get_partition")
+@unittest.mock.patch.object(main, "get_stack_parameters", return_value={})
+@unittest.mock.patch.object(main, "process_account")
+def test_ecs_handler_merges_accounts_in_order(
+    mock_process_account,
+    mock_get_stack_parameters,
+    mock_get_partition,
+    mock_get_valid_workspaces_regions,
+    mock_get_account,
+    mock_get_account_registry,
+    mock_solution_metrics_helper,
+    mock_upload_report,
+    mock_prefetch_credentials,
+):
+    mock_get_valid_workspaces_regions.return_value = []
+    spoke_accounts = [
+        main.AccountInfo(f"spoke-{index}", "spoke-role") for index in range(1, 4)
+    ]
+    mock_get_account_registry.return_value.get_accounts.return_value = spoke_accounts
+
+    def process_account(account, current_account, *args):
+        account_id = main.get_account_id(account, current_account)
+        if account_id == "spoke-2":
+            raise Exception("assume role failed")
+        metrics = main.DashboardMetrics()
+        metrics.update_total_workspaces(1)
+        report_sink = main.ReportSink()
+        report_sink.write(f"{account_id}\n")
+        return (report_sink, 1, [[account_id]], metrics)
+
+    mock_process_account.side_effect = process_account
+    reports = []
+    mock_upload_report.side_effect = lambda *args: reports.append(args[3].getvalue())
+    solution_metrics_helper = mock_solution_metrics_helper.return_value
+    solution_metrics_helper._timer.get_elapsed_time.return_value = 60
+
+    with unittest.mock.patch.dict(os.environ, {"Regions": ""}):
+        main.ecs_handler()
+
+    assert reports == [main.REPORT_HEADER + "111111111111\nspoke-1\nspoke-3\n"]
+    solution_metrics_helper.report_metrics.assert_called_once_with(
+        [[["111111111111"]], [["spoke-1"]], [["spoke-3"]]], 3, 3, 0
+    )
+
+
+def work_unit(directory_id):
+    return main.WorkUnit(
+        unit_id=f"111111111111_us-east-1_{directory_id}",
+        run_id="test-run",
+        account_id="111111111111",
+        role_name=None,
+        region="us-east-1",
+        directory={"DirectoryId": directory_id},
+        date_time_values={"date_today": "09/04/24"},
+    )
+
+
+@unittest.mock.patch.dict(os.environ, {"WorkMaxAttempts": "2"})
+@unittest.mock.patch.object(main, "process_work_unit")
+def test_run_worker_retries_and_records_failure(mock_process_work_unit, tmp_path):
+    work_queue = SqliteWorkQueue(str(tmp_path / "queue.db"))
+    units = [work_unit("d-1"), work_unit("d-2")]
+    work_queue.put(units)
+
+    def process_work_unit(unit, stack_parameters, sessions):
+        if unit.unit_id == units[1].unit_id:
+            raise Exception("directory failed")
+        return main.WorkResult(unit.unit_id, "row\n", [], {}, None)
+
+    mock_process_work_unit.side_effect = process_work_unit
+
+    assert main.run_worker(work_queue, {}, "worker-1") == 3
+
+    results = work_queue.get_results(units)
+    assert results[units[0].unit_id].report_csv == "row\n"
+    assert results[units[1].unit_id].report_csv == ""
+    assert results[units[1].unit_id].error == "directory failed"
+
+
+@unittest.mock.patch.object(main, "DirectoryReader")
+def test_process_work_unit(mock_directory_reader):
+    mock_directory_reader.return_value.process_directory.return_value = (
+        2,
+        [{"billableTime": 1}],
+        "row\n",
+    )
+    unit = work_unit("d-1")
+    sessions = {}
+
+    result = main.process_work_unit(unit, {}, sessions)
+
+    assert sessions["111111111111"] is client_factory.get_default_session()
+    directory_params = (
+        mock_directory_reader.return_value.process_directory.call_args.args[1]
+    )
+    assert directory_params["DirectoryId"] == "d-1"
+    assert directory_params["DateTimeValues"] == unit.date_time_values
+    assert result.report_csv == "row\n"
+    assert result.dashboard_metrics["total_workspaces"] == 2
+
+
+@unittest.mock.patch.object(main, "list_workspaces_for_directory")
+@unittest.mock.patch.object(main, "DirectoryReader")
+def test_process_directories_with_workspace_ids(
+    mock_directory_reader, mock_list_workspaces_for_directory
+):
+    mock_directory_reader.return_value.process_directory.return_value = (
+        1,
+        [{"billableTime": 1}],
+        "row\n",
+    )
+    mock_list_workspaces_for_directory.return_value = [
+        {"WorkspaceId": "ws-1"},
+        {"WorkspaceId": "ws-2"},
+    ]
+    report_sink = main.ReportSink(copy_objects=False)
+
+    result = main.process_directories(
+        boto3.session.Session(),
+        {"us-east-1"},
+        {},
+        {},
+        main.DashboardMetrics(),
+        report_sink,
+        {"us-east-1": [{"DirectoryId": "d-1"}]},
+        {"ws-2"},
+        upload=False,
+    )
+
+    assert result == (1, [[{"billableTime": 1}]])
+    process_directory = mock_directory_reader.return_value.process_directory
+    assert process_directory.call_args.args[3] == [{"WorkspaceId": "ws-2"}]
+    assert process_directory.call_args.kwargs == {"upload": False}
+    with report_sink:
+        assert report_sink.open().read() == b"row\n"
+
+
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+def test_get_work_units(mock_get_workspaces_directories):
+    mock_get_workspaces_directories.return_value = [{"DirectoryId": "d-1"}]
+    with unittest.mock.patch.dict(os.environ, {"RunId": "test-run"}):
+        units = main.get_work_units(
+            ["111111111111"], "111111111111", {"us-west-2", "us-east-1"}, {}
+        )
+    assert [unit.unit_id for unit in units] == [
+        "111111111111_us-east-1_d-1",
+        "111111111111_us-west-2_d-1",
+    ]
+    assert units[0].role_name is None
+    assert units[0].run_id == "test-run"
+
+
+@unittest.mock.patch.object(main, "run_worker")
+def test_wait_for_results_times_out(mock_run_worker, tmp_path):
+    work_queue = SqliteWorkQueue(str(tmp_path / "queue.db"))
+    with unittest.mock.patch.dict(os.environ, {"CoordinatorTimeoutSeconds": "0"}):
+        assert main.wait_for_results(work_queue, [work_unit("d-1")], {}) == {}
+    mock_run_worker.assert_called_once()
+
+
+@unittest.mock.patch.dict(
+    os.environ, {"Regions": "", "RunMode": "Coordinator", "RunId": "test-run"}
+)
+@unittest.mock.patch.object(main, "publish_run")
+@unittest.mock.patch.object(main, "SolutionMetricsHelper")
+@unittest.mock.patch.object(main, "get_accounts", return_value=["111111111111"])
+@unittest.mock.patch.object(main, "get_account", return_value="111111111111")
+@unittest.mock.patch.object(main, "get_valid_workspaces_regions", return_value=[])
+@unittest.mock.patch.object(main, "get_partition")
+@unittest.mock.patch.object(main, "get_stack_parameters", return_value={})
+@unittest.mock.patch.object(main, "get_work_units")
+@unittest.mock.patch.object(main, "get_work_queue")
+@unittest.mock.patch.object(main, "process_work_unit")
+def test_coordinator_merges_results_in_unit_order(
+    mock_process_work_unit,
+    mock_get_work_queue,
+    mock_get_work_units,
+    mock_get_stack_parameters,
+    mock_get_partition,
+    mock_get_valid_workspaces_regions,
+    mock_get_account,
+    mock_get_accounts,
+    mock_solution_metrics_helper,
+    mock_publish_run,
+    tmp_path,
+):
+    units = [work_unit("d-1"), work_unit("d-2")]
+    mock_get_work_units.return_value = units
+    mock_get_work_queue.return_value = SqliteWorkQueue(str(tmp_path / "queue.db"))
+    mock_process_work_unit.side_effect = lambda unit, *args: main.WorkResult(
+        unit.unit_id,
+        f"{unit.unit_id}\n",
+        [unit.unit_id],
+        {"total_workspaces": 1},
+        None,
+    )
+
+    reports = []
+    mock_publish_run.side_effect = lambda *args: reports.append(args[3].getvalue())
+
+    main.run()
+
+    args = mock_publish_run.call_args.args
+    assert reports[0] == (
+        main.REPORT_HEADER + "111111111111_us-east-1_d-1\n111111111111_us-east-1_d-2\n"
+    )
+    assert args[4] == [[[units[0].unit_id], [units[1].unit_id]]]
+    assert args[5].total_workspaces == 2
+    assert args[6] == 2
+
+
+@unittest.mock.patch.object(main, "DirectoryReader")
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+def test_process_directories_copy_objects(
+    mock_get_workspaces_directories, mock_directory_reader
+):
+    mock_get_workspaces_directories.return_value = [
+        {"DirectoryId": "d-1"},
+        {"DirectoryId": "d-2"},
+    ]
+    mock_directory_reader.return_value.get_account.return_value = "111111111111"
+    mock_directory_reader.return_value.process_directory.side_effect = [
+        (1, [{"billableTime": 1}], "row\n"),
+        (0, [], ""),
+    ]
+    report_sink = main.ReportSink(copy_objects=True)
+    stack_parameters = {"DryRun": "No", "TestEndOfMonth": "No"}
+
+    result = main.process_directories(
+        None,
+        {"us-east-1"},
+        stack_parameters,
+        {"date_for_s3_key": "2023/03/15/"},
+        main.DashboardMetrics(),
+        report_sink,
+    )
+
+    assert result == (2, [[{"billableTime": 1}], []])
+    assert report_sink.size == 0
+    assert report_sink.object_keys == [
+        "2023/03/15/us-east-1_111111111111_d-1_daily.csv"
+    ]
+
+
+@unittest.mock.patch.object(main, "DirectoryReader")
+def test_process_directories_retries_directories_failed_fast(mock_directory_reader):
+    session = main.client_factory.get_default_session()
+    circuit_breakers = main.client_factory.get_circuit_breakers()
+    circuit_breaker = circuit_breakers.get_breaker(
+        main.client_factory.get_credentials_identity(session), "us-east-1", "workspaces"
+    )
+    calls = []
+
+    def process_directory(
+        stack_parameters, directory_params, dashboard_metrics, workspaces, upload
+    ):
+        directory_id = directory_params["DirectoryId"]
+        calls.append(directory_id)
+        dashboard_metrics.update_billing_metrics("hourly_billed")
+        if calls == ["d-1"]:
+            # The breaker fails a call of the first attempt fast
+            circuit_breaker.rejected_calls += 1
+            return 1, [{"billableTime": 0}], "failed\n"
+        return 1, [{"billableTime": 1}], f"{directory_id}\n"
+
+    mock_directory_reader.return_value.process_directory.side_effect = process_directory
+    dashboard_metrics = main.DashboardMetrics()
+    report_sink = main.ReportSink(copy_objects=False)
+
+    directory_count, workspaces_processed = main.process_directories(
+        session,
+        {"us-east-1"},
+        {},
+        {},
+        dashboard_metrics,
+        report_sink,
+        {"us-east-1": [{"DirectoryId": "d-1"}, {"DirectoryId": "d-2"}]},
+    )
+
+    assert calls == ["d-1", "d-2", "d-1"]
+    assert directory_count == 2
+    assert workspaces_processed == [[{"billableTime": 1}], [{"billableTime": 1}]]
+    assert report_sink.getvalue() == "d-2\nd-1\n"
+    assert dashboard_metrics.billing_metrics.hourly_billed == 2
+
+
+@unittest.mock.patch.object(main, "get_credential_manager")
+def test_prefetch_credentials(mock_get_credential_manager):
+    spoke_account = main.AccountInfo("222222222222", "arn:aws:iam::222:role/spoke")
+    main.prefetch_credentials(["111111111111", spoke_account], "111111111111")
+    credential_manager = mock_get_credential_manager.return_value
+    credential_manager.prefetch.assert_called_once_with([spoke_account])
+    credential_manager.start_refresh.assert_called_once()
+
+
+@unittest.mock.patch.dict(os.environ, {"AWS_REGION": "eu-west-1"})
+@unittest.mock.patch.object(main, "preflight_accounts")
+def test_get_reachable_accounts(mock_preflight_accounts):
+    spoke_account = main.AccountInfo("222222222222", "arn:aws:iam::222:role/spoke")
+    accounts = ["111111111111", spoke_account]
+    mock_preflight_accounts.return_value = (["111111111111"], {spoke_account: "error"})
+
+    assert main.get_reachable_accounts(
+        accounts, "111111111111", {"us-west-2", "us-east-1"}
+    ) == ["111111111111"]
+    mock_preflight_accounts.assert_called_once_with(
+        accounts, "111111111111", "us-east-1"
+    )
+
+    mock_preflight_accounts.reset_mock()
+    main.get_reachable_accounts(accounts, "111111111111", {"eu-west-1", "us-east-1"})
+    mock_preflight_accounts.assert_called_once_with(
+        accounts, "111111111111", "eu-west-1"
+    )
+
+
+@unittest.mock.patch.object(main, "UsageTableDAO")
+def test_plan_run_priorities(mock_usage_table_dao):
+    mock_usage_table_dao.return_value.scan_ddb_items.return_value = [
+        {
+            "Account": {"S": "222222222222"},
+            "Region": {"S": "us-east-1"},
+            "InitialMode": {"S": "ALWAYS_ON"},
+        },
+        {
+            "Account": {"S": "333333333333"},
+            "Region": {"S": "us-east-1"},
+            "InitialMode": {"S": "ALWAYS_ON"},
+        },
+    ]
+    run_scheduler = unittest.mock.Mock(has_budget=True)
+    accounts = ["111111111111", main.AccountInfo("222222222222", "spoke-role")]
+
+    main.plan_run_priorities(
+        run_scheduler,
+        accounts,
+        "111111111111",
+        {"us-east-1"},
+        {"TestEndOfMonth": "Yes"},
+        {"current_month_last_day": False},
+    )
+    run_scheduler.plan.assert_called_once_with({PRIORITY_END_OF_MONTH: 1})
+
+    # The last day of the month without TestEndOfMonth
+    run_scheduler = unittest.mock.Mock(has_budget=True)
+    main.plan_run_priorities(
+        run_scheduler,
+        accounts,
+        "111111111111",
+        {"us-east-1"},
+        {"TestEndOfMonth": "No"},
+        {"current_month_last_day": True},
+    )
+    run_scheduler.plan.assert_called_once_with({PRIORITY_END_OF_MONTH: 1})
+
+    run_scheduler = unittest.mock.Mock(has_budget=False)
+    main.plan_run_priorities(
+        run_scheduler, accounts, "111111111111", {"us-east-1"}, {}, {}
+    )
+    run_scheduler.plan.assert_not_called()
+
+
+@unittest.mock.patch.dict(os.environ, {"AccountPreflight": "No"})
+@unittest.mock.patch.object(main, "preflight_accounts")
+def test_get_reachable_accounts_disabled(mock_preflight_accounts):
+    accounts = ["111111111111", "spoke-1"]
+    assert main.get_reachable_accounts(accounts, "111111111111", {"us-east-1"}) is (
+        accounts
+    )
+    mock_preflight_accounts.assert_not_called()
+
+
+@unittest.mock.patch.object(main, "get_directory_inventory", return_value=None)
+@unittest.mock.patch.object(main, "refreshable_session")
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+def test_discover_directories(
+    mock_get_workspaces_directories,
+    mock_refreshable_session,
+    mock_get_directory_inventory,
+):
+    spoke_account = main.AccountInfo("222222222222", "arn:aws:iam::222:role/spoke")
+    failed_account = main.AccountInfo("333333333333", "arn:aws:iam::333:role/spoke")
+    sessions = {
+        spoke_account: unittest.mock.Mock(),
+        failed_account: unittest.mock.Mock(),
+    }
+    mock_refreshable_session.side_effect = sessions.get
+
+    def get_workspaces_directories(session, region, raise_errors):
+        assert raise_errors
+        if session is sessions[failed_account] and region == "us-west-2":
+            raise Exception("AccessDenied")
+        return [{"DirectoryId": f"d-{region}"}]
+
+    mock_get_workspaces_directories.side_effect = get_workspaces_directories
+    inventory = unittest.mock.Mock()
+    inventory.is_known_empty.side_effect = (
+        lambda account_id, region: account_id == "111111111111"
+        and region == "us-west-2"
+    )
+
+    result = main.discover_directories(
+        ["111111111111", spoke_account, failed_account],
+        "111111111111",
+        {"us-east-1", "us-west-2"},
+        inventory,
+    )
+
+    assert result == {
+        "111111111111": {"us-east-1": [{"DirectoryId": "d-us-east-1"}]},
+        "222222222222": {
+            "us-east-1": [{"DirectoryId": "d-us-east-1"}],
+            "us-west-2": [{"DirectoryId": "d-us-west-2"}],
+        },
+    }
+    assert mock_get_workspaces_directories.call_count == 5
+    inventory.record.assert_any_call("222222222222", "us-west-2", 1)
+    assert inventory.record.call_count == 4
+    inventory.save.assert_called_once()
+    mock_get_directory_inventory.assert_not_called()
+
+
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+def test_discover_directories_without_inventory_update(
+    mock_get_workspaces_directories,
+):
+    mock_get_workspaces_directories.return_value = [{"DirectoryId": "d-1"}]
+    inventory = unittest.mock.Mock()
+    inventory.is_known_empty.return_value = False
+
+    result = main.discover_directories(
+        ["111111111111"],
+        "111111111111",
+        {"us-east-1"},
+        inventory,
+        update_inventory=False,
+    )
+
+    assert result == {"111111111111": {"us-east-1": [{"DirectoryId": "d-1"}]}}
+    inventory.record.assert_not_called()
+    inventory.save.assert_not_called()
+
+
+@unittest.mock.patch.object(main, "build_plan")
+@unittest.mock.patch.object(main, "get_directory_inventory", return_value=None)
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+@unittest.mock.patch.object(main, "get_reachable_accounts")
+@unittest.mock.patch.object(main, "get_accounts")
+@unittest.mock.patch.object(main, "get_account", return_value="111111111111")
+@unittest.mock.patch.object(main, "process_input_regions", return_value={"us-east-1"})
+@unittest.mock.patch.object(main, "get_valid_workspaces_regions")
+@unittest.mock.patch.object(main, "get_partition")
+@unittest.mock.patch.object(main, "get_stack_parameters", return_value={})
+def test_plan_handler(
+    mock_get_stack_parameters,
+    mock_get_partition,
+    mock_get_valid_workspaces_regions,
+    mock_process_input_regions,
+    mock_get_account,
+    mock_get_accounts,
+    mock_get_reachable_accounts,
+    mock_get_workspaces_directories,
+    mock_get_directory_inventory,
+    mock_build_plan,
+    capsys,
+):
+    mock_get_accounts.return_value = ["111111111111"]
+    mock_get_reachable_accounts.side_effect = lambda accounts, *args: accounts
+    mock_get_workspaces_directories.return_value = [{"DirectoryId": "d-1"}]
+    mock_build_plan.return_value = {"estimated_runtime_seconds": 1.0}
+
+    plan = main.plan_handler()
+
+    assert plan == {"estimated_runtime_seconds": 1.0}
+    targets, account_ids, regions, _, _ = mock_build_plan.call_args.args
+    assert [target.directory for target in targets] == [{"DirectoryId": "d-1"}]
+    assert account_ids == ["111111111111"]
+    assert regions == {"us-east-1"}
+    assert '"estimated_runtime_seconds": 1.0' in capsys.readouterr().out
+
+
+@unittest.mock.patch.object(main, "DirectoryReader")
+@unittest.mock.patch.object(main, "get_workspaces_directories")
+def test_process_directories_uses_discovered_directories(
+    mock_get_workspaces_directories, mock_directory_reader
+):
+    mock_directory_reader.return_value.process_directory.return_value = (
+        1,
+        [{"billableTime": 1}],
+        "row\n",
+    )
+    report_sink = main.ReportSink(copy_objects=False)
+
+    directory_count, _ = main.process_directories(
+        unittest.mock.Mock(),
+        {"us-east-1", "us-west-2"},
+        {},
+        {},
+        main.DashboardMetrics(),
+        report_sink,
+        {"us-east-1": [{"DirectoryId": "d-1"}]},
+    )
+
+    assert directory_count == 1
+    assert report_sink.getvalue() == "row\n"
+    mock_get_workspaces_directories.assert_not_called()
+
+
+@unittest.mock.patch.object(main, "upload_report")
+@unittest.mock.patch.object(main, "process_work_item")
+@unittest.mock.patch.object(main, "plan_work_items")
+def test_process_work_items_merges_chunks_in_plan_order(
+    mock_plan_work_items, mock_process_work_item, mock_upload_report
+):
+    def item(directory_id, chunk_index, chunk_count, size):
+        return main.WorkItem(
+            account_id="111111111111",
+            session=None,
+            region="us-east-1",
+            directory={"DirectoryId": directory_id},
+            workspaces=[{}] * size,
+            chunk_index=chunk_index,
+            chunk_count=chunk_count,
+        )
+
+    work_items = [
+        item("d-small", 0, 1, 1),
+        item("d-large", 0, 2, 2),
+        item("d-large", 1, 2, 1),
+    ]
+    mock_plan_work_items.return_value = work_items
+
+    def process_work_item(work_item, stack_parameters, date_time_values):
+        metrics = main.DashboardMetrics()
+        count = len(work_item.workspaces)
+        metrics.update_total_workspaces(count)
+        name = f"{work_item.directory['DirectoryId']}-{work_item.chunk_index}"
+        return count, [{"name": name}], f"{name}\n", metrics
+
+    mock_process_work_item.side_effect = process_work_item
+
+    (
+        report_sink,
+        directory_count,
+        workspaces_processed,
+        dashboard_metrics,
+    ) = main.process_work_items(
+        ["111111111111"],
+        "111111111111",
+        {"us-east-1"},
+        {},
+        {},
+        {
+            "111111111111": {
+                "us-east-1": [
+                    {"DirectoryId": "d-small"},
+                    {"DirectoryId": "d-large"},
+                ]
+            }
+        },
+    )
+
+    with report_sink:
+        assert report_sink.getvalue() == (
+            main.REPORT_HEADER + "d-small-0\nd-large-0\nd-large-1\n"
+        )
+    assert directory_count == 2
+    assert workspaces_processed == [
+        [[{"name": "d-small-0"}], [{"name": "d-large-0"}, {"name": "d-large-1"}]]
+    ]
+    assert dashboard_metrics.total_workspaces == 4
+    # Only the directory processed in chunks is uploaded here
+    mock_upload_report.assert_called_once()
+    assert mock_upload_report.call_args.args[3] == (
+        main.WorkspaceRecord.csv_header() + "d-large-0\nd-large-1\n"
+    )
+    assert mock_upload_report.call_args.args[4:] == (
+        "d-large",
+        "us-east-1",
+        "111111111111",
+    )
+
+
+@unittest.mock.patch.object(main, "DirectoryReader")
+def test_process_work_item(mock_directory_reader):
+    mock_directory_reader.return_value.process_directory.return_value = (
+        2,
+        [{"billableTime": 1}],
+        "rows",
+    )
+    work_item = main.WorkItem(
+        account_id="111111111111",
+        session="session",
+        region="us-east-1",
+        directory={"DirectoryId": "d-1"},
+        workspaces=[{}, {}],
+        chunk_index=0,
+        chunk_count=2,
+    )
+
+    result = main.process_work_item(work_item, {}, {"date_today": "09/04/24"})
+
+    mock_directory_reader.assert_called_once_with("session", "us-east-1")
+    process_directory = mock_directory_reader.return_value.process_directory
+    assert process_directory.call_args.args[3] == [{}, {}]
+    assert process_directory.call_args.kwargs == {"upload": False}
+    assert result[:3] == (2, [{"billableTime": 1}], "rows")
+    assert result[3].total_workspaces == 2
+
+
+def test_get_directory_reader():
+    session = unittest.mock.Mock()
+    with unittest.mock.patch.dict(os.environ, {"ProcessingEngine": "Pipeline"}):
+        assert isinstance(
+            main.get_directory_reader(session, "us-east-1"),
+            main.PipelineDirectoryReader,
+        )
+    with unittest.mock.patch.dict(os.environ, {"ProcessingEngine": "Asyncio"}):
+        assert isinstance(
+            main.get_directory_reader(session, "us-east-1"),
+            main.AsyncDirectoryReader,
+        )
+    with unittest.mock.patch.dict(os.environ, {"ProcessingEngine": "Threads"}):
+        directory_reader = main.get_directory_reader(session, "us-east-1")
+    assert type(directory_reader) is main.DirectoryReader
@@ -9,6 +9,10 @@ import os
 # Third Party Libraries
 import pytest
 
+# Cost Optimizer for Amazon Workspaces
+from .. import metrics_compute, scheduler
+from ..utils import client_factory, session_writer
+
 
 @pytest.fixture(scope="module", autouse=True)
 def aws_credentials():
@@ -19,3 +23,29 @@ def aws_credentials():
     os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
     os.environ["SOLUTION_ID"] = "SOTestID"
     os.environ["AWS_ACCOUNT"] = "123456789012"
+
+
+@pytest.fixture(autouse=True)
+def clear_client_factory():
+    client_factory.clear()
+    yield
+    client_factory.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_run_scheduler():
+    scheduler.clear()
+    yield
+    scheduler.clear()
+
+
+@pytest.fixture(autouse=True)
+def shutdown_compute_pool():
+    yield
+    metrics_compute.shutdown_compute_pool()
+
+
+@pytest.fixture(autouse=True)
+def shutdown_session_writers():
+    yield
+    session_writer.shutdown_session_writers()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+from unittest.mock import MagicMock, patch
+
+# Third Party Libraries
+import pytest
+
+# AWS Libraries
+import boto3
+import botocore.exceptions
+from botocore.stub import Stubber
+
+# Cost Optimizer for Amazon Workspaces
+from .. import account_preflight
+from ..account_preflight import (
+    AccountUnreachableError,
+    preflight_accounts,
+    probe_account,
+)
+from ..account_registry import AccountInfo
+from ..utils import client_factory
+
+spoke_1 = AccountInfo("222222222222", "arn:aws:iam::222222222222:role/spoke")
+spoke_2 = AccountInfo("333333333333", "arn:aws:iam::333333333333:role/spoke")
+
+
+def test_probe_account_calls_workspaces_with_tight_config():
+    credential_manager = MagicMock()
+    credential_manager.get_session.return_value = boto3.session.Session()
+    client = client_factory.get_client(
+        credential_manager.get_session.return_value,
+        "workspaces",
+        "us-east-1",
+        account_preflight.preflight_config,
+    )
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "describe_workspace_directories", {"Directories": []}, {"Limit": 1}
+        )
+        probe_account(credential_manager, spoke_1, "us-east-1")
+        stubber.assert_no_pending_responses()
+    credential_manager.get_session.assert_called_once_with(spoke_1)
+
+
+@pytest.mark.parametrize(
+    "error_code, unreachable",
+    [
+        ("AccessDeniedException", True),
+        ("UnauthorizedOperation", True),
+        ("ThrottlingException", False),
+        ("InternalServerError", False),
+    ],
+)
+def test_probe_account_raises_unreachable_on_denied_calls(error_code, unreachable):
+    credential_manager = MagicMock()
+    credential_manager.get_session.return_value = boto3.session.Session()
+    client = client_factory.get_client(
+        credential_manager.get_session.return_value,
+        "workspaces",
+        "us-east-1",
+        account_preflight.preflight_config,
+    )
+    with Stubber(client) as stubber:
+        stubber.add_client_error("describe_workspace_directories", error_code)
+        with pytest.raises(
+            AccountUnreachableError if unreachable else botocore.exceptions.ClientError
+        ) as error:
+            probe_account(credential_manager, spoke_1, "us-east-1")
+    assert isinstance(error.value, AccountUnreachableError) == unreachable
+
+
+def test_probe_account_raises_unreachable_when_the_role_cannot_be_assumed():
+    credential_manager = MagicMock()
+    credential_manager.get_session.side_effect = botocore.exceptions.ClientError(
+        {"Error": {"Code": "AccessDenied"}}, "AssumeRole"
+    )
+    with pytest.raises(AccountUnreachableError):
+        probe_account(credential_manager, spoke_1, "us-east-1")
+
+
+@patch.object(account_preflight, "get_credential_manager")
+@patch.object(account_preflight, "probe_account")
+def test_preflight_accounts_excludes_unreachable(
+    mock_probe_account, mock_get_credential_manager
+):
+    def probe_account(credential_manager, account, region):
+        if account == spoke_1:
+            raise AccountUnreachableError("AccessDenied")
+        # A transient error does not exclude the account
+        raise botocore.exceptions.ClientError(
+            {"Error": {"Code": "ThrottlingException"}}, "DescribeWorkspaceDirectories"
+        )
+
+    mock_probe_account.side_effect = probe_account
+
+    reachable, unreachable = preflight_accounts(
+        ["111111111111", spoke_1, spoke_2], "111111111111", "us-east-1"
+    )
+
+    assert reachable == ["111111111111", spoke_2]
+    assert unreachable == {spoke_1: "AccessDenied"}
+    assert mock_probe_account.call_count == 2
+
+
+@patch.object(account_preflight, "probe_account")
+def test_preflight_accounts_without_spokes(mock_probe_account):
+    assert preflight_accounts(["111111111111"], "111111111111", "us-east-1") == (
+        ["111111111111"],
+        {},
+    )
+    mock_probe_account.assert_not_called()
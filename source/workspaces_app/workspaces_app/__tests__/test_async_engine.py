@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Cost Optimizer for Amazon Workspaces
+from ..async_engine import AsyncDirectoryReader, AsyncEngine, get_api_concurrency
+from ..directory_reader import DirectoryReader
+from ..utils.dashboard_metrics import DashboardMetrics
+from ..workspace_record import (
+    WorkspaceBillingData,
+    WorkspaceDescription,
+    WorkspacePerformanceMetrics,
+    WorkspaceRecord,
+)
+
+
+def ws_record(workspace_id: str) -> WorkspaceRecord:
+    return WorkspaceRecord(
+        description=WorkspaceDescription(
+            account="111111111111",
+            region="us-east-1",
+            directory_id="d-1",
+            workspace_id=workspace_id,
+            initial_mode="AUTO_STOP",
+            usage_threshold=100,
+            bundle_type="STANDARD",
+            username="user",
+            computer_name="computer",
+        ),
+        billing_data=WorkspaceBillingData(
+            billable_hours=10, change_reported="-N-", new_mode="AUTO_STOP"
+        ),
+        performance_metrics=WorkspacePerformanceMetrics(
+            None, None, None, None, None, None
+        ),
+        report_date="10/01/24",
+        last_reported_metric_period="2024-10-01T00:00:00Z",
+    )
+
+
+def test_get_api_concurrency():
+    with patch.dict(os.environ, {"AsyncApiConcurrency": '{"cloudwatch": 4}'}):
+        api_concurrency = get_api_concurrency()
+    assert api_concurrency["cloudwatch"] == 4
+    assert api_concurrency["dynamodb"] == 32
+
+
+def test_get_api_concurrency_invalid_value():
+    with patch.dict(os.environ, {"AsyncApiConcurrency": "[1]"}):
+        assert get_api_concurrency()["cloudwatch"] == 16
+
+
+def test_engine_limits_calls_per_api():
+    lock = threading.Lock()
+    running = {"count": 0, "peak": 0}
+
+    def call():
+        with lock:
+            running["count"] += 1
+            running["peak"] = max(running["peak"], running["count"])
+        time.sleep(0.01)
+        with lock:
+            running["count"] -= 1
+
+    async def run():
+        engine = AsyncEngine({"cloudwatch": 2})
+        await asyncio.gather(*(engine.call("cloudwatch", call) for _ in range(6)))
+
+    asyncio.run(run())
+    assert running["peak"] == 2
+
+
+class RecordingEngine(AsyncEngine):
+    def __init__(self) -> None:
+        super().__init__()
+        self.apis: dict[str, set[str]] = {}
+
+    async def call(self, api: str, function, *args, **kwargs):
+        self.apis.setdefault(getattr(function, "__name__", None), set()).add(api)
+        return await super().call(api, function, *args, **kwargs)
+
+
+@patch.object(DirectoryReader, "get_account", return_value="111111111111")
+@patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+@patch("workspaces_app.async_engine.upload_report")
+def test_process_directory_async(
+    mock_upload_report, MockWorkspacesHelper, mock_get_account
+):
+    workspaces = [
+        {
+            "WorkspaceId": f"ws-{index}",
+            "State": "AVAILABLE",
+            "WorkspaceProperties": {
+                "RunningMode": "AUTO_STOP",
+                "ComputeTypeName": "STANDARD",
+            },
+        }
+        for index in range(3)
+    ]
+    workspaces_helper = MockWorkspacesHelper.return_value
+    workspaces_helper.get_workspaces_for_directory.return_value = workspaces
+    workspaces_helper.get_hourly_threshold_for_bundle_type.return_value = 100
+
+    def process_workspace(record, timeout, dashboard_metrics, calculated_metrics):
+        if record.workspace_id == "ws-1":
+            raise Exception("throttled")
+        dashboard_metrics.update_billing_metrics("hourly_billed")
+        return ws_record(record.workspace_id)
+
+    workspaces_helper.process_workspace.side_effect = process_workspace
+    engine = RecordingEngine()
+    directory_reader = AsyncDirectoryReader(unittest.mock.Mock(), "us-east-1", engine)
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.side_effect = (
+        lambda description: description
+    )
+    dashboard_metrics = DashboardMetrics()
+
+    result = asyncio.run(
+        directory_reader.process_directory_async(
+            {"DryRun": "No", "TestEndOfMonth": "No"},
+            {"DirectoryId": "d-1", "DateTimeValues": {}},
+            dashboard_metrics,
+        )
+    )
+
+    assert result[0] == 3
+    assert [row.split(",")[0] for row in result[2].splitlines()] == ["ws-0", "ws-2"]
+    assert len(result[1]) == 2
+    assert dashboard_metrics.billing_metrics.hourly_billed == 2
+    assert directory_reader.usage_table_dao.update_ddb_item.call_count == 2
+    # Each step holds the semaphore of its own API
+    assert engine.apis["fetch_metrics"] == {"cloudwatch"}
+    assert engine.apis["act"] == {"workspaces"}
+    assert engine.apis["persist"] == {"dynamodb"}
+    mock_upload_report.assert_called_once()
+    assert mock_upload_report.call_args.args[3] == (
+        WorkspaceRecord.csv_header() + result[2]
+    )
+
+
+@patch.object(DirectoryReader, "get_account", return_value="111111111111")
+@patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+@patch("workspaces_app.async_engine.upload_report")
+def test_process_directory_runs_in_an_event_loop(
+    mock_upload_report, MockWorkspacesHelper, mock_get_account
+):
+    workspaces_helper = MockWorkspacesHelper.return_value
+    workspaces_helper.get_hourly_threshold_for_bundle_type.return_value = 100
+    workspaces_helper.process_workspace.side_effect = (
+        lambda record, timeout, dashboard_metrics, calculated_metrics: ws_record(
+            record.workspace_id
+        )
+    )
+    directory_reader = AsyncDirectoryReader(unittest.mock.Mock(), "us-east-1")
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.side_effect = (
+        lambda description: description
+    )
+    workspace = {
+        "WorkspaceId": "ws-0",
+        "State": "AVAILABLE",
+        "WorkspaceProperties": {
+            "RunningMode": "AUTO_STOP",
+            "ComputeTypeName": "STANDARD",
+        },
+    }
+
+    # Called as the other readers are by process_directories
+    result = directory_reader.process_directory(
+        {"DryRun": "No", "TestEndOfMonth": "No"},
+        {"DirectoryId": "d-1", "DateTimeValues": {}},
+        DashboardMetrics(),
+        [workspace],
+        upload=False,
+    )
+
+    assert result[0] == 1
+    assert [row.split(",")[0] for row in result[2].splitlines()] == ["ws-0"]
+    workspaces_helper.get_workspaces_for_directory.assert_not_called()
+    mock_upload_report.assert_not_called()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import datetime
+from unittest.mock import patch
+
+# Third Party Libraries
+import pytest
+
+# AWS Libraries
+import boto3
+from botocore.stub import Stubber
+
+# Cost Optimizer for Amazon Workspaces
+from .. import credential_manager
+from ..account_registry import AccountInfo
+from ..credential_manager import CredentialManager, is_expiring
+
+spoke_1 = AccountInfo("222222222222", "arn:aws:iam::222222222222:role/spoke")
+spoke_2 = AccountInfo("333333333333", "arn:aws:iam::333333333333:role/spoke")
+
+
+@pytest.fixture()
+def sts_client():
+    yield boto3.client("sts", region_name="us-east-1")
+
+
+def assume_role_response(access_key: str, expires_in: datetime.timedelta) -> dict:
+    return {
+        "Credentials": {
+            "AccessKeyId": access_key,
+            "SecretAccessKey": "secret-key",
+            "SessionToken": "session-token",
+            "Expiration": datetime.datetime.now(datetime.timezone.utc) + expires_in,
+        }
+    }
+
+
+def add_assume_role(
+    stubber, account, access_key, expires_in=datetime.timedelta(hours=1)
+):
+    stubber.add_response(
+        "assume_role",
+        assume_role_response(access_key, expires_in),
+        {"RoleArn": account.role_name, "RoleSessionName": "SessionName"},
+    )
+
+
+def test_prefetch_assumes_each_account_once(sts_client):
+    manager = CredentialManager(sts_client, max_workers=1)
+    with Stubber(sts_client) as stubber:
+        add_assume_role(stubber, spoke_1, "ASIAKEY1XXXXXXXX")
+        add_assume_role(stubber, spoke_2, "ASIAKEY2XXXXXXXX")
+        manager.prefetch([spoke_1, spoke_2])
+        stubber.assert_no_pending_responses()
+
+        # Sessions are served from the cache without calling STS
+        session = manager.get_session(spoke_1)
+        assert session is manager.get_session(spoke_1)
+        assert (
+            session.get_credentials().get_frozen_credentials().access_key
+            == "ASIAKEY1XXXXXXXX"
+        )
+
+
+def test_prefetch_logs_failed_accounts(sts_client):
+    manager = CredentialManager(sts_client, max_workers=1)
+    with Stubber(sts_client) as stubber:
+        stubber.add_client_error("assume_role", "AccessDenied")
+        add_assume_role(stubber, spoke_2, "ASIAKEY2XXXXXXXX")
+        manager.prefetch([spoke_1, spoke_2])
+        stubber.assert_no_pending_responses()
+
+        # The failed account is assumed again on demand
+        add_assume_role(stubber, spoke_1, "ASIAKEY1XXXXXXXX")
+        assert manager.get_credentials(spoke_1)["access_key"] == "ASIAKEY1XXXXXXXX"
+
+
+def test_refresh_expiring(sts_client):
+    manager = CredentialManager(sts_client)
+    with Stubber(sts_client) as stubber:
+        add_assume_role(
+            stubber, spoke_1, "ASIAOLDKEYXXXXXX", datetime.timedelta(minutes=10)
+        )
+        add_assume_role(stubber, spoke_2, "ASIAKEY2XXXXXXXX")
+        manager.prefetch([spoke_1, spoke_2])
+
+        add_assume_role(stubber, spoke_1, "ASIANEWKEYXXXXXX")
+        manager.refresh_expiring()
+        stubber.assert_no_pending_responses()
+        assert manager.get_credentials(spoke_1)["access_key"] == "ASIANEWKEYXXXXXX"
+
+
+def test_session_refreshes_from_cache(sts_client):
+    manager = CredentialManager(sts_client)
+    with Stubber(sts_client) as stubber:
+        add_assume_role(
+            stubber, spoke_1, "ASIAOLDKEYXXXXXX", datetime.timedelta(minutes=30)
+        )
+        session = manager.get_session(spoke_1)
+        add_assume_role(stubber, spoke_1, "ASIANEWKEYXXXXXX")
+        manager.refresh_credentials(spoke_1)
+        with patch.object(credential_manager, "REFRESH_AHEAD_SECONDS", 45 * 60):
+            manager.refresh_expiring()
+        stubber.assert_no_pending_responses()
+
+    credentials = session.get_credentials()
+    credentials._expiry_time = datetime.datetime.now(datetime.timezone.utc)
+    assert credentials.get_frozen_credentials().access_key == "ASIANEWKEYXXXXXX"
+
+
+def test_is_expiring():
+    credentials = {
+        "expiry_time": (
+            datetime.datetime.now(datetime.timezone.utc)
+            + datetime.timedelta(minutes=10)
+        ).isoformat()
+    }
+    assert is_expiring(credentials, 15 * 60)
+    assert not is_expiring(credentials, 5 * 60)
+
+
+def test_start_and_stop_refresh(sts_client):
+    manager = CredentialManager(sts_client)
+    manager.start_refresh()
+    assert manager._refresh_thread.is_alive()
+    manager.stop_refresh()
+    assert manager._refresh_thread is None
+
+
+def test_get_credential_manager():
+    credential_manager.clear()
+    manager = credential_manager.get_credential_manager()
+    assert manager is credential_manager.get_credential_manager()
+    credential_manager.clear()
+    assert manager is not credential_manager.get_credential_manager()
+    credential_manager.clear()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+from decimal import Decimal
+
+# Third Party Libraries
+import pytest
+
+# AWS Libraries
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+# Cost Optimizer for Amazon Workspaces
+from ..ddb_codec import DdbCodec, decode_value, encode_value
+from ..workspace_record import (
+    WeightedAverage,
+    WorkspaceBillingData,
+    WorkspaceDescription,
+    WorkspacePerformanceMetrics,
+    WorkspaceRecord,
+)
+
+VALUES = [
+    "test",
+    "",
+    0,
+    20,
+    True,
+    None,
+    Decimal("93.42"),
+    Decimal(100),
+    b"\x01\x02",
+    ["a", Decimal(1)],
+    {"key": "value"},
+]
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_encode_value_matches_type_serializer(value):
+    assert encode_value(value) == TypeSerializer().serialize(value)
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_decode_value_matches_type_deserializer(value):
+    attr_value = TypeSerializer().serialize(value)
+
+    assert decode_value(attr_value) == TypeDeserializer().deserialize(attr_value)
+
+
+def test_encode_value_rejects_nan():
+    with pytest.raises(TypeError):
+        encode_value(Decimal("NaN"))
+
+
+def test_decode_falls_back_to_the_attribute_name():
+    codec = DdbCodec(
+        [("workspace_id", lambda record: record)],
+        WorkspaceRecord.class_field_to_ddb_attr,
+        WorkspaceRecord.ddb_attr_to_class_field,
+    )
+
+    assert codec.encode("ws-1") == {"WorkspaceId": {"S": "ws-1"}}
+    assert codec.decode({"WorkspaceId": {"S": "ws-1"}, "CPUUsage": {"B": b"\x01"}}) == {
+        "workspace_id": "ws-1",
+        "cpu_usage": Binary(b"\x01"),
+    }
+
+
+def test_workspace_record_matches_the_serialized_json():
+    ws_record = WorkspaceRecord(
+        description=WorkspaceDescription(
+            region="us-east-1",
+            account="111111111111",
+            workspace_id="ws-1",
+            directory_id="d-1",
+            usage_threshold=None,
+            bundle_type="STANDARD",
+            username="user",
+            computer_name="computer",
+            initial_mode="AUTO_STOP",
+        ),
+        billing_data=WorkspaceBillingData(billable_hours=20, new_mode="-N-"),
+        performance_metrics=WorkspacePerformanceMetrics(
+            in_session_latency=WeightedAverage(Decimal("93.42"), 67),
+            cpu_usage=None,
+            memory_usage=None,
+            root_volume_disk_usage=None,
+            user_volume_disk_usage=None,
+            udp_packet_loss_rate=None,
+        ),
+    )
+    serialized_json = {
+        WorkspaceRecord.class_field_to_ddb_attr(key): TypeSerializer().serialize(value)
+        for key, value in ws_record.to_json().items()
+    }
+
+    assert ws_record.to_ddb_obj() == serialized_json
+    assert (
+        WorkspaceRecord.from_ddb_obj(serialized_json, ws_record.description)
+        == ws_record
+    )
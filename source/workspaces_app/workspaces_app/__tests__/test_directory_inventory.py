@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import io
+import json
+import os
+import time
+from unittest.mock import patch
+
+# Third Party Libraries
+import pytest
+
+# AWS Libraries
+import boto3
+from botocore.stub import ANY, Stubber
+
+# Cost Optimizer for Amazon Workspaces
+from ..directory_inventory import (
+    INVENTORY_KEY,
+    DirectoryInventory,
+    get_directory_inventory,
+)
+
+
+@pytest.fixture()
+def inventory():
+    yield DirectoryInventory(
+        boto3.session.Session(region_name="us-east-1"), "test-bucket", 3600
+    )
+
+
+def add_get_object(stubber, entries):
+    stubber.add_response(
+        "get_object",
+        {"Body": io.BytesIO(json.dumps(entries).encode())},
+        {"Bucket": "test-bucket", "Key": INVENTORY_KEY},
+    )
+
+
+def test_is_known_empty(inventory):
+    now = time.time()
+    with Stubber(inventory._s3_client) as stubber:
+        add_get_object(
+            stubber,
+            {
+                "111111111111/us-east-1": {"directory_count": 0, "checked_at": now},
+                "111111111111/us-west-2": {"directory_count": 2, "checked_at": now},
+                "111111111111/eu-west-1": {
+                    "directory_count": 0,
+                    "checked_at": now - 7200,
+                },
+            },
+        )
+        inventory.load()
+
+    assert inventory.is_known_empty("111111111111", "us-east-1")
+    assert not inventory.is_known_empty("111111111111", "us-west-2")
+    assert not inventory.is_known_empty("111111111111", "eu-west-1")
+    assert not inventory.is_known_empty("222222222222", "us-east-1")
+
+
+def test_load_missing_inventory(inventory):
+    with Stubber(inventory._s3_client) as stubber:
+        stubber.add_client_error("get_object", "NoSuchKey")
+        inventory.load()
+    assert not inventory.is_known_empty("111111111111", "us-east-1")
+
+
+def test_record_and_save(inventory):
+    inventory.record("111111111111", "us-east-1", 0)
+    assert inventory.is_known_empty("111111111111", "us-east-1")
+    with Stubber(inventory._s3_client) as stubber:
+        stubber.add_response(
+            "put_object",
+            {},
+            {"Bucket": "test-bucket", "Key": INVENTORY_KEY, "Body": ANY},
+        )
+        inventory.save()
+        stubber.assert_no_pending_responses()
+
+
+def test_get_directory_inventory_disabled():
+    with patch.dict(os.environ, {"BucketName": "test-bucket"}):
+        assert get_directory_inventory(boto3.session.Session()) is None
+
+
+@patch.object(DirectoryInventory, "load")
+def test_get_directory_inventory(mock_load):
+    with patch.dict(
+        os.environ, {"BucketName": "test-bucket", "DirectoryInventoryTTLHours": "24"}
+    ):
+        inventory = get_directory_inventory(
+            boto3.session.Session(region_name="us-east-1")
+        )
+    assert inventory._ttl_seconds == 24 * 3600
+    mock_load.assert_called_once()
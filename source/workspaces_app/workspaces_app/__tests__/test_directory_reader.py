@@ -6,6 +6,7 @@
 # Standard Library
 import copy
 import datetime
+import os
 import unittest
 from decimal import Decimal
 
@@ -18,7 +19,8 @@ from botocore import stub
 
 # Cost Optimizer for Amazon Workspaces
 from ..directory_reader import DirectoryReader
-from ..utils import usage_table_dao
+from ..scheduler import RunScheduler
+from ..utils import client_factory, usage_table_dao
 from ..workspace_record import *
 from workspaces_app.utils.dashboard_metrics import DashboardMetrics
 
@@ -234,6 +236,18 @@ def test_get_end_of_month(session):
     assert not directory_reader.get_end_of_month({"TestEndOfMonth": "No"})
 
 
+def test_get_concurrency_slot(session):
+    directory_reader = DirectoryReader(session, "us-east-1")
+    controller = client_factory.get_concurrency_controller()
+    with directory_reader.get_concurrency_slot():
+        assert controller._running == 1
+    assert controller._running == 0
+
+    with unittest.mock.patch.dict(os.environ, {"AdaptiveConcurrency": "No"}):
+        with directory_reader.get_concurrency_slot():
+            assert controller._running == 0
+
+
 @unittest.mock.patch("boto3.session.Session")
 @unittest.mock.patch(DirectoryReader.__module__ + ".upload_report")
 @unittest.mock.patch(DirectoryReader.__module__ + ".WorkspacesHelper")
@@ -506,3 +520,245 @@ def test_process_directory_new_month(
     )
 
     assert new_ws_description == expected_ws_description
+
+
+def test_is_processed_in_current_window(session, ws_record):
+    directory_reader = DirectoryReader(session, "us-east-1")
+    date_time_values = {
+        "date_today": ws_record.report_date,
+        "end_time_for_current_month": ws_record.last_reported_metric_period,
+    }
+    assert directory_reader.is_processed_in_current_window(ws_record, date_time_values)
+    assert not directory_reader.is_processed_in_current_window(
+        ws_record.description, date_time_values
+    )
+    assert not directory_reader.is_processed_in_current_window(
+        ws_record,
+        {**date_time_values, "end_time_for_current_month": "2024-09-03T01:00:00Z"},
+    )
+    assert not directory_reader.is_processed_in_current_window(
+        ws_record, {**date_time_values, "date_today": "09/04/24"}
+    )
+    assert not directory_reader.is_processed_in_current_window(ws_record, {})
+
+
+@unittest.mock.patch.dict(os.environ, {"ResumeMode": "Yes"})
+@unittest.mock.patch("boto3.session.Session")
+@unittest.mock.patch(DirectoryReader.__module__ + ".upload_report")
+@unittest.mock.patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+def test_process_directory_resumes_processed_workspace(
+    MockWorkspacesHelper,
+    mock_upload_report,
+    mock_session,
+    stack_parameters,
+    directory_parameters,
+    ws_record,
+):
+    MockWorkspacesHelper.return_value.get_workspaces_for_directory.return_value = [
+        {
+            "WorkspaceId": ws_record.description.workspace_id,
+            "WorkspaceProperties": {
+                "RunningMode": "AUTO_STOP",
+                "ComputeTypeName": "STANDARD",
+            },
+        }
+    ]
+    mock_session.client.return_value.get_caller_identity.return_value = {
+        "Account": ws_record.description.account
+    }
+    directory_parameters["DateTimeValues"] = {
+        "date_today": ws_record.report_date,
+        "end_time_for_current_month": ws_record.last_reported_metric_period,
+    }
+    directory_reader = DirectoryReader(mock_session, "us-east-1")
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.return_value = ws_record
+    directory_reader.is_prev_month_data = unittest.mock.Mock(return_value=False)
+
+    result = directory_reader.process_directory(
+        stack_parameters, directory_parameters, dashboard_metrics
+    )
+
+    MockWorkspacesHelper.return_value.process_workspace.assert_not_called()
+    directory_reader.usage_table_dao.update_ddb_item.assert_not_called()
+    MockWorkspacesHelper.update_dashboard_metrics.assert_called_once_with(
+        dashboard_metrics,
+        ws_record.billing_data.change_reported,
+        ws_record.billing_data.new_mode,
+        ws_record.billing_data.workspace_terminated,
+    )
+    assert result[0] == 1
+    assert result[2] == ws_record.to_csv()
+
+
+@unittest.mock.patch.dict(os.environ, {"ResumeMode": "No"})
+@unittest.mock.patch("boto3.session.Session")
+@unittest.mock.patch(DirectoryReader.__module__ + ".upload_report")
+@unittest.mock.patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+def test_process_directory_resume_mode_disabled(
+    MockWorkspacesHelper,
+    mock_upload_report,
+    mock_session,
+    stack_parameters,
+    directory_parameters,
+    ws_record,
+):
+    MockWorkspacesHelper.return_value.get_workspaces_for_directory.return_value = [
+        {
+            "WorkspaceId": ws_record.description.workspace_id,
+            "WorkspaceProperties": {
+                "RunningMode": "AUTO_STOP",
+                "ComputeTypeName": "STANDARD",
+            },
+        }
+    ]
+    MockWorkspacesHelper.return_value.process_workspace.return_value = ws_record
+    directory_parameters["DateTimeValues"] = {
+        "date_today": ws_record.report_date,
+        "end_time_for_current_month": ws_record.last_reported_metric_period,
+    }
+    directory_reader = DirectoryReader(mock_session, "us-east-1")
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.return_value = ws_record
+    directory_reader.is_prev_month_data = unittest.mock.Mock(return_value=False)
+
+    directory_reader.process_directory(
+        stack_parameters, directory_parameters, dashboard_metrics
+    )
+
+    MockWorkspacesHelper.return_value.process_workspace.assert_called_once()
+    directory_reader.usage_table_dao.update_ddb_item.assert_called_once_with(ws_record)
+
+
+@unittest.mock.patch("boto3.session.Session")
+@unittest.mock.patch(DirectoryReader.__module__ + ".upload_report")
+@unittest.mock.patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+def test_process_directory_reports_non_actionable_workspace(
+    MockWorkspacesHelper,
+    mock_upload_report,
+    mock_session,
+    stack_parameters,
+    directory_parameters,
+    ws_record,
+):
+    MockWorkspacesHelper.return_value.get_workspaces_for_directory.return_value = [
+        {
+            "WorkspaceId": ws_record.description.workspace_id,
+            "State": "SUSPENDED",
+            "WorkspaceProperties": {
+                "RunningMode": "AUTO_STOP",
+                "ComputeTypeName": "STANDARD",
+            },
+        }
+    ]
+    directory_parameters["DateTimeValues"] = {"date_today": "09/04/24"}
+    directory_reader = DirectoryReader(mock_session, "us-east-1")
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.return_value = ws_record
+    directory_reader.is_prev_month_data = unittest.mock.Mock(return_value=False)
+    metrics = DashboardMetrics()
+
+    result = directory_reader.process_directory(
+        stack_parameters, directory_parameters, metrics
+    )
+
+    MockWorkspacesHelper.return_value.process_workspace.assert_not_called()
+    MockWorkspacesHelper.return_value.prefetch_connection_status.assert_called_once_with(
+        []
+    )
+    directory_reader.usage_table_dao.update_ddb_item.assert_not_called()
+    MockWorkspacesHelper.update_dashboard_metrics.assert_called_once_with(
+        metrics, None, ws_record.description.initial_mode, ""
+    )
+    assert metrics.workspace_state_metrics == {"SUSPENDED": 1}
+    assert result[0] == 1
+    assert result[1][0]["billableTime"] == ws_record.billing_data.billable_hours
+    assert ",Skipped," in result[2]
+
+
+def test_get_report_only_record_without_stored_record(session):
+    directory_reader = DirectoryReader(session, "us-east-1")
+    description = ws_description()
+    record = directory_reader.get_report_only_record(
+        description, {"date_today": "09/04/24"}
+    )
+    assert record.description == description
+    assert record.billing_data.billable_hours == 0
+    assert record.billing_data.change_reported == "-S-"
+    assert record.billing_data.new_mode == description.initial_mode
+    assert record.report_date == "09/04/24"
+    assert record.performance_metrics.cpu_usage is None
+
+
+# The last day of the month ranks ALWAYS_ON workspaces first without TestEndOfMonth
+@pytest.mark.parametrize(
+    "test_end_of_month, current_month_last_day", [("Yes", False), ("No", True)]
+)
+@unittest.mock.patch("boto3.session.Session")
+@unittest.mock.patch(DirectoryReader.__module__ + ".upload_report")
+@unittest.mock.patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+@unittest.mock.patch(DirectoryReader.__module__ + ".get_run_scheduler")
+def test_process_directory_defers_low_priority_workspaces(
+    mock_get_run_scheduler,
+    MockWorkspacesHelper,
+    mock_upload_report,
+    mock_session,
+    stack_parameters,
+    directory_parameters,
+    ws_billing_data,
+    ws_metrics,
+    test_end_of_month,
+    current_month_last_day,
+):
+    stack_parameters["TestEndOfMonth"] = test_end_of_month
+    directory_parameters["DateTimeValues"] = {
+        "current_month_last_day": current_month_last_day
+    }
+    MockWorkspacesHelper.return_value.get_workspaces_for_directory.return_value = [
+        {
+            "WorkspaceId": workspace_id,
+            "State": "AVAILABLE",
+            "WorkspaceProperties": {
+                "RunningMode": running_mode,
+                "ComputeTypeName": "STANDARD",
+            },
+        }
+        for workspace_id, running_mode in [
+            ("ws-auto-stop", "AUTO_STOP"),
+            ("ws-always-on", "ALWAYS_ON"),
+        ]
+    ]
+    directory_reader = DirectoryReader(mock_session, "us-east-1")
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.side_effect = (
+        lambda description: description
+    )
+    processed_record = WorkspaceRecord(
+        description=ws_description(workspace_id="ws-always-on"),
+        billing_data=ws_billing_data,
+        performance_metrics=ws_metrics,
+        report_date="test-report-date",
+        last_reported_metric_period="2024-09-03T00:00:00Z",
+    )
+    MockWorkspacesHelper.return_value.process_workspace.return_value = processed_record
+    run_scheduler = RunScheduler(0)
+    mock_get_run_scheduler.return_value = run_scheduler
+
+    result = directory_reader.process_directory(
+        stack_parameters, directory_parameters, DashboardMetrics()
+    )
+
+    # The end of month candidate is processed first, the other workspace is deferred
+    MockWorkspacesHelper.return_value.process_workspace.assert_called_once()
+    assert (
+        MockWorkspacesHelper.return_value.process_workspace.call_args.args[
+            0
+        ].workspace_id
+        == "ws-always-on"
+    )
+    directory_reader.usage_table_dao.update_ddb_item.assert_called_once_with(
+        processed_record
+    )
+    assert run_scheduler.deferred == ["ws-auto-stop"]
+    assert result[0] == 2
+    assert result[2].splitlines()[1].startswith("ws-auto-stop,0,")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import math
+import os
+from unittest.mock import patch
+
+# Third Party Libraries
+import pytest
+
+# Cost Optimizer for Amazon Workspaces
+from ..metrics_compute import (
+    ComputePool,
+    get_compute_pool,
+    get_compute_processes,
+    run_batch,
+)
+
+
+def test_run_batch_returns_the_error_of_a_failed_call():
+    results = run_batch([(math.sqrt, 4), (math.sqrt, -1), (abs, -2)])
+
+    assert results[0] == (True, 2.0)
+    assert results[1][0] is False
+    assert isinstance(results[1][1], ValueError)
+    assert results[2] == (True, 2)
+
+
+def test_compute_pool_runs_calls_in_worker_processes():
+    compute_pool = ComputePool(processes=2, batch_size=2)
+    try:
+        futures = [compute_pool.submit(math.sqrt, value) for value in (4, 9, 16, -1)]
+        # The last batch only has one call, it is sent after the batch wait
+        assert [future.result(timeout=60) for future in futures[:3]] == [
+            2.0,
+            3.0,
+            4.0,
+        ]
+        with pytest.raises(ValueError):
+            futures[3].result(timeout=60)
+    finally:
+        compute_pool.shutdown()
+
+
+def test_compute_pool_shutdown_sends_pending_calls():
+    compute_pool = ComputePool(processes=1, batch_size=10, max_batch_wait_seconds=60)
+    future = compute_pool.submit(abs, -3)
+
+    compute_pool.shutdown()
+
+    assert future.result(timeout=60) == 3
+
+
+@pytest.mark.parametrize(
+    "processes, expected",
+    [(None, 0), ("", 0), ("0", 0), ("4", 4), ("-1", 0), ("many", 0)],
+)
+def test_get_compute_processes(processes, expected):
+    environ = {} if processes is None else {"MetricsComputeProcesses": processes}
+    with patch.dict(os.environ, environ, clear=True):
+        assert get_compute_processes() == expected
+
+
+def test_get_compute_processes_auto():
+    with patch.dict(os.environ, {"MetricsComputeProcesses": "auto"}), patch(
+        "os.cpu_count", return_value=8
+    ):
+        assert get_compute_processes() == 8
+
+
+def test_get_compute_pool_disabled_by_default():
+    with patch.dict(os.environ, {}, clear=True):
+        assert get_compute_pool() is None
+
+
+def test_get_compute_pool_is_shared():
+    with patch.dict(os.environ, {"MetricsComputeProcesses": "1"}):
+        compute_pool = get_compute_pool()
+
+        assert isinstance(compute_pool, ComputePool)
+        assert get_compute_pool() is compute_pool
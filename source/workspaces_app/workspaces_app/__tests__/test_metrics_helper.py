@@ -20,7 +20,13 @@ import boto3
 from botocore.stub import Stubber
 
 # Cost Optimizer for Amazon Workspaces
-from ..metrics_helper import MetricsHelper, get_autostop_timeout_hours
+from ..metrics_helper import (
+    MetricsHelper,
+    compute_workspace_metrics,
+    get_autostop_timeout_hours,
+    pack_metric_data_points,
+    unpack_metric_data_points,
+)
 from ..user_session import UserSession
 from ..workspace_record import *
 
@@ -1569,3 +1575,93 @@ def test_apply_hours_increment_cap_handles_zero_previous_hours(session):
     )
 
     assert result == 48
+
+
+def test_get_billable_hours_and_performance_with_compute_pool(
+    mocker, session, ws_record, metric_data
+):
+    region = "us-east-1"
+    metrics_helper = MetricsHelper(session, region, "test-table")
+    start_time = "2021-05-01T00:00:00Z"
+    end_time = "2021-05-06T00:00:00Z"
+    user_sessions = [user_session_factory()]
+    mocker.patch.object(
+        metrics_helper,
+        "get_time_range",
+        return_value={"start_time": start_time, "end_time": end_time},
+    )
+    mocker.patch.object(metrics_helper, "get_cloudwatch_metric_data_points")
+    mocker.patch.object(
+        metrics_helper, "get_list_data_points", return_value=metric_data
+    )
+    mock_update_ddb_items = mocker.patch.object(
+        metrics_helper.session_table, "update_ddb_items"
+    )
+    mock_compute_pool = mocker.patch(
+        "workspaces_app.metrics_helper.get_compute_pool"
+    ).return_value
+    mock_compute_pool.submit.return_value.result.return_value = (
+        user_sessions,
+        30,
+        ws_record.performance_metrics,
+    )
+    spy_get_user_sessions = mocker.spy(metrics_helper, "get_user_sessions")
+
+    result = metrics_helper.get_billable_hours_and_performance(
+        start_time, end_time, ws_record, 60
+    )
+
+    function, payload = mock_compute_pool.submit.call_args.args
+    assert function is compute_workspace_metrics
+    assert payload == (
+        pack_metric_data_points(metric_data),
+        ws_record.description,
+        60,
+        ws_record.billing_data.billable_hours,
+        ws_record.performance_metrics,
+    )
+    spy_get_user_sessions.assert_not_called()
+    mock_update_ddb_items.assert_called_once_with(user_sessions)
+    assert result == {
+        "billable_hours": 30,
+        "performance_metrics": ws_record.performance_metrics,
+    }
+
+
+def test_pack_metric_data_points():
+    timestamps = [
+        datetime.datetime(2024, 1, 1, 12, 0, 0, tzinfo=tzutc()),
+        datetime.datetime(2024, 1, 1, 12, 5, 0, tzinfo=tzutc()),
+    ]
+    metric_data_points = {
+        "userconnected": {"timestamps": timestamps, "values": [1.0, 0.0]},
+        "cpuusage": {"timestamps": timestamps[:1], "values": [12.5]},
+    }
+
+    packed_metric_data_points = pack_metric_data_points(metric_data_points)
+
+    assert packed_metric_data_points == (
+        ("userconnected", (1704110400.0, 1704110700.0), (1.0, 0.0)),
+        ("cpuusage", (1704110400.0,), (12.5,)),
+    )
+    assert unpack_metric_data_points(packed_metric_data_points) == metric_data_points
+
+
+def test_compute_workspace_metrics_matches_inline_computation(session, ws_record):
+    metrics_helper = MetricsHelper(session, "us-east-1", "test-table")
+    metric_data_points = metric_data_factory([0, 1, 2, 20, 21], 40, 10)
+    for data in metric_data_points.values():
+        data["timestamps"] = [
+            timestamp.replace(tzinfo=tzutc()) for timestamp in data["timestamps"]
+        ]
+    arguments = (
+        ws_record.description,
+        60,
+        ws_record.billing_data.billable_hours,
+        ws_record.performance_metrics,
+    )
+    payload = (pack_metric_data_points(metric_data_points), *arguments)
+
+    expected_result = metrics_helper.compute_metrics(metric_data_points, *arguments)
+
+    assert compute_workspace_metrics(payload) == expected_result
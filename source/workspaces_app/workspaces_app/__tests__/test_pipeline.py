@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Cost Optimizer for Amazon Workspaces
+from ..directory_reader import DirectoryReader
+from ..pipeline import (
+    Pipeline,
+    PipelineDirectoryReader,
+    RateLimiter,
+    Stage,
+    build_stages,
+    get_stage_settings,
+)
+from ..utils.dashboard_metrics import DashboardMetrics
+from ..workspace_record import (
+    WorkspaceBillingData,
+    WorkspaceDescription,
+    WorkspacePerformanceMetrics,
+    WorkspaceRecord,
+)
+
+
+def ws_record(workspace_id: str) -> WorkspaceRecord:
+    return WorkspaceRecord(
+        description=WorkspaceDescription(
+            account="111111111111",
+            region="us-east-1",
+            directory_id="d-1",
+            workspace_id=workspace_id,
+            initial_mode="AUTO_STOP",
+            usage_threshold=100,
+            bundle_type="STANDARD",
+            username="user",
+            computer_name="computer",
+        ),
+        billing_data=WorkspaceBillingData(
+            billable_hours=10, change_reported="-N-", new_mode="AUTO_STOP"
+        ),
+        performance_metrics=WorkspacePerformanceMetrics(
+            None, None, None, None, None, None
+        ),
+        report_date="10/01/24",
+        last_reported_metric_period="2024-10-01T00:00:00Z",
+    )
+
+
+def test_pipeline_runs_items_through_stages():
+    results = []
+    errors = []
+
+    def double(item):
+        if item["value"] == 2:
+            raise ValueError("invalid")
+        item["value"] *= 2
+
+    pipeline = Pipeline(
+        [
+            Stage("double", double, concurrency=2),
+            Stage("collect", lambda item: results.append(item["value"])),
+        ],
+        lambda item, stage, error: errors.append((item["value"], stage)),
+        queue_size=1,
+    )
+
+    pipeline.run({"value": value} for value in range(5))
+
+    assert sorted(results) == [0, 2, 6, 8]
+    assert errors == [(2, "double")]
+
+
+def test_pipeline_slow_stage_throttles_upstream_stages():
+    release = threading.Event()
+    fetched = []
+
+    pipeline = Pipeline(
+        [
+            Stage("fetch", fetched.append),
+            Stage("write", lambda item: release.wait()),
+        ],
+        lambda item, stage, error: None,
+        queue_size=1,
+    )
+    thread = threading.Thread(target=pipeline.run, args=(range(20),))
+    thread.start()
+    time.sleep(0.2)
+
+    # One item is written, one waits in the queue of the writer and one is being fetched
+    assert len(fetched) <= 3
+    release.set()
+    thread.join(timeout=10)
+    assert len(fetched) == 20
+
+
+def test_rate_limiter_spaces_calls():
+    now = {"time": 100.0}
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now["time"] += seconds
+
+    rate_limiter = RateLimiter(4, clock=lambda: now["time"], sleep=sleep)
+    for _ in range(3):
+        rate_limiter.acquire()
+
+    assert sleeps == [0.25, 0.25]
+
+
+def test_get_stage_settings():
+    with patch.dict(os.environ, {"PipelineStageConcurrency": '{"persist": 2}'}):
+        settings = get_stage_settings("PipelineStageConcurrency", {"persist": 8})
+    assert settings == {"persist": 2}
+
+
+def test_get_stage_settings_invalid_value():
+    with patch.dict(os.environ, {"PipelineStageConcurrency": "[1]"}):
+        assert get_stage_settings("PipelineStageConcurrency", {"persist": 8}) == {
+            "persist": 8
+        }
+
+
+def test_build_stages_with_rate_limits():
+    with patch.dict(
+        os.environ,
+        {
+            "PipelineStageConcurrency": '{"metrics": 3}',
+            "PipelineStageRateLimits": '{"act": 5}',
+        },
+    ):
+        stages = build_stages([("metrics", print), ("act", print)])
+
+    assert [stage.concurrency for stage in stages] == [3, 4]
+    assert stages[0].rate_limiter is None
+    assert isinstance(stages[1].rate_limiter, RateLimiter)
+
+
+def test_build_stages_share_the_rate_limiters_of_a_scope():
+    with patch.dict(os.environ, {"PipelineStageRateLimits": '{"act": 5}'}):
+        stages = build_stages([("act", print)], ("111111111111", "us-east-1"))
+        # Another directory of the same account and region processed at the same time
+        other_stages = build_stages([("act", print)], ("111111111111", "us-east-1"))
+        other_region_stages = build_stages(
+            [("act", print)], ("111111111111", "eu-west-1")
+        )
+
+    assert other_stages[0].rate_limiter is stages[0].rate_limiter
+    assert other_region_stages[0].rate_limiter is not stages[0].rate_limiter
+
+
+@patch.object(DirectoryReader, "get_account", return_value="111111111111")
+@patch(DirectoryReader.__module__ + ".WorkspacesHelper")
+@patch("workspaces_app.pipeline.upload_report")
+def test_pipeline_process_directory(
+    mock_upload_report, MockWorkspacesHelper, mock_get_account
+):
+    workspaces = [
+        {
+            "WorkspaceId": f"ws-{index}",
+            "State": "PENDING" if index == 3 else "AVAILABLE",
+            "WorkspaceProperties": {
+                "RunningMode": "AUTO_STOP",
+                "ComputeTypeName": "STANDARD",
+                "RunningModeAutoStopTimeoutInMinutes": 60,
+            },
+        }
+        for index in range(4)
+    ]
+    workspaces_helper = MockWorkspacesHelper.return_value
+    workspaces_helper.get_workspaces_for_directory.return_value = workspaces
+    workspaces_helper.get_hourly_threshold_for_bundle_type.return_value = 100
+    workspaces_helper.is_quiescent_workspace.return_value = False
+    workspaces_helper.get_analyzed_record.side_effect = lambda record: record
+    metrics_helper = workspaces_helper.metrics_helper
+    metrics_helper.get_metric_data_points.return_value = (
+        {"start_time": "2024-10-01T00:00:00Z"},
+        {"userconnected": {"timestamps": [], "values": []}},
+    )
+    metrics_helper.calculate_billable_hours_and_performance.return_value = (
+        ["session"],
+        {"billable_hours": 5, "performance_metrics": None},
+    )
+
+    def process_workspace(record, timeout, dashboard_metrics, calculated_metrics):
+        assert timeout == 60
+        assert calculated_metrics["billable_hours"] == 5
+        if record.workspace_id == "ws-1":
+            raise Exception("throttled")
+        dashboard_metrics.update_billing_metrics("hourly_billed")
+        return ws_record(record.workspace_id)
+
+    workspaces_helper.process_workspace.side_effect = process_workspace
+    directory_reader = PipelineDirectoryReader(unittest.mock.Mock(), "us-east-1")
+    directory_reader.usage_table_dao = unittest.mock.Mock()
+    directory_reader.usage_table_dao.get_workspace_ddb_item.side_effect = (
+        lambda description: description
+    )
+    dashboard_metrics = DashboardMetrics()
+
+    result = directory_reader.process_directory(
+        {"DryRun": "No", "TestEndOfMonth": "No"},
+        {"DirectoryId": "d-1", "DateTimeValues": {}},
+        dashboard_metrics,
+    )
+
+    assert result[0] == 4
+    assert [row.split(",")[0] for row in result[2].splitlines()] == [
+        "ws-0",
+        "ws-2",
+        "ws-3",
+    ]
+    assert len(result[1]) == 3
+    assert dashboard_metrics.billing_metrics.hourly_billed == 2
+    # The PENDING workspace is reported without analysis and is not stored
+    assert workspaces_helper.prefetch_tags.call_count == 3
+    assert directory_reader.usage_table_dao.update_ddb_item.call_count == 2
+    assert metrics_helper.session_table.update_ddb_items.call_count == 2
+    mock_upload_report.assert_called_once()
+    assert mock_upload_report.call_args.args[3] == (
+        WorkspaceRecord.csv_header() + result[2]
+    )
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import json
+import os
+from unittest.mock import Mock, patch
+
+# Cost Optimizer for Amazon Workspaces
+from ..run_planner import (
+    build_plan,
+    estimate_api_calls,
+    estimate_runtime,
+    get_api_latencies,
+    get_metric_data_calls_per_workspace,
+    get_plan_concurrency,
+    get_sessions_per_workspace,
+)
+from ..work_scheduler import DirectoryTarget
+
+
+def directory_plan(workspaces, actionable_workspaces):
+    return {
+        "workspaces": workspaces,
+        "actionable_workspaces": actionable_workspaces,
+        "listing_calls": max(1, -(-workspaces // 25)),
+        "listing_seconds": 0.1,
+    }
+
+
+def test_get_metric_data_calls_per_workspace():
+    # A month of 5 minute data points of the 7 metrics fits in a single call
+    assert (
+        get_metric_data_calls_per_workspace(
+            {
+                "start_time_for_current_month": "2024-10-01T00:00:00Z",
+                "end_time_for_current_month": "2024-10-31T23:59:59Z",
+            }
+        )
+        == 1
+    )
+    assert (
+        get_metric_data_calls_per_workspace(
+            {
+                "start_time_for_current_month": "2024-01-01T00:00:00Z",
+                "end_time_for_current_month": "2024-03-01T00:00:00Z",
+            }
+        )
+        == 2
+    )
+
+
+def test_estimate_api_calls():
+    api_calls = estimate_api_calls(
+        [directory_plan(60, 50), directory_plan(5, 0)],
+        pair_count=4,
+        metric_data_calls_per_workspace=1,
+    )
+
+    assert api_calls == {
+        "DescribeWorkspaceDirectories": 4,
+        "DescribeWorkspaces": 4,
+        "DescribeWorkspacesConnectionStatus": 2,
+        "DescribeTags": 50,
+        "GetMetricData": 50,
+        "DynamoDBGetItem": 65,
+        "DynamoDBPutItem": 50,
+        "DynamoDBBatchWriteItem": 2,
+        "S3PutObject": 3,
+    }
+
+
+def test_estimate_api_calls_batches_the_user_sessions():
+    directory_plans = [directory_plan(60, 50), directory_plan(5, 0)]
+
+    api_calls = estimate_api_calls(
+        directory_plans, pair_count=4, metric_data_calls_per_workspace=1
+    )
+    assert api_calls["DynamoDBBatchWriteItem"] == 2
+
+    api_calls = estimate_api_calls(
+        directory_plans,
+        pair_count=4,
+        metric_data_calls_per_workspace=1,
+        sessions_per_workspace=3,
+    )
+    assert api_calls["DynamoDBBatchWriteItem"] == 6
+
+    with patch.dict(os.environ, {"BackgroundSessionWrites": "No"}):
+        api_calls = estimate_api_calls(
+            directory_plans,
+            pair_count=4,
+            metric_data_calls_per_workspace=1,
+            sessions_per_workspace=3,
+        )
+    assert api_calls["DynamoDBBatchWriteItem"] == 50
+
+
+def test_get_sessions_per_workspace():
+    assert get_sessions_per_workspace() == 1.0
+    with patch.dict(os.environ, {"PlanSessionsPerWorkspace": "2.5"}):
+        assert get_sessions_per_workspace() == 2.5
+    with patch.dict(os.environ, {"PlanSessionsPerWorkspace": "many"}):
+        assert get_sessions_per_workspace() == 1.0
+
+
+def test_get_api_latencies():
+    with patch.dict(os.environ, {"PlanApiLatencies": '{"cloudwatch": 1}'}):
+        latencies = get_api_latencies({"workspaces": 0.5})
+    assert latencies["workspaces"] == 0.5
+    assert latencies["cloudwatch"] == 1.0
+
+    with patch.dict(os.environ, {"PlanApiLatencies": "[1]"}):
+        assert get_api_latencies({})["cloudwatch"] == 0.4
+
+
+def test_get_plan_concurrency():
+    with patch.dict(os.environ, {"MaxConcurrentAccounts": "4"}):
+        assert get_plan_concurrency(2, 10)["cloudwatch"] == 2
+    with patch.dict(
+        os.environ,
+        {
+            "WorkScheduler": "LargestFirst",
+            "MaxConcurrentWorkItems": "16",
+            "ProcessingEngine": "Asyncio",
+            "AsyncApiConcurrency": '{"cloudwatch": 4}',
+        },
+    ):
+        assert get_plan_concurrency(1, 10)["cloudwatch"] == 40
+    with patch.dict(
+        os.environ,
+        {
+            "MaxConcurrentAccounts": "4",
+            "ProcessingEngine": "Pipeline",
+            "PipelineStageConcurrency": '{"metrics": 3}',
+        },
+    ):
+        concurrency = get_plan_concurrency(1, 10)
+    assert concurrency["cloudwatch"] == 3
+    assert concurrency["dynamodb"] == 8
+
+
+def test_estimate_runtime():
+    api_calls = {"GetMetricData": 100, "DynamoDBPutItem": 100}
+    latencies = {"workspaces": 0.2, "cloudwatch": 0.4, "dynamodb": 0.1, "s3": 0.1}
+    concurrency = {"workspaces": 1, "cloudwatch": 2, "dynamodb": 1, "s3": 1}
+
+    api_seconds, runtime = estimate_runtime(
+        api_calls, latencies, concurrency, overlapping=False
+    )
+    assert api_seconds["cloudwatch"] == 20.0
+    assert runtime == 30.0
+
+    _, runtime = estimate_runtime(api_calls, latencies, concurrency, overlapping=True)
+    assert runtime == 20.0
+
+
+@patch.dict(os.environ, {"ProcessingEngine": "Threads"})
+@patch("workspaces_app.run_planner.client_factory")
+@patch("workspaces_app.run_planner.list_workspaces_for_directory")
+def test_build_plan(mock_list_workspaces_for_directory, mock_client_factory):
+    mock_list_workspaces_for_directory.side_effect = lambda client, directory_id: (
+        [{"WorkspaceId": "ws-1", "State": "AVAILABLE"}, {"State": "PENDING"}]
+        if directory_id == "d-1"
+        else []
+    )
+    targets = [
+        DirectoryTarget("111111111111", Mock(), "us-east-1", {"DirectoryId": "d-1"}),
+        DirectoryTarget("111111111111", Mock(), "us-west-2", {"DirectoryId": "d-2"}),
+    ]
+
+    plan = build_plan(
+        targets,
+        ["111111111111"],
+        {"us-east-1", "us-west-2"},
+        {
+            "start_time_for_current_month": "2024-10-01T00:00:00Z",
+            "end_time_for_current_month": "2024-10-15T00:00:00Z",
+        },
+        budget_seconds=3600,
+    )
+
+    assert plan["totals"] == {
+        "directories": 2,
+        "workspaces": 2,
+        "actionable_workspaces": 1,
+    }
+    assert [directory["directory_id"] for directory in plan["directories"]] == [
+        "d-1",
+        "d-2",
+    ]
+    assert plan["api_calls"]["DescribeWorkspaceDirectories"] == 2
+    assert plan["api_calls"]["GetMetricData"] == 1
+    assert plan["fits_budget"]
+    # The plan is written as JSON
+    json.dumps(plan)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import datetime
+import os
+from unittest.mock import patch
+
+# Cost Optimizer for Amazon Workspaces
+from .. import scheduler
+from ..scheduler import (
+    PRIORITY_END_OF_MONTH,
+    PRIORITY_NEAR_THRESHOLD,
+    PRIORITY_OTHER,
+    RunScheduler,
+    get_budget_seconds,
+    get_priority,
+    get_stored_priority_counts,
+    is_end_of_month,
+)
+from ..workspace_record import (
+    WorkspaceBillingData,
+    WorkspaceDescription,
+    WorkspacePerformanceMetrics,
+    WorkspaceRecord,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def description(initial_mode: str) -> WorkspaceDescription:
+    return WorkspaceDescription(
+        account="111111111111",
+        region="us-east-1",
+        directory_id="d-1",
+        workspace_id="ws-1",
+        initial_mode=initial_mode,
+        usage_threshold=100,
+        bundle_type="STANDARD",
+        username="user",
+        computer_name="computer",
+    )
+
+
+def record(initial_mode: str, billable_hours: int) -> WorkspaceRecord:
+    return WorkspaceRecord(
+        description=description(initial_mode),
+        billing_data=WorkspaceBillingData(
+            billable_hours=billable_hours,
+            change_reported="-N-",
+            new_mode=initial_mode,
+        ),
+        performance_metrics=WorkspacePerformanceMetrics(
+            None, None, None, None, None, None
+        ),
+        report_date="10/01/24",
+        last_reported_metric_period="2024-10-01T00:00:00Z",
+    )
+
+
+def test_get_priority():
+    assert get_priority(description("ALWAYS_ON"), True) == PRIORITY_END_OF_MONTH
+    assert get_priority(description("ALWAYS_ON"), False) == PRIORITY_OTHER
+    assert get_priority(record("AUTO_STOP", 85), True) == PRIORITY_NEAR_THRESHOLD
+    assert get_priority(record("AUTO_STOP", 20), True) == PRIORITY_OTHER
+    assert get_priority(description("AUTO_STOP"), True) == PRIORITY_OTHER
+
+
+def test_schedule_keeps_order_without_budget():
+    run_scheduler = RunScheduler()
+    assert run_scheduler.schedule([2, 0, 1], lambda item: item) == [
+        (2, 2),
+        (0, 0),
+        (1, 1),
+    ]
+    assert not run_scheduler.should_defer(PRIORITY_OTHER)
+
+
+def test_schedule_orders_by_priority_with_budget():
+    run_scheduler = RunScheduler(60)
+    assert run_scheduler.schedule(
+        ["c", "a", "b", "a2"], lambda item: "abc".index(item[0])
+    ) == [
+        (0, "a"),
+        (0, "a2"),
+        (1, "b"),
+        (2, "c"),
+    ]
+
+
+def test_should_defer_reserves_time_for_higher_priority():
+    clock = FakeClock()
+    run_scheduler = RunScheduler(100, clock)
+    run_scheduler.schedule(list(range(10)), lambda item: 0 if item < 5 else 2)
+
+    # 10 seconds per workspace
+    clock.now = 10
+    run_scheduler.complete(0)
+    assert not run_scheduler.should_defer(PRIORITY_END_OF_MONTH)
+    # 4 pending end of month workspaces need 40 of the remaining 90 seconds
+    assert not run_scheduler.should_defer(PRIORITY_OTHER)
+
+    clock.now = 60
+    for _ in range(5):
+        run_scheduler.complete(2)
+    clock.now = 95
+    assert run_scheduler.should_defer(PRIORITY_OTHER)
+    # End of month conversion candidates are never deferred
+    assert not run_scheduler.should_defer(PRIORITY_END_OF_MONTH)
+
+    run_scheduler.defer(PRIORITY_OTHER, "ws-1")
+    assert run_scheduler.deferred == ["ws-1"]
+
+
+def test_should_defer_reserves_time_for_later_directories():
+    clock = FakeClock()
+    run_scheduler = RunScheduler(100, clock)
+    # The end of month candidates are in the second directory
+    run_scheduler.plan({PRIORITY_END_OF_MONTH: 5, PRIORITY_OTHER: 5})
+    run_scheduler.schedule(list(range(5)), lambda item: PRIORITY_OTHER)
+
+    # 10 seconds per workspace
+    clock.now = 10
+    run_scheduler.complete(PRIORITY_OTHER)
+    assert not run_scheduler.should_defer(PRIORITY_OTHER)
+    clock.now = 50
+    for _ in range(4):
+        run_scheduler.complete(PRIORITY_OTHER)
+    # The 5 candidates of the second directory need the remaining 50 seconds
+    assert run_scheduler.should_defer(PRIORITY_OTHER)
+
+    run_scheduler.schedule(list(range(5)), lambda item: PRIORITY_END_OF_MONTH)
+    assert not run_scheduler.should_defer(PRIORITY_END_OF_MONTH)
+    for _ in range(5):
+        run_scheduler.complete(PRIORITY_END_OF_MONTH)
+    clock.now = 60
+    assert not run_scheduler.should_defer(PRIORITY_OTHER)
+
+
+def test_get_stored_priority_counts():
+    def ddb_item(account, region, initial_mode, billable_hours, terminated=False):
+        return {
+            "Account": {"S": account},
+            "Region": {"S": region},
+            "InitialMode": {"S": initial_mode},
+            "UsageThreshold": {"N": "100"},
+            "BillableHours": {"N": str(billable_hours)},
+            "WorkspaceTerminated": {"S": "Yes" if terminated else ""},
+        }
+
+    ddb_items = [
+        ddb_item("111111111111", "us-east-1", "ALWAYS_ON", 200),
+        ddb_item("111111111111", "us-east-1", "AUTO_STOP", 90),
+        ddb_item("111111111111", "us-east-1", "AUTO_STOP", 10),
+        ddb_item("111111111111", "us-east-1", "ALWAYS_ON", 200, terminated=True),
+        ddb_item("111111111111", "eu-west-1", "ALWAYS_ON", 200),
+        ddb_item("222222222222", "us-east-1", "ALWAYS_ON", 200),
+    ]
+    assert get_stored_priority_counts(
+        ddb_items, True, ["111111111111"], {"us-east-1"}
+    ) == {PRIORITY_END_OF_MONTH: 1, PRIORITY_NEAR_THRESHOLD: 1, PRIORITY_OTHER: 1}
+    assert get_stored_priority_counts(
+        ddb_items, False, ["111111111111"], {"us-east-1"}
+    ) == {PRIORITY_NEAR_THRESHOLD: 1, PRIORITY_OTHER: 2}
+
+
+def test_is_end_of_month():
+    assert is_end_of_month({"TestEndOfMonth": "Yes"}, {})
+    assert is_end_of_month({"TestEndOfMonth": "No"}, {"current_month_last_day": True})
+    assert not is_end_of_month(
+        {"TestEndOfMonth": "No"}, {"current_month_last_day": False}
+    )
+    assert not is_end_of_month({}, None)
+
+
+def test_get_budget_seconds():
+    stack_parameters = {"TestEndOfMonth": "No"}
+    now = datetime.datetime(2024, 10, 15, 22, 0, tzinfo=datetime.timezone.utc)
+    assert get_budget_seconds(stack_parameters, now) is None
+    with patch.dict(os.environ, {"RunTimeBudgetMinutes": "180"}):
+        assert get_budget_seconds(stack_parameters, now) == 180 * 60
+
+
+def test_get_budget_seconds_ends_at_midnight_on_last_day():
+    stack_parameters = {"TestEndOfMonth": "Yes"}
+    now = datetime.datetime(2024, 10, 31, 22, 0, tzinfo=datetime.timezone.utc)
+    assert get_budget_seconds(stack_parameters, now) == 2 * 3600
+    with patch.dict(os.environ, {"RunTimeBudgetMinutes": "60"}):
+        assert get_budget_seconds(stack_parameters, now) == 3600
+
+
+def test_start_run_scheduler():
+    with patch.dict(os.environ, {"RunTimeBudgetMinutes": "10"}):
+        run_scheduler = scheduler.start_run_scheduler({"TestEndOfMonth": "No"})
+    assert run_scheduler is scheduler.get_run_scheduler()
+    assert run_scheduler.has_budget
+    scheduler.clear()
+    assert not scheduler.get_run_scheduler().has_budget
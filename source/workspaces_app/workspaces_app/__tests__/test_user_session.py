@@ -5,7 +5,7 @@
 
 # Standard Library
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
 # Third Party Libraries
@@ -72,14 +72,8 @@ def ddb_item(user_session):
         "Username": {
             "S": user_session.username,
         },
-        "ActiveSessions": {
-            "L": list(
-                map(
-                    lambda x: {"S": convert_time_to_string(x)},
-                    user_session.active_sessions,
-                )
-            ),
-        },
+        # Five connected samples from 2024-01-01T12:00:00Z
+        "ActiveSessions": {"B": b"\x01e\x92\xa9@\x01,\x1f"},
         "DurationHours": {"N": str(user_session.duration_hours)},
         "InSessionLatency": {
             "N": str(user_session.in_session_latency),
@@ -108,6 +102,62 @@ def test_user_session_to_ddb_item(user_session, ddb_item):
     assert result == ddb_item
 
 
+def test_user_session_to_ddb_item_with_timestamps(user_session, ddb_item, monkeypatch):
+    monkeypatch.setenv("CompactActiveSessions", "No")
+
+    result = user_session.to_ddb_obj()
+
+    assert result == {
+        **ddb_item,
+        "ActiveSessions": {
+            "L": [
+                {"S": convert_time_to_string(x)} for x in user_session.active_sessions
+            ]
+        },
+    }
+
+
+def test_user_session_from_ddb_item(user_session, ddb_item):
+    result = UserSession.from_ddb_obj(ddb_item)
+
+    assert result.session_time == user_session.session_time
+    assert result.active_sessions == [
+        time.replace(tzinfo=timezone.utc) for time in user_session.active_sessions
+    ]
+    assert result.cpu_usage == user_session.cpu_usage
+    assert result.duration_hours == 1
+
+
+def test_user_session_from_ddb_item_with_timestamps(user_session, ddb_item):
+    ddb_item["ActiveSessions"] = {
+        "L": [{"S": convert_time_to_string(x)} for x in user_session.active_sessions]
+    }
+
+    result = UserSession.from_ddb_obj(ddb_item)
+
+    assert [convert_time_to_string(x) for x in result.active_sessions] == [
+        convert_time_to_string(x) for x in user_session.active_sessions
+    ]
+
+
+def test_active_sessions_round_trip_with_gaps():
+    active_sessions = [
+        datetime(2024, 1, 1, 23, 55, tzinfo=timezone.utc) + timedelta(minutes=5 * slot)
+        for slot in [0, 1, 2, 7, 8, 30]
+    ]
+
+    data = encode_active_sessions(active_sessions)
+
+    assert len(data) == 11
+    assert decode_active_sessions(data) == active_sessions
+
+
+def test_unaligned_active_sessions_are_not_encoded():
+    active_sessions = [datetime(2024, 1, 1, 12), datetime(2024, 1, 1, 12, 7)]
+
+    assert encode_active_sessions(active_sessions) is None
+
+
 def test_from_json(user_session):
     class_as_json = asdict(user_session)
     del class_as_json["session_time"]
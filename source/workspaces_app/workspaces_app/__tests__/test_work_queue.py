@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import datetime
+import io
+import json
+import os
+from unittest.mock import patch
+
+# Third Party Libraries
+import pytest
+from pytest import raises
+
+# AWS Libraries
+import boto3
+from botocore.stub import Stubber
+
+# Cost Optimizer for Amazon Workspaces
+from ..work_queue import (
+    SqliteWorkQueue,
+    SqsWorkQueue,
+    WorkQueue,
+    WorkResult,
+    WorkUnit,
+    decode_work_unit,
+    encode_work_unit,
+    get_work_queue,
+)
+
+QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/111111111111/wco-work"
+
+
+def work_unit(directory_id: str) -> WorkUnit:
+    return WorkUnit(
+        unit_id=f"111111111111_us-east-1_{directory_id}",
+        run_id="test-run",
+        account_id="111111111111",
+        role_name=None,
+        region="us-east-1",
+        directory={"DirectoryId": directory_id},
+        date_time_values={
+            "date_today": "09/04/24",
+            "first_day_selected_month": datetime.date(2024, 9, 1),
+        },
+    )
+
+
+def work_result(unit: WorkUnit) -> WorkResult:
+    return WorkResult(
+        unit_id=unit.unit_id,
+        report_csv=f"{unit.unit_id}\n",
+        workspaces_processed=[{"billableTime": 10}],
+        dashboard_metrics={"total_workspaces": 1},
+        error=None,
+    )
+
+
+@pytest.fixture()
+def sqlite_queue(tmp_path):
+    yield SqliteWorkQueue(str(tmp_path / "queue.db"))
+
+
+def test_work_queue_is_abstract():
+    with raises(TypeError):
+        WorkQueue()
+
+
+def test_encode_decode_work_unit():
+    unit = work_unit("d-1")
+    assert decode_work_unit(encode_work_unit(unit)) == unit
+
+
+def test_sqlite_work_queue_leases_each_unit_once(sqlite_queue):
+    units = [work_unit("d-1"), work_unit("d-2")]
+    sqlite_queue.put(units)
+
+    first = sqlite_queue.lease("worker-1", 60)
+    second = sqlite_queue.lease("worker-2", 60)
+
+    assert first.unit == units[0]
+    assert second.unit == units[1]
+    assert first.attempts == 1
+    assert sqlite_queue.lease("worker-3", 60) is None
+
+
+def test_sqlite_work_queue_release_and_expiry(sqlite_queue):
+    unit = work_unit("d-1")
+    sqlite_queue.put([unit])
+
+    lease = sqlite_queue.lease("worker-1", 60)
+    sqlite_queue.release(lease)
+    lease = sqlite_queue.lease("worker-2", 0)
+    assert lease.attempts == 2
+
+    # The lease of worker-2 has expired
+    lease = sqlite_queue.lease("worker-3", 60)
+    assert lease.handle == "worker-3"
+    assert lease.attempts == 3
+
+
+def test_sqlite_work_queue_complete(sqlite_queue):
+    units = [work_unit("d-1"), work_unit("d-2")]
+    sqlite_queue.put(units)
+
+    lease = sqlite_queue.lease("worker-1", 60)
+    sqlite_queue.complete(lease, work_result(lease.unit))
+
+    assert sqlite_queue.get_results(units) == {units[0].unit_id: work_result(units[0])}
+    assert sqlite_queue.lease("worker-1", 60).unit == units[1]
+    assert sqlite_queue.lease("worker-1", 60) is None
+
+
+def test_sqlite_work_queue_keeps_the_results_of_each_run(sqlite_queue):
+    previous_unit = work_unit("d-1")
+    sqlite_queue.put([previous_unit])
+    previous_lease = sqlite_queue.lease("worker-1", 60)
+
+    # The next run puts the same directory while the previous lease is still held
+    unit = previous_unit._replace(run_id="next-run")
+    sqlite_queue.put([unit])
+    sqlite_queue.complete(previous_lease, work_result(previous_unit))
+
+    assert sqlite_queue.get_results([unit]) == {}
+    lease = sqlite_queue.lease("worker-2", 60)
+    assert lease.unit == unit
+    sqlite_queue.complete(lease, work_result(unit))
+    assert sqlite_queue.get_results([unit]) == {unit.unit_id: work_result(unit)}
+    assert sqlite_queue.get_results([previous_unit]) == {
+        previous_unit.unit_id: work_result(previous_unit)
+    }
+
+
+def test_sqs_work_queue():
+    session = boto3.session.Session(region_name="us-east-1")
+    queue = SqsWorkQueue(session, QUEUE_URL, "test-bucket", "work_results/")
+    unit = work_unit("d-1")
+    result = work_result(unit)
+    result_key = f"work_results/test-run/{unit.unit_id}.json"
+
+    with Stubber(queue._sqs_client) as sqs_stubber, Stubber(
+        queue._s3_client
+    ) as s3_stubber:
+        sqs_stubber.add_response(
+            "send_message_batch",
+            {"Successful": [], "Failed": []},
+            {
+                "QueueUrl": QUEUE_URL,
+                "Entries": [{"Id": "0", "MessageBody": encode_work_unit(unit)}],
+            },
+        )
+        sqs_stubber.add_response(
+            "receive_message",
+            {
+                "Messages": [
+                    {
+                        "Body": encode_work_unit(unit),
+                        "ReceiptHandle": "handle-1",
+                        "Attributes": {"ApproximateReceiveCount": "2"},
+                    }
+                ]
+            },
+        )
+        sqs_stubber.add_response(
+            "change_message_visibility",
+            {},
+            {
+                "QueueUrl": QUEUE_URL,
+                "ReceiptHandle": "handle-1",
+                "VisibilityTimeout": 120,
+            },
+        )
+        s3_stubber.add_response(
+            "put_object",
+            {},
+            {
+                "Bucket": "test-bucket",
+                "Key": result_key,
+                "Body": json.dumps(result._asdict()),
+            },
+        )
+        sqs_stubber.add_response(
+            "delete_message",
+            {},
+            {"QueueUrl": QUEUE_URL, "ReceiptHandle": "handle-1"},
+        )
+        s3_stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(json.dumps(result._asdict()).encode())},
+            {"Bucket": "test-bucket", "Key": result_key},
+        )
+
+        queue.put([unit])
+        lease = queue.lease("worker-1", 60)
+        assert lease.unit == unit
+        assert lease.attempts == 2
+        queue.extend(lease, 120)
+        queue.complete(lease, result)
+        assert queue.get_results([unit]) == {unit.unit_id: result}
+
+        sqs_stubber.assert_no_pending_responses()
+        s3_stubber.assert_no_pending_responses()
+
+
+def test_sqs_work_queue_missing_result():
+    session = boto3.session.Session(region_name="us-east-1")
+    queue = SqsWorkQueue(session, QUEUE_URL, "test-bucket", "work_results/")
+    with Stubber(queue._s3_client) as s3_stubber:
+        s3_stubber.add_client_error("get_object", "NoSuchKey")
+        assert queue.get_results([work_unit("d-1")]) == {}
+
+
+@patch.dict(os.environ, {"WorkQueueUrl": QUEUE_URL, "BucketName": "test-bucket"})
+def test_get_work_queue_sqs():
+    assert isinstance(
+        get_work_queue(boto3.session.Session(region_name="us-east-1")), SqsWorkQueue
+    )
+
+
+def test_get_work_queue_sqlite(tmp_path):
+    with patch.dict(os.environ, {"WorkQueuePath": str(tmp_path / "queue.db")}):
+        assert isinstance(get_work_queue(boto3.session.Session()), SqliteWorkQueue)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import threading
+import time
+from unittest.mock import patch
+
+# AWS Libraries
+import boto3
+
+# Cost Optimizer for Amazon Workspaces
+from .. import work_scheduler
+from ..utils.adaptive_concurrency import AimdController
+from ..work_scheduler import (
+    DirectoryTarget,
+    LargestFirstScheduler,
+    WorkItem,
+    plan_work_items,
+)
+
+
+def work_item(account_id: str, region: str, size: int, name: str) -> WorkItem:
+    return WorkItem(
+        account_id=account_id,
+        session=None,
+        region=region,
+        directory={"DirectoryId": name},
+        workspaces=[{"WorkspaceId": f"{name}-{index}"} for index in range(size)],
+        chunk_index=0,
+        chunk_count=1,
+    )
+
+
+@patch.object(work_scheduler, "list_workspaces_for_directory")
+def test_plan_work_items_splits_large_directories(mock_list_workspaces):
+    workspaces = {
+        "d-large": [{"WorkspaceId": f"ws-{index}"} for index in range(5)],
+        "d-empty": [],
+    }
+    mock_list_workspaces.side_effect = lambda client, directory_id: workspaces[
+        directory_id
+    ]
+    session = boto3.session.Session(region_name="us-east-1")
+    targets = [
+        DirectoryTarget("111111111111", session, "us-east-1", {"DirectoryId": name})
+        for name in ["d-large", "d-empty"]
+    ]
+
+    work_items = plan_work_items(targets, chunk_size=2, max_workers=2)
+
+    assert [
+        (item.directory["DirectoryId"], len(item.workspaces), item.chunk_index)
+        for item in work_items
+    ] == [("d-large", 2, 0), ("d-large", 2, 1), ("d-large", 1, 2), ("d-empty", 0, 0)]
+    assert {item.chunk_count for item in work_items[:3]} == {3}
+    assert work_items[3].chunk_count == 1
+
+
+@patch.object(work_scheduler, "list_workspaces_for_directory")
+def test_plan_work_items_listing_error(mock_list_workspaces):
+    mock_list_workspaces.side_effect = Exception("throttled")
+    session = boto3.session.Session(region_name="us-east-1")
+    work_items = plan_work_items(
+        [DirectoryTarget("111111111111", session, "us-east-1", {"DirectoryId": "d"})]
+    )
+    assert len(work_items) == 1
+    assert work_items[0].workspaces is None
+
+
+def test_scheduler_runs_largest_first():
+    work_items = [
+        work_item("a", "us-east-1", 1, "small"),
+        work_item("a", "us-east-1", 8, "large"),
+        work_item("a", "us-east-1", 4, "medium"),
+    ]
+    started = []
+
+    futures = LargestFirstScheduler(max_workers=1).run(
+        work_items,
+        lambda item: started.append(item.directory["DirectoryId"])
+        or item.directory["DirectoryId"],
+    )
+
+    assert started == ["large", "medium", "small"]
+    assert [future.result() for future in futures] == ["small", "large", "medium"]
+
+
+def test_scheduler_caps_concurrency_per_account_and_region():
+    work_items = [
+        work_item(account_id, region, 1, f"{account_id}-{region}-{index}")
+        for account_id in ["a", "b"]
+        for region in ["us-east-1", "us-west-2"]
+        for index in range(3)
+    ]
+    lock = threading.Lock()
+    running = {"accounts": {}, "regions": {}, "account_regions": {}}
+    peaks = {"accounts": 0, "regions": 0, "account_regions": 0}
+
+    def process(item):
+        keys = [
+            ("accounts", item.account_id),
+            ("regions", item.region),
+            ("account_regions", (item.account_id, item.region)),
+        ]
+        with lock:
+            for key, value in keys:
+                running[key][value] = running[key].get(value, 0) + 1
+                peaks[key] = max(peaks[key], running[key][value])
+        time.sleep(0.05)
+        with lock:
+            for key, value in keys:
+                running[key][value] -= 1
+
+    futures = LargestFirstScheduler(
+        max_workers=8, max_per_account=3, max_per_region=3, max_per_account_region=2
+    ).run(work_items, process)
+
+    assert all(future.done() for future in futures)
+    assert peaks["accounts"] <= 3
+    assert peaks["account_regions"] <= 2
+    assert peaks["regions"] <= 3
+    # The accounts run in the same region side by side up to the region cap
+    assert peaks["regions"] > 2
+
+
+def test_scheduler_returns_failures():
+    def process(item):
+        raise Exception("failed")
+
+    futures = LargestFirstScheduler().run(
+        [work_item("a", "us-east-1", 1, "d")], process
+    )
+    assert str(futures[0].exception()) == "failed"
+
+
+def test_scheduler_follows_the_concurrency_limit():
+    controller = AimdController(8)
+    controller.on_throttle("workspaces:DescribeTags")
+    controller.on_throttle("workspaces:DescribeTags")
+    lock = threading.Lock()
+    running = {"count": 0, "peak": 0}
+
+    def process(item):
+        with lock:
+            running["count"] += 1
+            running["peak"] = max(running["peak"], running["count"])
+        time.sleep(0.01)
+        with lock:
+            running["count"] -= 1
+
+    LargestFirstScheduler(
+        max_workers=8,
+        max_per_account=8,
+        max_per_region=8,
+        max_per_account_region=8,
+        concurrency_controller=controller,
+    ).run([work_item("a", "us-east-1", 1, f"d-{index}") for index in range(8)], process)
+
+    assert controller.limit == 4
+    assert running["peak"] <= 4
@@ -10,6 +10,7 @@ from decimal import Decimal
 import pytest
 
 # Cost Optimizer for Amazon Workspaces
+from ..ddb_codec import decode_value, encode_value
 from ..workspace_record import *
 
 METRIC_LIST = [
@@ -116,6 +117,7 @@ def ddb_item(ws_record):
         "WorkspaceTerminated": {
             "S": ws_record.billing_data.workspace_terminated,
         },
+        "MaintenanceHours": {"N": str(ws_record.billing_data.maintenance_hours)},
         "InSessionLatency": {
             "N": str(ws_record.performance_metrics.in_session_latency.avg),
         },
@@ -163,6 +165,7 @@ def ddb_item(ws_record):
         "ReportDate": {"S": ws_record.report_date},
         "LastReportedMetricPeriod": {"S": ws_record.last_reported_metric_period},
         "LastKnownUserConnection": {"S": ws_record.last_known_user_connection},
+        "ConnectedAtLastReport": {"BOOL": ws_record.connected_at_last_report},
     }
 
 
@@ -178,7 +181,17 @@ def test_workspace_record_to_ddb_item(ws_record, ddb_item):
     assert result == ddb_item
 
 
-def test_serialize():
+def test_ddb_item_without_connection_state_to_workspace_record(
+    ddb_item, ws_description
+):
+    del ddb_item["ConnectedAtLastReport"]
+
+    result = WorkspaceRecord.from_ddb_obj(ddb_item, ws_description)
+
+    assert result.connected_at_last_report
+
+
+def test_encode_fields():
     test_fields = {
         "none_item": None,
         "string_item": "string",
@@ -193,11 +206,11 @@ def test_serialize():
     }
     result = {}
     for key, value in test_fields.items():
-        result |= WorkspaceRecord.serialize(key, value)
+        result[WorkspaceRecord.class_field_to_ddb_attr(key)] = encode_value(value)
     assert result == expected_result
 
 
-def test_deserialize():
+def test_decode_attributes():
     test_fields = {
         "none_item": None,
         "string_item": "string",
@@ -212,7 +225,7 @@ def test_deserialize():
     }
     result = {}
     for key, value in test_ddb_item.items():
-        result |= WorkspaceRecord.deserialize(key, value)
+        result[WorkspaceRecord.ddb_attr_to_class_field(key)] = decode_value(value)
     assert result == test_fields
 
 
@@ -7,6 +7,7 @@
 import datetime
 import time
 from decimal import Decimal
+from unittest.mock import Mock, patch
 
 # Third Party Libraries
 import pytest
@@ -21,6 +22,7 @@ from botocore.stub import Stubber
 from .. import workspaces_helper
 from ..utils import date_utils, workspace_utils
 from ..utils.dashboard_metrics import DashboardMetrics
+from ..utils.hedging import get_call_timeout_error
 from ..workspace_record import *
 
 
@@ -1269,6 +1271,23 @@ def test_get_workspaces_for_directory_use_next_token(session):
     assert response == [{"WorkspaceId": "id_1"}, {"WorkspaceId": "id_2"}]
 
 
+def test_list_workspaces_for_directory_returns_partial_list_on_call_timeout():
+    with patch.object(
+        workspaces_helper.client_factory,
+        "hedged_call",
+        side_effect=[
+            {"Workspaces": [{"WorkspaceId": "id_1"}], "NextToken": "s223123jj32"},
+            get_call_timeout_error(
+                "workspaces:DescribeWorkspaces", "ran out of its budget"
+            ),
+        ],
+    ):
+        response = workspaces_helper.list_workspaces_for_directory(
+            Mock(), "123qwe123qwe"
+        )
+    assert response == [{"WorkspaceId": "id_1"}]
+
+
 def test_get_workspaces_for_directory_no_next_token(session):
     settings = {
         "region": "us-east-1",
@@ -1337,6 +1356,28 @@ def test_get_list_tags_for_workspace_returns_list_of_tags(mocker, session):
     assert workspace_helper.get_list_tags_for_workspace(workspace_id) == ["tags"]
 
 
+def test_prefetch_tags_caches_the_tags_of_a_workspace(mocker, session):
+    settings = {
+        "region": "us-east-1",
+        "hourlyLimits": 10,
+        "testEndOfMonth": True,
+        "isDryRun": True,
+        "startTime": 1,
+        "endTime": 2,
+        "TerminateUnusedWorkspaces": "Dry Run",
+    }
+    workspace_helper = workspaces_helper.WorkspacesHelper(session, settings)
+    mocker.patch.object(workspace_helper.workspaces_client, "describe_tags")
+    workspace_helper.workspaces_client.describe_tags.return_value = {
+        "TagList": ["tags"]
+    }
+    workspace_helper.prefetch_tags("ws-1")
+    assert workspace_helper.get_list_tags_for_workspace("ws-1") == ["tags"]
+    workspace_helper.workspaces_client.describe_tags.assert_called_once_with(
+        ResourceId="ws-1"
+    )
+
+
 def test_compare_usage_metrics__returns_error_for_billable_time_none(session):
     settings = {
         "region": "us-east-1",
@@ -2203,3 +2244,257 @@ def test_add_maintenance_time_skips_when_no_directory_info(session):
     )
 
     assert result == 20  # No maintenance time added
+
+
+def test_prefetch_connection_status(session):
+    settings = {"region": "us-east-1"}
+    workspace_ids = [f"ws-{index:08d}" for index in range(30)]
+    last_known_timestamp = datetime.datetime(
+        2024, 9, 1, 12, 0, 0, tzinfo=datetime.timezone.utc
+    )
+    workspace_helper = workspaces_helper.WorkspacesHelper(session, settings)
+    client_stubber = Stubber(workspace_helper.workspaces_client)
+    for batch in (workspace_ids[:25], workspace_ids[25:]):
+        client_stubber.add_response(
+            "describe_workspaces_connection_status",
+            {
+                "WorkspacesConnectionStatus": [
+                    {
+                        "WorkspaceId": workspace_id,
+                        "ConnectionState": "DISCONNECTED",
+                        "LastKnownUserConnectionTimestamp": last_known_timestamp,
+                    }
+                    for workspace_id in batch
+                ]
+            },
+            {"WorkspaceIds": batch},
+        )
+    client_stubber.activate()
+    workspace_helper.prefetch_connection_status(workspace_ids)
+    client_stubber.assert_no_pending_responses()
+    assert len(workspace_helper.connection_status) == 30
+    # Served from the prefetched status without another API call
+    assert (
+        workspace_helper.get_last_known_user_connection_timestamp(workspace_ids[0])
+        == last_known_timestamp
+    )
+    client_stubber.deactivate()
+
+
+@pytest.mark.parametrize(
+    "status,expected",
+    [
+        (None, False),
+        ({"ConnectionState": "DISCONNECTED"}, False),
+        (
+            {
+                "ConnectionState": "DISCONNECTED",
+                "LastKnownUserConnectionTimestamp": datetime.datetime(
+                    2024, 8, 30, tzinfo=datetime.timezone.utc
+                ),
+            },
+            True,
+        ),
+        (
+            {
+                "ConnectionState": "DISCONNECTED",
+                "LastKnownUserConnectionTimestamp": datetime.datetime(
+                    2024, 9, 2, tzinfo=datetime.timezone.utc
+                ),
+            },
+            False,
+        ),
+        (
+            {
+                "ConnectionState": "CONNECTED",
+                "LastKnownUserConnectionTimestamp": datetime.datetime(
+                    2024, 8, 30, tzinfo=datetime.timezone.utc
+                ),
+            },
+            False,
+        ),
+    ],
+)
+def test_is_quiescent_workspace(session, ws_record, status, expected):
+    workspace_helper = workspaces_helper.WorkspacesHelper(
+        session, {"region": "us-east-1"}
+    )
+    ws_record.last_reported_metric_period = "2024-09-01T00:00:00Z"
+    if status is not None:
+        workspace_helper.connection_status[ws_record.description.workspace_id] = status
+    assert workspace_helper.is_quiescent_workspace(ws_record) == expected
+    assert not workspace_helper.is_quiescent_workspace(ws_record.description)
+
+
+def test_is_quiescent_workspace_connected_at_last_report(session, ws_record):
+    workspace_helper = workspaces_helper.WorkspacesHelper(
+        session, {"region": "us-east-1"}
+    )
+    # The session started before the last report and ended after it
+    ws_record.last_reported_metric_period = "2024-09-01T00:00:00Z"
+    ws_record.connected_at_last_report = True
+    workspace_helper.connection_status[ws_record.description.workspace_id] = {
+        "ConnectionState": "DISCONNECTED",
+        "LastKnownUserConnectionTimestamp": datetime.datetime(
+            2024, 8, 30, tzinfo=datetime.timezone.utc
+        ),
+    }
+    assert not workspace_helper.is_quiescent_workspace(ws_record)
+
+
+@pytest.mark.parametrize(
+    "status,expected",
+    [
+        (None, True),
+        ({"ConnectionState": "CONNECTED"}, True),
+        ({"ConnectionState": "DISCONNECTED"}, False),
+    ],
+)
+def test_is_connected_workspace(session, status, expected):
+    workspace_helper = workspaces_helper.WorkspacesHelper(
+        session, {"region": "us-east-1"}
+    )
+    if status is not None:
+        workspace_helper.connection_status["ws-1"] = status
+    assert workspace_helper.is_connected_workspace("ws-1") == expected
+
+
+def test_process_workspace_quiescent_skips_metrics(mocker, session, ws_record):
+    settings = {
+        "region": "us-east-1",
+        "hourlyLimits": {"test-bundle": 100},
+        "testEndOfMonth": False,
+        "isDryRun": True,
+        "dateTimeValues": {
+            "start_time_for_current_month": "2024-09-01T00:00:00Z",
+            "end_time_for_current_month": "2024-09-05T00:00:00Z",
+            "current_month_last_day": False,
+            "date_today": "09/05/24",
+        },
+    }
+    ws_record.last_reported_metric_period = "2024-09-04T00:00:00Z"
+    workspace_helper = workspaces_helper.WorkspacesHelper(session, settings)
+    workspace_helper.connection_status[ws_record.description.workspace_id] = {
+        "ConnectionState": "DISCONNECTED",
+        "LastKnownUserConnectionTimestamp": datetime.datetime(
+            2024, 9, 2, tzinfo=datetime.timezone.utc
+        ),
+    }
+    mock_get_billable_hours = mocker.patch.object(
+        workspace_helper.metrics_helper, "get_billable_hours_and_performance"
+    )
+    mocker.patch.object(workspace_helper, "is_standby_workspace", return_value=False)
+    mocker.patch.object(
+        workspace_helper, "get_list_tags_for_workspace", return_value=[]
+    )
+    mocker.patch.object(
+        workspace_helper, "get_termination_status", return_value=("", None)
+    )
+    result = workspace_helper.process_workspace(ws_record, 60, DashboardMetrics())
+    mock_get_billable_hours.assert_not_called()
+    assert result.billing_data.billable_hours == ws_record.billing_data.billable_hours
+    assert result.performance_metrics == ws_record.performance_metrics
+    assert result.last_reported_metric_period == "2024-09-05T00:00:00Z"
+
+
+def test_process_workspace_quiescent_at_end_of_month_keeps_hours(
+    mocker, session, ws_record
+):
+    settings = {
+        "region": "us-east-1",
+        "hourlyLimits": {"test-bundle": 100},
+        "testEndOfMonth": True,
+        "isDryRun": True,
+        "dateTimeValues": {
+            "start_time_for_current_month": "2024-09-01T00:00:00Z",
+            "end_time_for_current_month": "2024-09-30T00:00:00Z",
+            "current_month_last_day": True,
+            "date_today": "09/30/24",
+        },
+        "directoryInfo": {
+            "WorkspaceCreationProperties": {"EnableMaintenanceMode": True}
+        },
+    }
+    ws_record.description = ws_description(initial_mode="AUTO_STOP")
+    ws_record.last_reported_metric_period = "2024-09-04T00:00:00Z"
+    workspace_helper = workspaces_helper.WorkspacesHelper(session, settings)
+    workspace_helper.connection_status[ws_record.description.workspace_id] = {
+        "ConnectionState": "DISCONNECTED",
+        "LastKnownUserConnectionTimestamp": datetime.datetime(
+            2024, 9, 2, tzinfo=datetime.timezone.utc
+        ),
+    }
+    mock_get_billable_hours = mocker.patch.object(
+        workspace_helper.metrics_helper, "get_billable_hours_and_performance"
+    )
+    mocker.patch.object(workspace_helper, "is_standby_workspace", return_value=False)
+    mocker.patch.object(
+        workspace_helper, "get_list_tags_for_workspace", return_value=[]
+    )
+    mock_get_termination_status = mocker.patch.object(
+        workspace_helper, "get_termination_status", return_value=("", None)
+    )
+
+    first_result = workspace_helper.process_workspace(ws_record, 60, DashboardMetrics())
+    first_result.last_reported_metric_period = "2024-09-04T00:00:00Z"
+    second_result = workspace_helper.process_workspace(
+        first_result, 60, DashboardMetrics()
+    )
+
+    mock_get_billable_hours.assert_not_called()
+    assert first_result.billing_data.billable_hours == 21
+    assert second_result.billing_data.billable_hours == 21
+    assert second_result.billing_data.raw_billable_hours == 20
+    assert [call.args[1] for call in mock_get_termination_status.call_args_list] == [
+        20,
+        20,
+    ]
+
+
+def test_process_workspace_with_calculated_metrics(mocker, session, ws_record):
+    settings = {
+        "region": "us-east-1",
+        "hourlyLimits": {"test-bundle": 100},
+        "testEndOfMonth": False,
+        "isDryRun": True,
+        "dateTimeValues": {
+            "start_time_for_current_month": "2024-09-01T00:00:00Z",
+            "end_time_for_current_month": "2024-09-05T00:00:00Z",
+            "current_month_last_day": False,
+            "date_today": "09/05/24",
+        },
+    }
+    ws_record.last_reported_metric_period = "2024-09-04T00:00:00Z"
+    workspace_helper = workspaces_helper.WorkspacesHelper(session, settings)
+    mock_get_billable_hours = mocker.patch.object(
+        workspace_helper.metrics_helper, "get_billable_hours_and_performance"
+    )
+    mocker.patch.object(workspace_helper, "is_standby_workspace", return_value=False)
+    mocker.patch.object(
+        workspace_helper, "get_list_tags_for_workspace", return_value=[]
+    )
+    mocker.patch.object(
+        workspace_helper, "get_termination_status", return_value=("", None)
+    )
+    result = workspace_helper.process_workspace(
+        ws_record,
+        60,
+        DashboardMetrics(),
+        calculated_metrics={
+            "billable_hours": 42,
+            "performance_metrics": ws_record.performance_metrics,
+        },
+    )
+    mock_get_billable_hours.assert_not_called()
+    assert result.billing_data.billable_hours == 42
+
+
+def test_update_dashboard_metrics_for_report_only_workspace():
+    dashboard_metrics = DashboardMetrics()
+
+    workspaces_helper.WorkspacesHelper.update_dashboard_metrics(
+        dashboard_metrics, None, "AUTO_STOP", ""
+    )
+
+    assert dashboard_metrics.conversion_metrics.conversion_skips == 0
+    assert dashboard_metrics.billing_metrics.hourly_billed == 1
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+# AWS Libraries
+import botocore
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .account_registry import AccountInfo
+from .credential_manager import CredentialManager, get_credential_manager
+from .utils import client_factory
+
+logger = Logger(service="account_preflight")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+# The probe fails fast instead of going through the 20 retries used for processing
+preflight_config = botocore.config.Config(
+    connect_timeout=5,
+    read_timeout=10,
+    retries={"max_attempts": 2, "mode": "standard"},
+    user_agent_extra=os.getenv("UserAgentString"),
+)
+
+# The errors of the probe which mean the account cannot be processed in any region
+UNREACHABLE_ERROR_CODES = {
+    "AccessDenied",
+    "AccessDeniedException",
+    "UnauthorizedOperation",
+}
+
+
+class AccountUnreachableError(Exception):
+    """Raised when the role of an account cannot be assumed or WorkSpaces is denied to it."""
+
+
+def probe_account(
+    credential_manager: CredentialManager, account: AccountInfo, region: str
+) -> None:
+    """
+    This method checks that the role of the account can be assumed and that WorkSpaces can
+    be called with it. It raises AccountUnreachableError when the role cannot be assumed
+    or the call is denied, and the error of the call otherwise, e.g. when throttled.
+    :param credential_manager: the credential manager caching the spoke sessions
+    :param account: the spoke account
+    :param region: the region to call WorkSpaces in
+    """
+    try:
+        session = credential_manager.get_session(account)
+    except botocore.exceptions.ClientError as e:
+        raise AccountUnreachableError(f"Unable to assume the role: {e}") from e
+    workspaces_client = client_factory.get_client(
+        session, "workspaces", region, preflight_config
+    )
+    try:
+        workspaces_client.describe_workspace_directories(Limit=1)
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in UNREACHABLE_ERROR_CODES:
+            raise AccountUnreachableError(str(e)) from e
+        raise
+
+
+def preflight_accounts(
+    accounts: list[Union[AccountInfo, str]],
+    current_account: str,
+    region: str,
+    max_workers: Union[int, None] = None,
+) -> tuple[list[Union[AccountInfo, str]], dict[AccountInfo, str]]:
+    """
+    This method probes the spoke accounts in parallel, so accounts whose role was deleted
+    or which are denied by an SCP are found before processing instead of after the retries
+    of every region. The current account is always kept, as are the accounts whose probe
+    failed with any other error, e.g. a throttled or timed out call.
+    :param accounts: the current account followed by the spoke accounts
+    :param current_account: the id of the account the ECS task runs in
+    :param region: the region to probe WorkSpaces in
+    :param max_workers: the number of accounts to probe in parallel
+    :return: the reachable accounts in their original order and the error of each
+        unreachable account
+    """
+    spoke_accounts = [account for account in accounts if account != current_account]
+    if not spoke_accounts:
+        return list(accounts), {}
+    max_workers = max_workers or int(os.getenv("MaxConcurrentAssumeRole", "16"))
+    credential_manager = get_credential_manager()
+    logger.info(f"Probing {len(spoke_accounts)} spoke accounts in {region}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            account: executor.submit(probe_account, credential_manager, account, region)
+            for account in spoke_accounts
+        }
+    unreachable_accounts = {}
+    for account, future in futures.items():
+        try:
+            future.result()
+        except AccountUnreachableError as e:
+            unreachable_accounts[account] = str(e)
+        except Exception as e:
+            logger.warning(
+                f"Keeping account {account.account_id}, its probe in {region} failed: {e}"
+            )
+    if unreachable_accounts:
+        logger.error(
+            f"Excluding {len(unreachable_accounts)} unreachable accounts from processing"
+        )
+        for account, error in unreachable_accounts.items():
+            logger.error(
+                f"Account {account.account_id} is unreachable with role "
+                f"{account.role_name}: {error}"
+            )
+    reachable_accounts = [
+        account for account in accounts if account not in unreachable_accounts
+    ]
+    return reachable_accounts, unreachable_accounts
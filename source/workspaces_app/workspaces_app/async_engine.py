@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import asyncio
+import json
+import os
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+# AWS Libraries
+import boto3
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .pipeline import (
+    ACT_STAGE,
+    COMPUTE_STAGE,
+    METRICS_STAGE,
+    PERSIST_STAGE,
+    PREFETCH_STAGE,
+    PipelineDirectoryReader,
+    WorkspaceTask,
+)
+from .scheduler import get_priority, get_run_scheduler, is_end_of_month
+from .utils import client_factory, workspace_utils
+from .utils.dashboard_metrics import DashboardMetrics
+from .utils.s3_utils import upload_report
+from .workspace_record import WorkspaceRecord
+from .workspaces_helper import WorkspacesHelper
+
+logger = Logger(service="async_engine")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+# Calls in flight per API. Each step of the analysis of a workspace holds the semaphore
+# of the API it calls: WorkSpaces for the tags and the mode changes, CloudWatch for the
+# metrics and DynamoDB for the records and the user sessions.
+DEFAULT_API_CONCURRENCY = {
+    "workspaces": 8,
+    "cloudwatch": 16,
+    "dynamodb": 32,
+    "s3": 8,
+}
+
+
+def get_api_concurrency() -> dict[str, int]:
+    """
+    This method returns the concurrency of each API. AsyncApiConcurrency overrides the
+    defaults with a JSON object, e.g. {"cloudwatch": 32}.
+    """
+    api_concurrency = dict(DEFAULT_API_CONCURRENCY)
+    overrides = os.getenv("AsyncApiConcurrency")
+    if overrides:
+        try:
+            api_concurrency.update(
+                {
+                    api: max(1, int(limit))
+                    for api, limit in json.loads(overrides).items()
+                }
+            )
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid value for AsyncApiConcurrency: {overrides}: {e}")
+    return api_concurrency
+
+
+class AsyncEngine:
+    """
+    Runs the blocking boto3 calls of the pipeline from asyncio, with a semaphore per API so
+    each service gets its own concurrency regardless of the number of tasks.
+    """
+
+    def __init__(
+        self, api_concurrency: typing.Union[dict[str, int], None] = None
+    ) -> None:
+        self._api_concurrency = api_concurrency or get_api_concurrency()
+        self._semaphores = {
+            api: asyncio.Semaphore(limit)
+            for api, limit in self._api_concurrency.items()
+        }
+
+    @property
+    def max_threads(self) -> int:
+        return sum(self._api_concurrency.values())
+
+    async def call(self, api: str, function: typing.Callable, *args, **kwargs):
+        async with self._semaphores[api]:
+            return await asyncio.to_thread(function, *args, **kwargs)
+
+
+class AsyncDirectoryReader(PipelineDirectoryReader):
+    """
+    Processes the workspaces of a directory concurrently. A workspace goes through the
+    steps of the pipeline, each step holding the semaphore of the API it calls, so a slow
+    API does not hold up the calls of the others.
+    """
+
+    def __init__(
+        self,
+        session: boto3.session.Session,
+        region: str,
+        engine: typing.Union[AsyncEngine, None] = None,
+    ) -> None:
+        super().__init__(session, region)
+        self._engine = engine
+
+    def process_directory(
+        self,
+        stack_parameters: dict,
+        directory_parameters: dict,
+        dashboard_metrics: DashboardMetrics,
+        workspaces: typing.Union[typing.List[dict], None] = None,
+        upload: bool = True,
+    ) -> typing.Tuple[int, typing.List[dict], str]:
+        """
+        This method processes the directory in an event loop of the calling thread, so the
+        directories go through process_directories as with the other engines
+        """
+        return asyncio.run(
+            self._run_directory(
+                stack_parameters,
+                directory_parameters,
+                dashboard_metrics,
+                workspaces,
+                upload,
+            )
+        )
+
+    async def _run_directory(
+        self,
+        stack_parameters: dict,
+        directory_parameters: dict,
+        dashboard_metrics: DashboardMetrics,
+        workspaces: typing.Union[typing.List[dict], None],
+        upload: bool,
+    ) -> typing.Tuple[int, typing.List[dict], str]:
+        # The semaphores of the engine belong to the event loop of the directory
+        if self._engine is None:
+            self._engine = AsyncEngine()
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self._engine.max_threads)
+        )
+        return await self.process_directory_async(
+            stack_parameters,
+            directory_parameters,
+            dashboard_metrics,
+            workspaces,
+            upload,
+        )
+
+    async def process_directory_async(
+        self,
+        stack_parameters: dict,
+        directory_parameters: dict,
+        dashboard_metrics: DashboardMetrics,
+        workspaces: typing.Union[typing.List[dict], None] = None,
+        upload: bool = True,
+    ) -> typing.Tuple[int, typing.List[dict], str]:
+        """
+        :param stack_parameters: Dictionary containing parameters used in the stack.
+        :param directory_parameters: Dictionary containing the directory to process.
+        :param dashboard_metrics: the metrics the results are added to, only updated from
+            the event loop
+        :param workspaces: the workspaces to process, all the workspaces of the directory
+            are listed when not given
+        :param upload: upload the directory report
+        :return: the number of workspaces, the workspaces processed and the report rows
+        """
+        resume_mode = self.get_resume_mode()
+        directory_id = directory_parameters.get("DirectoryId")
+        date_time_values = directory_parameters.get("DateTimeValues")
+        end_of_month = is_end_of_month(stack_parameters, date_time_values)
+        workspaces_helper = self.get_workspaces_helper(
+            stack_parameters, directory_parameters
+        )
+        await asyncio.to_thread(self.get_account)
+        if workspaces is not None:
+            list_workspaces = workspaces
+        else:
+            list_workspaces = await self._engine.call(
+                "workspaces",
+                workspaces_helper.get_workspaces_for_directory,
+                directory_id,
+            )
+        await self._engine.call(
+            "workspaces",
+            workspaces_helper.prefetch_connection_status,
+            [
+                workspace.get("WorkspaceId")
+                for workspace in list_workspaces
+                if workspace_utils.is_actionable_workspace(workspace)
+            ],
+        )
+        ws_records = await asyncio.gather(
+            *(
+                self._engine.call(
+                    "dynamodb",
+                    self.get_workspace_record,
+                    workspace,
+                    directory_id,
+                    workspaces_helper,
+                )
+                for workspace in list_workspaces
+            ),
+            return_exceptions=True,
+        )
+        loaded_workspaces = []
+        for workspace, ws_record in zip(list_workspaces, ws_records):
+            if isinstance(ws_record, Exception):
+                logger.error(
+                    f"Error processing the workspace {workspace.get('WorkspaceId')}: {ws_record}"
+                )
+            else:
+                loaded_workspaces.append((workspace, ws_record))
+
+        # Tasks acquire the semaphores in the order they are created, i.e. by priority
+        run_scheduler = get_run_scheduler()
+        scheduled_workspaces = run_scheduler.schedule(
+            loaded_workspaces,
+            lambda loaded_workspace: get_priority(loaded_workspace[1], end_of_month),
+        )
+        results = await asyncio.gather(
+            *(
+                self._process_workspace_async(
+                    priority,
+                    workspace,
+                    ws_record,
+                    resume_mode,
+                    date_time_values,
+                    workspaces_helper,
+                )
+                for priority, (workspace, ws_record) in scheduled_workspaces
+            )
+        )
+
+        workspace_count = len(scheduled_workspaces)
+        list_processed_workspaces = []
+        directory_csv = ""
+        for result in results:
+            if result is None:
+                continue
+            new_ws_record, workspace_metrics = result
+            dashboard_metrics.merge(workspace_metrics)
+            directory_csv += new_ws_record.to_csv()
+            list_processed_workspaces.append(
+                self.get_workspace_processed(new_ws_record)
+            )
+        if upload and workspace_count:
+            # Upload with default session, rather than delegated
+            await self._engine.call(
+                "s3",
+                upload_report,
+                client_factory.get_default_session(),
+                date_time_values,
+                stack_parameters,
+                WorkspaceRecord.csv_header() + directory_csv,
+                directory_id,
+                self.region,
+                self.get_account(),
+            )
+        return workspace_count, list_processed_workspaces, directory_csv
+
+    async def _process_workspace_async(
+        self,
+        priority: int,
+        workspace: dict,
+        ws_record,
+        resume_mode: bool,
+        date_time_values: dict[str, any],
+        workspaces_helper: WorkspacesHelper,
+    ) -> typing.Union[typing.Tuple[WorkspaceRecord, DashboardMetrics], None]:
+        # Every workspace has its own metrics, the steps run in threads
+        task = WorkspaceTask(
+            workspace=workspace, ws_record=ws_record, priority=priority
+        )
+        steps = [
+            (
+                PREFETCH_STAGE,
+                "workspaces",
+                self.prefetch,
+                (task, resume_mode, date_time_values, workspaces_helper),
+            ),
+            (
+                METRICS_STAGE,
+                "cloudwatch",
+                self.fetch_metrics,
+                (task, date_time_values, workspaces_helper),
+            ),
+            (COMPUTE_STAGE, None, self.compute, (task, workspaces_helper)),
+            (ACT_STAGE, "workspaces", self.act, (task, workspaces_helper)),
+            (PERSIST_STAGE, "dynamodb", self.persist, (task, workspaces_helper)),
+        ]
+        for stage, api, step, args in steps:
+            try:
+                if api is None:
+                    # No calls are made, the step only needs a thread
+                    await asyncio.to_thread(step, *args)
+                else:
+                    await self._engine.call(api, step, *args)
+            except Exception as e:
+                self._on_process_error(task, stage, e)
+                return None
+        return task.new_ws_record, task.dashboard_metrics
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Union
+
+# AWS Libraries
+import boto3
+import botocore
+import botocore.credentials
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .account_registry import AccountInfo
+from .utils import client_factory
+
+logger = Logger(service="credential_manager")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+sts_config = botocore.config.Config(
+    max_pool_connections=50,
+    retries={"max_attempts": 20, "mode": "standard"},
+    user_agent_extra=os.getenv("UserAgentString"),
+)
+
+# Credentials are refreshed in the background once they expire within this window. It is
+# longer than the 15 minute advisory refresh of botocore, so sessions always find fresh
+# credentials in the cache when they refresh.
+REFRESH_AHEAD_SECONDS = 20 * 60
+REFRESH_INTERVAL_SECONDS = 60
+
+
+class CredentialManager:
+    """
+    Assumes the spoke account roles and caches the credentials and sessions per account.
+    Roles are assumed concurrently at startup with a single regional STS client, and a
+    background thread refreshes credentials before they expire.
+    """
+
+    def __init__(self, sts_client=None, max_workers: Union[int, None] = None) -> None:
+        self._sts_client = sts_client
+        self._max_workers = max_workers or int(
+            os.getenv("MaxConcurrentAssumeRole", "16")
+        )
+        self._lock = threading.RLock()
+        self._account_locks: dict[AccountInfo, threading.Lock] = {}
+        self._credentials: dict[AccountInfo, dict[str, str]] = {}
+        self._sessions: dict[AccountInfo, boto3.session.Session] = {}
+        self._stop_refresh = threading.Event()
+        self._refresh_thread: Union[threading.Thread, None] = None
+
+    def get_sts_client(self):
+        with self._lock:
+            return self._get_sts_client()
+
+    def _get_sts_client(self):
+        if self._sts_client is None:
+            # Use the STS endpoint of the region of the task instead of the global endpoint
+            session = client_factory.new_session()
+            session._session.set_config_variable("sts_regional_endpoints", "regional")
+            region = (
+                os.getenv("AWS_REGION")
+                or client_factory.get_default_session().region_name
+            )
+            self._sts_client = client_factory.get_client(
+                session, "sts", region, sts_config
+            )
+        return self._sts_client
+
+    def prefetch(self, accounts: list[AccountInfo]) -> None:
+        """
+        This method assumes the roles of the accounts concurrently. Accounts which fail
+        are logged and assumed again when their session is requested.
+        :param accounts: the spoke accounts
+        """
+        if not accounts:
+            return
+        logger.info(f"Assuming roles for {len(accounts)} accounts")
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {
+                account: executor.submit(self.refresh_credentials, account)
+                for account in accounts
+            }
+        for account, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.exception(f"Error assuming role for account {account}: {str(e)}")
+
+    def get_session(self, account: AccountInfo) -> boto3.session.Session:
+        """
+        This method returns the session for a spoke account. The session is created once
+        per account, so clients are shared by everything processing the account.
+        :param account: the spoke account
+        :return: a boto3 session with refreshable credentials of the spoke role
+        """
+        with self._lock:
+            session = self._sessions.get(account)
+        if session is not None:
+            return session
+        # Assume the role outside of the lock so other accounts are not blocked on STS
+        metadata = self.get_credentials(account)
+        with self._lock:
+            session = self._sessions.get(account)
+            if session is None:
+                refreshable_credentials = (
+                    botocore.credentials.RefreshableCredentials.create_from_metadata(
+                        metadata=metadata,
+                        refresh_using=partial(self.get_credentials, account),
+                        method="sts-assume-role",
+                    )
+                )
+                botocore_session = botocore.session.get_session()
+                botocore_session._credentials = refreshable_credentials
+                session = client_factory.new_session(botocore_session)
+                self._sessions[account] = session
+                client_factory.get_circuit_breakers().set_account_id(
+                    refreshable_credentials, account.account_id
+                )
+            return session
+
+    def get_credentials(self, account: AccountInfo) -> dict[str, str]:
+        """
+        This method returns the cached credentials of the account, and only calls STS
+        when the cached credentials are about to expire, e.g. when the background refresh
+        failed or is not running.
+        :param account: the spoke account
+        :return: the credentials metadata used by RefreshableCredentials
+        """
+        credentials = self._credentials.get(account)
+        if credentials is None or is_expiring(credentials, REFRESH_AHEAD_SECONDS):
+            credentials = self.refresh_credentials(account)
+        return credentials
+
+    def refresh_credentials(self, account: AccountInfo) -> dict[str, str]:
+        with self._get_account_lock(account):
+            credentials = self._credentials.get(account)
+            # Another thread may have refreshed the credentials while we waited for the lock
+            if credentials is not None and not is_expiring(
+                credentials, REFRESH_AHEAD_SECONDS
+            ):
+                return credentials
+            response = self.get_sts_client().assume_role(
+                RoleArn=account.role_name, RoleSessionName="SessionName"
+            )
+            credentials = response.get("Credentials")
+            credentials = {
+                "access_key": credentials.get("AccessKeyId"),
+                "secret_key": credentials.get("SecretAccessKey"),
+                "token": credentials.get("SessionToken"),
+                "expiry_time": credentials.get("Expiration").isoformat(),
+            }
+            self._credentials[account] = credentials
+            return credentials
+
+    def refresh_expiring(self) -> None:
+        """This method refreshes the credentials expiring within the refresh ahead window."""
+        for account, credentials in list(self._credentials.items()):
+            if is_expiring(credentials, REFRESH_AHEAD_SECONDS):
+                try:
+                    self.refresh_credentials(account)
+                except Exception as e:
+                    logger.exception(
+                        f"Error refreshing credentials for account {account}: {str(e)}"
+                    )
+
+    def start_refresh(self) -> None:
+        with self._lock:
+            if self._refresh_thread is None:
+                self._stop_refresh.clear()
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh_loop, name="credential-refresh", daemon=True
+                )
+                self._refresh_thread.start()
+
+    def stop_refresh(self) -> None:
+        with self._lock:
+            refresh_thread, self._refresh_thread = self._refresh_thread, None
+        if refresh_thread is not None:
+            self._stop_refresh.set()
+            refresh_thread.join()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_refresh.wait(REFRESH_INTERVAL_SECONDS):
+            self.refresh_expiring()
+
+    def _get_account_lock(self, account: AccountInfo) -> threading.Lock:
+        with self._lock:
+            return self._account_locks.setdefault(account, threading.Lock())
+
+
+def is_expiring(credentials: dict[str, str], seconds: int) -> bool:
+    expiry_time = datetime.datetime.fromisoformat(credentials.get("expiry_time"))
+    return expiry_time - datetime.datetime.now(
+        datetime.timezone.utc
+    ) <= datetime.timedelta(seconds=seconds)
+
+
+_credential_manager: Union[CredentialManager, None] = None
+_credential_manager_lock = threading.Lock()
+
+
+def get_credential_manager() -> CredentialManager:
+    global _credential_manager
+    with _credential_manager_lock:
+        if _credential_manager is None:
+            _credential_manager = CredentialManager()
+        return _credential_manager
+
+
+def clear() -> None:
+    """This method stops the background refresh and drops the cached credentials."""
+    global _credential_manager
+    with _credential_manager_lock:
+        credential_manager, _credential_manager = _credential_manager, None
+    if credential_manager is not None:
+        credential_manager.stop_refresh()
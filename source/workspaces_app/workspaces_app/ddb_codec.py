@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import typing
+from decimal import Decimal
+from functools import lru_cache
+
+# AWS Libraries
+from boto3.dynamodb.types import DYNAMODB_CONTEXT, TypeDeserializer, TypeSerializer
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _encode_decimal(value: Decimal) -> dict[str, str]:
+    # The context raises on the values DynamoDB rejects, as TypeSerializer does
+    number = str(DYNAMODB_CONTEXT.create_decimal(value))
+    if number in ("Infinity", "NaN"):
+        raise TypeError("Infinity and NaN not supported")
+    return {"N": number}
+
+
+# Encoders of the scalar types of the records, the other types go through TypeSerializer
+_ENCODERS: dict[type, typing.Callable[[any], dict[str, any]]] = {
+    str: lambda value: {"S": value},
+    int: lambda value: {"N": str(value)},
+    bool: lambda value: {"BOOL": value},
+    Decimal: _encode_decimal,
+    type(None): lambda value: {"NULL": True},
+}
+
+_DECODERS: dict[str, typing.Callable[[any], any]] = {
+    "S": lambda value: value,
+    "N": DYNAMODB_CONTEXT.create_decimal,
+    "BOOL": lambda value: value,
+    "NULL": lambda value: None,
+}
+
+
+def encode_value(value: any) -> dict[str, any]:
+    """This method serializes a value as a DynamoDB attribute value."""
+    encoder = _ENCODERS.get(type(value))
+    return encoder(value) if encoder else _serializer.serialize(value)
+
+
+def decode_value(attr_value: dict[str, any]) -> any:
+    """This method deserializes a DynamoDB attribute value."""
+    if len(attr_value) == 1:
+        ((dynamodb_type, value),) = attr_value.items()
+        decoder = _DECODERS.get(dynamodb_type)
+        if decoder:
+            return decoder(value)
+    return _deserializer.deserialize(attr_value)
+
+
+class DdbCodec:
+    """
+    Converts records to and from DynamoDB items. The attribute names and the getters of
+    the fields are computed once per record class instead of once per field of every record.
+    """
+
+    def __init__(
+        self,
+        fields: list[tuple[str, typing.Callable[[any], any]]],
+        class_field_to_ddb_attr: typing.Callable[[str], str],
+        ddb_attr_to_class_field: typing.Callable[[str], str],
+    ) -> None:
+        """
+        :param fields: the name of each field with the function returning its value
+        :param class_field_to_ddb_attr: the function naming the attribute of a field
+        :param ddb_attr_to_class_field: the function naming the field of an attribute
+        not in fields, e.g. of items written by an older version
+        """
+        self._getters = [
+            (class_field_to_ddb_attr(name), getter) for name, getter in fields
+        ]
+        self._class_fields = {class_field_to_ddb_attr(name): name for name, _ in fields}
+        self._ddb_attr_to_class_field = lru_cache(maxsize=None)(ddb_attr_to_class_field)
+
+    def encode(self, record: any) -> dict[str, any]:
+        """
+        :param record: the record to serialize
+        :return: the DynamoDB item of the record
+        """
+        return {attr: encode_value(getter(record)) for attr, getter in self._getters}
+
+    def decode(self, ddb_item: dict[str, any]) -> dict[str, any]:
+        """
+        :param ddb_item: a serialized DynamoDB item
+        :return: the values of the item keyed by the names of the class fields
+        """
+        class_fields = self._class_fields
+        return {
+            (
+                class_fields.get(attr) or self._ddb_attr_to_class_field(attr)
+            ): decode_value(attr_value)
+            for attr, attr_value in ddb_item.items()
+        }
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import json
+import os
+import threading
+import time
+from typing import Union
+
+# AWS Libraries
+import botocore
+from aws_lambda_powertools import Logger
+from boto3.session import Session
+from botocore.exceptions import ClientError
+
+# Cost Optimizer for Amazon Workspaces
+from .utils import client_factory
+
+logger = Logger(service="directory_inventory")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+boto_config = botocore.config.Config(
+    retries={"max_attempts": 20, "mode": "standard"},
+    user_agent_extra=os.getenv("UserAgentString"),
+)
+
+INVENTORY_KEY = "directory_inventory/inventory.json"
+
+
+class DirectoryInventory:
+    """
+    Number of directories found in each account and region by previous runs, stored as
+    a JSON object in the reporting bucket. Regions which had no directories within the
+    TTL are not listed again.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        bucket_name: str,
+        ttl_seconds: int,
+        key: str = INVENTORY_KEY,
+    ) -> None:
+        self._s3_client = client_factory.get_client(session, "s3", config=boto_config)
+        self._bucket_name = bucket_name
+        self._ttl_seconds = ttl_seconds
+        self._key = key
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Union[int, float]]] = {}
+
+    @staticmethod
+    def _entry_key(account_id: str, region: str) -> str:
+        return f"{account_id}/{region}"
+
+    def load(self) -> None:
+        try:
+            response = self._s3_client.get_object(
+                Bucket=self._bucket_name, Key=self._key
+            )
+            entries = json.loads(response["Body"].read())
+        except ClientError as exception:
+            if exception.response.get("Error", {}).get("Code") not in (
+                "NoSuchKey",
+                "404",
+            ):
+                logger.exception(f"Error loading the directory inventory: {exception}")
+            entries = {}
+        with self._lock:
+            self._entries = entries
+
+    def is_known_empty(self, account_id: str, region: str) -> bool:
+        """
+        This method returns True when the region had no directories when it was last listed
+        and that is more recent than the TTL.
+        """
+        with self._lock:
+            entry = self._entries.get(self._entry_key(account_id, region))
+        if entry is None or entry.get("directory_count"):
+            return False
+        return time.time() - entry.get("checked_at", 0) < self._ttl_seconds
+
+    def record(self, account_id: str, region: str, directory_count: int) -> None:
+        with self._lock:
+            self._entries[self._entry_key(account_id, region)] = {
+                "directory_count": directory_count,
+                "checked_at": time.time(),
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            body = json.dumps(self._entries, sort_keys=True)
+        try:
+            self._s3_client.put_object(
+                Bucket=self._bucket_name, Key=self._key, Body=body
+            )
+        except ClientError as exception:
+            logger.exception(f"Error saving the directory inventory: {exception}")
+
+
+def get_directory_inventory(session: Session) -> Union[DirectoryInventory, None]:
+    """
+    This method returns the directory inventory when DirectoryInventoryTTLHours is set,
+    otherwise every region is listed on every run.
+    """
+    ttl_hours = float(os.getenv("DirectoryInventoryTTLHours", "0") or 0)
+    bucket_name = os.getenv("BucketName")
+    if ttl_hours <= 0 or not bucket_name:
+        return None
+    directory_inventory = DirectoryInventory(
+        session, bucket_name, int(ttl_hours * 3600)
+    )
+    directory_inventory.load()
+    return directory_inventory
@@ -8,16 +8,25 @@ import datetime
 import os
 import time
 import typing
+from contextlib import nullcontext
 
 # AWS Libraries
 import boto3
 from aws_lambda_powertools import Logger
 
 # Cost Optimizer for Amazon Workspaces
+from .utils import client_factory, workspace_utils
+from .utils.adaptive_concurrency import is_adaptive_concurrency_enabled
 from .utils.dashboard_metrics import DashboardMetrics
 from .utils.s3_utils import upload_report
 from .utils.usage_table_dao import UsageTableDAO
-from .workspace_record import WorkspaceDescription, WorkspaceRecord
+from .scheduler import get_priority, get_run_scheduler, is_end_of_month
+from .workspace_record import (
+    WorkspaceBillingData,
+    WorkspaceDescription,
+    WorkspacePerformanceMetrics,
+    WorkspaceRecord,
+)
 from .workspaces_helper import WorkspacesHelper
 
 # Initialize logger
@@ -30,8 +39,9 @@ class DirectoryReader:
     def __init__(self, session: boto3.session.Session, region: str) -> None:
         self._session = session
         self.region = region
+        self._account = None
         self.usage_table_dao = UsageTableDAO(
-            boto3.session.Session(), os.environ.get("UsageTable"), region
+            client_factory.get_default_session(), os.environ.get("UsageTable"), region
         )  # provide default session so as not to use assumed role session
 
     def process_directory(
@@ -39,18 +49,116 @@ class DirectoryReader:
         stack_parameters: dict,
         directory_parameters: dict,
         dashboard_metrics: DashboardMetrics,
+        workspaces: typing.Union[typing.List[dict], None] = None,
+        upload: bool = True,
     ) -> typing.Tuple[int, typing.List[dict], str]:
+        """
+        :param stack_parameters: Dictionary containing parameters used in the stack.
+        :param directory_parameters: Dictionary containing the directory to process.
+        :param dashboard_metrics: the metrics the results are added to
+        :param workspaces: the workspaces to process, e.g. a chunk of a large directory. All the
+            workspaces of the directory are listed when not given.
+        :param upload: upload the directory report, the caller uploads the report of a
+            directory processed in chunks
+        :return: the number of workspaces, the workspaces processed and the report rows
+        """
         workspace_count = 0
         list_processed_workspaces = []
         directory_csv = ""
-        is_dry_run = self.get_dry_run(stack_parameters)
-        test_end_of_month = self.get_end_of_month(stack_parameters)
+        resume_mode = self.get_resume_mode()
         directory_id = directory_parameters.get("DirectoryId")
-        directory_info = directory_parameters.get("Directory", {})
+        date_time_values = directory_parameters.get("DateTimeValues")
+        end_of_month = is_end_of_month(stack_parameters, date_time_values)
         report_csv = WorkspaceRecord.csv_header()
 
+        workspaces_helper = self.get_workspaces_helper(
+            stack_parameters, directory_parameters
+        )
+        if workspaces is not None:
+            list_workspaces = workspaces
+        else:
+            list_workspaces = workspaces_helper.get_workspaces_for_directory(
+                directory_id
+            )
+        workspaces_helper.prefetch_connection_status(
+            [
+                workspace.get("WorkspaceId")
+                for workspace in list_workspaces
+                if workspace_utils.is_actionable_workspace(workspace)
+            ]
+        )
+        run_scheduler = get_run_scheduler()
+        loaded_workspaces = []
+        for workspace in list_workspaces:
+            try:
+                loaded_workspaces.append(
+                    (
+                        workspace,
+                        self.get_workspace_record(
+                            workspace, directory_id, workspaces_helper
+                        ),
+                    )
+                )
+            except Exception as e:
+                logger.exception(
+                    f"Error processing the workspace {workspace.get('WorkspaceId')}: {e}"
+                )
+        scheduled_workspaces = run_scheduler.schedule(
+            loaded_workspaces,
+            lambda loaded_workspace: get_priority(loaded_workspace[1], end_of_month),
+        )
+        for priority, (workspace, ws_record) in scheduled_workspaces:
+            is_deferred = False
+            try:
+                logger.debug("Processing workspace {}".format(workspace))
+                workspace_count = workspace_count + 1
+                is_deferred = self.is_deferred(
+                    workspace, ws_record, priority, resume_mode, date_time_values
+                )
+                with self.get_concurrency_slot():
+                    new_ws_record, is_changed = self.analyze_workspace(
+                        workspace,
+                        ws_record,
+                        is_deferred,
+                        resume_mode,
+                        date_time_values,
+                        workspaces_helper,
+                        dashboard_metrics,
+                    )
+                    report_csv += new_ws_record.to_csv()
+                    directory_csv += new_ws_record.to_csv()
+                    list_processed_workspaces.append(
+                        self.get_workspace_processed(new_ws_record)
+                    )
+                    if is_changed:
+                        self.usage_table_dao.update_ddb_item(new_ws_record)
+            except Exception as e:
+                logger.exception(
+                    f"Error processing the workspace {workspace.get('WorkspaceId')}: {e}"
+                )
+            finally:
+                if is_deferred:
+                    run_scheduler.defer(priority, workspace.get("WorkspaceId"))
+                else:
+                    run_scheduler.complete(priority)
+            if upload:
+                # Upload with default session, rather than delegated
+                upload_report(
+                    client_factory.get_default_session(),
+                    date_time_values,
+                    stack_parameters,
+                    report_csv,
+                    directory_id,
+                    self.region,
+                    self.get_account(),
+                )
+        return workspace_count, list_processed_workspaces, directory_csv
+
+    def get_workspaces_helper(
+        self, stack_parameters: dict, directory_parameters: dict
+    ) -> WorkspacesHelper:
         # List of bundles with specific hourly limits
-        workspaces_helper = WorkspacesHelper(
+        return WorkspacesHelper(
             self._session,
             {
                 "region": self.region,
@@ -65,86 +173,172 @@ class DirectoryReader:
                     "GRAPHICS_G4DN": stack_parameters.get("GraphicsG4dnLimit"),
                     "GRAPHICSPRO_G4DN": stack_parameters.get("GraphicsProG4dnLimit"),
                 },
-                "testEndOfMonth": test_end_of_month,
-                "isDryRun": is_dry_run,
+                "testEndOfMonth": self.get_end_of_month(stack_parameters),
+                "isDryRun": self.get_dry_run(stack_parameters),
                 "dateTimeValues": directory_parameters.get("DateTimeValues"),
                 "terminateUnusedWorkspaces": stack_parameters.get(
                     "TerminateUnusedWorkspaces"
                 ),
-                "directoryInfo": directory_info,
+                "directoryInfo": directory_parameters.get("Directory", {}),
             },
         )
-        list_workspaces = workspaces_helper.get_workspaces_for_directory(directory_id)
-        for workspace in list_workspaces:
-            try:
-                logger.debug("Processing workspace {}".format(workspace))
-                bundle_type = workspace.get("WorkspaceProperties").get(
-                    "ComputeTypeName"
-                )
-                usage_threshold = (
-                    workspaces_helper.get_hourly_threshold_for_bundle_type(bundle_type)
-                )
-                account = self.get_account()
-                workspace_count = workspace_count + 1
-                ws_description = WorkspaceDescription(
-                    account=account,
-                    region=self.region,
-                    directory_id=directory_id,
-                    workspace_id=workspace.get("WorkspaceId"),
-                    initial_mode=workspace.get("WorkspaceProperties").get(
-                        "RunningMode"
-                    ),
-                    usage_threshold=usage_threshold,
-                    bundle_type=bundle_type,
-                    username=workspace.get("UserName", ""),
-                    computer_name=workspace.get("ComputerName", ""),
-                )
-                ws_record = self.usage_table_dao.get_workspace_ddb_item(ws_description)
-                if isinstance(ws_record, WorkspaceRecord) and self.is_prev_month_data(
-                    ws_record
-                ):
-                    # If the current month is different from the last reported month,
-                    # treat it as if there is no previous data available
-                    ws_record = ws_description
-
-                new_ws_record = workspaces_helper.process_workspace(
-                    ws_record,
-                    workspace.get("WorkspaceProperties").get(
-                        "RunningModeAutoStopTimeoutInMinutes"
-                    ),
-                    dashboard_metrics,
+
+    def is_deferred(
+        self,
+        workspace: dict,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        priority: int,
+        resume_mode: bool,
+        date_time_values: dict[str, any],
+    ) -> bool:
+        """This method checks if the run scheduler defers the analysis of the workspace."""
+        return (
+            workspace_utils.is_actionable_workspace(workspace)
+            and not (
+                resume_mode
+                and self.is_processed_in_current_window(ws_record, date_time_values)
+            )
+            and get_run_scheduler().should_defer(priority)
+        )
+
+    def analyze_workspace(
+        self,
+        workspace: dict,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        is_deferred: bool,
+        resume_mode: bool,
+        date_time_values: dict[str, any],
+        workspaces_helper: WorkspacesHelper,
+        dashboard_metrics: DashboardMetrics,
+    ) -> typing.Tuple[WorkspaceRecord, bool]:
+        """
+        This method analyzes a workspace, or reuses the stored results when the workspace is
+        not analyzed in this run
+        :param workspace: the workspace as described by the WorkSpaces API
+        :param ws_record: the stored record or the description if there is no stored record
+        :param is_deferred: whether the run scheduler deferred the workspace
+        :param resume_mode: whether workspaces processed in the current window are skipped
+        :param date_time_values: dictionary of the date strings for the current run
+        :param workspaces_helper: the helper of the directory
+        :param dashboard_metrics: the metrics the results are added to
+        :return: the record for the report and whether it has to be stored
+        """
+        ws_description = (
+            ws_record
+            if isinstance(ws_record, WorkspaceDescription)
+            else ws_record.description
+        )
+        dashboard_metrics.update_workspace_state_metrics(
+            workspace.get("State", "UNKNOWN")
+        )
+        is_actionable = workspace_utils.is_actionable_workspace(workspace)
+        is_resumed = resume_mode and self.is_processed_in_current_window(
+            ws_record, date_time_values
+        )
+        if not is_actionable or is_deferred:
+            if is_deferred:
+                logger.info(
+                    f"Deferring workspace {ws_description.workspace_id} to a follow-up run"
                 )
-                report_csv += new_ws_record.to_csv()
-                directory_csv += new_ws_record.to_csv()
-                workspace_processed = {
-                    "previousMode": new_ws_record.description.initial_mode,
-                    "newMode": new_ws_record.billing_data.new_mode,
-                    "bundleType": new_ws_record.description.bundle_type,
-                    "hourlyThreshold": new_ws_record.description.usage_threshold,
-                    "billableTime": new_ws_record.billing_data.billable_hours,
-                    "workspaceType": new_ws_record.workspace_type,
-                }
-                list_processed_workspaces.append(workspace_processed)
-                self.usage_table_dao.update_ddb_item(new_ws_record)
-            except Exception as e:
-                logger.exception(
-                    f"Error processing the workspace {workspace.get('WorkspaceId')}: {e}"
+            else:
+                logger.info(
+                    f"Reporting workspace {ws_description.workspace_id} in state {workspace.get('State')} without analysis"
                 )
-            # Upload with default session, rather than delegated
-            upload_report(
-                boto3.session.Session(),
-                directory_parameters.get("DateTimeValues"),
-                stack_parameters,
-                report_csv,
-                directory_id,
-                self.region,
-                self.get_account(),
+            new_ws_record = self.get_report_only_record(ws_record, date_time_values)
+            # The row is not a conversion decision, so it is not a conversion skip
+            WorkspacesHelper.update_dashboard_metrics(
+                dashboard_metrics,
+                None,
+                new_ws_record.billing_data.new_mode,
+                new_ws_record.billing_data.workspace_terminated,
             )
-        return workspace_count, list_processed_workspaces, directory_csv
+        elif is_resumed:
+            # The workspace was finalized by an earlier attempt of this run,
+            # reuse the stored record for the report
+            logger.debug(
+                f"Workspace {ws_description.workspace_id} was already processed in the current window"
+            )
+            WorkspacesHelper.update_dashboard_metrics(
+                dashboard_metrics,
+                ws_record.billing_data.change_reported,
+                ws_record.billing_data.new_mode,
+                ws_record.billing_data.workspace_terminated,
+            )
+            new_ws_record = ws_record
+        else:
+            new_ws_record = workspaces_helper.process_workspace(
+                ws_record,
+                workspace.get("WorkspaceProperties").get(
+                    "RunningModeAutoStopTimeoutInMinutes"
+                ),
+                dashboard_metrics,
+            )
+        # A deferred workspace is not stored, so the follow-up run processes it
+        return new_ws_record, is_actionable and not is_resumed and not is_deferred
+
+    @staticmethod
+    def get_workspace_processed(ws_record: WorkspaceRecord) -> dict[str, any]:
+        return {
+            "previousMode": ws_record.description.initial_mode,
+            "newMode": ws_record.billing_data.new_mode,
+            "bundleType": ws_record.description.bundle_type,
+            "hourlyThreshold": ws_record.description.usage_threshold,
+            "billableTime": ws_record.billing_data.billable_hours,
+            "workspaceType": ws_record.workspace_type,
+        }
+
+    def get_workspace_record(
+        self,
+        workspace: dict,
+        directory_id: str,
+        workspaces_helper: WorkspacesHelper,
+    ) -> WorkspaceRecord | WorkspaceDescription:
+        """
+        This method returns the stored record of the workspace for the current month
+        :param workspace: the workspace as described by the WorkSpaces API
+        :param directory_id: the directory of the workspace
+        :param workspaces_helper: the helper of the directory
+        :return: the stored record or the description if there is no stored record
+        """
+        bundle_type = workspace.get("WorkspaceProperties").get("ComputeTypeName")
+        usage_threshold = workspaces_helper.get_hourly_threshold_for_bundle_type(
+            bundle_type
+        )
+        ws_description = WorkspaceDescription(
+            account=self.get_account(),
+            region=self.region,
+            directory_id=directory_id,
+            workspace_id=workspace.get("WorkspaceId"),
+            initial_mode=workspace.get("WorkspaceProperties").get("RunningMode"),
+            usage_threshold=usage_threshold,
+            bundle_type=bundle_type,
+            username=workspace.get("UserName", ""),
+            computer_name=workspace.get("ComputerName", ""),
+        )
+        ws_record = self.usage_table_dao.get_workspace_ddb_item(ws_description)
+        if isinstance(ws_record, WorkspaceRecord) and self.is_prev_month_data(
+            ws_record
+        ):
+            # If the current month is different from the last reported month,
+            # treat it as if there is no previous data available
+            ws_record = ws_description
+        return ws_record
 
     def get_account(self) -> str:
-        sts_client = self._session.client("sts")
-        return sts_client.get_caller_identity().get("Account")
+        if self._account is None:
+            sts_client = client_factory.get_client(self._session, "sts")
+            self._account = sts_client.get_caller_identity().get("Account")
+        return self._account
+
+    def get_concurrency_slot(self) -> typing.ContextManager:
+        """
+        This method returns the slot a workspace is processed in. With adaptive concurrency,
+        the workspaces processed at the same time by all the threads follow the limit of the
+        controller, which shrinks when the APIs throttle.
+        """
+        if is_adaptive_concurrency_enabled():
+            return client_factory.get_concurrency_controller().slot()
+        return nullcontext()
 
     def get_dry_run(self, stack_parameters: dict[str, any]) -> bool:
         return stack_parameters.get("DryRun") == "Yes"
@@ -152,6 +346,85 @@ class DirectoryReader:
     def get_end_of_month(self, stack_parameters: dict[str, any]) -> bool:
         return stack_parameters.get("TestEndOfMonth") == "Yes"
 
+    def get_resume_mode(self) -> bool:
+        return os.getenv("ResumeMode", "Yes") == "Yes"
+
+    def is_processed_in_current_window(
+        self,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        date_time_values: dict[str, any],
+    ) -> bool:
+        """
+        This method checks if the stored record of a workspace was already finalized for the
+        current hourly metric window, e.g. by an earlier attempt that stopped partway through
+        :param ws_record: the stored record or the description if there is no stored record
+        :param date_time_values: dictionary of the date strings for the current run
+        :return: True if the workspace does not need to be processed again
+        """
+        if not isinstance(ws_record, WorkspaceRecord) or not date_time_values:
+            return False
+        return ws_record.report_date == date_time_values.get(
+            "date_today"
+        ) and ws_record.last_reported_metric_period == date_time_values.get(
+            "end_time_for_current_month"
+        )
+
+    def get_report_only_record(
+        self,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        date_time_values: dict[str, any],
+    ) -> WorkspaceRecord:
+        """
+        This method builds the report row for a workspace which is not analyzed because of
+        its state. Previously stored usage is carried forward and the change is reported as skipped.
+        :param ws_record: the stored record or the description if there is no stored record
+        :param date_time_values: dictionary of the date strings for the current run
+        :return: a workspace record for the report
+        """
+        if isinstance(ws_record, WorkspaceRecord):
+            description = ws_record.description
+            billable_hours = ws_record.billing_data.billable_hours
+            maintenance_hours = ws_record.billing_data.maintenance_hours
+            performance_metrics = ws_record.performance_metrics
+            last_known_user_connection = ws_record.last_known_user_connection
+            tags = ws_record.tags
+            workspace_type = ws_record.workspace_type
+            connected_at_last_report = ws_record.connected_at_last_report
+        else:
+            description = ws_record
+            billable_hours = 0
+            maintenance_hours = 0
+            performance_metrics = WorkspacePerformanceMetrics(
+                in_session_latency=None,
+                cpu_usage=None,
+                memory_usage=None,
+                root_volume_disk_usage=None,
+                user_volume_disk_usage=None,
+                udp_packet_loss_rate=None,
+            )
+            last_known_user_connection = ""
+            tags = '"[]"'
+            workspace_type = ""
+            connected_at_last_report = False
+        return WorkspaceRecord(
+            description=description,
+            billing_data=WorkspaceBillingData(
+                billable_hours=billable_hours,
+                change_reported="-S-",
+                new_mode=description.initial_mode,
+                maintenance_hours=maintenance_hours,
+            ),
+            performance_metrics=performance_metrics,
+            report_date=(date_time_values or {}).get("date_today", ""),
+            last_reported_metric_period=getattr(
+                ws_record, "last_reported_metric_period", ""
+            ),
+            last_known_user_connection=last_known_user_connection,
+            tags=tags,
+            workspace_type=workspace_type,
+            connected_at_last_report=connected_at_last_report,
+        )
+
     def is_prev_month_data(self, ws_record: WorkspaceRecord) -> bool:
         current_month = time.gmtime().tm_mon
         last_reported_month = datetime.datetime.strptime(
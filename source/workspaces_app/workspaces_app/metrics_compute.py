@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Union
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+logger = Logger(service="metrics_compute")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+DEFAULT_BATCH_SIZE = 16
+# Time a partial batch waits for more calls before it is sent to a worker process
+DEFAULT_MAX_BATCH_WAIT_SECONDS = 0.02
+
+
+def run_batch(calls: list[tuple[Callable, tuple]]) -> list[tuple[bool, any]]:
+    """
+    This method runs a batch of calls in a worker process. The error of a call is
+    returned with its result so it only fails that call.
+    :param calls: the function and the payload of each call
+    :return: whether each call succeeded, with its result or its error
+    """
+    results = []
+    for function, payload in calls:
+        try:
+            results.append((True, function(payload)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class ComputePool:
+    """
+    Runs CPU bound functions on worker processes so the computation of the workspaces
+    processed by different threads is not serialized by the GIL. Calls are sent to the
+    workers in batches to limit the cost of the inter-process communication. Functions
+    must be defined at the top level of a module and payloads must be picklable.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_wait_seconds: float = DEFAULT_MAX_BATCH_WAIT_SECONDS,
+    ) -> None:
+        # Forking a process with the threads of the run could deadlock the workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._batch_size = max(1, batch_size)
+        self._max_batch_wait_seconds = max_batch_wait_seconds
+        self._lock = threading.Lock()
+        self._pending: list[tuple[Callable, tuple, Future]] = []
+        self._timer: Union[threading.Timer, None] = None
+
+    def submit(self, function: Callable, payload: tuple) -> Future:
+        """
+        This method queues a call for the next batch
+        :param function: the function to run in a worker process
+        :param payload: the argument of the function
+        :return: the future of the result of the call
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((function, payload, future))
+            if len(self._pending) >= self._batch_size:
+                batch = self._take_batch()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(
+                        self._max_batch_wait_seconds, self.flush
+                    )
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            self._send(batch)
+        return future
+
+    def flush(self) -> None:
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self._send(batch)
+
+    def _take_batch(self) -> list[tuple[Callable, tuple, Future]]:
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _send(self, batch: list[tuple[Callable, tuple, Future]]) -> None:
+        futures = [future for _, _, future in batch]
+        try:
+            batch_future = self._executor.submit(
+                run_batch, [(function, payload) for function, payload, _ in batch]
+            )
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        batch_future.add_done_callback(lambda done: self._set_results(futures, done))
+
+    @staticmethod
+    def _set_results(futures: list[Future], batch_future: Future) -> None:
+        try:
+            results = batch_future.result()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, (succeeded, result) in zip(futures, results):
+            if succeeded:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def shutdown(self) -> None:
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+
+def get_compute_processes() -> int:
+    """
+    This method returns the number of worker processes from MetricsComputeProcesses,
+    "auto" uses every CPU of the task. The computation runs in the calling thread when
+    it is not set.
+    """
+    processes = os.getenv("MetricsComputeProcesses", "0") or "0"
+    if processes.lower() == "auto":
+        return os.cpu_count() or 1
+    try:
+        return max(0, int(processes))
+    except ValueError:
+        logger.warning(f"Invalid value for MetricsComputeProcesses: {processes}")
+        return 0
+
+
+_compute_pool: Union[ComputePool, None] = None
+_compute_pool_lock = threading.Lock()
+
+
+def get_compute_pool() -> Union[ComputePool, None]:
+    global _compute_pool
+    with _compute_pool_lock:
+        if _compute_pool is None:
+            processes = get_compute_processes()
+            if not processes:
+                return None
+            logger.info(f"Starting {processes} metrics compute processes")
+            _compute_pool = ComputePool(
+                processes,
+                int(os.getenv("MetricsComputeBatchSize", DEFAULT_BATCH_SIZE)),
+            )
+        return _compute_pool
+
+
+def shutdown_compute_pool() -> None:
+    global _compute_pool
+    with _compute_pool_lock:
+        compute_pool, _compute_pool = _compute_pool, None
+    if compute_pool is not None:
+        compute_pool.shutdown()
@@ -8,7 +8,7 @@ import bisect
 import math
 import os
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal
 from statistics import mean
 
@@ -18,7 +18,9 @@ import botocore
 from aws_lambda_powertools import Logger
 
 # Cost Optimizer for Amazon Workspaces
+from .metrics_compute import get_compute_pool
 from .user_session import UserSession
+from .utils import client_factory
 from .utils.user_session_dao import UserSessionDAO
 from .workspace_record import (
     WeightedAverage,
@@ -45,6 +47,15 @@ METRIC_LIST = [
     "UserVolumeDiskUsage",
     "UDPPacketLossRate",
 ]
+# Maximum number of data points returned by a get_metric_data call
+METRIC_DATA_PAGE_SIZE = 100800
+# Period of the metric data points, in seconds
+METRIC_PERIOD_SECONDS = 300
+
+boto_config = botocore.config.Config(
+    max_pool_connections=100,
+    retries={"max_attempts": 20, "mode": "standard"},
+)
 
 
 def get_autostop_timeout_hours() -> int:
@@ -57,202 +68,11 @@ def get_autostop_timeout_hours() -> int:
         raise
 
 
-class MetricsHelper:
-    def __init__(
-        self, session: boto3.session.Session, region: str, session_table
-    ) -> None:
-        self.region = region
-        boto_config = botocore.config.Config(
-            max_pool_connections=100,
-            retries={"max_attempts": 20, "mode": "standard"},
-        )
-        self.client = session.client(
-            "cloudwatch", region_name=self.region, config=boto_config
-        )
-        # use default boto session instead of the passed in assumed role session
-        self.session_table = UserSessionDAO(
-            boto3.session.Session(), session_table, region
-        )
-
-    def get_billable_hours_and_performance(
-        self,
-        start_of_month: str,
-        current_time: str,
-        ws_record: WorkspaceRecord | WorkspaceDescription,
-        autostop_timeout_minutes: int,
-    ) -> dict[str, int | WorkspacePerformanceMetrics] | None:
-        """
-        This method returns the billable hours and performance metrics for the given workspace
-        :param start_time: Start time for the calculating hours
-        :param end_time: End time for calculating hours
-        :param ws_record: The record of workspace usage for the month from the db or description if
-        the db record doesn't exist
-        :param autostop_timeout_minutes: The autostop timeout for the given workspace
-        :return: billable hours and performance metircs for the workspace
-        """
-        ws_description = (
-            ws_record.description
-            if isinstance(ws_record, WorkspaceRecord)
-            else ws_record
-        )
-        logger.debug(
-            "Calculating user connected hours for the workspace {} with start time {} and end time {}".format(
-                ws_description.workspace_id, start_of_month, current_time
-            )
-        )
-        last_reported_time = getattr(ws_record, "last_reported_metric_period", None)
-        time_range = self.get_time_range(
-            start_of_month, current_time, last_reported_time
-        )
-        list_metric_data_points = self.get_cloudwatch_metric_data_points(
-            ws_description.workspace_id, time_range
-        )
-        if list_metric_data_points:
-            metric_data_points = self.get_list_data_points(list_metric_data_points)
-            user_sessions = self.get_user_sessions(
-                metric_data_points,
-                ws_description,
-                ws_description.initial_mode,
-                autostop_timeout_minutes,
-            )
-            if user_sessions:
-                self.session_table.update_ddb_items(user_sessions)
-            billable_hours = self.get_user_connected_hours(
-                user_sessions,
-                ws_description.workspace_id,
-                ws_description.initial_mode,
-                autostop_timeout_minutes,
-                getattr(
-                    getattr(ws_record, "billing_data", None), "billable_hours", None
-                ),
-            )
-            performance_metrics = self.process_performance_metrics(
-                metric_data_points, getattr(ws_record, "performance_metrics", None)
-            )
-
-            billable_hours = self.apply_hours_increment_cap(
-                billable_hours, ws_record, time_range
-            )
-
-            logger.debug("Calculated user connected hours: {}".format(billable_hours))
-
-            return {
-                "billable_hours": billable_hours,
-                "performance_metrics": performance_metrics,
-            }
-        else:
-            return None
-
-    def get_time_range(
-        self, start_of_month: str, end_time: str, last_reported_time: str
-    ) -> dict:
-        """
-        This method determines the time range to be used for the get_metric_data query. It uses
-        the last report time as the start, if that last report time isn't available it uses
-        the first of the month.
-        :param start_of_month: Date string for the beginning of the month
-        :param end_time: Date string to be used for the end of the time range
-        :param last_reported_time: The time when the data for the workspace was last analyzed
-        :return: dictionary containing time range
-        """
-        start_time = last_reported_time or start_of_month
-        time_range_start = datetime.strptime(start_time, TIME_FORMAT)
-        time_range_end = datetime.strptime(end_time, TIME_FORMAT)
-        time_range = {
-            START_TIME: time_range_start.strftime(TIME_FORMAT),
-            END_TIME: time_range_end.strftime(TIME_FORMAT),
-        }
-        logger.debug(
-            "the start time and end time for the get_metric_data query is {}".format(
-                time_range
-            )
-        )
-        return time_range
-
-    def build_query(self, metric: str, workspace_id: str) -> dict:
-        """
-        This method creates a query for a metric to be used with get_metric_data
-        :param metric: The name of the metric to request
-        :param workspace_id: The workspace for which to get metrics
-        :return: A query to be used with get_metric_data
-        """
-        stat = "Maximum" if metric == "UserConnected" else "Average"
-        return {
-            "Id": metric.lower(),
-            "MetricStat": {
-                "Metric": {
-                    "Dimensions": [{"Name": "WorkspaceId", "Value": workspace_id}],
-                    "Namespace": "AWS/WorkSpaces",
-                    "MetricName": metric,
-                },
-                "Period": 300,
-                "Stat": stat,
-            },
-        }
-
-    def get_cloudwatch_metric_data_points(
-        self, workspace_id: str, time_range: list[str]
-    ):
-        """
-        This method returns the cloudwatch metric datapoints for given workspace id and time ranges.
-        :param metric: metric to use to query cloudwatch metrics
-        :param workspace_id:
-        :param time_range: List of time ranges to query and get the metrics for
-        :return: list of Datapoints for the cloudwatch metrics
-        """
-        logger.debug(
-            "Getting the cloudwatch metrics for the workspace id {}".format(
-                workspace_id
-            )
-        )
-        list_data_points = []
-        metric_queries = [
-            self.build_query(metric, workspace_id) for metric in METRIC_LIST
-        ]
-        try:
-            metrics_paginator = self.client.get_paginator("get_metric_data")
-            metrics_iterator = metrics_paginator.paginate(
-                MetricDataQueries=metric_queries,
-                StartTime=time_range[START_TIME],
-                EndTime=time_range[END_TIME],
-                ScanBy="TimestampAscending",
-                PaginationConfig={"PageSize": 100800},
-            )
-            for page in metrics_iterator:
-                list_data_points.extend(page.get("MetricDataResults"))
-        except Exception as error:
-            logger.exception(
-                "Error occurred while processing workspace {}, {}".format(
-                    workspace_id, error
-                )
-            )
-            return None
-        logger.debug(
-            "The cloudwatch metrics list for workspace id {} is {}".format(
-                workspace_id, list_data_points
-            )
-        )
-        return list_data_points
-
-    def get_list_data_points(self, list_metric_data_points):
-        """
-        This method returns the sorted list of data points
-        :param list_metric_data_points: a list of MetricDataResults from a get_metric_data query
-        :return: sorted list of data points
-        """
-        logger.debug(
-            "Getting the list of user session data points for metric data points {}".format(
-                list_metric_data_points
-            )
-        )
-        metric_data_points = {}
-        for data_point in list_metric_data_points:
-            metric_id = data_point.get("Id")
-            metric_data_points.setdefault(metric_id, defaultdict(list))
-            metric_data_points[metric_id]["timestamps"].extend(data_point["Timestamps"])
-            metric_data_points[metric_id]["values"].extend(data_point["Values"])
-            metric_data_points[metric_id] = dict(metric_data_points[metric_id])
-        return metric_data_points
+class MetricsCalculator:
+    """
+    The computation of the user sessions, billable hours and performance metrics from the
+    metric data of a workspace. It makes no calls so it can run in a worker process.
+    """
 
     def get_user_connected_hours(
         self,
@@ -524,6 +344,344 @@ class MetricsHelper:
         else:
             return None
 
+    def compute_metrics(
+        self,
+        metric_data_points: dict[str, dict[str, list]],
+        ws_description: WorkspaceDescription,
+        autostop_timeout_minutes: int,
+        previous_billable_hours: int | None,
+        prev_metrics: WorkspacePerformanceMetrics | None,
+    ) -> tuple[list[UserSession], int, WorkspacePerformanceMetrics]:
+        """
+        This method computes the results of a workspace from its metric data points
+        :param metric_data_points: the metric data points returned by get_list_data_points
+        :param ws_description: The description of the workspace
+        :param autostop_timeout_minutes: The autostop timeout for the given workspace
+        :param previous_billable_hours: The previously calculated billable hours
+        :param prev_metrics: The previously calculated performance metrics
+        :return: the user sessions, the billable hours before the increment cap and the
+        performance metrics
+        """
+        user_sessions = self.get_user_sessions(
+            metric_data_points,
+            ws_description,
+            ws_description.initial_mode,
+            autostop_timeout_minutes,
+        )
+        billable_hours = self.get_user_connected_hours(
+            user_sessions,
+            ws_description.workspace_id,
+            ws_description.initial_mode,
+            autostop_timeout_minutes,
+            previous_billable_hours,
+        )
+        performance_metrics = self.process_performance_metrics(
+            metric_data_points, prev_metrics
+        )
+        return user_sessions, billable_hours, performance_metrics
+
+
+def pack_metric_data_points(
+    metric_data_points: dict[str, dict[str, list]],
+) -> tuple[tuple[str, tuple[float, ...], tuple[float, ...]], ...]:
+    """
+    This method converts the metric data points to tuples of floats, which pickle to a
+    fraction of the size of the datetime objects, to send them to a worker process
+    """
+    return tuple(
+        (
+            metric_id,
+            tuple(
+                (
+                    timestamp
+                    if timestamp.tzinfo
+                    else timestamp.replace(tzinfo=timezone.utc)
+                ).timestamp()
+                for timestamp in data["timestamps"]
+            ),
+            tuple(data["values"]),
+        )
+        for metric_id, data in metric_data_points.items()
+    )
+
+
+def unpack_metric_data_points(
+    packed_metric_data_points: tuple[tuple[str, tuple[float, ...], tuple[float, ...]]],
+) -> dict[str, dict[str, list]]:
+    return {
+        metric_id: {
+            "timestamps": [
+                datetime.fromtimestamp(timestamp, timezone.utc)
+                for timestamp in timestamps
+            ],
+            "values": list(values),
+        }
+        for metric_id, timestamps, values in packed_metric_data_points
+    }
+
+
+def compute_workspace_metrics(
+    payload: tuple,
+) -> tuple[list[UserSession], int, WorkspacePerformanceMetrics]:
+    """
+    This method runs MetricsCalculator.compute_metrics in a worker process
+    :param payload: the packed metric data points followed by the other arguments of
+    compute_metrics
+    """
+    packed_metric_data_points, *arguments = payload
+    return MetricsCalculator().compute_metrics(
+        unpack_metric_data_points(packed_metric_data_points), *arguments
+    )
+
+
+class MetricsHelper(MetricsCalculator):
+    def __init__(
+        self, session: boto3.session.Session, region: str, session_table
+    ) -> None:
+        self.region = region
+        self.client = client_factory.get_client(
+            session, "cloudwatch", self.region, boto_config
+        )
+        # use default boto session instead of the passed in assumed role session
+        self.session_table = UserSessionDAO(
+            client_factory.get_default_session(), session_table, region
+        )
+
+    def get_billable_hours_and_performance(
+        self,
+        start_of_month: str,
+        current_time: str,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        autostop_timeout_minutes: int,
+    ) -> dict[str, int | WorkspacePerformanceMetrics] | None:
+        """
+        This method returns the billable hours and performance metrics for the given workspace
+        :param start_time: Start time for the calculating hours
+        :param end_time: End time for calculating hours
+        :param ws_record: The record of workspace usage for the month from the db or description if
+        the db record doesn't exist
+        :param autostop_timeout_minutes: The autostop timeout for the given workspace
+        :return: billable hours and performance metircs for the workspace
+        """
+        time_range, metric_data_points = self.get_metric_data_points(
+            start_of_month, current_time, ws_record
+        )
+        if metric_data_points:
+            user_sessions, calculated_metrics = (
+                self.calculate_billable_hours_and_performance(
+                    metric_data_points, time_range, ws_record, autostop_timeout_minutes
+                )
+            )
+            if user_sessions:
+                self.session_table.update_ddb_items(user_sessions)
+            return calculated_metrics
+        else:
+            return None
+
+    def get_metric_data_points(
+        self,
+        start_of_month: str,
+        current_time: str,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+    ) -> tuple[dict, dict[str, dict[str, list]] | None]:
+        """
+        This method fetches the metric data points of the given workspace since its last report
+        :param start_of_month: Start time for the calculating hours
+        :param current_time: End time for calculating hours
+        :param ws_record: The record of workspace usage for the month from the db or description if
+        the db record doesn't exist
+        :return: the time range of the query and the metric data points, None if there is no data
+        """
+        ws_description = (
+            ws_record.description
+            if isinstance(ws_record, WorkspaceRecord)
+            else ws_record
+        )
+        logger.debug(
+            "Calculating user connected hours for the workspace {} with start time {} and end time {}".format(
+                ws_description.workspace_id, start_of_month, current_time
+            )
+        )
+        last_reported_time = getattr(ws_record, "last_reported_metric_period", None)
+        time_range = self.get_time_range(
+            start_of_month, current_time, last_reported_time
+        )
+        list_metric_data_points = self.get_cloudwatch_metric_data_points(
+            ws_description.workspace_id, time_range
+        )
+        if not list_metric_data_points:
+            return time_range, None
+        return time_range, self.get_list_data_points(list_metric_data_points)
+
+    def calculate_billable_hours_and_performance(
+        self,
+        metric_data_points: dict[str, dict[str, list]],
+        time_range: dict,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        autostop_timeout_minutes: int,
+    ) -> tuple[list[UserSession], dict[str, int | WorkspacePerformanceMetrics]]:
+        """
+        This method computes the billable hours and performance metrics from the metric data
+        points, in a worker process when the compute pool is enabled
+        :param metric_data_points: the metric data points returned by get_metric_data_points
+        :param time_range: the time range of the metric data points
+        :param ws_record: The record of workspace usage for the month from the db or description if
+        the db record doesn't exist
+        :param autostop_timeout_minutes: The autostop timeout for the given workspace
+        :return: the user sessions to store and the billable hours and performance metrics
+        """
+        ws_description = (
+            ws_record.description
+            if isinstance(ws_record, WorkspaceRecord)
+            else ws_record
+        )
+        arguments = (
+            ws_description,
+            autostop_timeout_minutes,
+            getattr(
+                getattr(ws_record, "billing_data", None), "raw_billable_hours", None
+            ),
+            getattr(ws_record, "performance_metrics", None),
+        )
+        compute_pool = get_compute_pool()
+        if compute_pool:
+            user_sessions, billable_hours, performance_metrics = compute_pool.submit(
+                compute_workspace_metrics,
+                (pack_metric_data_points(metric_data_points), *arguments),
+            ).result()
+        else:
+            user_sessions, billable_hours, performance_metrics = self.compute_metrics(
+                metric_data_points, *arguments
+            )
+
+        billable_hours = self.apply_hours_increment_cap(
+            billable_hours, ws_record, time_range
+        )
+
+        logger.debug("Calculated user connected hours: {}".format(billable_hours))
+
+        return user_sessions, {
+            "billable_hours": billable_hours,
+            "performance_metrics": performance_metrics,
+        }
+
+    def get_time_range(
+        self, start_of_month: str, end_time: str, last_reported_time: str
+    ) -> dict:
+        """
+        This method determines the time range to be used for the get_metric_data query. It uses
+        the last report time as the start, if that last report time isn't available it uses
+        the first of the month.
+        :param start_of_month: Date string for the beginning of the month
+        :param end_time: Date string to be used for the end of the time range
+        :param last_reported_time: The time when the data for the workspace was last analyzed
+        :return: dictionary containing time range
+        """
+        start_time = last_reported_time or start_of_month
+        time_range_start = datetime.strptime(start_time, TIME_FORMAT)
+        time_range_end = datetime.strptime(end_time, TIME_FORMAT)
+        time_range = {
+            START_TIME: time_range_start.strftime(TIME_FORMAT),
+            END_TIME: time_range_end.strftime(TIME_FORMAT),
+        }
+        logger.debug(
+            "the start time and end time for the get_metric_data query is {}".format(
+                time_range
+            )
+        )
+        return time_range
+
+    def build_query(self, metric: str, workspace_id: str) -> dict:
+        """
+        This method creates a query for a metric to be used with get_metric_data
+        :param metric: The name of the metric to request
+        :param workspace_id: The workspace for which to get metrics
+        :return: A query to be used with get_metric_data
+        """
+        stat = "Maximum" if metric == "UserConnected" else "Average"
+        return {
+            "Id": metric.lower(),
+            "MetricStat": {
+                "Metric": {
+                    "Dimensions": [{"Name": "WorkspaceId", "Value": workspace_id}],
+                    "Namespace": "AWS/WorkSpaces",
+                    "MetricName": metric,
+                },
+                "Period": METRIC_PERIOD_SECONDS,
+                "Stat": stat,
+            },
+        }
+
+    def get_cloudwatch_metric_data_points(
+        self, workspace_id: str, time_range: list[str]
+    ):
+        """
+        This method returns the cloudwatch metric datapoints for given workspace id and time ranges.
+        :param metric: metric to use to query cloudwatch metrics
+        :param workspace_id:
+        :param time_range: List of time ranges to query and get the metrics for
+        :return: list of Datapoints for the cloudwatch metrics
+        """
+        logger.debug(
+            "Getting the cloudwatch metrics for the workspace id {}".format(
+                workspace_id
+            )
+        )
+        list_data_points = []
+        metric_queries = [
+            self.build_query(metric, workspace_id) for metric in METRIC_LIST
+        ]
+        request = {
+            "MetricDataQueries": metric_queries,
+            "StartTime": time_range[START_TIME],
+            "EndTime": time_range[END_TIME],
+            "ScanBy": "TimestampAscending",
+            "MaxDatapoints": METRIC_DATA_PAGE_SIZE,
+        }
+        try:
+            # Pages are requested one by one so a slow page can be hedged
+            while True:
+                page = client_factory.hedged_call(
+                    self.client, "get_metric_data", **request
+                )
+                list_data_points.extend(page.get("MetricDataResults"))
+                if not page.get("NextToken"):
+                    break
+                request["NextToken"] = page["NextToken"]
+        except Exception as error:
+            logger.exception(
+                "Error occurred while processing workspace {}, {}".format(
+                    workspace_id, error
+                )
+            )
+            return None
+        logger.debug(
+            "The cloudwatch metrics list for workspace id {} is {}".format(
+                workspace_id, list_data_points
+            )
+        )
+        return list_data_points
+
+    def get_list_data_points(self, list_metric_data_points):
+        """
+        This method returns the sorted list of data points
+        :param list_metric_data_points: a list of MetricDataResults from a get_metric_data query
+        :return: sorted list of data points
+        """
+        logger.debug(
+            "Getting the list of user session data points for metric data points {}".format(
+                list_metric_data_points
+            )
+        )
+        metric_data_points = {}
+        for data_point in list_metric_data_points:
+            metric_id = data_point.get("Id")
+            metric_data_points.setdefault(metric_id, defaultdict(list))
+            metric_data_points[metric_id]["timestamps"].extend(data_point["Timestamps"])
+            metric_data_points[metric_id]["values"].extend(data_point["Values"])
+            metric_data_points[metric_id] = dict(metric_data_points[metric_id])
+        return metric_data_points
+
     def apply_hours_increment_cap(
         self,
         billable_hours: int,
@@ -531,7 +689,9 @@ class MetricsHelper:
         time_range: dict,
     ) -> int:
         previous_billable_hours = (
-            getattr(getattr(ws_record, "billing_data", None), "billable_hours", None)
+            getattr(
+                getattr(ws_record, "billing_data", None), "raw_billable_hours", None
+            )
             or 0
         )
 
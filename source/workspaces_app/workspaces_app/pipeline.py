@@ -0,0 +1,507 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import json
+import os
+import queue
+import threading
+import time
+import typing
+from dataclasses import dataclass, field
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .directory_reader import DirectoryReader
+from .scheduler import get_priority, get_run_scheduler, is_end_of_month
+from .user_session import UserSession
+from .utils import client_factory, workspace_utils
+from .utils.dashboard_metrics import DashboardMetrics
+from .utils.s3_utils import upload_report
+from .workspace_record import WorkspaceDescription, WorkspaceRecord
+from .workspaces_helper import WorkspacesHelper
+
+logger = Logger(service="pipeline")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+STATE_STAGE = "state"
+PREFETCH_STAGE = "prefetch"
+METRICS_STAGE = "metrics"
+COMPUTE_STAGE = "compute"
+ACT_STAGE = "act"
+PERSIST_STAGE = "persist"
+
+# Threads per stage. The compute stage only waits for the compute pool when it is enabled.
+DEFAULT_STAGE_CONCURRENCY = {
+    STATE_STAGE: 8,
+    PREFETCH_STAGE: 8,
+    METRICS_STAGE: 16,
+    COMPUTE_STAGE: 2,
+    ACT_STAGE: 4,
+    PERSIST_STAGE: 8,
+}
+DEFAULT_QUEUE_SIZE = 32
+
+_DONE = object()
+
+
+def get_stage_settings(env_name: str, defaults: dict[str, float]) -> dict[str, float]:
+    """
+    This method returns the settings of each stage with the overrides of the JSON object
+    in the environment variable, e.g. {"persist": 4}.
+    """
+    settings = dict(defaults)
+    overrides = os.getenv(env_name)
+    if overrides:
+        try:
+            settings.update(
+                {stage: float(value) for stage, value in json.loads(overrides).items()}
+            )
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid value for {env_name}: {overrides}: {e}")
+    return settings
+
+
+class RateLimiter:
+    """Spaces the calls of the threads of a stage to at most a rate per second."""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._interval = 1 / rate_per_second
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next_call = clock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = self._clock()
+            wait_seconds = self._next_call - now
+            self._next_call = max(now, self._next_call) + self._interval
+        if wait_seconds > 0:
+            self._sleep(wait_seconds)
+
+
+_rate_limiters: dict[tuple, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: tuple, rate_per_second: float) -> RateLimiter:
+    """
+    This method returns the process-wide limiter of a key, so the directories processed at
+    the same time share the rate of a stage instead of each getting its own
+    :param key: the account, the region and the name of the stage
+    :param rate_per_second: the calls per second of the limiter when it is created
+    """
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(rate_per_second)
+        return _rate_limiters[key]
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    function: typing.Callable[[any], None]
+    concurrency: int = 1
+    rate_limiter: typing.Union[RateLimiter, None] = None
+
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues. Each stage has its own threads
+    and rate limit, and a stage waits when the queue of the next stage is full, so a slow
+    stage throttles the stages before it instead of building up items in memory. An item
+    whose stage raises is passed to on_error and leaves the pipeline.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        on_error: typing.Callable[[any, str, Exception], None],
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self._stages = stages
+        self._on_error = on_error
+        self._queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+
+    def run(self, items: typing.Iterable) -> None:
+        """This method feeds the items to the first stage and waits until all of them are done."""
+        stage_threads = []
+        for index, stage in enumerate(self._stages):
+            threads = [
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(index,),
+                    name=f"pipeline-{stage.name}-{number}",
+                    daemon=True,
+                )
+                for number in range(max(1, stage.concurrency))
+            ]
+            for thread in threads:
+                thread.start()
+            stage_threads.append(threads)
+        for item in items:
+            self._queues[0].put(item)
+        # A stage is done when the stage before it is done and its queue is drained
+        for index, threads in enumerate(stage_threads):
+            for _ in threads:
+                self._queues[index].put(_DONE)
+            for thread in threads:
+                thread.join()
+
+    def _run_stage(self, index: int) -> None:
+        stage = self._stages[index]
+        input_queue = self._queues[index]
+        output_queue = (
+            self._queues[index + 1] if index + 1 < len(self._queues) else None
+        )
+        while True:
+            item = input_queue.get()
+            if item is _DONE:
+                return
+            try:
+                if stage.rate_limiter is not None:
+                    stage.rate_limiter.acquire()
+                stage.function(item)
+            except Exception as e:
+                try:
+                    self._on_error(item, stage.name, e)
+                except Exception:
+                    logger.exception(f"Error handling the error of stage {stage.name}")
+                continue
+            if output_queue is not None:
+                output_queue.put(item)
+
+
+def build_stages(
+    functions: list[tuple[str, typing.Callable[[any], None]]],
+    scope: tuple = (),
+) -> list[Stage]:
+    """
+    This method creates the stages with their concurrency from PipelineStageConcurrency
+    and their calls per second from PipelineStageRateLimits. The rate of a stage is shared
+    by all the pipelines of the same scope.
+    :param functions: the name and the function of each stage
+    :param scope: the account and the region of the calls of the stages
+    """
+    concurrency = get_stage_settings(
+        "PipelineStageConcurrency", DEFAULT_STAGE_CONCURRENCY
+    )
+    rate_limits = get_stage_settings("PipelineStageRateLimits", {})
+    return [
+        Stage(
+            name=name,
+            function=function,
+            concurrency=max(1, int(concurrency.get(name, 1))),
+            rate_limiter=(
+                get_rate_limiter((*scope, name), rate_limits[name])
+                if rate_limits.get(name, 0) > 0
+                else None
+            ),
+        )
+        for name, function in functions
+    ]
+
+
+def get_queue_size() -> int:
+    return int(os.getenv("PipelineQueueSize", DEFAULT_QUEUE_SIZE))
+
+
+@dataclass
+class WorkspaceTask:
+    """The state of a workspace as it moves through the stages."""
+
+    workspace: dict
+    ws_record: typing.Union[WorkspaceRecord, WorkspaceDescription, None] = None
+    priority: typing.Union[int, None] = None
+    is_deferred: bool = False
+    analyzed_record: typing.Union[WorkspaceRecord, WorkspaceDescription, None] = None
+    time_range: typing.Union[dict, None] = None
+    metric_data_points: typing.Union[dict, None] = None
+    calculated_metrics: typing.Union[dict, None] = None
+    user_sessions: list[UserSession] = field(default_factory=list)
+    new_ws_record: typing.Union[WorkspaceRecord, None] = None
+    should_store: bool = False
+    is_reported: bool = False
+    dashboard_metrics: DashboardMetrics = field(default_factory=DashboardMetrics)
+
+    @property
+    def workspace_id(self) -> str:
+        return self.workspace.get("WorkspaceId")
+
+    @property
+    def autostop_timeout_minutes(self) -> typing.Union[int, None]:
+        return self.workspace.get("WorkspaceProperties").get(
+            "RunningModeAutoStopTimeoutInMinutes"
+        )
+
+
+class PipelineDirectoryReader(DirectoryReader):
+    """
+    Processes the workspaces of a directory through the stages
+    prefetch -> metrics -> compute -> act -> persist. The stored records of the workspaces
+    are loaded by the state stage first, since the run scheduler orders the workspaces by
+    their stored usage before they enter the other stages.
+    """
+
+    def process_directory(
+        self,
+        stack_parameters: dict,
+        directory_parameters: dict,
+        dashboard_metrics: DashboardMetrics,
+        workspaces: typing.Union[typing.List[dict], None] = None,
+        upload: bool = True,
+    ) -> typing.Tuple[int, typing.List[dict], str]:
+        """
+        :param stack_parameters: Dictionary containing parameters used in the stack.
+        :param directory_parameters: Dictionary containing the directory to process.
+        :param dashboard_metrics: the metrics the results are added to
+        :param workspaces: the workspaces to process, all the workspaces of the directory
+            are listed when not given
+        :param upload: upload the directory report
+        :return: the number of workspaces, the workspaces processed and the report rows
+        """
+        resume_mode = self.get_resume_mode()
+        directory_id = directory_parameters.get("DirectoryId")
+        date_time_values = directory_parameters.get("DateTimeValues")
+        end_of_month = is_end_of_month(stack_parameters, date_time_values)
+        workspaces_helper = self.get_workspaces_helper(
+            stack_parameters, directory_parameters
+        )
+        if workspaces is not None:
+            list_workspaces = workspaces
+        else:
+            list_workspaces = workspaces_helper.get_workspaces_for_directory(
+                directory_id
+            )
+        workspaces_helper.prefetch_connection_status(
+            [
+                workspace.get("WorkspaceId")
+                for workspace in list_workspaces
+                if workspace_utils.is_actionable_workspace(workspace)
+            ]
+        )
+        # The stages of the directories of an account and region share their rate limits
+        rate_limit_scope = (self.get_account(), self.region)
+
+        tasks = [WorkspaceTask(workspace=workspace) for workspace in list_workspaces]
+        Pipeline(
+            build_stages(
+                [
+                    (
+                        STATE_STAGE,
+                        lambda task: self.load_state(
+                            task, directory_id, workspaces_helper
+                        ),
+                    )
+                ],
+                rate_limit_scope,
+            ),
+            self._on_load_error,
+            get_queue_size(),
+        ).run(tasks)
+
+        run_scheduler = get_run_scheduler()
+        scheduled_tasks = run_scheduler.schedule(
+            [task for task in tasks if task.ws_record is not None],
+            lambda task: get_priority(task.ws_record, end_of_month),
+        )
+        for priority, task in scheduled_tasks:
+            task.priority = priority
+        Pipeline(
+            build_stages(
+                [
+                    (
+                        PREFETCH_STAGE,
+                        lambda task: self.prefetch(
+                            task, resume_mode, date_time_values, workspaces_helper
+                        ),
+                    ),
+                    (
+                        METRICS_STAGE,
+                        lambda task: self.fetch_metrics(
+                            task, date_time_values, workspaces_helper
+                        ),
+                    ),
+                    (
+                        COMPUTE_STAGE,
+                        lambda task: self.compute(task, workspaces_helper),
+                    ),
+                    (ACT_STAGE, lambda task: self.act(task, workspaces_helper)),
+                    (
+                        PERSIST_STAGE,
+                        lambda task: self.persist(task, workspaces_helper),
+                    ),
+                ],
+                rate_limit_scope,
+            ),
+            self._on_process_error,
+            get_queue_size(),
+        ).run(task for _, task in scheduled_tasks)
+
+        list_processed_workspaces = []
+        directory_csv = ""
+        for _, task in scheduled_tasks:
+            dashboard_metrics.merge(task.dashboard_metrics)
+            if task.is_reported:
+                directory_csv += task.new_ws_record.to_csv()
+                list_processed_workspaces.append(
+                    self.get_workspace_processed(task.new_ws_record)
+                )
+        if upload and scheduled_tasks:
+            # Upload with default session, rather than delegated
+            upload_report(
+                client_factory.get_default_session(),
+                date_time_values,
+                stack_parameters,
+                WorkspaceRecord.csv_header() + directory_csv,
+                directory_id,
+                self.region,
+                self.get_account(),
+            )
+        return len(scheduled_tasks), list_processed_workspaces, directory_csv
+
+    def load_state(
+        self,
+        task: WorkspaceTask,
+        directory_id: str,
+        workspaces_helper: WorkspacesHelper,
+    ) -> None:
+        task.ws_record = self.get_workspace_record(
+            task.workspace, directory_id, workspaces_helper
+        )
+
+    def prefetch(
+        self,
+        task: WorkspaceTask,
+        resume_mode: bool,
+        date_time_values: dict[str, any],
+        workspaces_helper: WorkspacesHelper,
+    ) -> None:
+        """
+        This method decides if the workspace is analyzed and gets its tags. A workspace which
+        is not analyzed gets its report row here and skips to the persist stage.
+        """
+        task.is_deferred = self.is_deferred(
+            task.workspace,
+            task.ws_record,
+            task.priority,
+            resume_mode,
+            date_time_values,
+        )
+        is_analyzed = (
+            workspace_utils.is_actionable_workspace(task.workspace)
+            and not task.is_deferred
+            and not (
+                resume_mode
+                and self.is_processed_in_current_window(
+                    task.ws_record, date_time_values
+                )
+            )
+        )
+        if not is_analyzed:
+            # No calls are made for a workspace which is not analyzed
+            task.new_ws_record, task.should_store = self.analyze_workspace(
+                task.workspace,
+                task.ws_record,
+                task.is_deferred,
+                resume_mode,
+                date_time_values,
+                workspaces_helper,
+                task.dashboard_metrics,
+            )
+            return
+        task.dashboard_metrics.update_workspace_state_metrics(
+            task.workspace.get("State", "UNKNOWN")
+        )
+        task.analyzed_record = workspaces_helper.get_analyzed_record(task.ws_record)
+        workspaces_helper.prefetch_tags(task.workspace_id)
+
+    def fetch_metrics(
+        self,
+        task: WorkspaceTask,
+        date_time_values: dict[str, any],
+        workspaces_helper: WorkspacesHelper,
+    ) -> None:
+        if task.new_ws_record is not None:
+            return
+        if workspaces_helper.is_quiescent_workspace(task.analyzed_record):
+            task.calculated_metrics = workspaces_helper.get_calculated_metrics(
+                task.analyzed_record, task.autostop_timeout_minutes
+            )
+            return
+        task.time_range, task.metric_data_points = (
+            workspaces_helper.metrics_helper.get_metric_data_points(
+                date_time_values.get("start_time_for_current_month"),
+                date_time_values.get("end_time_for_current_month"),
+                task.analyzed_record,
+            )
+        )
+
+    def compute(self, task: WorkspaceTask, workspaces_helper: WorkspacesHelper) -> None:
+        if task.new_ws_record is not None or task.calculated_metrics is not None:
+            return
+        if not task.metric_data_points:
+            raise ValueError(f"No metric data for the workspace {task.workspace_id}")
+        task.user_sessions, task.calculated_metrics = (
+            workspaces_helper.metrics_helper.calculate_billable_hours_and_performance(
+                task.metric_data_points,
+                task.time_range,
+                task.analyzed_record,
+                task.autostop_timeout_minutes,
+            )
+        )
+        # The data points are not needed anymore, release them before the slower stages
+        task.metric_data_points = None
+
+    def act(self, task: WorkspaceTask, workspaces_helper: WorkspacesHelper) -> None:
+        if task.new_ws_record is not None:
+            return
+        task.new_ws_record = workspaces_helper.process_workspace(
+            task.ws_record,
+            task.autostop_timeout_minutes,
+            task.dashboard_metrics,
+            calculated_metrics=task.calculated_metrics,
+        )
+        task.should_store = True
+
+    def persist(self, task: WorkspaceTask, workspaces_helper: WorkspacesHelper) -> None:
+        task.is_reported = True
+        try:
+            if task.user_sessions:
+                workspaces_helper.metrics_helper.session_table.update_ddb_items(
+                    task.user_sessions
+                )
+            if task.should_store:
+                self.usage_table_dao.update_ddb_item(task.new_ws_record)
+        finally:
+            self._finish(task)
+
+    def _finish(self, task: WorkspaceTask) -> None:
+        run_scheduler = get_run_scheduler()
+        if task.is_deferred:
+            run_scheduler.defer(task.priority, task.workspace_id)
+        else:
+            run_scheduler.complete(task.priority)
+
+    def _on_load_error(self, task: WorkspaceTask, stage: str, error: Exception) -> None:
+        logger.exception(f"Error processing the workspace {task.workspace_id}: {error}")
+
+    def _on_process_error(
+        self, task: WorkspaceTask, stage: str, error: Exception
+    ) -> None:
+        logger.exception(
+            f"Error processing the workspace {task.workspace_id} in the {stage} stage: {error}"
+        )
+        if stage != PERSIST_STAGE:
+            self._finish(task)
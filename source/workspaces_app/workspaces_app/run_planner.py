@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import datetime
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .async_engine import get_api_concurrency
+from .metrics_helper import METRIC_DATA_PAGE_SIZE, METRIC_LIST, METRIC_PERIOD_SECONDS
+from .pipeline import (
+    DEFAULT_STAGE_CONCURRENCY,
+    METRICS_STAGE,
+    PERSIST_STAGE,
+    PREFETCH_STAGE,
+    get_stage_settings,
+)
+from .utils import client_factory, workspace_utils
+from .utils.session_writer import BATCH_SIZE, is_background_writes_enabled
+from .work_scheduler import DirectoryTarget
+from .workspaces_helper import (
+    CONNECTION_STATUS_BATCH_SIZE,
+    botoConfig,
+    list_workspaces_for_directory,
+)
+
+logger = Logger(service="run_planner")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Maximum number of workspaces returned by a describe_workspaces call
+DESCRIBE_WORKSPACES_PAGE_SIZE = 25
+
+WORKSPACES_API = "workspaces"
+CLOUDWATCH_API = "cloudwatch"
+DYNAMODB_API = "dynamodb"
+S3_API = "s3"
+
+# The service of each estimated operation
+OPERATION_APIS = {
+    "DescribeWorkspaceDirectories": WORKSPACES_API,
+    "DescribeWorkspaces": WORKSPACES_API,
+    "DescribeWorkspacesConnectionStatus": WORKSPACES_API,
+    "DescribeTags": WORKSPACES_API,
+    "GetMetricData": CLOUDWATCH_API,
+    "DynamoDBGetItem": DYNAMODB_API,
+    "DynamoDBPutItem": DYNAMODB_API,
+    "DynamoDBBatchWriteItem": DYNAMODB_API,
+    "S3PutObject": S3_API,
+}
+
+# Seconds per call assumed when a service is not called by the planner
+DEFAULT_API_LATENCY_SECONDS = {
+    WORKSPACES_API: 0.2,
+    CLOUDWATCH_API: 0.4,
+    DYNAMODB_API: 0.02,
+    S3_API: 0.1,
+}
+
+# User sessions assumed per actionable workspace, about one per day between daily runs
+DEFAULT_SESSIONS_PER_WORKSPACE = 1.0
+
+
+def list_directory(target: DirectoryTarget) -> dict[str, any]:
+    """
+    This method lists the workspaces of a directory and measures the latency of the calls
+    :return: the plan of the directory
+    """
+    started = time.monotonic()
+    workspaces = list_workspaces_for_directory(
+        client_factory.get_client(
+            target.session, WORKSPACES_API, target.region, botoConfig
+        ),
+        target.directory.get("DirectoryId"),
+    )
+    listing_seconds = time.monotonic() - started
+    return {
+        "account_id": target.account_id,
+        "region": target.region,
+        "directory_id": target.directory.get("DirectoryId"),
+        "workspaces": len(workspaces),
+        "actionable_workspaces": sum(
+            1
+            for workspace in workspaces
+            if workspace_utils.is_actionable_workspace(workspace)
+        ),
+        "listing_calls": max(
+            1, math.ceil(len(workspaces) / DESCRIBE_WORKSPACES_PAGE_SIZE)
+        ),
+        "listing_seconds": round(listing_seconds, 3),
+    }
+
+
+def list_directories(
+    targets: list[DirectoryTarget], max_workers: Union[int, None] = None
+) -> list[dict[str, any]]:
+    """This method counts the workspaces of the directories concurrently."""
+    max_workers = max_workers or int(os.getenv("MaxConcurrentDiscovery", "16"))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(list_directory, targets))
+
+
+def get_metric_data_calls_per_workspace(date_time_values: dict[str, any]) -> int:
+    """
+    This method returns the get_metric_data calls of a workspace without a previous report,
+    which queries every metric from the start of the month
+    """
+    start_time = datetime.datetime.strptime(
+        date_time_values.get("start_time_for_current_month"), TIME_FORMAT
+    )
+    end_time = datetime.datetime.strptime(
+        date_time_values.get("end_time_for_current_month"), TIME_FORMAT
+    )
+    data_points = (
+        len(METRIC_LIST)
+        * max(0, (end_time - start_time).total_seconds())
+        / METRIC_PERIOD_SECONDS
+    )
+    return max(1, math.ceil(data_points / METRIC_DATA_PAGE_SIZE))
+
+
+def estimate_api_calls(
+    directory_plans: list[dict[str, any]],
+    pair_count: int,
+    metric_data_calls_per_workspace: int,
+    sessions_per_workspace: float = DEFAULT_SESSIONS_PER_WORKSPACE,
+) -> dict[str, int]:
+    """
+    This method estimates the calls of a run. The estimates are upper bounds, workspaces
+    without a user connection since the last run do not query CloudWatch and workspaces
+    without user sessions do not write any.
+    :param directory_plans: the plans returned by list_directory
+    :param pair_count: the number of account and region pairs
+    :param metric_data_calls_per_workspace: the get_metric_data calls of a workspace
+    :param sessions_per_workspace: the user sessions expected per actionable workspace
+    :return: the number of calls of each operation
+    """
+    workspaces = sum(plan["workspaces"] for plan in directory_plans)
+    actionable_workspaces = sum(
+        plan["actionable_workspaces"] for plan in directory_plans
+    )
+    # The background writer fills batches across workspaces, the inline writes batch
+    # the sessions of each workspace on their own
+    if is_background_writes_enabled():
+        session_batches = math.ceil(
+            actionable_workspaces * sessions_per_workspace / BATCH_SIZE
+        )
+    else:
+        session_batches = actionable_workspaces * math.ceil(
+            sessions_per_workspace / BATCH_SIZE
+        )
+    return {
+        "DescribeWorkspaceDirectories": pair_count,
+        "DescribeWorkspaces": sum(plan["listing_calls"] for plan in directory_plans),
+        "DescribeWorkspacesConnectionStatus": sum(
+            math.ceil(plan["actionable_workspaces"] / CONNECTION_STATUS_BATCH_SIZE)
+            for plan in directory_plans
+        ),
+        "DescribeTags": actionable_workspaces,
+        "GetMetricData": actionable_workspaces * metric_data_calls_per_workspace,
+        "DynamoDBGetItem": workspaces,
+        "DynamoDBPutItem": actionable_workspaces,
+        "DynamoDBBatchWriteItem": session_batches,
+        # One report per directory and the aggregated report
+        "S3PutObject": len(directory_plans) + 1,
+    }
+
+
+def get_sessions_per_workspace() -> float:
+    """This method returns the user sessions expected per actionable workspace."""
+    value = os.getenv("PlanSessionsPerWorkspace")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            logger.warning(f"Invalid value for PlanSessionsPerWorkspace: {value}")
+    return DEFAULT_SESSIONS_PER_WORKSPACE
+
+
+def get_api_latencies(observed: dict[str, float]) -> dict[str, float]:
+    """
+    This method returns the seconds per call of each service. PlanApiLatencies overrides
+    the latencies observed while planning, which override the defaults.
+    """
+    latencies = {**DEFAULT_API_LATENCY_SECONDS, **observed}
+    overrides = os.getenv("PlanApiLatencies")
+    if overrides:
+        try:
+            latencies.update(
+                {api: float(seconds) for api, seconds in json.loads(overrides).items()}
+            )
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid value for PlanApiLatencies: {overrides}: {e}")
+    return latencies
+
+
+def get_plan_concurrency(account_count: int, directory_count: int) -> dict[str, int]:
+    """
+    This method returns the calls in flight per service with the configured engine. The
+    default engine processes the accounts, or the work items with the LargestFirst
+    scheduler, in parallel with one call at a time each.
+    """
+    if os.getenv("WorkScheduler", "Account") == "LargestFirst":
+        workers = min(
+            int(os.getenv("MaxConcurrentWorkItems", "16")), max(1, directory_count)
+        )
+    else:
+        workers = min(
+            int(os.getenv("MaxConcurrentAccounts", "4")), max(1, account_count)
+        )
+    processing_engine = os.getenv("ProcessingEngine", "Threads")
+    if processing_engine == "Asyncio":
+        api_concurrency = get_api_concurrency()
+        return {
+            api: workers * api_concurrency.get(api, 1)
+            for api in DEFAULT_API_LATENCY_SECONDS
+        }
+    if processing_engine == "Pipeline":
+        stage_concurrency = get_stage_settings(
+            "PipelineStageConcurrency", DEFAULT_STAGE_CONCURRENCY
+        )
+        return {
+            WORKSPACES_API: workers * int(stage_concurrency[PREFETCH_STAGE]),
+            CLOUDWATCH_API: workers * int(stage_concurrency[METRICS_STAGE]),
+            DYNAMODB_API: workers * int(stage_concurrency[PERSIST_STAGE]),
+            S3_API: workers,
+        }
+    return {api: workers for api in DEFAULT_API_LATENCY_SECONDS}
+
+
+def estimate_runtime(
+    api_calls: dict[str, int],
+    latencies: dict[str, float],
+    concurrency: dict[str, int],
+    overlapping: bool,
+) -> tuple[dict[str, float], float]:
+    """
+    This method estimates the time spent calling each service
+    :param overlapping: whether the calls to different services run at the same time, as
+        in the asyncio and pipeline engines
+    :return: the seconds of each service and of the run
+    """
+    api_seconds = {api: 0.0 for api in DEFAULT_API_LATENCY_SECONDS}
+    for operation, calls in api_calls.items():
+        api = OPERATION_APIS[operation]
+        api_seconds[api] += calls * latencies[api] / max(1, concurrency[api])
+    api_seconds = {api: round(seconds, 1) for api, seconds in api_seconds.items()}
+    if overlapping:
+        return api_seconds, max(api_seconds.values())
+    return api_seconds, round(sum(api_seconds.values()), 1)
+
+
+def build_plan(
+    targets: list[DirectoryTarget],
+    account_ids: list[str],
+    regions: list[str],
+    date_time_values: dict[str, any],
+    budget_seconds: Union[float, None] = None,
+) -> dict[str, any]:
+    """
+    This method builds the plan of a run with listing calls only, nothing is modified
+    :param targets: the directories found by the discovery
+    :param account_ids: the accounts to process
+    :param regions: the regions to process
+    :param date_time_values: dictionary of the date strings for the run
+    :param budget_seconds: the time budget of the run, if any
+    :return: the plan as a JSON serializable dictionary
+    """
+    directory_plans = list_directories(targets)
+    listing_calls = sum(plan["listing_calls"] for plan in directory_plans)
+    observed = {}
+    if listing_calls:
+        observed[WORKSPACES_API] = round(
+            sum(plan["listing_seconds"] for plan in directory_plans) / listing_calls,
+            3,
+        )
+    api_calls = estimate_api_calls(
+        directory_plans,
+        len(account_ids) * len(regions),
+        get_metric_data_calls_per_workspace(date_time_values),
+        get_sessions_per_workspace(),
+    )
+    latencies = get_api_latencies(observed)
+    concurrency = get_plan_concurrency(len(account_ids), len(directory_plans))
+    processing_engine = os.getenv("ProcessingEngine", "Threads")
+    api_seconds, runtime_seconds = estimate_runtime(
+        api_calls,
+        latencies,
+        concurrency,
+        overlapping=processing_engine in ("Asyncio", "Pipeline"),
+    )
+    plan = {
+        "processing_engine": processing_engine,
+        "accounts": len(account_ids),
+        "regions": sorted(regions),
+        "directories": directory_plans,
+        "totals": {
+            "directories": len(directory_plans),
+            "workspaces": sum(plan["workspaces"] for plan in directory_plans),
+            "actionable_workspaces": sum(
+                plan["actionable_workspaces"] for plan in directory_plans
+            ),
+        },
+        "api_calls": api_calls,
+        "api_latency_seconds": latencies,
+        "api_concurrency": concurrency,
+        "api_seconds": api_seconds,
+        "estimated_runtime_seconds": runtime_seconds,
+        "budget_seconds": budget_seconds,
+        "fits_budget": (
+            None if budget_seconds is None else runtime_seconds <= budget_seconds
+        ),
+    }
+    logger.info(
+        f"Planned {plan['totals']['workspaces']} workspaces in "
+        f"{len(directory_plans)} directories, estimated runtime {runtime_seconds} seconds"
+    )
+    return plan
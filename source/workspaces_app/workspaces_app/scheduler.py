@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import calendar
+import datetime
+import os
+import threading
+import time
+from typing import Callable, Iterable, TypeVar, Union
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .ddb_codec import decode_value
+from .workspace_record import WorkspaceDescription, WorkspaceRecord
+from .workspaces_helper import ALWAYS_ON, AUTO_STOP
+
+logger = Logger(service="scheduler")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+# ALWAYS_ON workspaces are only converted at the end of the month
+PRIORITY_END_OF_MONTH = 0
+# AUTO_STOP workspaces which may cross their usage threshold
+PRIORITY_NEAR_THRESHOLD = 1
+PRIORITY_OTHER = 2
+
+NEAR_THRESHOLD_RATIO = 0.8
+# Time assumed per workspace until the first workspaces are processed
+DEFAULT_SECONDS_PER_WORKSPACE = 1.0
+
+T = TypeVar("T")
+
+
+def is_end_of_month(
+    stack_parameters: dict[str, any], date_time_values: Union[dict[str, any], None]
+) -> bool:
+    """
+    This method returns whether ALWAYS_ON workspaces are evaluated for conversion in this
+    run, on the last day of the month or when TestEndOfMonth is set, as WorkspacesHelper does
+    """
+    return bool(
+        (date_time_values or {}).get("current_month_last_day")
+        or stack_parameters.get("TestEndOfMonth") == "Yes"
+    )
+
+
+def get_priority(
+    ws_record: Union[WorkspaceRecord, WorkspaceDescription], end_of_month: bool
+) -> int:
+    """
+    This method ranks a workspace by the value of processing it in this run
+    :param ws_record: the stored record or the description if there is no stored record
+    :param end_of_month: whether ALWAYS_ON workspaces are evaluated for conversion
+    :return: the priority, lower values are processed first
+    """
+    description = (
+        ws_record
+        if isinstance(ws_record, WorkspaceDescription)
+        else ws_record.description
+    )
+    return rank_workspace(
+        description.initial_mode,
+        description.usage_threshold,
+        (
+            ws_record.billing_data.billable_hours
+            if isinstance(ws_record, WorkspaceRecord)
+            else None
+        ),
+        end_of_month,
+    )
+
+
+def rank_workspace(
+    initial_mode: str,
+    usage_threshold: Union[int, None],
+    billable_hours: Union[int, None],
+    end_of_month: bool,
+) -> int:
+    """
+    This method ranks a workspace from its running mode, its usage threshold and the
+    billable hours of its stored record, None when it has no stored record
+    """
+    if end_of_month and initial_mode == ALWAYS_ON:
+        return PRIORITY_END_OF_MONTH
+    if (
+        initial_mode == AUTO_STOP
+        and usage_threshold
+        and billable_hours is not None
+        and billable_hours >= NEAR_THRESHOLD_RATIO * float(usage_threshold)
+    ):
+        return PRIORITY_NEAR_THRESHOLD
+    return PRIORITY_OTHER
+
+
+# Attributes of the usage table items read to plan the priorities of a run
+PLAN_ATTRIBUTES = [
+    "Account",
+    "Region",
+    "InitialMode",
+    "UsageThreshold",
+    "BillableHours",
+    "WorkspaceTerminated",
+]
+
+
+def get_stored_priority_counts(
+    ddb_items: Iterable[dict[str, any]],
+    end_of_month: bool,
+    account_ids: Iterable[str],
+    regions: Iterable[str],
+) -> dict[int, int]:
+    """
+    This method counts the workspaces of each priority from the records stored by the
+    previous runs, for the accounts and regions of this run
+    :param ddb_items: the usage table items with the PLAN_ATTRIBUTES
+    :param end_of_month: whether ALWAYS_ON workspaces are evaluated for conversion
+    :return: the number of workspaces by priority
+    """
+    account_ids = set(account_ids)
+    regions = set(regions)
+    priority_counts: dict[int, int] = {}
+    for ddb_item in ddb_items:
+        item = {key: decode_value(value) for key, value in ddb_item.items()}
+        if (
+            item.get("Account") not in account_ids
+            or item.get("Region") not in regions
+            or item.get("WorkspaceTerminated")
+        ):
+            continue
+        priority = rank_workspace(
+            item.get("InitialMode"),
+            item.get("UsageThreshold"),
+            item.get("BillableHours"),
+            end_of_month,
+        )
+        priority_counts[priority] = priority_counts.get(priority, 0) + 1
+    return priority_counts
+
+
+class RunScheduler:
+    """
+    Orders the workspaces of a directory by priority and defers low priority workspaces
+    when the time budget of the run would otherwise not cover the work with a higher
+    priority. The time per workspace is measured from the throughput of the run, so it
+    accounts for the accounts processed in parallel. The workspaces planned for the whole
+    run are reserved for until their directory is scheduled, so high priority workspaces
+    of the directories processed last are covered too.
+    """
+
+    def __init__(
+        self,
+        budget_seconds: Union[float, None] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._budget_seconds = budget_seconds
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self._first_scheduled: Union[float, None] = None
+        self._pending: dict[int, int] = {}
+        self._unscheduled: dict[int, int] = {}
+        self._processed = 0
+        self.deferred: list[str] = []
+
+    @property
+    def has_budget(self) -> bool:
+        return self._budget_seconds is not None
+
+    def remaining_seconds(self) -> float:
+        if self._budget_seconds is None:
+            return float("inf")
+        return self._budget_seconds - (self._clock() - self._started)
+
+    def seconds_per_workspace(self) -> float:
+        with self._lock:
+            if not self._processed or self._first_scheduled is None:
+                return DEFAULT_SECONDS_PER_WORKSPACE
+            return (self._clock() - self._first_scheduled) / self._processed
+
+    def plan(self, priority_counts: dict[int, int]) -> None:
+        """
+        This method registers the workspaces expected in the run before their directories
+        are listed
+        :param priority_counts: the number of workspaces by priority
+        """
+        with self._lock:
+            self._unscheduled = dict(priority_counts)
+        logger.info(f"Planned workspaces by priority: {priority_counts}")
+
+    def schedule(
+        self, items: list[T], priority_of: Callable[[T], int]
+    ) -> list[tuple[int, T]]:
+        """
+        This method registers the items as pending work. With a budget the items are
+        ordered by priority, otherwise they keep their order.
+        :param items: the work of a directory
+        :param priority_of: returns the priority of an item
+        :return: the priority and the item, in the order to process them
+        """
+        scheduled = [(priority_of(item), item) for item in items]
+        if self.has_budget:
+            scheduled.sort(key=lambda entry: entry[0])
+        with self._lock:
+            if self._first_scheduled is None:
+                self._first_scheduled = self._clock()
+            for priority, _ in scheduled:
+                self._pending[priority] = self._pending.get(priority, 0) + 1
+                if self._unscheduled.get(priority):
+                    self._unscheduled[priority] -= 1
+        return scheduled
+
+    def should_defer(self, priority: int) -> bool:
+        """
+        This method returns True when the remaining budget is needed for the pending work
+        with a higher priority. End of month conversion candidates are never deferred.
+        """
+        if not self.has_budget or priority == PRIORITY_END_OF_MONTH:
+            return False
+        seconds_per_workspace = self.seconds_per_workspace()
+        with self._lock:
+            higher_priority_count = sum(
+                count
+                for counts in (self._pending, self._unscheduled)
+                for pending, count in counts.items()
+                if pending < priority
+            )
+        reserve_seconds = higher_priority_count * seconds_per_workspace
+        return self.remaining_seconds() - reserve_seconds < seconds_per_workspace
+
+    def complete(self, priority: int) -> None:
+        with self._lock:
+            self._pending[priority] = self._pending.get(priority, 0) - 1
+            self._processed += 1
+
+    def defer(self, priority: int, workspace_id: str) -> None:
+        with self._lock:
+            self._pending[priority] = self._pending.get(priority, 0) - 1
+            self.deferred.append(workspace_id)
+
+    def log_summary(self) -> None:
+        if self.deferred:
+            logger.warning(
+                f"Deferred {len(self.deferred)} workspaces to a follow-up run "
+                f"after processing {self._processed} workspaces"
+            )
+
+
+def get_budget_seconds(
+    stack_parameters: dict[str, any],
+    now: Union[datetime.datetime, None] = None,
+) -> Union[float, None]:
+    """
+    This method returns the time budget of the run from RunTimeBudgetMinutes. On the last
+    day of the month the budget ends at midnight UTC, when the month is billed.
+    :return: the budget in seconds or None when the run has no budget
+    """
+    budget_seconds = None
+    budget_minutes = os.getenv("RunTimeBudgetMinutes")
+    if budget_minutes:
+        budget_seconds = float(budget_minutes) * 60
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    last_day = calendar.monthrange(now.year, now.month)[1]
+    if stack_parameters.get("TestEndOfMonth") == "Yes" and now.day == last_day:
+        midnight = datetime.datetime.combine(
+            now.date() + datetime.timedelta(days=1),
+            datetime.time(),
+            tzinfo=datetime.timezone.utc,
+        )
+        seconds_to_midnight = (midnight - now).total_seconds()
+        if budget_seconds is None or seconds_to_midnight < budget_seconds:
+            budget_seconds = seconds_to_midnight
+    return budget_seconds
+
+
+_run_scheduler: Union[RunScheduler, None] = None
+_run_scheduler_lock = threading.Lock()
+
+
+def start_run_scheduler(stack_parameters: dict[str, any]) -> RunScheduler:
+    """This method starts the budget of the run, it is shared by every directory."""
+    global _run_scheduler
+    budget_seconds = get_budget_seconds(stack_parameters)
+    if budget_seconds is not None:
+        logger.info(f"Run time budget is {round(budget_seconds / 60, 2)} minutes")
+    with _run_scheduler_lock:
+        _run_scheduler = RunScheduler(budget_seconds)
+        return _run_scheduler
+
+
+def get_run_scheduler() -> RunScheduler:
+    global _run_scheduler
+    with _run_scheduler_lock:
+        if _run_scheduler is None:
+            _run_scheduler = RunScheduler()
+        return _run_scheduler
+
+
+def clear() -> None:
+    global _run_scheduler
+    with _run_scheduler_lock:
+        _run_scheduler = None
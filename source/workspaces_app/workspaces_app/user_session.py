@@ -4,17 +4,23 @@
 # SPDX-License-Identifier: Apache-2.0
 
 # Standard Library
+import calendar
 import logging
 import os
 import re
+import struct
 from dataclasses import asdict, dataclass, field, fields
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Optional
+from operator import attrgetter
+from typing import Optional, Union
 
 # AWS Libraries
 import botocore
-from boto3.dynamodb.types import TypeSerializer
+from boto3.dynamodb.types import Binary
+
+# Cost Optimizer for Amazon Workspaces
+from .ddb_codec import DdbCodec, encode_value
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +30,70 @@ botoConfig = botocore.config.Config(
     user_agent_extra=os.getenv("UserAgentString"),
 )
 
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# The active sessions are the samples of the 5 minutes UserConnected metric
+ACTIVE_SESSION_SLOT_SECONDS = 300
+ACTIVE_SESSION_SLOT = timedelta(seconds=ACTIVE_SESSION_SLOT_SECONDS)
+ACTIVE_SESSIONS_ATTR = "ActiveSessions"
+ACTIVE_SESSIONS_VERSION = 1
+# version, epoch seconds of the first sample and seconds between the samples
+ACTIVE_SESSIONS_HEADER = struct.Struct(">BIH")
+
+
+def get_epoch_seconds(timestamp: datetime) -> int:
+    """This method returns the epoch seconds of a timestamp, naive timestamps are UTC."""
+    return calendar.timegm(timestamp.utctimetuple())
+
+
+def encode_active_sessions(active_sessions: list[datetime]) -> Union[bytes, None]:
+    """
+    This method encodes the timestamps of a session as the epoch of its first sample
+    followed by a bitmap of the connected 5 minutes slots
+    :param active_sessions: the sorted timestamps of the connected samples
+    :return: the encoded timestamps, None if they are not aligned on the slots
+    """
+    start_time = active_sessions[0]
+    if start_time.microsecond:
+        return None
+    bits = 0
+    for timestamp in active_sessions:
+        slot, remainder = divmod(timestamp - start_time, ACTIVE_SESSION_SLOT)
+        if remainder or slot < 0:
+            return None
+        bits |= 1 << slot
+    # Slot n is bit n % 8 of byte n // 8
+    bitmap = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return (
+        ACTIVE_SESSIONS_HEADER.pack(
+            ACTIVE_SESSIONS_VERSION,
+            get_epoch_seconds(start_time),
+            ACTIVE_SESSION_SLOT_SECONDS,
+        )
+        + bitmap
+    )
+
+
+def decode_active_sessions(data: bytes) -> list[datetime]:
+    """
+    This method decodes the timestamps encoded by encode_active_sessions
+    :param data: the encoded timestamps
+    :return: the UTC timestamps of the connected samples
+    """
+    version, start, slot_seconds = ACTIVE_SESSIONS_HEADER.unpack_from(data)
+    if version != ACTIVE_SESSIONS_VERSION:
+        raise ValueError(f"Unknown version {version} of the active sessions")
+    start_time = datetime.fromtimestamp(start, tz=timezone.utc)
+    bitmap = data[ACTIVE_SESSIONS_HEADER.size :]
+    return [
+        start_time + timedelta(seconds=slot * slot_seconds)
+        for slot in range(len(bitmap) * 8)
+        if bitmap[slot // 8] & (1 << (slot % 8))
+    ]
+
+
+def is_compact_active_sessions_enabled() -> bool:
+    return os.getenv("CompactActiveSessions", "Yes") == "Yes"
+
 
 @dataclass(frozen=True)
 class UserSession:
@@ -43,7 +113,6 @@ class UserSession:
     udp_packet_loss_rate: Optional[Decimal] = None
 
     def __post_init__(self):
-        TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
         start = self.active_sessions[0].strftime(TIME_FORMAT)
         end = self.active_sessions[-1].strftime(TIME_FORMAT)
         object.__setattr__(self, "session_time", start + " - " + end)
@@ -65,22 +134,45 @@ class UserSession:
     def to_ddb_obj(self) -> dict[str, any]:
         """
         This method creates DynamoDB serialized dictionary from a UserSession rd for
-        use with DynamoDB write calls.
+        use with DynamoDB write calls. The active sessions are stored as a binary bitmap,
+        or as a list of timestamps when CompactActiveSessions is No.
         :return: a dictionary serialized as a DynamoDB item
         """
-        serializer = TypeSerializer()
-        class_as_json = asdict(self)
-        TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
-        class_as_json["active_sessions"] = [
-            time.strftime(TIME_FORMAT) if class_as_json["active_sessions"] else None
-            for time in class_as_json["active_sessions"]
-        ]
-        ddb_obj = {
-            self.class_field_to_ddb_attr(key): serializer.serialize(value)
-            for key, value in class_as_json.items()
-        }
+        ddb_obj = _ddb_codec.encode(self)
+        active_sessions = (
+            encode_active_sessions(self.active_sessions)
+            if is_compact_active_sessions_enabled()
+            else None
+        )
+        ddb_obj[ACTIVE_SESSIONS_ATTR] = encode_value(
+            active_sessions
+            or [time.strftime(TIME_FORMAT) for time in self.active_sessions]
+        )
         return ddb_obj
 
+    @classmethod
+    def from_ddb_obj(cls, ddb_obj: dict[str, any]) -> "UserSession":
+        """
+        This method creates a UserSession from a DynamoDB item, with the active sessions
+        stored either as a binary bitmap or as a list of timestamps
+        :param ddb_obj: a DynamoDB item of the user session table
+        :return: a UserSession
+        """
+        class_as_json = _ddb_codec.decode(ddb_obj)
+        del class_as_json["session_time"]
+        class_as_json["duration_hours"] = int(class_as_json["duration_hours"])
+        active_sessions = class_as_json["active_sessions"]
+        if isinstance(active_sessions, Binary):
+            class_as_json["active_sessions"] = decode_active_sessions(
+                active_sessions.value
+            )
+        else:
+            class_as_json["active_sessions"] = [
+                datetime.strptime(time, TIME_FORMAT).replace(tzinfo=timezone.utc)
+                for time in active_sessions
+            ]
+        return cls.from_json(class_as_json)
+
     @staticmethod
     def class_field_to_ddb_attr(field_name: str) -> str:
         """
@@ -108,3 +200,14 @@ class UserSession:
         class_field = re.sub(r"[a-z](?=[A-Z])|[A-Z](?=[A-Z][a-z])", r"\g<0>_", ddb_attr)
 
         return class_field.lower()
+
+
+_ddb_codec = DdbCodec(
+    [
+        (session_field.name, attrgetter(session_field.name))
+        for session_field in fields(UserSession)
+        if session_field.name != "active_sessions"
+    ],
+    UserSession.class_field_to_ddb_attr,
+    UserSession.ddb_attr_to_class_field,
+)
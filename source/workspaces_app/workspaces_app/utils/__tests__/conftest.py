@@ -9,6 +9,9 @@ import os
 # Third Party Libraries
 import pytest
 
+# Cost Optimizer for Amazon Workspaces
+from .. import client_factory, session_writer
+
 
 @pytest.fixture(scope="module", autouse=True)
 def aws_credentials():
@@ -19,3 +22,16 @@ def aws_credentials():
     os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
     os.environ["SOLUTION_ID"] = "SOTestID"
     os.environ["AWS_ACCOUNT"] = "123456789012"
+
+
+@pytest.fixture(autouse=True)
+def clear_client_factory():
+    client_factory.clear()
+    yield
+    client_factory.clear()
+
+
+@pytest.fixture(autouse=True)
+def shutdown_session_writers():
+    yield
+    session_writer.shutdown_session_writers()
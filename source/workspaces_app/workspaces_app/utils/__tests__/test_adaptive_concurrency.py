@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import threading
+from unittest.mock import Mock
+
+# Cost Optimizer for Amazon Workspaces
+from .. import client_factory
+from ..adaptive_concurrency import AimdController, is_throttling
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_controller_decreases_on_throttling():
+    clock = FakeClock()
+    controller = AimdController(16, minimum=2, clock=clock)
+
+    controller.on_throttle("cloudwatch:GetMetricData")
+    assert controller.limit == 8
+    # Throttling of the calls in flight during the cooldown does not decrease the limit
+    controller.on_throttle("cloudwatch:GetMetricData")
+    assert controller.limit == 8
+
+    for _ in range(3):
+        clock.now += 10
+        controller.on_throttle("workspaces:DescribeTags")
+
+    assert controller.limit == 2
+    assert controller.get_metrics() == {
+        "concurrency_limit": 2,
+        "min_concurrency_limit": 2,
+        "throttles": {"cloudwatch:GetMetricData": 2, "workspaces:DescribeTags": 3},
+        "retries": {},
+    }
+
+
+def test_controller_increases_per_completed_work_item():
+    controller = AimdController(4, clock=FakeClock())
+    controller.on_throttle("workspaces:DescribeTags")
+    assert controller.limit == 2
+
+    # The calls of a work item do not grow the limit
+    for _ in range(10):
+        controller.on_success("workspaces:DescribeTags", retries=1)
+    assert controller.limit == 2
+    for _ in range(2):
+        with controller.slot():
+            pass
+    assert controller.limit == 3
+    for _ in range(3):
+        with controller.slot():
+            pass
+    assert controller.limit == 4
+    for _ in range(8):
+        with controller.slot():
+            pass
+
+    metrics = controller.get_metrics()
+    assert metrics["concurrency_limit"] == 4
+    assert metrics["min_concurrency_limit"] == 2
+    assert metrics["retries"] == {"workspaces:DescribeTags": 10}
+
+
+def test_slot_waits_for_the_limit():
+    controller = AimdController(2, clock=FakeClock())
+    controller.on_throttle("workspaces:DescribeTags")
+    assert controller.limit == 1
+    acquired = threading.Event()
+
+    def process_work_item():
+        with controller.slot():
+            acquired.set()
+
+    with controller.slot():
+        thread = threading.Thread(target=process_work_item)
+        thread.start()
+        assert not acquired.wait(0.05)
+    thread.join(5)
+    assert acquired.is_set()
+
+
+def test_is_throttling():
+    assert is_throttling({"Error": {"Code": "ThrottlingException"}})
+    assert is_throttling({"Error": {"Code": "RequestLimitExceeded"}})
+    assert not is_throttling({"Error": {"Code": "AccessDeniedException"}})
+    assert not is_throttling({"TagList": []})
+
+
+def test_client_reports_throttling_and_success():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "workspaces", "us-east-1")
+    controller = client_factory.get_concurrency_controller()
+    operation = client.meta.service_model.operation_model("DescribeTags")
+
+    client.meta.events.emit(
+        "needs-retry.workspaces.DescribeTags",
+        response=(Mock(status_code=400), {"Error": {"Code": "ThrottlingException"}}),
+        endpoint=None,
+        operation=operation,
+        attempts=1,
+        caught_exception=None,
+        request_dict={"context": {}},
+    )
+    client.meta.events.emit(
+        "after-call.workspaces.DescribeTags",
+        http_response=Mock(status_code=200),
+        parsed={"ResponseMetadata": {"RetryAttempts": 1}},
+        model=operation,
+        context={},
+    )
+
+    assert controller.throttles == {"workspaces:DescribeTags": 1}
+    assert controller.retries == {"workspaces:DescribeTags": 1}
+    assert controller.limit == 8
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+from unittest.mock import patch
+
+# Cost Optimizer for Amazon Workspaces
+from ..api_rate_limiter import ApiRateLimiter, TokenBucket, get_api_rate_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_allows_bursts_then_spaces_calls():
+    clock = FakeClock()
+    bucket = TokenBucket(2, capacity=2, clock=clock, sleep=clock.sleep)
+
+    for _ in range(4):
+        bucket.acquire()
+
+    assert clock.sleeps == [0.5, 0.5]
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(2, capacity=2, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 10
+
+    bucket.acquire()
+    bucket.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_api_rate_limiter_buckets():
+    rate_limiter = ApiRateLimiter(
+        {"workspaces": 10, "workspaces:DescribeWorkspaces": 5, "cloudwatch": 0}
+    )
+    bucket = rate_limiter.get_bucket(
+        "account", "us-east-1", "workspaces", "DescribeWorkspaces"
+    )
+
+    assert bucket is rate_limiter.get_bucket(
+        "account", "us-east-1", "workspaces", "DescribeWorkspaces"
+    )
+    assert bucket is not rate_limiter.get_bucket(
+        "account", "us-west-2", "workspaces", "DescribeWorkspaces"
+    )
+    assert bucket is not rate_limiter.get_bucket(
+        "other-account", "us-east-1", "workspaces", "DescribeWorkspaces"
+    )
+    assert rate_limiter.get_rate_limit("workspaces", "DescribeWorkspaces") == 5
+    assert rate_limiter.get_rate_limit("workspaces", "DescribeTags") == 10
+    assert (
+        rate_limiter.get_bucket("account", "us-east-1", "cloudwatch", "GetMetricData")
+        is None
+    )
+    assert rate_limiter.get_bucket("account", "us-east-1", "s3", "PutObject") is None
+
+
+def test_get_api_rate_limits():
+    with patch.dict(
+        os.environ, {"ApiRateLimits": '{"cloudwatch:GetMetricData": 25, "s3": 100}'}
+    ):
+        rate_limits = get_api_rate_limits()
+    assert rate_limits["cloudwatch:GetMetricData"] == 25
+    assert rate_limits["s3"] == 100
+    assert rate_limits["workspaces"] == 10
+
+    with patch.dict(os.environ, {"ApiRateLimits": "[1]"}):
+        assert get_api_rate_limits()["cloudwatch:GetMetricData"] == 50
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+from unittest.mock import Mock
+
+# Third Party Libraries
+import pytest
+
+# AWS Libraries
+from botocore.exceptions import ClientError
+
+# Cost Optimizer for Amazon Workspaces
+from .. import client_factory
+from ..circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def breaker(clock):
+    return CircuitBreaker(
+        failure_rate=0.5,
+        minimum_calls=4,
+        window_seconds=60,
+        open_seconds=30,
+        clock=clock,
+    )
+
+
+def test_breaker_opens_on_failure_rate():
+    clock = FakeClock()
+    circuit_breaker = breaker(clock)
+    for failed in [False, True, False]:
+        circuit_breaker.record(failed)
+    assert circuit_breaker.state == CLOSED
+
+    circuit_breaker.record(True)
+
+    assert circuit_breaker.state == OPEN
+    assert circuit_breaker.trips == 1
+    assert not circuit_breaker.allow()
+    assert circuit_breaker.rejected_calls == 1
+
+
+def test_breaker_ignores_failures_outside_the_window():
+    clock = FakeClock()
+    circuit_breaker = breaker(clock)
+    for _ in range(3):
+        circuit_breaker.record(True)
+    clock.now += 61
+    for _ in range(3):
+        circuit_breaker.record(False)
+
+    assert circuit_breaker.state == CLOSED
+
+
+def test_breaker_probes_after_the_open_period():
+    clock = FakeClock()
+    circuit_breaker = breaker(clock)
+    for _ in range(4):
+        circuit_breaker.record(True)
+    clock.now += 30
+
+    assert circuit_breaker.allow()
+    assert circuit_breaker.state == HALF_OPEN
+    # A single call probes the API
+    assert not circuit_breaker.allow()
+    circuit_breaker.record(True)
+    assert circuit_breaker.state == OPEN
+    assert circuit_breaker.trips == 2
+
+    clock.now += 30
+    assert circuit_breaker.allow()
+    circuit_breaker.record(False)
+    assert circuit_breaker.state == CLOSED
+    assert circuit_breaker.allow()
+
+
+def test_circuit_breakers_wait_for_retry():
+    clock = FakeClock()
+    circuit_breakers = CircuitBreakers(lambda: breaker(clock), sleep=clock.sleep)
+    cloudwatch_breaker = circuit_breakers.get_breaker(
+        "account", "us-east-1", "cloudwatch"
+    )
+    circuit_breakers.get_breaker("account", "us-west-2", "cloudwatch")
+    circuit_breakers.set_account_id("account", "111111111111")
+    for _ in range(4):
+        cloudwatch_breaker.record(True)
+    cloudwatch_breaker.allow()
+    clock.now += 10
+
+    circuit_breakers.wait_for_retry("account", "us-west-2")
+    assert clock.now == 110
+    circuit_breakers.wait_for_retry("account", "us-east-1")
+    assert clock.now == 130
+
+    assert circuit_breakers.get_rejected_calls("account", "us-east-1") == 1
+    assert circuit_breakers.get_rejected_calls("account", "us-west-2") == 0
+    assert circuit_breakers.get_tripped_breakers() == [
+        {
+            "account": "111111111111",
+            "region": "us-east-1",
+            "service": "cloudwatch",
+            "state": OPEN,
+            "trips": 1,
+            "rejected_calls": 1,
+        }
+    ]
+
+
+def emit_needs_retry(client, status_code=None, caught_exception=None):
+    client.meta.events.emit(
+        "needs-retry.workspaces.DescribeTags",
+        response=None if status_code is None else (Mock(status_code=status_code), {}),
+        endpoint=None,
+        operation=client.meta.service_model.operation_model("DescribeTags"),
+        attempts=1,
+        caught_exception=caught_exception,
+        request_dict={"context": {}},
+    )
+
+
+def test_client_fails_fast_when_the_breaker_is_open():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "workspaces", "us-east-1")
+    circuit_breaker = client_factory.get_circuit_breakers().get_breaker(
+        client_factory.get_credentials_identity(session), "us-east-1", "workspaces"
+    )
+    for _ in range(20):
+        emit_needs_retry(client, 503)
+
+    with pytest.raises(CircuitOpenError) as error:
+        client.describe_tags(ResourceId="ws-1")
+    # Call sites handling failed calls also handle the calls failed fast
+    assert isinstance(error.value, ClientError)
+    assert error.value.response["Error"]["Code"] == "CircuitOpen"
+    assert circuit_breaker.rejected_calls == 1
+
+
+def test_server_errors_of_each_attempt_are_failures():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "workspaces", "us-east-1")
+    circuit_breaker = client_factory.get_circuit_breakers().get_breaker(
+        client_factory.get_credentials_identity(session), "us-east-1", "workspaces"
+    )
+    # The attempts of retried calls are recorded before the retries run out
+    for status_code in [400] * 10 + [503] * 9:
+        emit_needs_retry(client, status_code)
+    assert circuit_breaker.state == CLOSED
+
+    emit_needs_retry(client, 503)
+
+    assert circuit_breaker.state == OPEN
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import datetime
+from unittest.mock import patch
+
+# AWS Libraries
+import boto3
+import botocore
+import botocore.session
+from botocore.credentials import RefreshableCredentials
+
+# Cost Optimizer for Amazon Workspaces
+from .. import client_factory
+
+config = botocore.config.Config(retries={"max_attempts": 20, "mode": "standard"})
+
+
+def refreshable_session():
+    credentials = RefreshableCredentials.create_from_metadata(
+        metadata={
+            "access_key": "spoke-key",
+            "secret_key": "spoke-secret",
+            "token": "spoke-token",
+            "expiry_time": (
+                datetime.datetime.now(datetime.timezone.utc)
+                + datetime.timedelta(hours=1)
+            ).isoformat(),
+        },
+        refresh_using=lambda: None,
+        method="sts-assume-role",
+    )
+    session = botocore.session.get_session()
+    session._credentials = credentials
+    return client_factory.new_session(session)
+
+
+def test_get_default_session_is_reused():
+    assert client_factory.get_default_session() is client_factory.get_default_session()
+
+
+def test_get_client_reuses_client_across_sessions_with_same_credentials():
+    first = client_factory.get_client(
+        boto3.session.Session(), "workspaces", "us-east-1", config
+    )
+    second = client_factory.get_client(
+        boto3.session.Session(), "workspaces", "us-east-1", config
+    )
+    assert first is second
+
+
+def test_get_client_keys_on_service_region_and_config():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "workspaces", "us-east-1", config)
+    assert client is not client_factory.get_client(
+        session, "cloudwatch", "us-east-1", config
+    )
+    assert client is not client_factory.get_client(
+        session, "workspaces", "us-west-2", config
+    )
+    assert client is not client_factory.get_client(session, "workspaces", "us-east-1")
+
+
+def test_get_client_separates_credentials():
+    spoke_session = refreshable_session()
+    default_client = client_factory.get_client(
+        client_factory.get_default_session(), "workspaces", "us-east-1", config
+    )
+    spoke_client = client_factory.get_client(
+        spoke_session, "workspaces", "us-east-1", config
+    )
+    assert default_client is not spoke_client
+    assert spoke_client is client_factory.get_client(
+        spoke_session, "workspaces", "us-east-1", config
+    )
+    assert spoke_client._request_signer._credentials.access_key == "spoke-key"
+
+
+def test_new_session_shares_loader():
+    first = client_factory.new_session()
+    second = client_factory.new_session()
+    assert (
+        first._session.get_component("data_loader")
+        is second._session.get_component("data_loader")
+        is client_factory.get_loader()
+    )
+
+
+def test_clear():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "s3")
+    client_factory.clear()
+    assert client_factory.get_default_session() is not session
+    assert client_factory.get_client(session, "s3") is not client
+
+
+def test_get_client_rate_limits_calls():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "workspaces", "us-east-1", config)
+    rate_limiter = client_factory.get_api_rate_limiter()
+
+    with patch.object(rate_limiter, "acquire") as mock_acquire:
+        client.meta.events.emit(
+            "before-call.workspaces.DescribeTags",
+            model=client.meta.service_model.operation_model("DescribeTags"),
+            params={},
+            request_signer=None,
+            context={},
+        )
+
+    mock_acquire.assert_called_once_with(
+        client_factory.get_credentials_identity(session),
+        "us-east-1",
+        "workspaces",
+        "DescribeTags",
+    )
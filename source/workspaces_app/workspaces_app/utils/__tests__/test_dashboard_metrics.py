@@ -8,8 +8,11 @@ from unittest.mock import MagicMock, patch
 # Third Party Libraries
 import pytest
 
+# AWS Libraries
+from aws_lambda_powertools.metrics import MetricUnit
+
 # Cost Optimizer for Amazon Workspaces
-from workspaces_app.utils.dashboard_metrics import DashboardMetrics
+from workspaces_app.utils.dashboard_metrics import METRIC_NAMESPACE, DashboardMetrics
 
 
 @pytest.fixture
@@ -82,7 +85,8 @@ def test_publish_metrics(mock_metrics, mock_single_metric, dashboard_metrics):
     dashboard_metrics.publish_metrics(60.0, "False", "Yes")
 
     assert mock_single_metric.call_count == 3
-    assert mock_metrics.add_metric.call_count == 6
+    # The 6 metrics and the 2 limits of the adaptive concurrency
+    assert mock_metrics.add_metric.call_count == 8
     assert mock_metrics.flush_metrics.call_count == 1
 
     mock_context_manager.add_dimension.assert_called_with(
@@ -130,3 +134,122 @@ def test_dry_run_termination(dashboard_metrics):
 def test_no_termination(dashboard_metrics):
     dashboard_metrics.publish_metrics(60.0, "False", "No")
     assert dashboard_metrics.termination_metrics == 0
+
+
+@patch("workspaces_app.utils.dashboard_metrics.single_metric")
+@patch("workspaces_app.utils.dashboard_metrics.metrics")
+def test_publish_workspace_state_metrics(
+    mock_metrics, mock_single_metric, dashboard_metrics
+):
+    mock_context_manager = MagicMock()
+    mock_single_metric.return_value.__enter__.return_value = mock_context_manager
+
+    dashboard_metrics.update_workspace_state_metrics("AVAILABLE")
+    dashboard_metrics.update_workspace_state_metrics("AVAILABLE")
+    dashboard_metrics.update_workspace_state_metrics("SUSPENDED")
+    assert dashboard_metrics.workspace_state_metrics == {
+        "AVAILABLE": 2,
+        "SUSPENDED": 1,
+    }
+
+    dashboard_metrics.publish_metrics(60.0, "False", "No")
+
+    assert mock_single_metric.call_count == 4
+    mock_single_metric.assert_any_call(
+        namespace=METRIC_NAMESPACE,
+        name="WorkspacesByState",
+        unit=MetricUnit.Count,
+        value=2,
+    )
+    mock_context_manager.add_dimension.assert_called_with(
+        name="State", value="SUSPENDED"
+    )
+
+
+def test_merge(dashboard_metrics):
+    dashboard_metrics.update_total_workspaces(2)
+    dashboard_metrics.update_workspace_state_metrics("AVAILABLE")
+    other = DashboardMetrics()
+    other.update_total_workspaces(3)
+    other.update_billing_metrics("hourly_billed")
+    other.update_conversion_metrics("monthly_to_hourly")
+    other.update_conversion_metrics("conversion_skips")
+    other.update_termination_metrics()
+    other.update_workspace_state_metrics("AVAILABLE")
+    other.update_workspace_state_metrics("STOPPED")
+
+    dashboard_metrics.merge(other)
+
+    assert dashboard_metrics.total_workspaces == 5
+    assert dashboard_metrics.billing_metrics.hourly_billed == 1
+    assert dashboard_metrics.conversion_metrics.monthly_to_hourly == 1
+    assert dashboard_metrics.conversion_metrics.conversion_skips == 1
+    assert dashboard_metrics.termination_metrics == 1
+    assert dashboard_metrics.workspace_state_metrics == {"AVAILABLE": 2, "STOPPED": 1}
+
+
+def test_concurrency_metrics(dashboard_metrics):
+    dashboard_metrics.update_concurrency_metrics(
+        {
+            "concurrency_limit": 8,
+            "min_concurrency_limit": 4,
+            "throttles": {"cloudwatch:GetMetricData": 2},
+            "retries": {},
+        }
+    )
+    other = DashboardMetrics()
+    other.update_concurrency_metrics(
+        {
+            "concurrency_limit": 16,
+            "min_concurrency_limit": 2,
+            "throttles": {"cloudwatch:GetMetricData": 1},
+            "retries": {"workspaces:DescribeTags": 3},
+        }
+    )
+
+    dashboard_metrics.merge(DashboardMetrics.from_json(other.to_json()))
+
+    assert dashboard_metrics.to_json()["concurrency_metrics"] == {
+        "concurrency_limit": 8,
+        "min_concurrency_limit": 2,
+        "throttles": {"cloudwatch:GetMetricData": 3},
+        "retries": {"workspaces:DescribeTags": 3},
+    }
+
+
+@patch("workspaces_app.utils.dashboard_metrics.single_metric")
+@patch("workspaces_app.utils.dashboard_metrics.metrics")
+def test_publish_concurrency_metrics(
+    mock_metrics, mock_single_metric, dashboard_metrics
+):
+    mock_context_manager = MagicMock()
+    mock_single_metric.return_value.__enter__.return_value = mock_context_manager
+    dashboard_metrics.update_concurrency_metrics(
+        {
+            "concurrency_limit": 8,
+            "min_concurrency_limit": 4,
+            "throttles": {"cloudwatch:GetMetricData": 3},
+            "retries": {"cloudwatch:GetMetricData": 5},
+        }
+    )
+
+    dashboard_metrics.publish_metrics(60.0, "False", "No")
+
+    mock_metrics.add_metric.assert_any_call(
+        name="MinConcurrencyLimit", unit=MetricUnit.Count, value=4
+    )
+    mock_single_metric.assert_any_call(
+        namespace=METRIC_NAMESPACE,
+        name="ThrottledCalls",
+        unit=MetricUnit.Count,
+        value=3,
+    )
+    mock_single_metric.assert_any_call(
+        namespace=METRIC_NAMESPACE,
+        name="RetriedCalls",
+        unit=MetricUnit.Count,
+        value=5,
+    )
+    mock_context_manager.add_dimension.assert_called_with(
+        name="Api", value="cloudwatch:GetMetricData"
+    )
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import threading
+from unittest.mock import Mock
+
+# Third Party Libraries
+import pytest
+
+# AWS Libraries
+import botocore.config
+import botocore.exceptions
+
+# Cost Optimizer for Amazon Workspaces
+from .. import client_factory
+from ..api_timeouts import get_api_timeouts, get_call_budget, with_timeouts
+from ..hedging import CallTimeoutError, HedgedCaller, LatencyTracker
+
+
+def cloudwatch_client(get_metric_data):
+    client = Mock(get_metric_data=get_metric_data)
+    client.meta.service_model.service_name = "cloudwatch"
+    client.meta.method_to_api_mapping = {"get_metric_data": "GetMetricData"}
+    return client
+
+
+def test_latency_tracker_percentiles():
+    latency_tracker = LatencyTracker(max_samples=100)
+    for seconds in range(1, 101):
+        latency_tracker.record("cloudwatch:GetMetricData", seconds / 100)
+
+    assert latency_tracker.get_percentile("cloudwatch:GetMetricData", 50) == 0.51
+    assert latency_tracker.get_percentile("cloudwatch:GetMetricData", 99) == 0.99
+    assert latency_tracker.get_percentile("cloudwatch:GetMetricData", 50, 101) is None
+    assert latency_tracker.get_percentile("workspaces:DescribeWorkspaces", 50) is None
+    assert latency_tracker.get_summary() == {
+        "cloudwatch:GetMetricData": {"p50": 0.51, "p99": 0.99}
+    }
+
+
+def test_hedged_call_uses_the_first_response():
+    first_attempt = threading.Event()
+    responses = iter(["slow", "fast"])
+
+    def get_metric_data(**kwargs):
+        response = next(responses)
+        if response == "slow":
+            first_attempt.wait(5)
+        return {"Response": response}
+
+    hedged_caller = HedgedCaller({}, minimum_samples=1)
+    hedged_caller.latency_tracker.record("cloudwatch:GetMetricData", 0.01)
+
+    response = hedged_caller.call(cloudwatch_client(get_metric_data), "get_metric_data")
+    first_attempt.set()
+
+    assert response == {"Response": "fast"}
+    assert hedged_caller.hedges == {"cloudwatch:GetMetricData": 1}
+
+
+def test_call_without_latencies_is_not_hedged():
+    threads = []
+
+    def get_metric_data(**kwargs):
+        threads.append(threading.current_thread())
+        return {"MetricDataResults": []}
+
+    get_metric_data = Mock(side_effect=get_metric_data)
+    hedged_caller = HedgedCaller({"cloudwatch:GetMetricData": 5})
+
+    response = hedged_caller.call(
+        cloudwatch_client(get_metric_data), "get_metric_data", NextToken="token"
+    )
+
+    assert response == {"MetricDataResults": []}
+    get_metric_data.assert_called_once_with(NextToken="token")
+    assert hedged_caller.hedges == {}
+    # Without a hedge delay the call does not go through the thread pool
+    assert threads == [threading.current_thread()]
+
+
+def test_hedged_call_over_budget_times_out():
+    release = threading.Event()
+    hedged_caller = HedgedCaller({"cloudwatch:GetMetricData": 0.05}, minimum_samples=1)
+    hedged_caller.latency_tracker.record("cloudwatch:GetMetricData", 0.01)
+
+    with pytest.raises(CallTimeoutError) as error:
+        hedged_caller.call(
+            cloudwatch_client(lambda **kwargs: release.wait(5)), "get_metric_data"
+        )
+    release.set()
+    # The callers handle the timeout as any other failed call
+    assert isinstance(error.value, botocore.exceptions.ClientError)
+    assert error.value.response["Error"]["Code"] == "CallTimeout"
+    assert error.value.operation_name == "GetMetricData"
+
+
+def test_budgeted_call_stops_retrying_after_its_budget():
+    clock = Mock(return_value=0)
+    hedged_caller = HedgedCaller({"cloudwatch:GetMetricData": 10}, clock=clock)
+    client = client_factory.get_default_session().client(
+        "cloudwatch", region_name="us-east-1"
+    )
+    hedged_caller.register(client)
+    operation = client.meta.service_model.operation_model("GetMetricData")
+
+    def needs_retry(caught_exception=None, status_code=500):
+        client.meta.events.emit(
+            "needs-retry.cloudwatch.GetMetricData",
+            response=(
+                None if caught_exception else (Mock(status_code=status_code), {})
+            ),
+            endpoint=None,
+            operation=operation,
+            attempts=1,
+            caught_exception=caught_exception,
+            request_dict={"context": {}},
+        )
+
+    def get_metric_data(**kwargs):
+        needs_retry()
+        clock.return_value = 11
+        # The response of the last attempt is used even after the budget is spent
+        needs_retry(status_code=200)
+        needs_retry(ConnectionError())
+        return {}
+
+    with pytest.raises(CallTimeoutError):
+        hedged_caller.call(cloudwatch_client(get_metric_data), "get_metric_data")
+    # The attempts are not sent once the budget is spent
+    with pytest.raises(CallTimeoutError):
+        hedged_caller._call_with_deadline(
+            10,
+            client.meta.events.emit,
+            {"event_name": "before-send.cloudwatch.GetMetricData", "request": Mock()},
+        )
+    # The calls without a budget are retried as configured
+    needs_retry()
+
+
+def test_call_raises_the_error_of_the_attempt():
+    hedged_caller = HedgedCaller({"cloudwatch:GetMetricData": 5})
+
+    with pytest.raises(ValueError):
+        hedged_caller.call(
+            cloudwatch_client(Mock(side_effect=ValueError("Invalid query"))),
+            "get_metric_data",
+        )
+
+
+def test_api_timeouts_overrides(monkeypatch):
+    monkeypatch.setenv("ApiTimeouts", '{"connect": 3, "cloudwatch:GetMetricData": 60}')
+    timeouts = get_api_timeouts()
+
+    config = with_timeouts(timeouts, "cloudwatch", None)
+    assert config.connect_timeout == 3
+    assert config.read_timeout == 30
+    assert with_timeouts(timeouts, "ssm", None).read_timeout == 30
+    assert get_call_budget(timeouts, "cloudwatch", "GetMetricData") == 60
+    assert get_call_budget(timeouts, "cloudwatch", "ListMetrics") is None
+
+    monkeypatch.setenv("ApiTimeouts", "[3]")
+    assert get_api_timeouts()["connect"] == 5
+
+
+def test_with_timeouts_keeps_the_timeouts_of_the_config():
+    config = with_timeouts(
+        get_api_timeouts(),
+        "workspaces",
+        botocore.config.Config(read_timeout=10, retries={"max_attempts": 2}),
+    )
+    assert config.connect_timeout == 5
+    assert config.read_timeout == 10
+    assert config.retries == {"max_attempts": 2}
+
+
+def test_client_records_call_latencies():
+    session = client_factory.get_default_session()
+    client = client_factory.get_client(session, "workspaces", "us-east-1")
+    assert client.meta.config.connect_timeout == 5
+    assert client.meta.config.read_timeout == 20
+
+    operation = client.meta.service_model.operation_model("DescribeWorkspaces")
+    context = {}
+    client.meta.events.emit(
+        "before-call.workspaces.DescribeWorkspaces",
+        model=operation,
+        params={},
+        request_signer=None,
+        context=context,
+    )
+    client.meta.events.emit(
+        "after-call.workspaces.DescribeWorkspaces",
+        http_response=Mock(status_code=200),
+        parsed={},
+        model=operation,
+        context=context,
+    )
+
+    latency_tracker = client_factory.get_hedged_caller().latency_tracker
+    assert (
+        latency_tracker.get_percentile("workspaces:DescribeWorkspaces", 50) is not None
+    )
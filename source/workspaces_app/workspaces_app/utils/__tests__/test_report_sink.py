@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+from unittest.mock import patch
+
+# Cost Optimizer for Amazon Workspaces
+from ..report_sink import ReportSink
+
+
+def test_write():
+    with ReportSink() as report_sink:
+        report_sink.write("header\n")
+        report_sink.write("row,é\n")
+        assert report_sink.getvalue() == "header\nrow,é\n"
+        assert report_sink.size == len("header\nrow,é\n".encode("utf-8"))
+
+
+def test_write_after_read_appends():
+    with ReportSink() as report_sink:
+        report_sink.write("first\n")
+        report_sink.open().read()
+        report_sink.write("second\n")
+        assert report_sink.getvalue() == "first\nsecond\n"
+
+
+def test_write_sink():
+    with ReportSink() as report_sink, ReportSink() as account_sink:
+        report_sink.write("header\n")
+        account_sink.write("row\n")
+        report_sink.write_sink(account_sink)
+        assert report_sink.getvalue() == "header\nrow\n"
+        assert report_sink.size == len("header\nrow\n")
+
+
+def test_spills_to_disk_above_spool_size():
+    with ReportSink(spool_bytes=16) as report_sink:
+        report_sink.write("row\n")
+        assert not report_sink._file._rolled
+        report_sink.write("a longer row than the spool\n")
+        assert report_sink._file._rolled
+        assert report_sink.getvalue() == "row\na longer row than the spool\n"
+
+
+def test_copy_objects_from_environment():
+    with patch.dict(os.environ, {"ReportAggregation": "Copy"}):
+        assert ReportSink().copy_objects
+    assert not ReportSink().copy_objects
+
+
+def test_write_sink_keeps_object_keys():
+    with ReportSink(copy_objects=True) as report_sink, ReportSink(
+        copy_objects=True
+    ) as account_sink:
+        report_sink.add_object("key-1")
+        account_sink.add_object("key-2")
+        report_sink.write_sink(account_sink)
+        assert report_sink.object_keys == ["key-1", "key-2"]
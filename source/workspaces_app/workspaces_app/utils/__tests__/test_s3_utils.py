@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 # Standard Library
+import io
 import time
 import unittest
 
@@ -12,10 +13,14 @@ import jmespath
 import pytest
 
 # AWS Libraries
+import boto3
 import botocore
+from botocore.stub import ANY, Stubber
 
 # Cost Optimizer for Amazon Workspaces
-from .. import s3_utils
+from ...workspace_record import WorkspaceRecord
+from .. import client_factory, s3_utils
+from ..report_sink import ReportSink
 
 
 # Class used to mock a boto3 page iterator. Boto3 uses jmespath
@@ -267,3 +272,237 @@ def test_put_report_error(mock_session):
     session.client.return_value.put_object.assert_called_once_with(
         Bucket=bucket_name, Body=report_body, Key=s3_key
     )
+
+
+@unittest.mock.patch("boto3.session.Session")
+def test_upload_report(mock_session):
+    session = mock_session()
+    report_sink = ReportSink()
+    report_sink.write("header\nrow\n")
+    s3_utils.s3_upload_report(session, "a_bucket_name", report_sink, "a_key")
+    upload_args = session.client.return_value.upload_fileobj.call_args
+    assert upload_args.args[0].read() == b"header\nrow\n"
+    assert upload_args.args[1:] == ("a_bucket_name", "a_key")
+    assert upload_args.kwargs["Config"] is s3_utils.transfer_config
+
+
+@unittest.mock.patch("boto3.session.Session")
+def test_upload_report_error(mock_session):
+    session = mock_session()
+    session.client.return_value.upload_fileobj.side_effect = (
+        botocore.exceptions.ClientError({}, "an_error")
+    )
+    s3_utils.s3_upload_report(session, "a_bucket_name", ReportSink(), "a_key")
+    session.client.return_value.upload_fileobj.assert_called_once()
+
+
+@unittest.mock.patch(s3_utils.__name__ + ".s3_upload_report")
+def test_upload_report_sink(mock_s3_upload_report):
+    session = unittest.mock.Mock()
+    report_sink = ReportSink()
+    stack_parameters = {
+        "BucketName": "a_bucket_name",
+        "DryRun": "No",
+        "TestEndOfMonth": "No",
+    }
+    s3_utils.upload_report_sink(
+        session, {"date_for_s3_key": "2023/03/15/"}, stack_parameters, report_sink
+    )
+    mock_s3_upload_report.assert_called_once_with(
+        session, "a_bucket_name", report_sink, "2023/03/15/aggregated_daily.csv"
+    )
+
+
+def stub_list_objects(stubber, object_sizes):
+    stubber.add_response(
+        "list_objects_v2",
+        {
+            "Contents": [
+                {"Key": key, "Size": size} for key, size in object_sizes.items()
+            ]
+        },
+        {"Bucket": "a_bucket_name", "Prefix": ANY},
+    )
+
+
+def stub_get_object(stubber, key, start, end):
+    stubber.add_response(
+        "get_object",
+        {"Body": io.BytesIO(b"r" * (end - start))},
+        {"Bucket": "a_bucket_name", "Key": key, "Range": f"bytes={start}-{end - 1}"},
+    )
+
+
+def test_copy_report_small_report_is_put():
+    session = boto3.session.Session(region_name="us-east-1")
+    s3_client = client_factory.get_client(session, "s3", config=s3_utils.boto_config)
+    header_bytes = len(WorkspaceRecord.csv_header())
+    report_sink = ReportSink(copy_objects=True)
+    report_sink.write("header\n")
+    report_sink.add_object("2023/03/15/us-east-1_111_d-1_daily.csv")
+    report_sink.add_object("2023/03/15/us-east-1_111_d-2_daily.csv")
+    report_sink.add_object("2023/03/15/us-east-1_111_d-3_daily.csv")
+
+    with Stubber(s3_client) as stubber:
+        stub_list_objects(
+            stubber,
+            {
+                "2023/03/15/us-east-1_111_d-1_daily.csv": header_bytes + 10,
+                "2023/03/15/us-east-1_111_d-2_daily.csv": header_bytes,
+            },
+        )
+        stub_get_object(
+            stubber,
+            "2023/03/15/us-east-1_111_d-1_daily.csv",
+            header_bytes,
+            header_bytes + 10,
+        )
+        stubber.add_response(
+            "put_object",
+            {},
+            {
+                "Bucket": "a_bucket_name",
+                "Body": b"header\n" + b"r" * 10,
+                "Key": "aggregated.csv",
+            },
+        )
+        s3_utils.s3_copy_report(session, "a_bucket_name", report_sink, "aggregated.csv")
+        stubber.assert_no_pending_responses()
+
+
+def test_copy_report_uses_upload_part_copy_for_large_ranges():
+    session = boto3.session.Session(region_name="us-east-1")
+    s3_client = client_factory.get_client(session, "s3", config=s3_utils.boto_config)
+    header_bytes = len(WorkspaceRecord.csv_header())
+    min_part = s3_utils.MIN_PART_BYTES
+    large_key = "2023/03/15/us-east-1_111_d-1_daily.csv"
+    small_key = "2023/03/15/us-east-1_111_d-2_daily.csv"
+    large_end = header_bytes + 12 * 1024 * 1024
+    report_sink = ReportSink(copy_objects=True)
+    report_sink.write("h\n")
+    report_sink.add_object(large_key)
+    report_sink.add_object(small_key)
+    upload = {"Bucket": "a_bucket_name", "Key": "aggregated.csv", "UploadId": "id"}
+
+    with Stubber(s3_client) as stubber:
+        stub_list_objects(
+            stubber, {large_key: large_end, small_key: header_bytes + 100}
+        )
+        stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "id"},
+            {"Bucket": "a_bucket_name", "Key": "aggregated.csv"},
+        )
+        # The header is topped up to a full part from the start of the large report
+        stub_get_object(stubber, large_key, header_bytes, header_bytes + min_part - 2)
+        stubber.add_response(
+            "upload_part", {"ETag": "etag-1"}, {**upload, "PartNumber": 1, "Body": ANY}
+        )
+        stubber.add_response(
+            "upload_part_copy",
+            {"CopyPartResult": {"ETag": "etag-2"}},
+            {
+                **upload,
+                "PartNumber": 2,
+                "CopySource": {"Bucket": "a_bucket_name", "Key": large_key},
+                "CopySourceRange": f"bytes={header_bytes + min_part - 2}-{large_end - 1}",
+            },
+        )
+        stub_get_object(stubber, small_key, header_bytes, header_bytes + 100)
+        stubber.add_response(
+            "upload_part",
+            {"ETag": "etag-3"},
+            {**upload, "PartNumber": 3, "Body": b"r" * 100},
+        )
+        stubber.add_response(
+            "complete_multipart_upload",
+            {},
+            {
+                **upload,
+                "MultipartUpload": {
+                    "Parts": [
+                        {"ETag": "etag-1", "PartNumber": 1},
+                        {"ETag": "etag-2", "PartNumber": 2},
+                        {"ETag": "etag-3", "PartNumber": 3},
+                    ]
+                },
+            },
+        )
+        s3_utils.s3_copy_report(session, "a_bucket_name", report_sink, "aggregated.csv")
+        stubber.assert_no_pending_responses()
+
+
+def test_copy_report_aborts_failed_upload():
+    session = boto3.session.Session(region_name="us-east-1")
+    s3_client = client_factory.get_client(session, "s3", config=s3_utils.boto_config)
+    header_bytes = len(WorkspaceRecord.csv_header())
+    key = "2023/03/15/us-east-1_111_d-1_daily.csv"
+    report_sink = ReportSink(copy_objects=True)
+    report_sink.add_object(key)
+    upload = {"Bucket": "a_bucket_name", "Key": "aggregated.csv", "UploadId": "id"}
+
+    with Stubber(s3_client) as stubber:
+        stub_list_objects(stubber, {key: header_bytes + s3_utils.MIN_PART_BYTES})
+        stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "id"},
+            {"Bucket": "a_bucket_name", "Key": "aggregated.csv"},
+        )
+        stubber.add_client_error("upload_part_copy", "InternalError")
+        stubber.add_response("abort_multipart_upload", {}, upload)
+        s3_utils.s3_copy_report(session, "a_bucket_name", report_sink, "aggregated.csv")
+        stubber.assert_no_pending_responses()
+
+
+def test_copy_report_raises_the_upload_error_when_abort_fails():
+    session = boto3.session.Session(region_name="us-east-1")
+    s3_client = client_factory.get_client(session, "s3", config=s3_utils.boto_config)
+    header_bytes = len(WorkspaceRecord.csv_header())
+    key = "2023/03/15/us-east-1_111_d-1_daily.csv"
+    report_sink = ReportSink(copy_objects=True)
+    report_sink.add_object(key)
+
+    with Stubber(s3_client) as stubber:
+        stub_list_objects(stubber, {key: header_bytes + s3_utils.MIN_PART_BYTES})
+        stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "id"},
+            {"Bucket": "a_bucket_name", "Key": "aggregated.csv"},
+        )
+        stubber.add_client_error("upload_part_copy", "InternalError")
+        stubber.add_client_error("abort_multipart_upload", "AccessDenied")
+        with unittest.mock.patch.object(s3_utils.logger, "exception") as mock_exception:
+            s3_utils.s3_copy_report(
+                session, "a_bucket_name", report_sink, "aggregated.csv"
+            )
+        stubber.assert_no_pending_responses()
+    assert "InternalError" in mock_exception.call_args.args[0]
+
+
+def test_copy_report_list_objects_error_is_handled():
+    session = boto3.session.Session(region_name="us-east-1")
+    s3_client = client_factory.get_client(session, "s3", config=s3_utils.boto_config)
+    report_sink = ReportSink(copy_objects=True)
+    report_sink.add_object("2023/03/15/us-east-1_111_d-1_daily.csv")
+
+    with Stubber(s3_client) as stubber:
+        stubber.add_client_error("list_objects_v2", "AccessDenied")
+        s3_utils.s3_copy_report(session, "a_bucket_name", report_sink, "aggregated.csv")
+        stubber.assert_no_pending_responses()
+
+
+@unittest.mock.patch(s3_utils.__name__ + ".s3_copy_report")
+def test_upload_report_sink_copy_objects(mock_s3_copy_report):
+    session = unittest.mock.Mock()
+    report_sink = ReportSink(copy_objects=True)
+    stack_parameters = {
+        "BucketName": "a_bucket_name",
+        "DryRun": "No",
+        "TestEndOfMonth": "No",
+    }
+    s3_utils.upload_report_sink(
+        session, {"date_for_s3_key": "2023/03/15/"}, stack_parameters, report_sink
+    )
+    mock_s3_copy_report.assert_called_once_with(
+        session, "a_bucket_name", report_sink, "2023/03/15/aggregated_daily.csv"
+    )
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import threading
+from unittest.mock import Mock
+
+# Cost Optimizer for Amazon Workspaces
+from ..session_writer import (
+    MAX_BACKOFF_SECONDS,
+    SessionWriter,
+    deduplicate_items,
+    get_backoff_seconds,
+)
+
+
+def items(count, start=0, session_time="2024-10-01T09:00:00Z"):
+    return [
+        {"WorkspaceId": {"S": f"ws-{i}"}, "SessionTime": {"S": session_time}}
+        for i in range(start, start + count)
+    ]
+
+
+def written_batch_sizes(client):
+    return [
+        len(call.kwargs["RequestItems"]["test-table"])
+        for call in client.batch_write_item.call_args_list
+    ]
+
+
+def test_writer_batches_items_across_workspaces():
+    client = Mock()
+    client.batch_write_item.return_value = {"UnprocessedItems": {}}
+    session_writer = SessionWriter(client, "test-table", linger_seconds=60)
+
+    session_writer.put(items(20))
+    session_writer.put(items(10, 20))
+    session_writer.put(items(2, 30))
+
+    assert session_writer.close(5)
+    assert written_batch_sizes(client) == [25, 7]
+    assert session_writer.written_items == 32
+
+
+def test_writer_deduplicates_items_of_a_batch():
+    client = Mock()
+    client.batch_write_item.return_value = {"UnprocessedItems": {}}
+    session_writer = SessionWriter(client, "test-table", linger_seconds=60)
+    updated_item = items(1)[0] | {"DurationHours": {"N": "2"}}
+
+    # The same workspace processed again before the batch is written
+    session_writer.put(items(3))
+    session_writer.put([updated_item])
+
+    assert session_writer.close(5)
+    written_items = [
+        request["PutRequest"]["Item"]
+        for request in client.batch_write_item.call_args.kwargs["RequestItems"][
+            "test-table"
+        ]
+    ]
+    assert written_items == items(3)[1:] + [updated_item]
+
+
+def test_deduplicate_items_keeps_sessions_of_different_times():
+    session_items = items(2) + items(2, session_time="2024-10-01T14:00:00Z")
+    assert deduplicate_items(session_items + items(1)) == session_items[1:] + items(1)
+
+
+def test_writer_retries_unprocessed_items_in_the_background():
+    client = Mock()
+    unprocessed_items = {"test-table": [{"PutRequest": {"Item": items(1)[0]}}]}
+    client.batch_write_item.side_effect = [
+        {"UnprocessedItems": unprocessed_items},
+        {"UnprocessedItems": {}},
+    ]
+    sleep = Mock()
+    session_writer = SessionWriter(client, "test-table", sleep=sleep)
+
+    session_writer.put(items(3))
+
+    assert session_writer.close(5)
+    sleep.assert_called_once()
+    assert client.batch_write_item.call_args.kwargs == {
+        "RequestItems": unprocessed_items
+    }
+    assert session_writer.written_items == 3
+    assert session_writer.failed_items == 0
+
+
+def test_writer_counts_failed_items():
+    client = Mock()
+    client.batch_write_item.side_effect = Exception("Table not found")
+    session_writer = SessionWriter(client, "test-table")
+
+    session_writer.put(items(3))
+
+    assert session_writer.close(5)
+    assert session_writer.failed_items == 3
+
+
+def test_close_times_out():
+    release = threading.Event()
+    client = Mock()
+    client.batch_write_item.side_effect = lambda **kwargs: release.wait(5) and {}
+    session_writer = SessionWriter(client, "test-table")
+    session_writer.put(items(1))
+
+    assert not session_writer.close(0.05)
+    release.set()
+
+
+def test_backoff_has_full_jitter():
+    assert get_backoff_seconds(1, lambda low, high: high) == 2
+    assert get_backoff_seconds(10, lambda low, high: high) == MAX_BACKOFF_SECONDS
+    assert get_backoff_seconds(3, lambda low, high: low) == 0
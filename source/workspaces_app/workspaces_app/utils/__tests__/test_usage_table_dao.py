@@ -115,6 +115,7 @@ def workspace_ddb_item(ws_record):
         "WorkspaceTerminated": {
             "S": billing_data.workspace_terminated,
         },
+        "MaintenanceHours": {"N": str(billing_data.maintenance_hours)},
         "InSessionLatency": {
             "N": str(perf_metrics.in_session_latency.avg),
         },
@@ -160,6 +161,7 @@ def workspace_ddb_item(ws_record):
         "ReportDate": {"S": ws_record.report_date},
         "LastReportedMetricPeriod": {"S": ws_record.last_reported_metric_period},
         "LastKnownUserConnection": {"S": ws_record.last_known_user_connection},
+        "ConnectedAtLastReport": {"BOOL": ws_record.connected_at_last_report},
     }
 
 
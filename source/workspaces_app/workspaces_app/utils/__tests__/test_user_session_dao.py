@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 # Standard Library
+import dataclasses
 import unittest
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -18,6 +19,7 @@ from botocore import stub
 
 # Cost Optimizer for Amazon Workspaces
 from ...user_session import *
+from ..session_writer import shutdown_session_writers
 from ..user_session_dao import UserSessionDAO
 
 TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
@@ -88,12 +90,7 @@ def ddb_item(user_session):
             "S": user_session.username,
         },
         "ActiveSessions": {
-            "L": list(
-                map(
-                    lambda x: {"S": convert_time_to_string(x)},
-                    user_session.active_sessions,
-                )
-            ),
+            "B": encode_active_sessions(user_session.active_sessions),
         },
         "DurationHours": {"N": str(user_session.duration_hours)},
         "InSessionLatency": {
@@ -117,6 +114,16 @@ def ddb_item(user_session):
     }
 
 
+@pytest.fixture()
+def other_user_session(user_session):
+    return dataclasses.replace(user_session, workspace_id="other-test-id")
+
+
+@pytest.fixture()
+def other_ddb_item(ddb_item, other_user_session):
+    return ddb_item | {"WorkspaceId": {"S": other_user_session.workspace_id}}
+
+
 def batch_write_item_response_factory(items_to_process=None):
     unprocessed_items = {"UnprocessedItems": {}}
     if items_to_process:
@@ -145,8 +152,10 @@ def test_batch_write_ddb_item(
     mock_session,
     ddb_item,
     user_session,
+    other_ddb_item,
+    other_user_session,
 ):
-    list_ddb_items = [ddb_item, ddb_item]
+    list_ddb_items = [ddb_item, other_ddb_item]
     table_name = "test-table"
     region = "us-east-1"
     dynamo_client = boto3.client("dynamodb")
@@ -162,8 +171,10 @@ def test_batch_write_ddb_item(
             }
         },
     )
-    table_dao = UserSessionDAO(boto3.session.Session(), table_name, region)
-    table_dao.update_ddb_items([user_session, user_session])
+    table_dao = UserSessionDAO(
+        boto3.session.Session(), table_name, region, background_writes=False
+    )
+    table_dao.update_ddb_items([user_session, other_user_session])
     stub_dynamo.assert_no_pending_responses()
     stub_dynamo.deactivate()
 
@@ -175,8 +186,10 @@ def test_batch_write_ddb_item_with_retries_timeout(
     mock_sleep,
     ddb_item,
     user_session,
+    other_ddb_item,
+    other_user_session,
 ):
-    list_ddb_items = [ddb_item, ddb_item]
+    list_ddb_items = [ddb_item, other_ddb_item]
     table_name = "test-table"
     region = "us-east-1"
     dynamo_client = boto3.client("dynamodb")
@@ -190,8 +203,10 @@ def test_batch_write_ddb_item_with_retries_timeout(
             batch_write_item_response_factory(request_items),
             expected_params={"RequestItems": {table_name: request_items}},
         )
-    table_dao = UserSessionDAO(boto3.session.Session(), table_name, region)
-    table_dao.update_ddb_items([user_session, user_session])
+    table_dao = UserSessionDAO(
+        boto3.session.Session(), table_name, region, background_writes=False
+    )
+    table_dao.update_ddb_items([user_session, other_user_session])
     stub_dynamo.assert_no_pending_responses()
 
 
@@ -202,8 +217,10 @@ def test_batch_write_ddb_item_retries_once(
     mock_sleep,
     ddb_item,
     user_session,
+    other_ddb_item,
+    other_user_session,
 ):
-    list_ddb_items = [ddb_item, ddb_item]
+    list_ddb_items = [ddb_item, other_ddb_item]
     table_name = "test-table"
     region = "us-east-1"
     dynamo_client = boto3.client("dynamodb")
@@ -221,6 +238,43 @@ def test_batch_write_ddb_item_retries_once(
         batch_write_item_response_factory(),
         expected_params={"RequestItems": {table_name: request_items}},
     )
-    table_dao = UserSessionDAO(boto3.session.Session(), table_name, region)
-    table_dao.update_ddb_items([user_session, user_session])
+    table_dao = UserSessionDAO(
+        boto3.session.Session(), table_name, region, background_writes=False
+    )
+    table_dao.update_ddb_items([user_session, other_user_session])
+    stub_dynamo.assert_no_pending_responses()
+
+
+@unittest.mock.patch("boto3.session.Session")
+def test_batch_write_ddb_item_in_the_background(
+    mock_session,
+    ddb_item,
+    user_session,
+    other_ddb_item,
+    other_user_session,
+):
+    table_name = "test-table"
+    dynamo_client = boto3.client("dynamodb")
+    stub_dynamo = stub.Stubber(dynamo_client)
+    mock_session.return_value.client.return_value = dynamo_client
+    stub_dynamo.activate()
+    stub_dynamo.add_response(
+        "batch_write_item",
+        batch_write_item_response_factory(),
+        expected_params={
+            "RequestItems": {
+                # The session written twice is only in the batch once
+                table_name: [
+                    {"PutRequest": {"Item": item}}
+                    for item in [other_ddb_item, ddb_item]
+                ]
+            }
+        },
+    )
+    table_dao = UserSessionDAO(
+        boto3.session.Session(), table_name, "us-east-1", background_writes=True
+    )
+    table_dao.update_ddb_items([user_session, other_user_session])
+    table_dao.update_ddb_items([user_session])
+    shutdown_session_writers()
     stub_dynamo.assert_no_pending_responses()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import threading
+import time
+import typing
+from contextlib import contextmanager
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+logger = Logger(service="adaptive_concurrency")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "RequestThrottledException",
+}
+DEFAULT_DECREASE_FACTOR = 0.5
+# Time after a decrease during which throttling does not decrease the limit again, so the
+# calls in flight when the limit was cut do not cut it down to the minimum
+DEFAULT_DECREASE_COOLDOWN_SECONDS = 5.0
+
+
+class AimdController:
+    """
+    Adapts the number of concurrent work items to the throttling of the APIs. The limit is
+    cut by a factor when a call is throttled and grows by one after a limit worth of work
+    items complete without throttling, so it settles just below the rate the APIs accept.
+    A work item makes many calls, so counting calls would grow the limit back as fast as
+    it is cut.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        decrease_cooldown_seconds: float = DEFAULT_DECREASE_COOLDOWN_SECONDS,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self._decrease_factor = decrease_factor
+        self._decrease_cooldown_seconds = decrease_cooldown_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+        self._limit = self.maximum
+        self._min_limit = self.maximum
+        self._running = 0
+        self._completed = 0
+        self._last_decrease: typing.Union[float, None] = None
+        self.calls: dict[str, int] = {}
+        self.throttles: dict[str, int] = {}
+        self.retries: dict[str, int] = {}
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @contextmanager
+    def slot(self) -> typing.Iterator[None]:
+        """
+        This method waits until fewer work items than the limit are running, and holds a
+        slot while the work item runs
+        """
+        with self._slot_released:
+            self._slot_released.wait_for(lambda: self._running < self._limit)
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._slot_released:
+                self._running -= 1
+                self._on_completed()
+                self._slot_released.notify_all()
+
+    def _on_completed(self) -> None:
+        self._completed += 1
+        if self._completed >= self._limit and self._limit < self.maximum:
+            self._completed = 0
+            self._limit += 1
+            logger.debug(f"Increased the concurrency limit to {self._limit}")
+
+    def on_success(self, api: str, retries: int = 0) -> None:
+        with self._lock:
+            self.calls[api] = self.calls.get(api, 0) + 1
+            if retries:
+                self.retries[api] = self.retries.get(api, 0) + retries
+
+    def on_throttle(self, api: str) -> None:
+        with self._lock:
+            self.throttles[api] = self.throttles.get(api, 0) + 1
+            now = self._clock()
+            if (
+                self._last_decrease is not None
+                and now - self._last_decrease < self._decrease_cooldown_seconds
+            ):
+                return
+            self._last_decrease = now
+            self._completed = 0
+            limit = max(self.minimum, int(self._limit * self._decrease_factor))
+            if limit < self._limit:
+                logger.info(
+                    f"Decreased the concurrency limit from {self._limit} to {limit} "
+                    f"after {api} was throttled"
+                )
+                self._limit = limit
+                self._min_limit = min(self._min_limit, limit)
+
+    def get_metrics(self) -> dict[str, any]:
+        """
+        :return: the current and lowest limits with the throttled and retried calls by API
+        """
+        with self._lock:
+            return {
+                "concurrency_limit": self._limit,
+                "min_concurrency_limit": self._min_limit,
+                "throttles": dict(self.throttles),
+                "retries": dict(self.retries),
+            }
+
+    def log_summary(self) -> None:
+        logger.info(f"Adaptive concurrency: {self.get_metrics()}")
+
+    def register(self, client) -> None:
+        """
+        This method reports the throttled attempts and the successful calls of a client
+        :param client: a boto3 client
+        """
+        service_name = client.meta.service_model.service_name
+        service_id = client.meta.service_model.service_id.hyphenize()
+
+        def needs_retry(response, operation, **kwargs) -> None:
+            # Called after every attempt, before the retry handler decides to retry
+            if response is not None and is_throttling(response[1]):
+                self.on_throttle(f"{service_name}:{operation.name}")
+
+        def after_call(http_response, parsed, model, **kwargs) -> None:
+            if http_response.status_code < 300:
+                self.on_success(
+                    f"{service_name}:{model.name}",
+                    parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+                )
+
+        client.meta.events.register(f"needs-retry.{service_id}", needs_retry)
+        client.meta.events.register(f"after-call.{service_id}", after_call)
+
+
+def is_throttling(parsed_response: dict) -> bool:
+    return parsed_response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+def is_adaptive_concurrency_enabled() -> bool:
+    return os.getenv("AdaptiveConcurrency", "Yes") == "Yes"
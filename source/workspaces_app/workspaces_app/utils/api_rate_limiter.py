@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import json
+import os
+import threading
+import time
+import typing
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+logger = Logger(service="api_rate_limiter")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+# Requests per second of each account and region, keyed by "service:Operation" or by
+# service for every operation of the service. The APIs which are not listed are not limited.
+DEFAULT_API_RATE_LIMITS = {
+    "workspaces": 10,
+    "workspaces:DescribeWorkspaces": 5,
+    "workspaces:DescribeWorkspacesConnectionStatus": 5,
+    "workspaces:ModifyWorkspaceProperties": 2,
+    "workspaces:TerminateWorkspaces": 2,
+    "cloudwatch:GetMetricData": 50,
+}
+
+
+class TokenBucket:
+    """
+    Lets calls through at a rate per second with bursts of up to the capacity. A call
+    which finds the bucket empty reserves the next token and sleeps until it is added.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        capacity: typing.Union[float, None] = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._rate = rate_per_second
+        self._capacity = capacity or max(1.0, rate_per_second)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self._capacity
+        self._updated = clock()
+
+    def acquire(self) -> float:
+        """
+        This method takes a token from the bucket
+        :return: the seconds waited for the token
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait_seconds = -self._tokens / self._rate if self._tokens < 0 else 0
+        if wait_seconds > 0:
+            self._sleep(wait_seconds)
+        return wait_seconds
+
+
+class ApiRateLimiter:
+    """
+    Rate limits the calls of the clients with a token bucket per account, region and
+    operation, shared by every client of the process. The limit of an operation is
+    looked up by "service:Operation" and then by service.
+    """
+
+    def __init__(self, rate_limits: dict[str, float]) -> None:
+        self._rate_limits = rate_limits
+        self._lock = threading.Lock()
+        self._buckets: dict[tuple, typing.Union[TokenBucket, None]] = {}
+        self.waited_seconds = 0.0
+
+    def get_rate_limit(
+        self, service_name: str, operation_name: str
+    ) -> typing.Union[float, None]:
+        rate_limit = self._rate_limits.get(f"{service_name}:{operation_name}")
+        if rate_limit is None:
+            rate_limit = self._rate_limits.get(service_name)
+        return rate_limit or None
+
+    def get_bucket(
+        self,
+        account: typing.Hashable,
+        region_name: str,
+        service_name: str,
+        operation_name: str,
+    ) -> typing.Union[TokenBucket, None]:
+        key = (account, region_name, service_name, operation_name)
+        with self._lock:
+            if key not in self._buckets:
+                rate_limit = self.get_rate_limit(service_name, operation_name)
+                self._buckets[key] = TokenBucket(rate_limit) if rate_limit else None
+            return self._buckets[key]
+
+    def acquire(
+        self,
+        account: typing.Hashable,
+        region_name: str,
+        service_name: str,
+        operation_name: str,
+    ) -> None:
+        bucket = self.get_bucket(account, region_name, service_name, operation_name)
+        if bucket is None:
+            return
+        wait_seconds = bucket.acquire()
+        if wait_seconds:
+            logger.debug(
+                f"Waited {wait_seconds:.3f} seconds for {service_name}:{operation_name} "
+                f"in {region_name}"
+            )
+            with self._lock:
+                self.waited_seconds += wait_seconds
+
+    def register(self, client, account: typing.Hashable, region_name: str) -> None:
+        """
+        This method rate limits the calls of a client with a before-call hook
+        :param client: a boto3 client
+        :param account: the identity of the credentials of the client
+        :param region_name: the region of the client
+        """
+        service_name = client.meta.service_model.service_name
+
+        def before_call(model, **kwargs) -> None:
+            self.acquire(account, region_name, service_name, model.name)
+
+        client.meta.events.register(
+            f"before-call.{client.meta.service_model.service_id.hyphenize()}",
+            before_call,
+        )
+
+
+def get_api_rate_limits() -> dict[str, float]:
+    """
+    This method returns the rate limits with the overrides of the ApiRateLimits stack
+    parameter, a JSON object such as {"cloudwatch:GetMetricData": 25}. A limit of 0
+    disables the limit of the API.
+    """
+    rate_limits = dict(DEFAULT_API_RATE_LIMITS)
+    overrides = os.getenv("ApiRateLimits")
+    if overrides:
+        try:
+            rate_limits.update(
+                {
+                    api: max(0.0, float(limit))
+                    for api, limit in json.loads(overrides).items()
+                }
+            )
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid value for ApiRateLimits: {overrides}: {e}")
+    return rate_limits
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import json
+import os
+import typing
+
+# AWS Libraries
+import botocore.config
+from aws_lambda_powertools import Logger
+
+logger = Logger(service="api_timeouts")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+CONNECT_TIMEOUT = "connect"
+DEFAULT_TIMEOUT = "default"
+
+# Seconds to connect and to wait for each response of a service, keyed by service, and
+# the budget of the whole call of an operation, keyed by "service:Operation". A call
+# with a budget gives up once it is spent, retries and hedged attempts included.
+DEFAULT_API_TIMEOUTS = {
+    CONNECT_TIMEOUT: 5,
+    DEFAULT_TIMEOUT: 30,
+    "workspaces": 20,
+    "cloudwatch": 30,
+    "dynamodb": 10,
+    "sts": 10,
+    "s3": 60,
+    "cloudwatch:GetMetricData": 120,
+    "workspaces:DescribeWorkspaces": 60,
+    "dynamodb:GetItem": 30,
+}
+
+
+def get_api_timeouts() -> dict[str, float]:
+    """
+    This method returns the timeouts with the overrides of ApiTimeouts, a JSON object such
+    as {"connect": 3, "cloudwatch": 20, "cloudwatch:GetMetricData": 60}
+    """
+    timeouts = dict(DEFAULT_API_TIMEOUTS)
+    overrides = os.getenv("ApiTimeouts")
+    if overrides:
+        try:
+            timeouts.update(
+                {key: float(seconds) for key, seconds in json.loads(overrides).items()}
+            )
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid value for ApiTimeouts: {overrides}: {e}")
+    return timeouts
+
+
+def with_timeouts(
+    timeouts: dict[str, float],
+    service_name: str,
+    config: typing.Union[botocore.config.Config, None],
+) -> botocore.config.Config:
+    """
+    This method returns the config of a client with the timeouts of its service
+    :param timeouts: the timeouts returned by get_api_timeouts
+    :param service_name: the name of the AWS service of the client
+    :param config: the config the client is created with
+    :return: the config with the connect and read timeouts, the timeouts set in config
+        are kept
+    """
+    timeout_config = botocore.config.Config(
+        connect_timeout=timeouts[CONNECT_TIMEOUT],
+        read_timeout=timeouts.get(service_name, timeouts[DEFAULT_TIMEOUT]),
+    )
+    if config is None:
+        return timeout_config
+    # The options set in config override the defaults of the service
+    return timeout_config.merge(config)
+
+
+def get_call_budget(
+    timeouts: dict[str, float], service_name: str, operation_name: str
+) -> typing.Union[float, None]:
+    """This method returns the seconds a call of an operation may take in total."""
+    return timeouts.get(f"{service_name}:{operation_name}")
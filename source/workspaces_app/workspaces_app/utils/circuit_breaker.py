@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import threading
+import time
+import typing
+from collections import deque
+
+# AWS Libraries
+import botocore.exceptions
+from aws_lambda_powertools import Logger
+
+logger = Logger(service="circuit_breaker")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(botocore.exceptions.ClientError):
+    """
+    Raised instead of calling an API whose circuit breaker is open. It is a ClientError so
+    the callers handle it as any other failed call.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast once the failure rate of the calls in a window reaches a threshold.
+    After the open period, a single call probes the API: the breaker closes when it
+    succeeds and opens again when it fails.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        minimum_calls: int = 20,
+        window_seconds: float = 60,
+        open_seconds: float = 30,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._failure_rate = failure_rate
+        self._minimum_calls = max(1, minimum_calls)
+        self._window_seconds = window_seconds
+        self._open_seconds = open_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at: typing.Union[float, None] = None
+        self._probing = False
+        self.state = CLOSED
+        self.trips = 0
+        self.rejected_calls = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and self.get_open_seconds_remaining() <= 0:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record(self, failed: bool) -> None:
+        with self._lock:
+            now = self._clock()
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    self._failures = 0
+                return
+            if self.state == OPEN:
+                return
+            self._calls.append((now, failed))
+            self._failures += failed
+            while self._calls and self._calls[0][0] < now - self._window_seconds:
+                self._failures -= self._calls.popleft()[1]
+            if (
+                len(self._calls) >= self._minimum_calls
+                and self._failures / len(self._calls) >= self._failure_rate
+            ):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.trips += 1
+        self._opened_at = now
+        self._probing = False
+        self._calls.clear()
+        self._failures = 0
+
+    def get_open_seconds_remaining(self) -> float:
+        if self.state != OPEN:
+            return 0
+        return self._opened_at + self._open_seconds - self._clock()
+
+
+class CircuitBreakers:
+    """
+    Keeps a circuit breaker per account, region and service, shared by every client of
+    the process, so a degraded regional endpoint fails fast instead of retrying every call.
+    """
+
+    def __init__(
+        self,
+        breaker_factory: typing.Callable[[], CircuitBreaker] = CircuitBreaker,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._breaker_factory = breaker_factory
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._breakers: dict[tuple, CircuitBreaker] = {}
+        self._account_ids: dict[typing.Hashable, str] = {}
+
+    def get_breaker(
+        self, account: typing.Hashable, region_name: str, service_name: str
+    ) -> CircuitBreaker:
+        key = (account, region_name, service_name)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = self._breaker_factory()
+            return self._breakers[key]
+
+    def set_account_id(self, account: typing.Hashable, account_id: str) -> None:
+        """This method names the account of a credentials identity in the summary."""
+        with self._lock:
+            self._account_ids[account] = account_id
+
+    def get_region_breakers(
+        self, account: typing.Hashable, region_name: str
+    ) -> list[CircuitBreaker]:
+        with self._lock:
+            return [
+                breaker
+                for key, breaker in self._breakers.items()
+                if key[:2] == (account, region_name)
+            ]
+
+    def get_rejected_calls(self, account: typing.Hashable, region_name: str) -> int:
+        """This method returns the calls failed fast for an account and region."""
+        return sum(
+            breaker.rejected_calls
+            for breaker in self.get_region_breakers(account, region_name)
+        )
+
+    def wait_for_retry(self, account: typing.Hashable, region_name: str) -> None:
+        """This method waits until the open breakers of an account and region let a call probe."""
+        seconds = max(
+            [
+                breaker.get_open_seconds_remaining()
+                for breaker in self.get_region_breakers(account, region_name)
+            ],
+            default=0,
+        )
+        if seconds > 0:
+            logger.info(f"Waiting {seconds:.1f} seconds for the APIs of {region_name}")
+            self._sleep(seconds)
+
+    def get_tripped_breakers(self) -> list[dict[str, any]]:
+        with self._lock:
+            return [
+                {
+                    # The credentials identity is not logged, only the account id
+                    "account": self._account_ids.get(account),
+                    "region": region_name,
+                    "service": service_name,
+                    "state": breaker.state,
+                    "trips": breaker.trips,
+                    "rejected_calls": breaker.rejected_calls,
+                }
+                for (account, region_name, service_name), breaker in (
+                    self._breakers.items()
+                )
+                if breaker.trips
+            ]
+
+    def log_summary(self) -> None:
+        tripped_breakers = self.get_tripped_breakers()
+        if tripped_breakers:
+            logger.error(f"Tripped circuit breakers: {tripped_breakers}")
+
+    def register(self, client, account: typing.Hashable, region_name: str) -> None:
+        """
+        This method fails the calls of a client fast while its breaker is open and records
+        the outcome of every attempt of the other calls, retries included. Server errors and
+        connection errors are failures.
+        :param client: a boto3 client
+        :param account: the identity of the credentials of the client
+        :param region_name: the region of the client
+        """
+        service_name = client.meta.service_model.service_name
+        service_id = client.meta.service_model.service_id.hyphenize()
+        breaker = self.get_breaker(account, region_name, service_name)
+
+        def before_call(model, **kwargs) -> None:
+            if not breaker.allow():
+                raise CircuitOpenError(
+                    {
+                        "Error": {
+                            "Code": "CircuitOpen",
+                            "Message": f"The circuit breaker of {service_name} in "
+                            f"{region_name} is open",
+                        }
+                    },
+                    model.name,
+                )
+
+        def needs_retry(response, caught_exception, **kwargs) -> None:
+            # Emitted after each attempt, before the retry handler decides to retry
+            breaker.record(
+                caught_exception is not None
+                or (response is not None and response[0].status_code >= 500)
+            )
+
+        # Registered first so a rejected call does not take a token of the rate limiter
+        client.meta.events.register_first(f"before-call.{service_id}", before_call)
+        client.meta.events.register_first(f"needs-retry.{service_id}", needs_retry)
+
+
+def get_circuit_breaker_factory() -> typing.Callable[[], CircuitBreaker]:
+    """This method returns a factory of the breakers configured by the environment."""
+    failure_rate = float(os.getenv("CircuitBreakerFailureRate", "0.5"))
+    minimum_calls = int(os.getenv("CircuitBreakerMinimumCalls", "20"))
+    window_seconds = float(os.getenv("CircuitBreakerWindowSeconds", "60"))
+    open_seconds = float(os.getenv("CircuitBreakerOpenSeconds", "30"))
+    return lambda: CircuitBreaker(
+        failure_rate, minimum_calls, window_seconds, open_seconds
+    )
+
+
+def is_circuit_breaker_enabled() -> bool:
+    return os.getenv("CircuitBreaker", "Yes") == "Yes"
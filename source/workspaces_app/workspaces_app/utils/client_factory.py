@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import threading
+import typing
+
+# AWS Libraries
+import boto3
+import botocore
+import botocore.loaders
+import botocore.session
+from aws_lambda_powertools import Logger
+from botocore.credentials import RefreshableCredentials
+
+# Cost Optimizer for Amazon Workspaces
+from .adaptive_concurrency import AimdController
+from .api_rate_limiter import ApiRateLimiter, get_api_rate_limits
+from .api_timeouts import get_api_timeouts, with_timeouts
+from .circuit_breaker import (
+    CircuitBreakers,
+    get_circuit_breaker_factory,
+    is_circuit_breaker_enabled,
+)
+from .hedging import HedgedCaller, is_hedging_enabled
+
+# Initialize logger
+logger = Logger(service="client_factory")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+_lock = threading.RLock()
+_loader: typing.Union[botocore.loaders.Loader, None] = None
+_default_session: typing.Union[boto3.session.Session, None] = None
+_clients: dict[tuple, typing.Any] = {}
+_api_rate_limiter: typing.Union[ApiRateLimiter, None] = None
+_concurrency_controller: typing.Union[AimdController, None] = None
+_circuit_breakers: typing.Union[CircuitBreakers, None] = None
+_hedged_caller: typing.Union[HedgedCaller, None] = None
+
+
+def get_loader() -> botocore.loaders.Loader:
+    """
+    This method returns the process-wide botocore data loader. Sharing the loader means
+    service models are parsed once per process instead of once per session.
+    :return: the shared botocore data loader
+    """
+    global _loader
+    with _lock:
+        if _loader is None:
+            _loader = botocore.loaders.create_loader()
+        return _loader
+
+
+def new_session(
+    botocore_session: typing.Union[botocore.session.Session, None] = None,
+) -> boto3.session.Session:
+    """
+    This method creates a boto3 session which uses the shared botocore data loader
+    :param botocore_session: an optional botocore session to wrap, e.g. one carrying
+    refreshable assumed role credentials
+    :return: a boto3 session
+    """
+    botocore_session = botocore_session or botocore.session.get_session()
+    botocore_session.register_component("data_loader", get_loader())
+    return boto3.session.Session(botocore_session=botocore_session)
+
+
+def get_default_session() -> boto3.session.Session:
+    """
+    This method returns the process-wide session for the credentials of the ECS task
+    :return: a boto3 session using the default credential chain
+    """
+    global _default_session
+    with _lock:
+        if _default_session is None:
+            _default_session = new_session()
+        return _default_session
+
+
+def get_api_rate_limiter() -> ApiRateLimiter:
+    """
+    This method returns the process-wide rate limiter of the API calls, so the clients of
+    all the threads share the token buckets of an account and region
+    """
+    global _api_rate_limiter
+    with _lock:
+        if _api_rate_limiter is None:
+            _api_rate_limiter = ApiRateLimiter(get_api_rate_limits())
+        return _api_rate_limiter
+
+
+def get_concurrency_controller() -> AimdController:
+    """
+    This method returns the process-wide controller of the number of concurrent work
+    items, which the clients report their throttled and successful calls to
+    """
+    global _concurrency_controller
+    with _lock:
+        if _concurrency_controller is None:
+            _concurrency_controller = AimdController(
+                int(os.getenv("MaxConcurrentWorkItems", "16")),
+                int(os.getenv("MinConcurrentWorkItems", "1")),
+            )
+        return _concurrency_controller
+
+
+def get_circuit_breakers() -> CircuitBreakers:
+    """
+    This method returns the process-wide circuit breakers of the API calls, so the clients
+    of all the threads stop calling a degraded endpoint together
+    """
+    global _circuit_breakers
+    with _lock:
+        if _circuit_breakers is None:
+            _circuit_breakers = CircuitBreakers(get_circuit_breaker_factory())
+        return _circuit_breakers
+
+
+def get_hedged_caller() -> HedgedCaller:
+    """
+    This method returns the process-wide caller of the hedged operations, which tracks the
+    latency of the calls of every client
+    """
+    global _hedged_caller
+    with _lock:
+        if _hedged_caller is None:
+            _hedged_caller = HedgedCaller(
+                get_api_timeouts(),
+                is_hedging_enabled(),
+                float(os.getenv("HedgeLatencyPercentile", "99")),
+            )
+        return _hedged_caller
+
+
+def hedged_call(client, method_name: str, **kwargs) -> dict:
+    """
+    This method calls an idempotent read operation within the budget of the operation and
+    hedges it when it is slower than usual
+    :param client: a client returned by get_client
+    :param method_name: the name of the client method, e.g. "get_metric_data"
+    :return: the response of the call
+    """
+    return get_hedged_caller().call(client, method_name, **kwargs)
+
+
+def get_client(
+    session: boto3.session.Session,
+    service_name: str,
+    region_name: typing.Union[str, None] = None,
+    config: typing.Union[botocore.config.Config, None] = None,
+):
+    """
+    This method returns a client for the given session, service, region and config. Clients
+    are created once per (credentials identity, service, region, config) and reused afterwards.
+    They get the connect and read timeouts of their service.
+    :param session: the boto3 session whose credentials the client should use
+    :param service_name: the name of the AWS service
+    :param region_name: the region for the client, defaults to the region of the session
+    :param config: the botocore config for the client
+    :return: a boto3 client
+    """
+    region_name = region_name or session.region_name
+    credentials_identity = get_credentials_identity(session)
+    key = (credentials_identity, service_name, region_name, config)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            logger.debug(
+                f"Creating {service_name} client for region {region_name}, {len(_clients)} clients cached"
+            )
+            client = session.client(
+                service_name,
+                region_name=region_name,
+                config=with_timeouts(get_api_timeouts(), service_name, config),
+            )
+            get_api_rate_limiter().register(client, credentials_identity, region_name)
+            get_concurrency_controller().register(client)
+            if is_circuit_breaker_enabled():
+                get_circuit_breakers().register(
+                    client, credentials_identity, region_name
+                )
+            get_hedged_caller().register(client)
+            _clients[key] = client
+        return client
+
+
+def get_credentials_identity(session: boto3.session.Session) -> typing.Hashable:
+    """
+    This method returns a hashable identity for the credentials of a session. Refreshable
+    credentials are identified by the credentials object itself since their keys rotate,
+    static credentials are identified by their values.
+    :param session: a boto3 session
+    :return: a hashable value identifying the credentials
+    """
+    credentials = session.get_credentials()
+    if credentials is None:
+        return None
+    if isinstance(credentials, RefreshableCredentials):
+        return credentials
+    frozen_credentials = credentials.get_frozen_credentials()
+    return (
+        frozen_credentials.access_key,
+        frozen_credentials.secret_key,
+        frozen_credentials.token,
+    )
+
+
+def clear() -> None:
+    """This method drops all cached sessions, clients and the state of their hooks."""
+    global _default_session, _api_rate_limiter, _concurrency_controller, _circuit_breakers
+    global _hedged_caller
+    with _lock:
+        _default_session = None
+        _api_rate_limiter = None
+        _concurrency_controller = None
+        _circuit_breakers = None
+        _hedged_caller = None
+        _clients.clear()
@@ -4,7 +4,7 @@
 
 # Standard Library
 import os
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 
 # AWS Libraries
 from aws_lambda_powertools import Logger, Metrics, single_metric
@@ -32,13 +32,28 @@ class ConversionMetrics:
     conversion_skips: int = 0
 
 
+@dataclass
+class ConcurrencyMetrics:
+    concurrency_limit: int = 0
+    min_concurrency_limit: int = 0
+    throttles: dict[str, int] = field(default_factory=dict)
+    retries: dict[str, int] = field(default_factory=dict)
+
+
+def min_limit(limit: int, other_limit: int) -> int:
+    """This method returns the lowest of two limits, a limit of 0 is not recorded."""
+    return min(limit or other_limit, other_limit or limit)
+
+
 class DashboardMetrics:
     def __init__(self):
         self.billing_metrics = BillingMetrics()
         self.conversion_metrics = ConversionMetrics()
         self.termination_metrics = 0
         self.total_workspaces = 0
-        logger.info(f"Initialized DashboardMetrics")
+        self.workspace_state_metrics: dict[str, int] = {}
+        self.concurrency_metrics = ConcurrencyMetrics()
+        logger.debug(f"Initialized DashboardMetrics")
 
     def update_total_workspaces(self, count: int):
         try:
@@ -78,6 +93,127 @@ class DashboardMetrics:
         except Exception as e:
             logger.error(f"Error updating termination metrics: {str(e)}")
 
+    def update_workspace_state_metrics(self, state: str):
+        try:
+            self.workspace_state_metrics[state] = (
+                self.workspace_state_metrics.get(state, 0) + 1
+            )
+        except Exception as e:
+            logger.error(f"Error updating workspace state metrics: {str(e)}")
+
+    def update_concurrency_metrics(self, controller_metrics: dict[str, any]):
+        """
+        This method records the limits and the throttled and retried calls of the adaptive
+        concurrency controller of the run
+        """
+        try:
+            self.merge_concurrency_metrics(ConcurrencyMetrics(**controller_metrics))
+        except Exception as e:
+            logger.error(f"Error updating concurrency metrics: {str(e)}")
+
+    def merge_concurrency_metrics(self, other: ConcurrencyMetrics):
+        # The limits of a run processed by several tasks are the lowest of the tasks
+        self.concurrency_metrics.concurrency_limit = min_limit(
+            self.concurrency_metrics.concurrency_limit, other.concurrency_limit
+        )
+        self.concurrency_metrics.min_concurrency_limit = min_limit(
+            self.concurrency_metrics.min_concurrency_limit, other.min_concurrency_limit
+        )
+        for counts, other_counts in (
+            (self.concurrency_metrics.throttles, other.throttles),
+            (self.concurrency_metrics.retries, other.retries),
+        ):
+            for api, count in other_counts.items():
+                counts[api] = counts.get(api, 0) + count
+
+    def merge(self, other: "DashboardMetrics"):
+        """
+        This method adds the counts collected by another instance, e.g. for a single account
+        :param other: the dashboard metrics to add to this instance
+        """
+        try:
+            self.total_workspaces += other.total_workspaces
+            self.billing_metrics.hourly_billed += other.billing_metrics.hourly_billed
+            self.billing_metrics.monthly_billed += other.billing_metrics.monthly_billed
+            self.conversion_metrics.hourly_to_monthly += (
+                other.conversion_metrics.hourly_to_monthly
+            )
+            self.conversion_metrics.monthly_to_hourly += (
+                other.conversion_metrics.monthly_to_hourly
+            )
+            self.conversion_metrics.conversion_errors += (
+                other.conversion_metrics.conversion_errors
+            )
+            self.conversion_metrics.conversion_skips += (
+                other.conversion_metrics.conversion_skips
+            )
+            self.termination_metrics += other.termination_metrics
+            for state, count in other.workspace_state_metrics.items():
+                self.workspace_state_metrics[state] = (
+                    self.workspace_state_metrics.get(state, 0) + count
+                )
+            self.merge_concurrency_metrics(other.concurrency_metrics)
+        except Exception as e:
+            logger.error(f"Error merging dashboard metrics: {str(e)}")
+
+    def to_json(self) -> dict[str, any]:
+        return {
+            "billing_metrics": asdict(self.billing_metrics),
+            "conversion_metrics": asdict(self.conversion_metrics),
+            "termination_metrics": self.termination_metrics,
+            "total_workspaces": self.total_workspaces,
+            "workspace_state_metrics": dict(self.workspace_state_metrics),
+            "concurrency_metrics": asdict(self.concurrency_metrics),
+        }
+
+    @classmethod
+    def from_json(cls, metrics_json: dict[str, any]) -> "DashboardMetrics":
+        dashboard_metrics = cls()
+        dashboard_metrics.billing_metrics = BillingMetrics(
+            **metrics_json.get("billing_metrics", {})
+        )
+        dashboard_metrics.conversion_metrics = ConversionMetrics(
+            **metrics_json.get("conversion_metrics", {})
+        )
+        dashboard_metrics.termination_metrics = metrics_json.get(
+            "termination_metrics", 0
+        )
+        dashboard_metrics.total_workspaces = metrics_json.get("total_workspaces", 0)
+        dashboard_metrics.workspace_state_metrics = dict(
+            metrics_json.get("workspace_state_metrics", {})
+        )
+        dashboard_metrics.concurrency_metrics = ConcurrencyMetrics(
+            **metrics_json.get("concurrency_metrics", {})
+        )
+        return dashboard_metrics
+
+    def publish_concurrency_metrics(self):
+        """
+        This method publishes the limits of the adaptive concurrency controller and the
+        throttled and retried calls of each API
+        """
+        for metric_name, metric_value in [
+            ("ConcurrencyLimit", self.concurrency_metrics.concurrency_limit),
+            ("MinConcurrencyLimit", self.concurrency_metrics.min_concurrency_limit),
+        ]:
+            logger.debug(f"Publishing metric: {metric_name} = {metric_value}")
+            metrics.add_metric(
+                name=metric_name, unit=MetricUnit.Count, value=metric_value
+            )
+        for metric_name, counts in [
+            ("ThrottledCalls", self.concurrency_metrics.throttles),
+            ("RetriedCalls", self.concurrency_metrics.retries),
+        ]:
+            for api, count in sorted(counts.items()):
+                logger.debug(f"Publishing metric: {metric_name}[{api}] = {count}")
+                with single_metric(
+                    namespace=METRIC_NAMESPACE,
+                    name=metric_name,
+                    unit=MetricUnit.Count,
+                    value=count,
+                ) as metric:
+                    metric.add_dimension(name="Api", value=api)
+
     def publish_metrics(
         self, execution_time: float, is_dry_run: str, terminate_unused_workspaces: str
     ):
@@ -117,6 +253,16 @@ class DashboardMetrics:
                         name=metric_name, unit=MetricUnit.Count, value=metric_value
                     )
 
+            for state, count in sorted(self.workspace_state_metrics.items()):
+                logger.debug(f"Publishing metric: WorkspacesByState[{state}] = {count}")
+                with single_metric(
+                    namespace=METRIC_NAMESPACE,
+                    name="WorkspacesByState",
+                    unit=MetricUnit.Count,
+                    value=count,
+                ) as metric:
+                    metric.add_dimension(name="State", value=state)
+
             if terminate_unused_workspaces == "Yes":
                 termination_status = "Terminated"
             elif terminate_unused_workspaces == "Dry Run":
@@ -141,6 +287,8 @@ class DashboardMetrics:
                 f"Publishing metric: TerminatedWorkspaces = {self.termination_metrics}"
             )
 
+            self.publish_concurrency_metrics()
+
             metrics.flush_metrics()
             logger.info("All metrics published successfully")
         except Exception as e:
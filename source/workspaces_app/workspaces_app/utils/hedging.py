@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import threading
+import time
+import typing
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# AWS Libraries
+import botocore.exceptions
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .api_timeouts import get_call_budget
+
+logger = Logger(service="hedging")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+DEFAULT_MAX_SAMPLES = 1000
+DEFAULT_HEDGE_PERCENTILE = 99
+# Calls of an operation observed before its latency percentile is trusted for hedging
+DEFAULT_MINIMUM_SAMPLES = 20
+
+
+class CallTimeoutError(botocore.exceptions.ClientError):
+    """
+    Raised when a call does not complete within the budget of its operation. It is a
+    ClientError so the callers handle it as any other failed call.
+    """
+
+
+def get_call_timeout_error(operation: str, message: str) -> CallTimeoutError:
+    """
+    :param operation: the operation named <service name>:<operation name>
+    :param message: the message of the error
+    """
+    return CallTimeoutError(
+        {"Error": {"Code": "CallTimeout", "Message": message}},
+        operation.split(":", 1)[-1],
+    )
+
+
+# The deadline of the budgeted call running in the thread, read by the hooks of the client
+# to stop retrying once the budget is spent
+_call_deadline = threading.local()
+
+
+class LatencyTracker:
+    """Keeps the latencies of the latest successful calls of each operation."""
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES) -> None:
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(operation)
+            if samples is None:
+                samples = self._samples[operation] = deque(maxlen=self._max_samples)
+            samples.append(seconds)
+
+    def get_percentile(
+        self, operation: str, percentile: float, minimum_samples: int = 1
+    ) -> typing.Union[float, None]:
+        """
+        :return: the latency percentile of an operation in seconds, None with fewer samples
+            than minimum_samples
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(operation, ()))
+        if not samples or len(samples) < minimum_samples:
+            return None
+        return samples[round(percentile / 100 * (len(samples) - 1))]
+
+    def get_summary(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            operations = list(self._samples)
+        return {
+            operation: {
+                "p50": round(self.get_percentile(operation, 50), 3),
+                "p99": round(self.get_percentile(operation, 99), 3),
+            }
+            for operation in operations
+        }
+
+
+class HedgedCaller:
+    """
+    Calls idempotent read operations with a time budget, and sends a second identical
+    request when the first one is slower than the latency percentile of the operation.
+    The first response is used, so a single hung connection does not block a worker.
+    """
+
+    def __init__(
+        self,
+        timeouts: dict[str, float],
+        hedging: bool = True,
+        percentile: float = DEFAULT_HEDGE_PERCENTILE,
+        minimum_samples: int = DEFAULT_MINIMUM_SAMPLES,
+        max_threads: int = 256,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.latency_tracker = LatencyTracker()
+        self._timeouts = timeouts
+        self._hedging = hedging
+        self._percentile = percentile
+        self._minimum_samples = minimum_samples
+        self._clock = clock
+        # Threads are only started when needed, the pool grows with the concurrent calls
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix="hedged_call"
+        )
+        self._lock = threading.Lock()
+        self.hedges: dict[str, int] = {}
+
+    def get_hedge_delay(self, operation: str) -> typing.Union[float, None]:
+        if not self._hedging:
+            return None
+        return self.latency_tracker.get_percentile(
+            operation, self._percentile, self._minimum_samples
+        )
+
+    def call(self, client, method_name: str, **kwargs) -> dict:
+        """
+        This method calls an operation of a client within its budget, hedging slow calls
+        :param client: a boto3 client
+        :param method_name: the name of the client method, e.g. "get_metric_data"
+        :return: the response of the first attempt to succeed
+        """
+        method = getattr(client, method_name)
+        service_name = client.meta.service_model.service_name
+        operation_name = client.meta.method_to_api_mapping[method_name]
+        operation = f"{service_name}:{operation_name}"
+        budget = get_call_budget(self._timeouts, service_name, operation_name)
+        deadline = None if budget is None else self._clock() + budget
+        hedge_delay = self.get_hedge_delay(operation)
+        if hedge_delay is None:
+            # Nothing to race, the hooks of the client enforce the budget between retries
+            return self._call_with_deadline(deadline, method, kwargs)
+
+        attempts = [
+            self._executor.submit(self._call_with_deadline, deadline, method, kwargs)
+        ]
+        done, _ = wait(
+            attempts,
+            timeout=hedge_delay if budget is None else min(hedge_delay, budget),
+        )
+        if not done and (deadline is None or self._clock() < deadline):
+            logger.debug(f"Hedging {operation} after {hedge_delay:.3f} seconds")
+            with self._lock:
+                self.hedges[operation] = self.hedges.get(operation, 0) + 1
+            attempts.append(
+                self._executor.submit(
+                    self._call_with_deadline, deadline, method, kwargs
+                )
+            )
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            timeout = None if deadline is None else max(0, deadline - self._clock())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+                error = error or attempt.exception()
+        if error is not None and not pending:
+            raise error
+        raise get_call_timeout_error(
+            operation,
+            f"{operation} did not complete within its budget of {budget} seconds",
+        )
+
+    @staticmethod
+    def _call_with_deadline(
+        deadline: typing.Union[float, None], method: typing.Callable, kwargs: dict
+    ) -> dict:
+        _call_deadline.value = deadline
+        try:
+            return method(**kwargs)
+        finally:
+            _call_deadline.value = None
+
+    def _check_deadline(self, operation: str) -> None:
+        deadline = getattr(_call_deadline, "value", None)
+        if deadline is not None and self._clock() >= deadline:
+            raise get_call_timeout_error(
+                operation, f"{operation} ran out of its budget, not retrying"
+            )
+
+    def register(self, client) -> None:
+        """
+        This method records the latency of the successful calls of a client, and stops
+        retrying the budgeted calls once their budget is spent, so an abandoned attempt
+        does not keep retrying in the background
+        :param client: a boto3 client
+        """
+        service_name = client.meta.service_model.service_name
+        service_id = client.meta.service_model.service_id.hyphenize()
+
+        def before_call(context, **kwargs) -> None:
+            context["call_started"] = self._clock()
+
+        def before_send(event_name, **kwargs) -> None:
+            # The event is named before-send.<service id>.<operation name>
+            self._check_deadline(f"{service_name}:{event_name.rsplit('.', 1)[-1]}")
+
+        def needs_retry(response, operation, caught_exception, **kwargs) -> None:
+            if caught_exception is not None or (
+                response is not None and response[0].status_code >= 300
+            ):
+                self._check_deadline(f"{service_name}:{operation.name}")
+
+        def after_call(http_response, model, context, **kwargs) -> None:
+            if http_response.status_code < 300 and "call_started" in context:
+                self.latency_tracker.record(
+                    f"{service_name}:{model.name}",
+                    self._clock() - context["call_started"],
+                )
+
+        client.meta.events.register(f"before-call.{service_id}", before_call)
+        client.meta.events.register(f"after-call.{service_id}", after_call)
+        client.meta.events.register_first(f"before-send.{service_id}", before_send)
+        client.meta.events.register_first(f"needs-retry.{service_id}", needs_retry)
+
+    def log_summary(self) -> None:
+        logger.info(
+            f"API latencies: {self.latency_tracker.get_summary()}, hedged calls: "
+            f"{dict(self.hedges)}"
+        )
+
+
+def is_hedging_enabled() -> bool:
+    return os.getenv("HedgeRequests", "Yes") == "Yes"
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import shutil
+import tempfile
+import typing
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Initialize logger
+logger = Logger(service="report_sink")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+DEFAULT_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+class ReportSink:
+    """
+    Append-only buffer for report rows. Rows are kept in memory up to the spool size
+    and spill to a temporary file after that, so memory use does not grow with the
+    size of the report.
+
+    With copy_objects the rows of a directory are not kept at all. The sink only records
+    the key of the per-directory report already uploaded by the DirectoryReader, and the
+    aggregated report is assembled from those objects in S3.
+    """
+
+    def __init__(
+        self,
+        spool_bytes: typing.Union[int, None] = None,
+        copy_objects: typing.Union[bool, None] = None,
+    ) -> None:
+        spool_bytes = spool_bytes or int(
+            os.getenv("ReportSpoolBytes", DEFAULT_SPOOL_BYTES)
+        )
+        if copy_objects is None:
+            copy_objects = os.getenv("ReportAggregation", "Stream") == "Copy"
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_bytes, mode="w+b")
+        self._size = 0
+        self.copy_objects = copy_objects
+        self.object_keys: list[str] = []
+
+    def __enter__(self) -> "ReportSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def write(self, rows: str) -> None:
+        data = rows.encode("utf-8")
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._size += len(data)
+
+    def add_object(self, s3_key: str) -> None:
+        self.object_keys.append(s3_key)
+
+    def write_sink(self, other: "ReportSink") -> None:
+        """This method appends the rows of another sink without loading them in memory."""
+        self._file.seek(0, os.SEEK_END)
+        shutil.copyfileobj(other.open(), self._file)
+        self._size += other.size
+        self.object_keys.extend(other.object_keys)
+
+    def open(self) -> typing.BinaryIO:
+        """
+        This method returns the content of the sink as a binary file positioned at the start
+        :return: the underlying file object
+        """
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def getvalue(self) -> str:
+        return self.open().read().decode("utf-8")
+
+    def close(self) -> None:
+        self._file.close()
@@ -11,6 +11,12 @@ import typing
 import boto3
 import botocore
 from aws_lambda_powertools import Logger
+from boto3.s3.transfer import TransferConfig
+
+# Cost Optimizer for Amazon Workspaces
+from ..workspace_record import WorkspaceRecord
+from . import client_factory
+from .report_sink import ReportSink
 
 # Initialize logger
 logger = Logger(service="wco_report_s3_utils")
@@ -22,6 +28,16 @@ boto_config = botocore.config.Config(
     user_agent_extra=os.getenv("UserAgentString"),
 )
 
+# Reports above the threshold are uploaded in parts, one part in memory per thread
+transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+# Every part of a multipart upload except the last one must be at least 5 MiB
+MIN_PART_BYTES = 5 * 1024 * 1024
+
 
 def upload_report(
     session: boto3.session.Session,
@@ -48,6 +64,27 @@ def upload_report(
     logger.debug("Successfully uploaded csv file to %s", s3_key)
 
 
+def upload_report_sink(
+    session: boto3.session.Session,
+    date_time_values,
+    stack_parameters: dict,
+    report_sink: ReportSink,
+):
+    """
+    :param report_sink: sink holding the rows of the aggregated report
+    :param stack_parameters: parameters for the stack
+    This method streams the aggregated report from the sink to the cost optimizer bucket.
+    """
+    logger.debug("Uploading the aggregated csv report to s3 bucket.")
+    s3_key = create_s3_key(stack_parameters, None, None, None, date_time_values)
+    bucket_name = stack_parameters["BucketName"]
+    if report_sink.copy_objects:
+        s3_copy_report(session, bucket_name, report_sink, s3_key)
+    else:
+        s3_upload_report(session, bucket_name, report_sink, s3_key)
+    logger.debug("Successfully uploaded csv file to %s", s3_key)
+
+
 def create_s3_key(
     stack_parameters: dict,
     directory_id: typing.Union[str, None],
@@ -93,7 +130,7 @@ def s3_put_report(
         "Putting report to s3 bucket {} with key: {}".format(bucket_name, s3_key)
     )
     try:
-        session.client("s3", config=boto_config).put_object(
+        client_factory.get_client(session, "s3", config=boto_config).put_object(
             Bucket=bucket_name, Body=report_body, Key=s3_key
         )
         logger.debug(
@@ -107,3 +144,210 @@ def s3_put_report(
                 e
             )
         )
+
+
+def s3_upload_report(
+    session: boto3.session.Session,
+    bucket_name: str,
+    report_sink: ReportSink,
+    s3_key: str,
+) -> None:
+    """
+    :param: bucket_name: Name of the bucket to upload report
+    :param: report_sink: sink holding the rows of the report
+    :param: s3_key: key for the s3 report
+    This method uploads the report from the sink, using a multipart upload for large reports
+    """
+    logger.debug(
+        "Uploading report of {} bytes to s3 bucket {} with key: {}".format(
+            report_sink.size, bucket_name, s3_key
+        )
+    )
+    try:
+        client_factory.get_client(session, "s3", config=boto_config).upload_fileobj(
+            report_sink.open(), bucket_name, s3_key, Config=transfer_config
+        )
+        logger.debug(
+            "Successfully uploaded the report to s3 bucket {} with key: {}".format(
+                bucket_name, s3_key
+            )
+        )
+    except (botocore.exceptions.ClientError, boto3.exceptions.S3UploadFailedError) as e:
+        logger.exception(
+            "Exception occurred while uploading the report to s3 bucket. Error {}".format(
+                e
+            )
+        )
+
+
+def s3_copy_report(
+    session: boto3.session.Session,
+    bucket_name: str,
+    report_sink: ReportSink,
+    s3_key: str,
+) -> None:
+    """
+    :param: bucket_name: Name of the bucket with the per-directory reports
+    :param: report_sink: sink holding the header and the keys of the per-directory reports
+    :param: s3_key: key for the aggregated report
+    This method assembles the aggregated report in S3 from the per-directory reports without
+    their headers. Ranges of at least 5 MiB are copied server side with UploadPartCopy, smaller
+    ranges are downloaded and buffered until they fill a part.
+    """
+    s3_client = client_factory.get_client(session, "s3", config=boto_config)
+    header_bytes = len(WorkspaceRecord.csv_header().encode("utf-8"))
+    try:
+        object_sizes = get_object_sizes(s3_client, bucket_name, report_sink.object_keys)
+        source_ranges = []
+        for key in report_sink.object_keys:
+            size = object_sizes.get(key)
+            if size is None:
+                logger.warning("Directory report {} not found, skipping".format(key))
+            elif size > header_bytes:
+                source_ranges.append((key, header_bytes, size))
+        buffer = bytearray(report_sink.open().read())
+        total_bytes = len(buffer) + sum(end - start for _, start, end in source_ranges)
+        logger.debug(
+            "Assembling report of {} bytes from {} directory reports to s3 bucket {} with key: {}".format(
+                total_bytes, len(source_ranges), bucket_name, s3_key
+            )
+        )
+        if total_bytes < MIN_PART_BYTES:
+            for key, start, end in source_ranges:
+                buffer += get_object_range(s3_client, bucket_name, key, start, end)
+            s3_client.put_object(Bucket=bucket_name, Body=bytes(buffer), Key=s3_key)
+        else:
+            upload_id = s3_client.create_multipart_upload(
+                Bucket=bucket_name, Key=s3_key
+            )["UploadId"]
+            try:
+                parts = copy_report_parts(
+                    s3_client, bucket_name, s3_key, upload_id, buffer, source_ranges
+                )
+                s3_client.complete_multipart_upload(
+                    Bucket=bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+            except Exception:
+                abort_multipart_upload(s3_client, bucket_name, s3_key, upload_id)
+                raise
+        logger.debug(
+            "Successfully assembled the report in s3 bucket {} with key: {}".format(
+                bucket_name, s3_key
+            )
+        )
+    except botocore.exceptions.ClientError as e:
+        logger.exception(
+            "Exception occurred while assembling the report in s3 bucket. Error {}".format(
+                e
+            )
+        )
+
+
+def abort_multipart_upload(
+    s3_client, bucket_name: str, s3_key: str, upload_id: str
+) -> None:
+    """
+    This method aborts a failed multipart upload. A failed abort is logged so the error of
+    the upload is raised, the lifecycle rule of the bucket removes the parts left behind.
+    """
+    try:
+        s3_client.abort_multipart_upload(
+            Bucket=bucket_name, Key=s3_key, UploadId=upload_id
+        )
+    except botocore.exceptions.ClientError as e:
+        logger.warning(
+            "Unable to abort the multipart upload {} of {}. Error {}".format(
+                upload_id, s3_key, e
+            )
+        )
+
+
+def copy_report_parts(
+    s3_client,
+    bucket_name: str,
+    s3_key: str,
+    upload_id: str,
+    buffer: bytearray,
+    source_ranges: list[tuple[str, int, int]],
+) -> list[dict]:
+    """
+    :param: buffer: bytes to upload before the first source range, e.g. the report header
+    :param: source_ranges: the key, start offset and end offset (exclusive) of each range to copy
+    :return: the parts of the multipart upload
+    This method uploads the parts of the aggregated report. Ranges are copied when they are
+    large enough to be a part on their own, otherwise they are added to the buffer.
+    """
+    parts = []
+
+    def upload_buffer():
+        response = s3_client.upload_part(
+            Bucket=bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=len(parts) + 1,
+            Body=bytes(buffer),
+        )
+        parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+        buffer.clear()
+
+    for key, start, end in source_ranges:
+        if buffer and len(buffer) < MIN_PART_BYTES:
+            # Top up the pending part from the start of this range
+            top_up_end = min(end, start + MIN_PART_BYTES - len(buffer))
+            buffer += get_object_range(s3_client, bucket_name, key, start, top_up_end)
+            start = top_up_end
+        if len(buffer) >= MIN_PART_BYTES:
+            upload_buffer()
+        if start == end:
+            continue
+        if end - start >= MIN_PART_BYTES:
+            response = s3_client.upload_part_copy(
+                Bucket=bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                CopySource={"Bucket": bucket_name, "Key": key},
+                CopySourceRange=f"bytes={start}-{end - 1}",
+            )
+            parts.append(
+                {
+                    "ETag": response["CopyPartResult"]["ETag"],
+                    "PartNumber": len(parts) + 1,
+                }
+            )
+        else:
+            buffer += get_object_range(s3_client, bucket_name, key, start, end)
+    if buffer:
+        upload_buffer()
+    return parts
+
+
+def get_object_sizes(s3_client, bucket_name: str, keys: list[str]) -> dict[str, int]:
+    """
+    :param: keys: keys of the objects
+    :return: the size of each object found, keyed by the object key
+    This method lists the objects under the common prefix of the keys.
+    """
+    if not keys:
+        return {}
+    wanted_keys = set(keys)
+    object_sizes = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=bucket_name, Prefix=os.path.commonprefix(keys)
+    ):
+        for s3_object in page.get("Contents", []):
+            if s3_object["Key"] in wanted_keys:
+                object_sizes[s3_object["Key"]] = s3_object["Size"]
+    return object_sizes
+
+
+def get_object_range(
+    s3_client, bucket_name: str, key: str, start: int, end: int
+) -> bytes:
+    return s3_client.get_object(
+        Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end - 1}"
+    )["Body"].read()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+import queue
+import random
+import threading
+import time
+import typing
+from itertools import batched
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Initialize logger
+logger = Logger(service="session_writer")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+BATCH_SIZE = 25
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+DEFAULT_QUEUE_SIZE = 1000
+# Seconds the writer waits for more items before writing a partial batch
+DEFAULT_LINGER_SECONDS = 1.0
+DEFAULT_SHUTDOWN_SECONDS = 120.0
+# The key of the user session table
+KEY_ATTRIBUTES = ("WorkspaceId", "SessionTime")
+
+_STOP = object()
+
+
+def get_backoff_seconds(
+    retries: int,
+    random_uniform: typing.Callable[[float, float], float] = random.uniform,
+) -> float:
+    """This method returns the exponential backoff with full jitter of a retry."""
+    return random_uniform(
+        0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2**retries)
+    )
+
+
+def deduplicate_items(items: typing.Iterable[dict]) -> list[dict]:
+    """
+    This method keeps the last item of each key, since a batch with two items of the same
+    key is rejected with a ValidationException, e.g. when a workspace is processed again
+    """
+    unique_items = {}
+    for item in items:
+        key = tuple(
+            tuple(item.get(attribute, {}).items()) for attribute in KEY_ATTRIBUTES
+        )
+        unique_items.pop(key, None)
+        unique_items[key] = item
+    return list(unique_items.values())
+
+
+def write_batch(
+    client,
+    table_name: str,
+    items: typing.Sequence[dict],
+    sleep: typing.Union[typing.Callable[[float], None], None] = None,
+) -> dict:
+    """
+    This method writes up to 25 items to a table and retries the unprocessed items with a
+    jittered exponential backoff
+    :param client: a DynamoDB client
+    :param table_name: the name of the table
+    :param items: the DynamoDB items to put
+    :param sleep: the function waiting between the retries, time.sleep by default
+    :return: the items still unprocessed after the last retry
+    """
+    sleep = sleep or time.sleep
+    response = client.batch_write_item(
+        RequestItems={table_name: [{"PutRequest": {"Item": item}} for item in items]}
+    )
+    retries = 0
+    while response.get("UnprocessedItems") and retries < MAX_RETRIES:
+        retries += 1
+        sleep(get_backoff_seconds(retries))
+        response = client.batch_write_item(
+            RequestItems=response.get("UnprocessedItems")
+        )
+    if response.get("UnprocessedItems"):
+        logger.error(
+            "Unable to write the following user sessions to the table: {}, retries left: {}".format(
+                response.get("UnprocessedItems"), MAX_RETRIES - retries
+            )
+        )
+    return response.get("UnprocessedItems", {})
+
+
+class SessionWriter:
+    """
+    Writes the user sessions of all the workspaces in a background thread, so retrying
+    throttled writes does not hold up the processing of a workspace. Items are grouped in
+    full batches across workspaces. put blocks while the bounded queue is full, which slows
+    the producers down to the rate the table accepts.
+    """
+
+    def __init__(
+        self,
+        client,
+        table_name: str,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        linger_seconds: float = DEFAULT_LINGER_SECONDS,
+        sleep: typing.Union[typing.Callable[[float], None], None] = None,
+    ) -> None:
+        self._client = client
+        self._table_name = table_name
+        self._linger_seconds = linger_seconds
+        self._sleep = sleep
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._thread: typing.Union[threading.Thread, None] = None
+        self._closed = False
+        self.written_items = 0
+        self.failed_items = 0
+
+    def put(self, items: list[dict]) -> None:
+        """
+        This method queues the DynamoDB items of the user sessions of a workspace
+        :param items: the DynamoDB items to put
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The session writer is closed")
+            # The thread is started on the first write so idle helpers cost nothing
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="session_writer", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(items)
+
+    def close(self, timeout: float = DEFAULT_SHUTDOWN_SECONDS) -> bool:
+        """
+        This method writes the queued items and stops the thread
+        :param timeout: the seconds to wait for the queued items to be written
+        :return: True when all the queued items were written or given up on
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(max(0, deadline - time.monotonic()))
+        if thread.is_alive():
+            logger.error(
+                f"Timed out after {timeout} seconds writing the user sessions, "
+                f"{self._queue.qsize()} workspaces left in the queue"
+            )
+            return False
+        logger.info(
+            f"Wrote {self.written_items} user sessions, {self.failed_items} failed"
+        )
+        return True
+
+    def _run(self) -> None:
+        pending: list[dict] = []
+        stopping = False
+        while not stopping:
+            try:
+                entry = self._queue.get(
+                    timeout=self._linger_seconds if pending else None
+                )
+            except queue.Empty:
+                entry = None
+            if entry is _STOP:
+                stopping = True
+            elif entry is not None:
+                pending.extend(entry)
+                if len(pending) < BATCH_SIZE:
+                    continue
+            # Full batches are written as soon as they fill up, the remainder after
+            # the queue was idle for the linger period or on close
+            full_items = len(pending) - len(pending) % BATCH_SIZE
+            items, pending = (
+                (pending, [])
+                if entry is None or stopping
+                else (pending[:full_items], pending[full_items:])
+            )
+            for batch in batched(deduplicate_items(items), BATCH_SIZE):
+                self._write(batch)
+
+    def _write(self, batch: typing.Sequence[dict]) -> None:
+        try:
+            unprocessed_items = write_batch(
+                self._client, self._table_name, batch, self._sleep
+            )
+            failed_items = len(unprocessed_items.get(self._table_name, []))
+        except Exception as e:
+            logger.exception(
+                "Exception occurred while updating the user session table. Error: {}".format(
+                    e
+                )
+            )
+            failed_items = len(batch)
+        self.written_items += len(batch) - failed_items
+        self.failed_items += failed_items
+
+
+_session_writers: dict[tuple, SessionWriter] = {}
+_session_writers_lock = threading.Lock()
+
+
+def get_session_writer(client, table_name: str) -> SessionWriter:
+    """
+    This method returns the process-wide writer of a table, so the sessions of the
+    workspaces of all the threads share batches
+    """
+    key = (client, table_name)
+    with _session_writers_lock:
+        if key not in _session_writers:
+            _session_writers[key] = SessionWriter(
+                client,
+                table_name,
+                int(os.getenv("SessionWriterQueueSize", DEFAULT_QUEUE_SIZE)),
+            )
+        return _session_writers[key]
+
+
+def shutdown_session_writers(timeout: typing.Union[float, None] = None) -> None:
+    """This method drains the writers of all the tables within a shared timeout."""
+    if timeout is None:
+        timeout = float(
+            os.getenv("SessionWriterShutdownSeconds", DEFAULT_SHUTDOWN_SECONDS)
+        )
+    with _session_writers_lock:
+        session_writers = list(_session_writers.values())
+        _session_writers.clear()
+    deadline = time.monotonic() + timeout
+    for session_writer in session_writers:
+        session_writer.close(max(0, deadline - time.monotonic()))
+
+
+def is_background_writes_enabled() -> bool:
+    return os.getenv("BackgroundSessionWrites", "Yes") == "Yes"
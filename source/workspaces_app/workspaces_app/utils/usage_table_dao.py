@@ -5,6 +5,7 @@
 
 # Standard Library
 import os
+import typing
 
 # AWS Libraries
 import boto3
@@ -13,6 +14,7 @@ from aws_lambda_powertools import Logger
 
 # Cost Optimizer for Amazon Workspaces
 from ..workspace_record import WorkspaceDescription, WorkspaceRecord
+from . import client_factory
 
 # Initialize logger
 logger = Logger(service="workspace_usage_table_dao")
@@ -29,7 +31,7 @@ class UsageTableDAO:
     def __init__(self, session: boto3.session.Session, table_name: str, region: str):
         self.region = region
         self.table_name = table_name
-        self.client = session.client("dynamodb", config=boto_config)
+        self.client = client_factory.get_client(session, "dynamodb", config=boto_config)
 
     def update_ddb_item(
         self,
@@ -66,7 +68,9 @@ class UsageTableDAO:
         """
         ws_record = ws_description
         try:
-            response = self.client.get_item(
+            response = client_factory.hedged_call(
+                self.client,
+                "get_item",
                 TableName=self.table_name,
                 Key={
                     "WorkspaceId": {"S": ws_description.workspace_id},
@@ -85,3 +89,19 @@ class UsageTableDAO:
                 )
             )
         return ws_record
+
+    def scan_ddb_items(self, attributes: list[str]) -> typing.Iterator[dict[str, any]]:
+        """
+        This method reads the given attributes of every item of the usage table
+        :param attributes: the names of the attributes to read
+        :return: the serialized DynamoDB items
+        """
+        paginator = self.client.get_paginator("scan")
+        for page in paginator.paginate(
+            TableName=self.table_name,
+            ProjectionExpression=", ".join(f"#{attribute}" for attribute in attributes),
+            ExpressionAttributeNames={
+                f"#{attribute}": attribute for attribute in attributes
+            },
+        ):
+            yield from page.get("Items", [])
@@ -5,7 +5,7 @@
 
 # Standard Library
 import os
-import time
+import typing
 from itertools import batched
 
 # AWS Libraries
@@ -15,6 +15,14 @@ from aws_lambda_powertools import Logger
 
 # Cost Optimizer for Amazon Workspaces
 from ..user_session import UserSession
+from . import client_factory
+from .session_writer import (
+    BATCH_SIZE,
+    deduplicate_items,
+    get_session_writer,
+    is_background_writes_enabled,
+    write_batch,
+)
 
 # Initialize logger
 logger = Logger(service="workspace_usage_table_dao")
@@ -28,49 +36,40 @@ boto_config = botocore.config.Config(
 
 
 class UserSessionDAO:
-    def __init__(self, session: boto3.session.Session, table_name: str, region: str):
+    def __init__(
+        self,
+        session: boto3.session.Session,
+        table_name: str,
+        region: str,
+        background_writes: typing.Union[bool, None] = None,
+    ):
         self.region = region
         self.table_name = table_name
-        self.client = session.client("dynamodb", config=boto_config)
+        self.client = client_factory.get_client(session, "dynamodb", config=boto_config)
+        if background_writes is None:
+            background_writes = is_background_writes_enabled()
+        self.session_writer = (
+            get_session_writer(self.client, table_name) if background_writes else None
+        )
 
     def update_ddb_items(
         self,
         user_sessions: list[UserSession],
     ):
         """
-        :param session: A boto3 session
-        :param table_name: The name of the workspace usage table
-        :param report_body: Report body containing the workspace analysis data
-        :param directory_region: The region in which the directory exists
-        :param account: The aws account for the workspace
-        This method writes the workspace analysis data to DynamoDB
+        :param user_sessions: The user sessions of a workspace
+        This method writes the user sessions to DynamoDB. With background writes the items
+        are queued for the session writer, which writes them after this method returns.
         """
         try:
             list_ddb_items = [
                 UserSession.to_ddb_obj(session) for session in user_sessions
             ]
-            for batch in batched(list_ddb_items, 25):
-                response = self.client.batch_write_item(
-                    RequestItems={
-                        self.table_name: [
-                            {"PutRequest": {"Item": item}} for item in batch
-                        ]
-                    }
-                )
-                retries = 0
-                max_retries = 5
-                while response.get("UnprocessedItems") and retries < max_retries:
-                    retries += 1
-                    time.sleep(2**retries + 10)
-                    response = self.client.batch_write_item(
-                        RequestItems=response.get("UnprocessedItems")
-                    )
-                if retries >= max_retries:
-                    logger.exception(
-                        "Unable to write the following user sessions to the table: {}, retries left: {}".format(
-                            response.get("UnprocessedItems"), max_retries - retries
-                        )
-                    )
+            if self.session_writer is not None:
+                self.session_writer.put(list_ddb_items)
+                return
+            for batch in batched(deduplicate_items(list_ddb_items), BATCH_SIZE):
+                write_batch(self.client, self.table_name, batch)
         except Exception as e:
             logger.exception(
                 "Exception occurred while updating the user session table. Error: {}".format(
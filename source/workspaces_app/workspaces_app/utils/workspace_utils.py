@@ -16,6 +16,16 @@ logger.setLevel(log_level)
 
 TERMINATE_UNUSED_WORKSPACES = os.getenv("TerminateUnusedWorkspaces")
 RESOURCE_UNAVAILABLE = "ResourceUnavailable"
+# Workspaces in these states are reported but not analyzed or modified
+NON_ACTIONABLE_STATES = {
+    "PENDING",
+    "TERMINATING",
+    "TERMINATED",
+    "SUSPENDED",
+    "ERROR",
+    "MAINTENANCE",
+    "ADMIN_MAINTENANCE",
+}
 
 
 def is_terminate_workspace_enabled():
@@ -67,3 +77,13 @@ def check_for_skip_tag(tags):
                 return True
 
     return False
+
+
+def is_actionable_workspace(workspace):
+    """
+    Return a boolean value to indicate if the workspace should go through metric collection,
+    tagging, termination and conversion based on its state
+    :param workspace: a workspace from the describe_workspaces response
+    :return: True if the workspace is in an actionable state or the state is unknown
+    """
+    return workspace.get("State") not in NON_ACTIONABLE_STATES
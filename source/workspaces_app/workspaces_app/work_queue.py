@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import abc
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing
+from itertools import batched
+from typing import Union
+
+# AWS Libraries
+import botocore
+from aws_lambda_powertools import Logger
+from boto3.session import Session
+from botocore.exceptions import ClientError
+
+# Cost Optimizer for Amazon Workspaces
+from .utils import client_factory
+from .utils.decimal_encoder import DecimalEncoder
+
+logger = Logger(service="work_queue")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+boto_config = botocore.config.Config(
+    retries={"max_attempts": 20, "mode": "standard"},
+    user_agent_extra=os.getenv("UserAgentString"),
+)
+
+SQS_BATCH_SIZE = 10
+DEFAULT_SQLITE_PATH = "/tmp/wco_work_queue.db"
+
+# A directory to process. The run level values are carried in every unit so that
+# workers started at a different time produce the same report as the coordinator.
+WorkUnit = namedtuple(
+    "WorkUnit",
+    [
+        "unit_id",
+        "run_id",
+        "account_id",
+        "role_name",
+        "region",
+        "directory",
+        "date_time_values",
+    ],
+)
+WorkResult = namedtuple(
+    "WorkResult",
+    ["unit_id", "report_csv", "workspaces_processed", "dashboard_metrics", "error"],
+)
+Lease = namedtuple("Lease", ["unit", "handle", "attempts"])
+
+
+def encode_work_unit(unit: WorkUnit) -> str:
+    date_time_values = dict(unit.date_time_values)
+    first_day_selected_month = date_time_values.get("first_day_selected_month")
+    if isinstance(first_day_selected_month, datetime.date):
+        date_time_values["first_day_selected_month"] = (
+            first_day_selected_month.isoformat()
+        )
+    return json.dumps(
+        unit._replace(date_time_values=date_time_values)._asdict(), cls=DecimalEncoder
+    )
+
+
+def decode_work_unit(body: str) -> WorkUnit:
+    unit = WorkUnit(**json.loads(body))
+    first_day_selected_month = unit.date_time_values.get("first_day_selected_month")
+    if isinstance(first_day_selected_month, str):
+        unit.date_time_values["first_day_selected_month"] = datetime.date.fromisoformat(
+            first_day_selected_month
+        )
+    return unit
+
+
+def encode_work_result(result: WorkResult) -> str:
+    return json.dumps(result._asdict(), cls=DecimalEncoder)
+
+
+def decode_work_result(body: str) -> WorkResult:
+    return WorkResult(**json.loads(body))
+
+
+class WorkQueue(abc.ABC):
+    @abc.abstractmethod
+    def put(self, units: list[WorkUnit]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def lease(self, worker_id: str, lease_seconds: int) -> Union[Lease, None]:
+        pass
+
+    @abc.abstractmethod
+    def extend(self, lease: Lease, lease_seconds: int) -> None:
+        pass
+
+    @abc.abstractmethod
+    def release(self, lease: Lease) -> None:
+        pass
+
+    @abc.abstractmethod
+    def complete(self, lease: Lease, result: WorkResult) -> None:
+        pass
+
+    @abc.abstractmethod
+    def get_results(self, units: list[WorkUnit]) -> dict[str, WorkResult]:
+        """
+        :param units: the units of a run
+        :return: the results of the units completed in this run, keyed by unit id
+        """
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    Work queue in a local SQLite database, for tests and single host runs. The results are
+    keyed by run, so the results of a previous run sharing the file are never merged.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self._path = path
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS work_units ("
+                "unit_id TEXT PRIMARY KEY, body TEXT NOT NULL, status TEXT NOT NULL, "
+                "lease_owner TEXT, lease_expiry REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS run_results (run_id TEXT NOT NULL, "
+                "unit_id TEXT NOT NULL, body TEXT NOT NULL, PRIMARY KEY (run_id, unit_id))"
+            )
+
+    def _connect(self) -> closing[sqlite3.Connection]:
+        return closing(sqlite3.connect(self._path, timeout=30, isolation_level=None))
+
+    def put(self, units: list[WorkUnit]) -> None:
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO work_units (unit_id, body, status, attempts) "
+                "VALUES (?, ?, 'PENDING', 0)",
+                [(unit.unit_id, encode_work_unit(unit)) for unit in units],
+            )
+
+    def lease(self, worker_id: str, lease_seconds: int) -> Union[Lease, None]:
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT unit_id, body, attempts FROM work_units "
+                "WHERE status = 'PENDING' OR (status = 'LEASED' AND lease_expiry < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            unit_id, body, attempts = row
+            connection.execute(
+                "UPDATE work_units SET status = 'LEASED', lease_owner = ?, "
+                "lease_expiry = ?, attempts = ? WHERE unit_id = ?",
+                (worker_id, now + lease_seconds, attempts + 1, unit_id),
+            )
+            connection.execute("COMMIT")
+        return Lease(decode_work_unit(body), worker_id, attempts + 1)
+
+    def extend(self, lease: Lease, lease_seconds: int) -> None:
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE work_units SET lease_expiry = ? "
+                "WHERE unit_id = ? AND lease_owner = ? AND status = 'LEASED'",
+                (time.time() + lease_seconds, lease.unit.unit_id, lease.handle),
+            )
+
+    def release(self, lease: Lease) -> None:
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "UPDATE work_units SET status = 'PENDING', lease_owner = NULL, "
+                "lease_expiry = NULL WHERE unit_id = ? AND lease_owner = ?",
+                (lease.unit.unit_id, lease.handle),
+            )
+
+    def complete(self, lease: Lease, result: WorkResult) -> None:
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO run_results (run_id, unit_id, body) "
+                "VALUES (?, ?, ?)",
+                (lease.unit.run_id, result.unit_id, encode_work_result(result)),
+            )
+            # A lease of a previous run does not complete the unit put again by this run
+            connection.execute(
+                "UPDATE work_units SET status = 'DONE' "
+                "WHERE unit_id = ? AND lease_owner = ?",
+                (lease.unit.unit_id, lease.handle),
+            )
+
+    def get_results(self, units: list[WorkUnit]) -> dict[str, WorkResult]:
+        unit_keys = {(unit.run_id, unit.unit_id) for unit in units}
+        run_ids = sorted({unit.run_id for unit in units})
+        with self._lock, self._connect() as connection:
+            rows = connection.execute(
+                "SELECT run_id, unit_id, body FROM run_results "
+                "WHERE run_id IN ({})".format(",".join("?" * len(run_ids))),
+                run_ids,
+            ).fetchall()
+        return {
+            unit_id: decode_work_result(body)
+            for run_id, unit_id, body in rows
+            if (run_id, unit_id) in unit_keys
+        }
+
+
+class SqsWorkQueue(WorkQueue):
+    """
+    Work queue on SQS. The visibility timeout of a received message is the lease and
+    partial results are written to the reporting bucket.
+    """
+
+    def __init__(
+        self, session: Session, queue_url: str, bucket_name: str, prefix: str
+    ) -> None:
+        super().__init__()
+        self._queue_url = queue_url
+        self._bucket_name = bucket_name
+        self._prefix = prefix
+        self._sqs_client = client_factory.get_client(session, "sqs", config=boto_config)
+        self._s3_client = client_factory.get_client(session, "s3", config=boto_config)
+
+    def _result_key(self, unit: WorkUnit) -> str:
+        return f"{self._prefix}{unit.run_id}/{unit.unit_id}.json"
+
+    def put(self, units: list[WorkUnit]) -> None:
+        for batch in batched(units, SQS_BATCH_SIZE):
+            response = self._sqs_client.send_message_batch(
+                QueueUrl=self._queue_url,
+                Entries=[
+                    {"Id": str(index), "MessageBody": encode_work_unit(unit)}
+                    for index, unit in enumerate(batch)
+                ],
+            )
+            for failed in response.get("Failed", []):
+                logger.error(
+                    "Error publishing work unit {}: {}".format(
+                        batch[int(failed.get("Id"))].unit_id, failed.get("Message")
+                    )
+                )
+
+    def lease(self, worker_id: str, lease_seconds: int) -> Union[Lease, None]:
+        response = self._sqs_client.receive_message(
+            QueueUrl=self._queue_url,
+            MaxNumberOfMessages=1,
+            VisibilityTimeout=lease_seconds,
+            WaitTimeSeconds=int(os.getenv("WorkQueueWaitSeconds", "20")),
+            MessageSystemAttributeNames=["ApproximateReceiveCount"],
+        )
+        messages = response.get("Messages", [])
+        if not messages:
+            return None
+        message = messages[0]
+        return Lease(
+            decode_work_unit(message.get("Body")),
+            message.get("ReceiptHandle"),
+            int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1)),
+        )
+
+    def extend(self, lease: Lease, lease_seconds: int) -> None:
+        self._sqs_client.change_message_visibility(
+            QueueUrl=self._queue_url,
+            ReceiptHandle=lease.handle,
+            VisibilityTimeout=lease_seconds,
+        )
+
+    def release(self, lease: Lease) -> None:
+        self.extend(lease, 0)
+
+    def complete(self, lease: Lease, result: WorkResult) -> None:
+        self._s3_client.put_object(
+            Bucket=self._bucket_name,
+            Key=self._result_key(lease.unit),
+            Body=encode_work_result(result),
+        )
+        self._sqs_client.delete_message(
+            QueueUrl=self._queue_url, ReceiptHandle=lease.handle
+        )
+
+    def get_results(self, units: list[WorkUnit]) -> dict[str, WorkResult]:
+        results = {}
+        for unit in units:
+            try:
+                response = self._s3_client.get_object(
+                    Bucket=self._bucket_name, Key=self._result_key(unit)
+                )
+            except ClientError as exception:
+                if exception.response.get("Error", {}).get("Code") in (
+                    "NoSuchKey",
+                    "404",
+                ):
+                    continue
+                raise
+            results[unit.unit_id] = decode_work_result(response["Body"].read())
+        return results
+
+
+def get_work_queue(session: Session) -> WorkQueue:
+    queue_url: str = os.getenv("WorkQueueUrl")
+    if queue_url:
+        return SqsWorkQueue(
+            session, queue_url, os.getenv("BucketName"), "work_results/"
+        )
+    # Single host run, e.g. for testing
+    return SqliteWorkQueue(os.getenv("WorkQueuePath", DEFAULT_SQLITE_PATH))
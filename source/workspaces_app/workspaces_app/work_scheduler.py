@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+# Standard Library
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Union
+
+# AWS Libraries
+from aws_lambda_powertools import Logger
+
+# Cost Optimizer for Amazon Workspaces
+from .utils import client_factory
+from .utils.adaptive_concurrency import AimdController, is_adaptive_concurrency_enabled
+from .workspaces_helper import botoConfig, list_workspaces_for_directory
+
+logger = Logger(service="work_scheduler")
+log_level = os.getenv("LogLevel", "INFO")
+logger.setLevel(log_level)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# A directory found by the discovery, with the session of its account
+DirectoryTarget = namedtuple(
+    "DirectoryTarget", ["account_id", "session", "region", "directory"]
+)
+# A chunk of the workspaces of a directory. Small directories are a single chunk. The
+# workspaces are None when the listing failed, they are listed again when processed.
+WorkItem = namedtuple(
+    "WorkItem",
+    [
+        "account_id",
+        "session",
+        "region",
+        "directory",
+        "workspaces",
+        "chunk_index",
+        "chunk_count",
+    ],
+)
+
+
+def plan_work_items(
+    targets: list[DirectoryTarget],
+    chunk_size: Union[int, None] = None,
+    max_workers: Union[int, None] = None,
+) -> list[WorkItem]:
+    """
+    This method lists the workspaces of the directories concurrently and splits every
+    directory into chunks of at most chunk_size workspaces. The size of a work item is the
+    number of its workspaces.
+    :param targets: the directories to process
+    :param chunk_size: the maximum number of workspaces of a work item
+    :param max_workers: the number of directories to list in parallel
+    :return: the work items in the order of the targets
+    """
+    chunk_size = chunk_size or int(os.getenv("WorkChunkSize", DEFAULT_CHUNK_SIZE))
+    max_workers = max_workers or int(os.getenv("MaxConcurrentDiscovery", "16"))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                list_workspaces_for_directory,
+                client_factory.get_client(
+                    target.session, "workspaces", target.region, botoConfig
+                ),
+                target.directory.get("DirectoryId"),
+            )
+            for target in targets
+        ]
+    work_items = []
+    for target, future in zip(targets, futures):
+        try:
+            workspaces = future.result()
+        except Exception as e:
+            logger.exception(
+                f"Error listing the workspaces of directory {target.directory.get('DirectoryId')}: {str(e)}"
+            )
+            work_items.append(
+                WorkItem(
+                    account_id=target.account_id,
+                    session=target.session,
+                    region=target.region,
+                    directory=target.directory,
+                    workspaces=None,
+                    chunk_index=0,
+                    chunk_count=1,
+                )
+            )
+            continue
+        chunks = [
+            workspaces[start : start + chunk_size]
+            for start in range(0, len(workspaces), chunk_size)
+        ] or [[]]
+        for chunk_index, chunk in enumerate(chunks):
+            work_items.append(
+                WorkItem(
+                    account_id=target.account_id,
+                    session=target.session,
+                    region=target.region,
+                    directory=target.directory,
+                    workspaces=chunk,
+                    chunk_index=chunk_index,
+                    chunk_count=len(chunks),
+                )
+            )
+    logger.info(f"Planned {len(work_items)} work items for {len(targets)} directories")
+    return work_items
+
+
+def get_size(work_item: WorkItem) -> int:
+    return len(work_item.workspaces or [])
+
+
+def get_account_region_key(work_item: WorkItem) -> tuple[str, str]:
+    return work_item.account_id, work_item.region
+
+
+class LargestFirstScheduler:
+    """
+    Runs work items on a worker pool, largest first, so the biggest directories do not
+    become the critical path of the run. The number of items running for the same account,
+    for the same region of an account and for the same region is capped. The API rate
+    limits apply per account and region, the region cap spreads the items of many accounts
+    across the regions. With adaptive concurrency, the number of running items also follows
+    the limit of the controller, which shrinks when the APIs throttle.
+    """
+
+    def __init__(
+        self,
+        max_workers: Union[int, None] = None,
+        max_per_account: Union[int, None] = None,
+        max_per_region: Union[int, None] = None,
+        max_per_account_region: Union[int, None] = None,
+        concurrency_controller: Union[AimdController, None] = None,
+    ) -> None:
+        self._max_workers = max(
+            1, max_workers or int(os.getenv("MaxConcurrentWorkItems", "16"))
+        )
+        self._max_per_account = max(
+            1, max_per_account or int(os.getenv("MaxConcurrentPerAccount", "4"))
+        )
+        self._max_per_region = max(
+            1, max_per_region or int(os.getenv("MaxConcurrentPerRegion", "8"))
+        )
+        # Only tighter than the account cap when set
+        self._max_per_account_region = max(
+            1,
+            max_per_account_region
+            or int(
+                os.getenv("MaxConcurrentPerAccountRegion", str(self._max_per_account))
+            ),
+        )
+        if concurrency_controller is None and is_adaptive_concurrency_enabled():
+            concurrency_controller = client_factory.get_concurrency_controller()
+        self._concurrency_controller = concurrency_controller
+
+    def get_max_running(self) -> int:
+        if self._concurrency_controller is None:
+            return self._max_workers
+        return min(self._max_workers, self._concurrency_controller.limit)
+
+    def run(
+        self, work_items: list[WorkItem], process: Callable[[WorkItem], any]
+    ) -> list[Future]:
+        """
+        This method processes the work items and waits until all of them are done
+        :param work_items: the work items to process
+        :param process: the function processing a single work item
+        :return: the future of each work item, in the order of the work items
+        """
+        # Sorting is stable, items of the same size keep the order of the plan
+        pending = sorted(
+            range(len(work_items)), key=lambda index: -get_size(work_items[index])
+        )
+        futures: list[Union[Future, None]] = [None] * len(work_items)
+        running: dict[Future, WorkItem] = {}
+        account_running: dict[str, int] = {}
+        account_region_running: dict[tuple[str, str], int] = {}
+        region_running: dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while pending or running:
+                for index in list(pending):
+                    if len(running) >= self.get_max_running():
+                        break
+                    work_item = work_items[index]
+                    if (
+                        account_running.get(work_item.account_id, 0)
+                        >= self._max_per_account
+                        or account_region_running.get(
+                            get_account_region_key(work_item), 0
+                        )
+                        >= self._max_per_account_region
+                        or region_running.get(work_item.region, 0)
+                        >= self._max_per_region
+                    ):
+                        continue
+                    pending.remove(index)
+                    future = executor.submit(process, work_item)
+                    futures[index] = future
+                    running[future] = work_item
+                    account_running[work_item.account_id] = (
+                        account_running.get(work_item.account_id, 0) + 1
+                    )
+                    account_region_running[get_account_region_key(work_item)] = (
+                        account_region_running.get(get_account_region_key(work_item), 0)
+                        + 1
+                    )
+                    region_running[work_item.region] = (
+                        region_running.get(work_item.region, 0) + 1
+                    )
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    work_item = running.pop(future)
+                    account_running[work_item.account_id] -= 1
+                    account_region_running[get_account_region_key(work_item)] -= 1
+                    region_running[work_item.region] -= 1
+        return futures
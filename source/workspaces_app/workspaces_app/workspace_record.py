@@ -7,12 +7,16 @@
 import logging
 import os
 import re
+import typing
 from dataclasses import asdict, dataclass, field, fields
 from decimal import Decimal
+from operator import attrgetter
 
 # AWS Libraries
 import botocore
-from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# Cost Optimizer for Amazon Workspaces
+from .ddb_codec import DdbCodec
 
 log = logging.getLogger(__name__)
 
@@ -133,6 +137,13 @@ class WorkspaceBillingData:
     change_reported: str = ""
     new_mode: str = ""
     workspace_terminated: str = ""
+    # Maintenance hours included in billable_hours, which are not carried to the next run
+    maintenance_hours: int = 0
+
+    @property
+    def raw_billable_hours(self) -> int:
+        """The billable hours calculated from the user connections."""
+        return self.billable_hours - self.maintenance_hours
 
     def to_json(self) -> dict[str, any]:
         return asdict(self)
@@ -162,6 +173,7 @@ class WorkspaceRecord:
     last_known_user_connection: str = ""
     tags: str = ""
     workspace_type: str = ""
+    connected_at_last_report: bool = False
 
     def to_json(self) -> dict[str, any]:
         return {
@@ -173,6 +185,7 @@ class WorkspaceRecord:
             "last_known_user_connection": self.last_known_user_connection,
             "tags": self.tags,
             "workspace_type": self.workspace_type,
+            "connected_at_last_report": self.connected_at_last_report,
         }
 
     def to_ddb_obj(self) -> dict[str, any]:
@@ -181,13 +194,7 @@ class WorkspaceRecord:
         use with DynamoDB write calls.
         :return: a dictionary serialized as a DynamoDB item
         """
-        class_as_json = self.to_json()
-        ddb_obj = {}
-
-        for key, value in class_as_json.items():
-            ddb_obj |= self.serialize(key, value)
-
-        return ddb_obj
+        return _ddb_codec.encode(self)
 
     def to_csv(self) -> str:
         """
@@ -242,10 +249,7 @@ class WorkspaceRecord:
         :param ddb_item: a serialized DynamoDB item
         :return: a WorkspaceRecord
         """
-        ddb_as_json = {}
-
-        for key, value in ddb_item.items():
-            ddb_as_json |= cls.deserialize(key, value)
+        ddb_as_json = _ddb_codec.decode(ddb_item)
 
         return cls(
             description=ws_description,
@@ -256,34 +260,10 @@ class WorkspaceRecord:
             performance_metrics=WorkspacePerformanceMetrics.from_json(ddb_as_json),
             tags=ddb_as_json["tags"],
             workspace_type=ddb_as_json["workspace_type"],
+            # Items written before the attribute existed give no guarantee
+            connected_at_last_report=ddb_as_json.get("connected_at_last_report", True),
         )
 
-    @staticmethod
-    def serialize(field_name: str, field_value: any) -> dict[str, any]:
-        """
-        This method serializes a class field for use with DynamoDB
-        :param field_name: the name of the class field
-        :param field_value: the current value of the class field
-        :return: a dict of a  serialized DynamoDB item
-        """
-        serializer = TypeSerializer()
-        ddb_attr = WorkspaceRecord.class_field_to_ddb_attr(field_name)
-
-        return {ddb_attr: serializer.serialize(field_value)}
-
-    @staticmethod
-    def deserialize(attr_name: str, attr_value: dict[str, any]) -> dict[str, any]:
-        """
-        This method deserializes a DynamoDB attribute to a class field
-        :param attr_name: the name of DynamoDB attribute
-        :param attr_value: the serialized value of the DynamoDB attr
-        :return: a dict of representing a class field
-        """
-        deserializer = TypeDeserializer()
-        class_attr = WorkspaceRecord.ddb_attr_to_class_field(attr_name)
-
-        return {class_attr: deserializer.deserialize(attr_value)}
-
     @staticmethod
     def class_field_to_ddb_attr(field_name: str) -> str:
         """
@@ -324,3 +304,42 @@ class WorkspaceRecord:
             "New Mode,Username,Computer Name,DirectoryId,WorkspaceTerminated,insessionlatency,"
             "cpuusage,memoryusage,rootvolumediskusage,uservolumediskusage,udppacketlossrate,Tags,WorkspaceType,ReportDate,\n"
         )
+
+
+def get_workspace_record_fields() -> list[tuple[str, typing.Callable]]:
+    """
+    This method returns the fields of WorkspaceRecord.to_json with the functions returning
+    their value from a record, without building the intermediate dictionaries
+    """
+    record_fields = [
+        (description_field.name, attrgetter(f"description.{description_field.name}"))
+        for description_field in fields(WorkspaceDescription)
+    ] + [
+        (billing_field.name, attrgetter(f"billing_data.{billing_field.name}"))
+        for billing_field in fields(WorkspaceBillingData)
+    ]
+    for metric_field in fields(WorkspacePerformanceMetrics):
+        metric = attrgetter(f"performance_metrics.{metric_field.name}")
+        record_fields += [
+            (
+                metric_field.name,
+                lambda record, metric=metric: getattr(metric(record), "avg", None),
+            ),
+            (
+                metric_field.name + "_count",
+                lambda record, metric=metric: getattr(metric(record), "count", 0),
+            ),
+        ]
+    return record_fields + [
+        (record_field.name, attrgetter(record_field.name))
+        for record_field in fields(WorkspaceRecord)
+        if record_field.name
+        not in ("description", "billing_data", "performance_metrics")
+    ]
+
+
+_ddb_codec = DdbCodec(
+    get_workspace_record_fields(),
+    WorkspaceRecord.class_field_to_ddb_attr,
+    WorkspaceRecord.ddb_attr_to_class_field,
+)
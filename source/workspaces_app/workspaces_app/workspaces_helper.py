@@ -7,7 +7,8 @@
 import os
 import time
 import typing
-from datetime import datetime
+from datetime import datetime, timezone
+from itertools import batched
 
 # AWS Libraries
 import boto3
@@ -16,7 +17,7 @@ from aws_lambda_powertools import Logger
 
 # Cost Optimizer for Amazon Workspaces
 from . import metrics_helper
-from .utils import workspace_utils
+from .utils import client_factory, workspace_utils
 from .utils.dashboard_metrics import DashboardMetrics
 from .workspace_record import (
     WorkspaceBillingData,
@@ -37,6 +38,9 @@ botoConfig = botocore.config.Config(
 
 ALWAYS_ON = "ALWAYS_ON"
 AUTO_STOP = "AUTO_STOP"
+CONNECTED = "CONNECTED"
+# Maximum number of workspace ids accepted by DescribeWorkspacesConnectionStatus
+CONNECTION_STATUS_BATCH_SIZE = 25
 
 
 class WorkspacesHelper(object):
@@ -46,22 +50,29 @@ class WorkspacesHelper(object):
         self.metrics_helper = metrics_helper.MetricsHelper(
             session, self.settings.get("region"), settings.get("userSessionTable")
         )
-        self.workspaces_client = session.client(
-            "workspaces", region_name=self.settings.get("region"), config=botoConfig
+        self.workspaces_client = client_factory.get_client(
+            session, "workspaces", self.settings.get("region"), botoConfig
         )
-        self.cloudwatch_client = session.client(
-            "cloudwatch", region_name=self.settings.get("region"), config=botoConfig
+        self.cloudwatch_client = client_factory.get_client(
+            session, "cloudwatch", self.settings.get("region"), botoConfig
         )
+        # Connection status by workspace id, filled by prefetch_connection_status
+        self.connection_status: dict[str, dict] = {}
+        # Tags by workspace id, filled by prefetch_tags
+        self.workspace_tags: dict[str, list | None] = {}
 
     def process_workspace(
         self,
         ws_record: WorkspaceRecord | WorkspaceDescription,
         autostop_timeout_minutes: int | None,
         dashboard_metrics: DashboardMetrics,
+        calculated_metrics: dict[str, any] | None = None,
     ) -> WorkspaceRecord:
         """
         This method processes the given workspace and returns a workspace record instance
         :param workspace: a preliminary workspace record instance
+        :param calculated_metrics: the billable hours and performance metrics when they were
+        calculated by the caller, they are calculated from the CloudWatch metrics otherwise
         :return: A workspace record instance filled out with the most current data.
         """
         description = (
@@ -69,17 +80,7 @@ class WorkspacesHelper(object):
             if isinstance(ws_record, WorkspaceDescription)
             else ws_record.description
         )
-
-        # if last reported date was date before release, treat it as if
-        # there was no previous data
-        if isinstance(ws_record, WorkspaceRecord):
-            last_reported_period = ws_record.last_reported_metric_period
-            last_reported_period = datetime.strptime(
-                last_reported_period, "%Y-%m-%dT%H:%M:%SZ"
-            )
-            release_271_date = datetime(2024, 8, 28)
-            if last_reported_period < release_271_date:
-                ws_record = ws_record.description
+        ws_record = self.get_analyzed_record(ws_record)
 
         workspace_id = description.workspace_id
         logger.debug(f"workspaceID: {workspace_id}")
@@ -94,18 +95,17 @@ class WorkspacesHelper(object):
         logger.debug(f"workspaceBundleType: {workspace_bundle_type}")
         logger.debug(f"workspaceType: {workspace_type}")
         last_known_user_connection = None
-        calculated_metrics = self.metrics_helper.get_billable_hours_and_performance(
-            self.settings.get("dateTimeValues").get("start_time_for_current_month"),
-            self.settings.get("dateTimeValues").get("end_time_for_current_month"),
-            ws_record,
-            autostop_timeout_minutes,
-        )
+        if calculated_metrics is None:
+            calculated_metrics = self.get_calculated_metrics(
+                ws_record, autostop_timeout_minutes
+            )
         raw_billable_hours = calculated_metrics.get("billable_hours")
 
         # Add maintenance time if applicable
         billable_hours = self.add_maintenance_time(
             raw_billable_hours, workspace_id, workspace_running_mode
         )
+        maintenance_hours = billable_hours - raw_billable_hours
 
         performance_metrics = calculated_metrics.get("performance_metrics")
         tags = self.get_list_tags_for_workspace(workspace_id)
@@ -128,29 +128,19 @@ class WorkspacesHelper(object):
                 workspace_running_mode,
             )
 
-        # Update metrics based on the optimization result
-        if optimization_result["resultCode"] == "-M-":
-            dashboard_metrics.update_conversion_metrics("hourly_to_monthly")
-        elif optimization_result["resultCode"] == "-H-":
-            dashboard_metrics.update_conversion_metrics("monthly_to_hourly")
-        elif optimization_result["resultCode"] == "-E-":
-            dashboard_metrics.update_conversion_metrics("conversion_errors")
-        elif optimization_result["resultCode"] == "-S-":
-            dashboard_metrics.update_conversion_metrics("conversion_skips")
-
-        if workspace_terminated:
-            dashboard_metrics.update_termination_metrics()
-
-        if optimization_result["newMode"] == "AUTO_STOP":
-            dashboard_metrics.update_billing_metrics("hourly_billed")
-        elif optimization_result["newMode"] == "ALWAYS_ON":
-            dashboard_metrics.update_billing_metrics("monthly_billed")
+        self.update_dashboard_metrics(
+            dashboard_metrics,
+            optimization_result["resultCode"],
+            optimization_result["newMode"],
+            workspace_terminated,
+        )
 
         billing_data = WorkspaceBillingData(
             billable_hours=billable_hours,
             change_reported=optimization_result["resultCode"],
             new_mode=optimization_result["newMode"],
             workspace_terminated=workspace_terminated,
+            maintenance_hours=maintenance_hours,
         )
         return WorkspaceRecord(
             description=description,
@@ -163,8 +153,87 @@ class WorkspacesHelper(object):
             last_known_user_connection=last_known_user_connection,
             tags="".join(('"', str(tags), '"')),
             workspace_type=workspace_type,
+            connected_at_last_report=self.is_connected_workspace(workspace_id),
+        )
+
+    @staticmethod
+    def get_analyzed_record(
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+    ) -> WorkspaceRecord | WorkspaceDescription:
+        """
+        This method returns the record the workspace is analyzed from. A record last reported
+        before the 2.7.1 release is treated as if there was no previous data.
+        """
+        if isinstance(ws_record, WorkspaceRecord):
+            last_reported_period = ws_record.last_reported_metric_period
+            last_reported_period = datetime.strptime(
+                last_reported_period, "%Y-%m-%dT%H:%M:%SZ"
+            )
+            release_271_date = datetime(2024, 8, 28)
+            if last_reported_period < release_271_date:
+                return ws_record.description
+        return ws_record
+
+    def get_calculated_metrics(
+        self,
+        ws_record: WorkspaceRecord | WorkspaceDescription,
+        autostop_timeout_minutes: int | None,
+    ) -> dict[str, any] | None:
+        """
+        This method returns the billable hours and performance metrics of the workspace
+        :param ws_record: the record returned by get_analyzed_record
+        :param autostop_timeout_minutes: The autostop timeout for the given workspace
+        :return: billable hours and performance metrics, None if there is no metric data
+        """
+        if self.is_quiescent_workspace(ws_record):
+            # No user connection since the last run, carry the previous results forward
+            # without the maintenance hours, which process_workspace adds again if due
+            logger.debug(
+                f"Workspace {ws_record.description.workspace_id} has no user connection since {ws_record.last_reported_metric_period}"
+            )
+            return {
+                "billable_hours": ws_record.billing_data.raw_billable_hours,
+                "performance_metrics": ws_record.performance_metrics,
+            }
+        return self.metrics_helper.get_billable_hours_and_performance(
+            self.settings.get("dateTimeValues").get("start_time_for_current_month"),
+            self.settings.get("dateTimeValues").get("end_time_for_current_month"),
+            ws_record,
+            autostop_timeout_minutes,
         )
 
+    @staticmethod
+    def update_dashboard_metrics(
+        dashboard_metrics: DashboardMetrics,
+        result_code: str | None,
+        new_mode: str,
+        workspace_terminated: str,
+    ) -> None:
+        """
+        This method updates the dashboard metrics with the outcome for a workspace
+        :param dashboard_metrics: the dashboard metrics for the run
+        :param result_code: the result code of the usage comparison, None when the workspace
+        is only reported
+        :param new_mode: the running mode of the workspace after processing
+        :param workspace_terminated: the termination status of the workspace
+        """
+        if result_code == "-M-":
+            dashboard_metrics.update_conversion_metrics("hourly_to_monthly")
+        elif result_code == "-H-":
+            dashboard_metrics.update_conversion_metrics("monthly_to_hourly")
+        elif result_code == "-E-":
+            dashboard_metrics.update_conversion_metrics("conversion_errors")
+        elif result_code == "-S-":
+            dashboard_metrics.update_conversion_metrics("conversion_skips")
+
+        if workspace_terminated:
+            dashboard_metrics.update_termination_metrics()
+
+        if new_mode == AUTO_STOP:
+            dashboard_metrics.update_billing_metrics("hourly_billed")
+        elif new_mode == ALWAYS_ON:
+            dashboard_metrics.update_billing_metrics("monthly_billed")
+
     def add_maintenance_time(
         self, billable_hours: int, workspace_id: str, workspace_running_mode: str
     ) -> int:
@@ -210,7 +279,15 @@ class WorkspacesHelper(object):
         else:
             return None
 
+    def prefetch_tags(self, workspace_id: str) -> None:
+        """This method gets the tags of a workspace ahead of its processing."""
+        self.workspace_tags[workspace_id] = self.get_list_tags_for_workspace(
+            workspace_id
+        )
+
     def get_list_tags_for_workspace(self, workspace_id):
+        if workspace_id in self.workspace_tags:
+            return self.workspace_tags[workspace_id]
         try:
             workspace_tags = self.workspaces_client.describe_tags(
                 ResourceId=workspace_id
@@ -260,27 +337,7 @@ class WorkspacesHelper(object):
         :return: List of workspaces for a given directory.
         This method returns the list of AWS workspaces in the given directory.
         """
-        logger.debug(f"Getting the workspace  for the directory {directory_id}")
-        list_workspaces = []
-        try:
-            response = self.workspaces_client.describe_workspaces(
-                DirectoryId=directory_id
-            )
-            list_workspaces = response.get("Workspaces", [])
-            next_token = response.get("NextToken", None)
-            while next_token is not None:
-                response = self.workspaces_client.describe_workspaces(
-                    DirectoryId=directory_id, NextToken=next_token
-                )
-                list_workspaces.extend(response.get("Workspaces", []))
-                next_token = response.get("NextToken", None)
-        except botocore.exceptions.ClientError as e:
-            logger.exception(
-                f"Error while getting the list of workspace for directory ID "
-                f"{directory_id}: Error: {e}"
-            )
-        logger.debug(f"Returning the list of workspaces as {list_workspaces}")
-        return list_workspaces
+        return list_workspaces_for_directory(self.workspaces_client, directory_id)
 
     def get_termination_status(self, workspace_id, billable_time, tags):
         """
@@ -392,6 +449,65 @@ class WorkspacesHelper(object):
             )
             return False
 
+    def prefetch_connection_status(self, workspace_ids: typing.List[str]) -> None:
+        """
+        This method fetches the connection status for the given workspaces in batches and
+        caches it for the quiescence and termination checks
+        :param workspace_ids: list of workspace ids
+        """
+        for batch in batched(workspace_ids, CONNECTION_STATUS_BATCH_SIZE):
+            try:
+                paginator = self.workspaces_client.get_paginator(
+                    "describe_workspaces_connection_status"
+                )
+                for page in paginator.paginate(WorkspaceIds=list(batch)):
+                    for status in page.get("WorkspacesConnectionStatus", []):
+                        self.connection_status[status.get("WorkspaceId")] = status
+            except Exception as error:
+                logger.exception(
+                    f"Error {error} while getting the connection status for workspaces {batch}"
+                )
+        logger.debug(
+            f"Prefetched the connection status for {len(self.connection_status)} workspaces"
+        )
+
+    def is_connected_workspace(self, workspace_id: str) -> bool:
+        """
+        This method checks if the user is connected to the workspace, based on the
+        prefetched connection status
+        :param workspace_id: ID for the given workspace
+        :return: True if the user is connected or the connection status is unknown
+        """
+        status = self.connection_status.get(workspace_id)
+        return status is None or status.get("ConnectionState") == CONNECTED
+
+    def is_quiescent_workspace(
+        self, ws_record: WorkspaceRecord | WorkspaceDescription
+    ) -> bool:
+        """
+        This method checks if there was no user connection to the workspace since its
+        metrics were last reported, based on the prefetched connection status
+        :param ws_record: the stored record or the description if there is no stored record
+        :return: True if the stored metrics are still current for the workspace
+        """
+        if not isinstance(ws_record, WorkspaceRecord):
+            return False
+        if ws_record.connected_at_last_report:
+            # The session running at the last report started before it, so its
+            # timestamp cannot tell whether the user stayed connected afterwards
+            return False
+        status = self.connection_status.get(ws_record.description.workspace_id)
+        if status is None or status.get("ConnectionState") == CONNECTED:
+            return False
+        last_known_timestamp = status.get("LastKnownUserConnectionTimestamp")
+        if last_known_timestamp is None:
+            # The status could not tell when the user last connected
+            return False
+        last_reported_period = datetime.strptime(
+            ws_record.last_reported_metric_period, "%Y-%m-%dT%H:%M:%SZ"
+        ).replace(tzinfo=timezone.utc)
+        return last_known_timestamp < last_reported_period
+
     def get_last_known_user_connection_timestamp(self, workspace_id):
         """
         This method return the LastKnownUserConnectionTimestamp for the given workspace_id
@@ -401,6 +517,10 @@ class WorkspacesHelper(object):
         logger.debug(
             f"Getting the last known user connection timestamp for the workspace_id {workspace_id}"
         )
+        if workspace_id in self.connection_status:
+            return self.connection_status[workspace_id].get(
+                "LastKnownUserConnectionTimestamp"
+            )
         try:
             response = self.workspaces_client.describe_workspaces_connection_status(
                 WorkspaceIds=[workspace_id]
@@ -659,3 +779,38 @@ class WorkspacesHelper(object):
             new_mode = ALWAYS_ON
 
         return result_code, new_mode
+
+
+def list_workspaces_for_directory(
+    workspaces_client, directory_id: str
+) -> typing.List[dict]:
+    """
+    :param workspaces_client: the WorkSpaces client of the region of the directory
+    :param directory_id: the directory to list
+    :return: List of workspaces for a given directory.
+    This method returns the list of AWS workspaces in the given directory.
+    """
+    logger.debug(f"Getting the workspace  for the directory {directory_id}")
+    list_workspaces = []
+    try:
+        response = client_factory.hedged_call(
+            workspaces_client, "describe_workspaces", DirectoryId=directory_id
+        )
+        list_workspaces = response.get("Workspaces", [])
+        next_token = response.get("NextToken", None)
+        while next_token is not None:
+            response = client_factory.hedged_call(
+                workspaces_client,
+                "describe_workspaces",
+                DirectoryId=directory_id,
+                NextToken=next_token,
+            )
+            list_workspaces.extend(response.get("Workspaces", []))
+            next_token = response.get("NextToken", None)
+    except botocore.exceptions.ClientError as e:
+        logger.exception(
+            f"Error while getting the list of workspace for directory ID "
+            f"{directory_id}: Error: {e}"
+        )
+    logger.debug(f"Returning the list of workspaces as {list_workspaces}")
+    return list_workspaces